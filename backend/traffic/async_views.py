@@ -0,0 +1,139 @@
+"""Async views for actions that spend their time waiting on upstream services
+
+DRF's ``APIView`` only dispatches synchronously, so these are plain Django
+async views mounted ahead of the router. Under the ASGI app each one waits
+on the shared httpx client without holding a worker thread, and they keep
+the request and response formats of the viewset actions they replace.
+"""
+import logging
+from typing import Any, Dict
+
+import msgpack
+import orjson
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+
+from .renderers import MessagePackRenderer, ORJSONRenderer
+from .services.geocoding_service import get_reverse_geocoder
+from .services.osrm_service import OSRMService
+
+logger = logging.getLogger(__name__)
+
+osrm_service = OSRMService()
+
+
+def _request_data(request) -> Dict[str, Any]:
+    """Body of a JSON, MessagePack or form request"""
+    if request.content_type == 'application/msgpack':
+        return msgpack.unpackb(request.body, raw=False)
+    if request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        return request.POST
+    return orjson.loads(request.body) if request.body else {}
+
+
+def _respond(request, data, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+    """Render like the API's renderers: MessagePack when asked for, else JSON"""
+    renderer = MessagePackRenderer if 'application/msgpack' in request.headers.get('Accept', '') else ORJSONRenderer
+    response = HttpResponse(renderer().render(data), status=status_code, content_type=renderer.media_type)
+    response['Vary'] = 'Accept'
+    return response
+
+
+def _error(request, message: str, status_code: int) -> HttpResponse:
+    return _respond(request, {'error': message}, status_code)
+
+
+@csrf_exempt
+@require_POST
+async def calculate_route(request):
+    """Calculate route between points"""
+    try:
+        data = _request_data(request)
+    except (ValueError, msgpack.ExtraData) as e:
+        return _error(request, f"Invalid request body: {str(e)}", status.HTTP_400_BAD_REQUEST)
+    start = data.get('start')
+    end = data.get('end')
+    waypoints = data.get('waypoints', [])
+
+    if not start or not end:
+        return _error(request, 'start and end points are required', status.HTTP_400_BAD_REQUEST)
+
+    try:
+        return _respond(request, await osrm_service.acalculate_route(start, end, waypoints))
+    except Exception as e:
+        return _error(request, str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def alternative_routes(request):
+    """Get alternative routes avoiding congested areas"""
+    try:
+        data = _request_data(request)
+    except (ValueError, msgpack.ExtraData) as e:
+        return _error(request, f"Invalid request body: {str(e)}", status.HTTP_400_BAD_REQUEST)
+    start = data.get('start')
+    end = data.get('end')
+    max_alternatives = data.get('max_alternatives', 3)
+
+    if not start or not end:
+        return _error(request, 'start and end points are required', status.HTTP_400_BAD_REQUEST)
+
+    try:
+        routes = await osrm_service.aget_alternative_routes(start, end, int(max_alternatives))
+        return _respond(request, {'routes': routes})
+    except Exception as e:
+        return _error(request, str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def search_locations(request):
+    """Search for locations"""
+    query = request.GET.get('query')
+    lat = request.GET.get('lat')
+    lon = request.GET.get('lon')
+
+    if not query:
+        return _error(request, 'query parameter is required', status.HTTP_400_BAD_REQUEST)
+
+    try:
+        data = await osrm_service.asearch_location(
+            query,
+            float(lat) if lat else None,
+            float(lon) if lon else None
+        )
+        return _respond(request, data)
+    except Exception as e:
+        return _error(request, str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def reverse_geocode(request):
+    """Convert coordinates to address"""
+    lat = request.GET.get('lat')
+    lon = request.GET.get('lon')
+
+    if not lat or not lon:
+        return _error(request, 'lat and lon parameters are required', status.HTTP_400_BAD_REQUEST)
+
+    try:
+        lat, lon = float(lat), float(lon)
+    except ValueError:
+        return _error(request, 'lat and lon must be numbers', status.HTTP_400_BAD_REQUEST)
+
+    try:
+        geocoder = await sync_to_async(get_reverse_geocoder, thread_sensitive=False)()
+        if not geocoder.available:
+            # No road network extract loaded; ask Nominatim as before
+            return _respond(request, await osrm_service.areverse_geocode(lat, lon))
+        # Geocoding is local but CPU bound; keep it off the event loop
+        data = await sync_to_async(
+            lambda: geocoder.reverse_geocode(lat, lon),
+            thread_sensitive=False
+        )()
+        return _respond(request, data)
+    except Exception as e:
+        return _error(request, str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
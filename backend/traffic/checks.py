@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def road_network_extract_check(app_configs, **kwargs):
+    """Warn at startup when the road network extract is missing"""
+    path = Path(getattr(settings, 'ROAD_NETWORK_EXTRACT', ''))
+    if path.is_file():
+        return []
+    return [Warning(
+        f"Road network extract not found at {path}",
+        hint=(
+            "Set ROAD_NETWORK_EXTRACT to a GeoJSON road network. Without it single "
+            "reverse geocodes go to Nominatim and batch reverse geocoding returns 503."
+        ),
+        id='traffic.W001',
+    )]
@@ -0,0 +1,67 @@
+import time
+from typing import Callable, Optional
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .services.resource_versions import body_cache, get_version
+
+
+def conditional_response(
+    request,
+    resource: str,
+    build: Callable[[], object],
+    window: Optional[int] = None
+) -> Response:
+    """Serve a read endpoint from its resource version
+
+    The strong ETag and ``Last-Modified`` come from the resource's version
+    counter, so a matching ``If-None-Match`` (or a recent enough
+    ``If-Modified-Since``) gets a 304 without touching the database.
+    Otherwise the serialized data for this version is taken from the body
+    cache, and ``build`` only runs on a miss. Resources that also change
+    with the clock, such as "alerts from the last hour", pass ``window`` in
+    seconds so the ETag rolls over at least that often. The negotiated
+    format is part of the tag and responses vary on ``Accept``, so JSON and
+    MessagePack bodies never share a validator.
+    """
+    version, modified = get_version(resource)
+    tag = f"{resource}-{version}"
+    if window:
+        bucket = int(time.time() // window)
+        tag = f"{tag}-{bucket}"
+        modified = max(modified, bucket * window)
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is not None:
+        tag = f"{tag}-{renderer.format}"
+    etag = f'"{tag}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(modified),
+        'Cache-Control': 'no-cache',
+    }
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # Weak comparison, as compression turns the ETag into W/"..."
+        etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+        if '*' in etags or etag in etags:
+            return _vary_on_accept(Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers))
+    else:
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since is not None and int(modified) <= if_modified_since:
+            return _vary_on_accept(Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers))
+
+    key = (tag, request.get_full_path())
+    data = body_cache.get(key)
+    if data is None:
+        data = build()
+        body_cache.set(key, data)
+    return _vary_on_accept(Response(data, headers=headers))
+
+
+def _vary_on_accept(response: Response) -> Response:
+    patch_vary_headers(response, ('Accept',))
+    return response
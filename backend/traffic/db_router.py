@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica: ContextVar[bool] = ContextVar('use_replica', default=False)
+
+
+class ReplicaHealth:
+    """Cached liveness (and, on PostgreSQL, replication lag) of the replica"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._healthy = False
+
+    def is_healthy(self, alias: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < settings.DATABASE_REPLICA_HEALTH_SECONDS:
+                return self._healthy
+            self._checked = now
+            self._healthy = self._check(alias)
+            return self._healthy
+
+    def _check(self, alias: str) -> bool:
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(
+                        "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+                    )
+                    lag = float(cursor.fetchone()[0])
+                    if lag > settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+                        logger.warning(f"Replica {alias} is {lag:.0f}s behind, reading from primary")
+                        return False
+                else:
+                    cursor.execute('SELECT 1')
+            return True
+        except Exception as e:
+            logger.warning(f"Replica {alias} unavailable, reading from primary: {str(e)}")
+            connection.close_if_unusable_or_obsolete()
+            return False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checked = 0.0
+
+
+replica_health = ReplicaHealth()
+
+
+def replica_alias() -> Optional[str]:
+    """The configured replica alias, if it exists"""
+    alias = settings.DATABASE_REPLICA_ALIAS
+    return alias if alias and alias in settings.DATABASES else None
+
+
+@contextmanager
+def use_replica(enabled: bool = True):
+    """Route reads in this block to the replica while it is healthy"""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_allowed(request) -> bool:
+    """Safe methods from clients that have not written recently"""
+    if request.method not in SAFE_METHODS:
+        return False
+    try:
+        pinned_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+    except ValueError:
+        pinned_until = 0.0
+    return pinned_until <= time.time()
+
+
+class ReplicaRouter:
+    """Sends reads to the replica inside ``use_replica``, everything else to default
+
+    Reads outside ``use_replica`` (collectors, writes' own lookups,
+    management commands) stay on the primary, as does everything while the
+    replica fails its health check.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return None
+        alias = replica_alias()
+        if alias is None or not replica_health.is_healthy(alias):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+class ReplicaReadMixin:
+    """Viewset mixin serving safe requests from the read replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_replica(replica_allowed(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReadYourWritesMiddleware(MiddlewareMixin):
+    """Pins a client to the primary for a while after it writes
+
+    Any unsafe request sets a cookie that keeps the client's reads off the
+    replica for ``DATABASE_REPLICA_STICKY_SECONDS``, long enough for the
+    replica to replay the write.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and replica_alias() is not None:
+            sticky = settings.DATABASE_REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, f"{time.time() + sticky:.3f}", max_age=int(sticky) + 1, httponly=True
+            )
+        return response
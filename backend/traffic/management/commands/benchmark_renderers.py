@@ -0,0 +1,135 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from traffic.renderers import MessagePackRenderer, ORJSONRenderer
+from traffic.middleware import brotli, compress
+from datetime import timedelta
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark serialize + compress time and size of the API renderers on typical payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed repetitions per renderer and encoding'
+        )
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=1,
+            help='Multiplier for the payload sizes'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        scale = options['scale']
+        random.seed(1)
+
+        payloads = {
+            'routes/calculate': self._route_payload(400 * scale),
+            'traffic/flow': self._flow_payload(2000 * scale),
+            'traffic-data (page)': self._traffic_page(100 * scale),
+        }
+        renderers = {
+            'drf-json': JSONRenderer(),
+            'orjson': ORJSONRenderer(),
+            'msgpack': MessagePackRenderer(),
+        }
+        encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+
+        self.stdout.write(
+            f"{'endpoint':<22}{'renderer':<10}{'encoding':<10}{'bytes':>10}{'ms':>10}"
+        )
+        for endpoint, data in payloads.items():
+            for renderer_name, renderer in renderers.items():
+                for encoding in encodings:
+                    size, elapsed = self._measure(renderer, data, encoding, iterations)
+                    self.stdout.write(
+                        f"{endpoint:<22}{renderer_name:<10}{encoding:<10}{size:>10}{elapsed * 1000:>10.2f}"
+                    )
+
+    def _measure(self, renderer, data, encoding, iterations):
+        body = b''
+        started = time.perf_counter()
+        for _ in range(iterations):
+            body = renderer.render(data, renderer.media_type, {})
+            if encoding != 'identity':
+                body = compress(body, encoding)
+        return len(body), (time.perf_counter() - started) / iterations
+
+    def _route_payload(self, steps):
+        """OSRM style route with steps and per-node annotations"""
+        coordinates = [[85.3 + i * 1e-4, 27.7 + i * 1e-4] for i in range(steps * 5)]
+        return {
+            'code': 'Ok',
+            'routes': [{
+                'distance': 12345.6,
+                'duration': 1800.2,
+                'geometry': {'type': 'LineString', 'coordinates': coordinates},
+                'legs': [{
+                    'steps': [
+                        {
+                            'distance': random.uniform(10, 500),
+                            'duration': random.uniform(5, 120),
+                            'name': f'Road {i % 50}',
+                            'maneuver': {
+                                'type': 'turn',
+                                'modifier': random.choice(['left', 'right', 'straight']),
+                                'location': coordinates[i * 5],
+                            },
+                        }
+                        for i in range(steps)
+                    ],
+                    'annotation': {
+                        'distance': [random.uniform(1, 50) for _ in coordinates],
+                        'duration': [random.uniform(0.1, 5) for _ in coordinates],
+                        'speed': [random.uniform(2, 20) for _ in coordinates],
+                        'nodes': [random.randrange(10 ** 9) for _ in coordinates],
+                    },
+                }],
+            }],
+        }
+
+    def _flow_payload(self, locations):
+        now = timezone.now()
+        return {
+            'bbox': '85.2443,27.6258,85.5419,27.8075',
+            'timestamp': now,
+            'flowSegmentData': {
+                f"{27.6 + i * 1e-3},{85.2 + i * 1e-3}": {
+                    'current_speed': random.uniform(5, 50),
+                    'free_flow_speed': 40.0,
+                    'confidence': random.random(),
+                    'road_closure': False,
+                    'timestamp': now,
+                }
+                for i in range(locations)
+            },
+        }
+
+    def _traffic_page(self, rows):
+        now = timezone.now()
+        return {
+            'count': rows * 50,
+            'next': 'http://localhost/api/traffic-data/?page=2',
+            'previous': None,
+            'results': [
+                {
+                    'id': i,
+                    'location': f"{27.6 + i * 1e-3},{85.2 + i * 1e-3}",
+                    'current_speed': random.uniform(5, 50),
+                    'free_flow_speed': 40.0,
+                    'current_travel_time': random.randrange(60, 3600),
+                    'free_flow_travel_time': 3600,
+                    'confidence': random.random(),
+                    'road_closure': False,
+                    'timestamp': (now - timedelta(seconds=i)).isoformat(),
+                }
+                for i in range(rows)
+            ],
+        }
@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
-from traffic.models import Route
-from traffic.services.traffic_collector import TrafficCollector
-import time
+from traffic.management.commands.run_scheduler import run_jobs
+from traffic.services.scheduled_jobs import lease_heartbeat
+from traffic.services.scheduler import build_job
+from traffic.services.sharding import LeaseManager, run_worker_processes
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,6 +10,8 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Continuously collect traffic data for all routes'
 
+    JOB = 'collect_traffic'
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--interval',
@@ -16,40 +19,45 @@ class Command(BaseCommand):
             default=300,
             help='Interval between data collection in seconds (default: 300)'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes to run on this machine, each claiming shards of the routes'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=None,
+            help='Shards the route set is split into (defaults to --workers); '
+                 'use the same value on every machine sharing the job'
+        )
 
     def handle(self, *args, **options):
-        collector = TrafficCollector()
         interval = options['interval']
+        workers = max(1, options['workers'])
+        shards = options['shards'] or workers
 
         self.stdout.write(
             self.style.SUCCESS(f'Starting traffic data collection (interval: {interval}s)')
         )
 
-        while True:
-            try:
-                # Get all active routes
-                routes = Route.objects.all()
-                
-                for route in routes:
-                    try:
-                        collector.collect_traffic_data(route)
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'Successfully collected traffic data for route: {route.name}'
-                            )
-                        )
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f'Error collecting traffic data for route {route.name}: {str(e)}'
-                            )
-                        )
-
-                time.sleep(interval)
-
-            except KeyboardInterrupt:
-                self.stdout.write(self.style.SUCCESS('Stopping traffic data collection'))
-                break
-            except Exception as e:
-                logger.error(f"Error in traffic collection loop: {str(e)}")
-                time.sleep(interval)  # Wait before retrying 
\ No newline at end of file
+        if workers == 1 and shards == 1:
+            self._run(interval)
+        else:
+            run_worker_processes(
+                lambda index: self._run(interval, LeaseManager(self.JOB, shards)),
+                workers
+            )
+
+    def _run(self, interval, lease=None):
+        """The scheduler's collect job; with a lease only routes in the claimed shards are visited"""
+        jobs = [build_job('collect', interval, lease=lease)]
+        if lease is not None:
+            lease.claim()
+            jobs.append(lease_heartbeat(lease))
+        try:
+            run_jobs(self, jobs)
+        finally:
+            if lease is not None:
+                lease.release_all()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from traffic.management.commands.run_scheduler import run_jobs
+from traffic.services.scheduler import build_job
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Refresh precomputed route geometry and monitored location mappings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=900,
+            help='Seconds between refresh passes (default: 900)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single pass and exit'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Starting route geometry refresh (interval: {interval}s)')
+        )
+        run_jobs(self, [build_job('route_geometry', interval)], once=options['once'])
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from traffic.services.ingestion_queue import get_ingestion_queue
+from traffic.services.scheduler import JOB_REGISTRY, Job, Scheduler, build_job
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def run_jobs(command, jobs, once=False, metrics_interval=0, max_workers=None):
+    """Run jobs on a scheduler until interrupted, then drain the ingestion queue
+
+    Shared by the collector commands, which each schedule a fixed set of jobs.
+    """
+    scheduler_jobs = list(jobs)
+    if metrics_interval and not once:
+        scheduler_jobs.append(Job('metrics', lambda: logger.info(f"Job metrics: {scheduler.report()}"), metrics_interval))
+    scheduler = Scheduler(scheduler_jobs, max_workers=max_workers or settings.SCHEDULER_MAX_WORKERS)
+
+    command.stdout.write(command.style.SUCCESS(
+        'Scheduling ' + ', '.join(f"{job.name} every {job.interval:g}s" for job in scheduler.jobs.values())
+    ))
+    try:
+        if once:
+            scheduler.run_once()
+        else:
+            scheduler.run()
+    except KeyboardInterrupt:
+        # run() finishes the running jobs before the interrupt gets here
+        command.stdout.write(command.style.WARNING('Stopped, draining ingestion queue...'))
+    finally:
+        get_ingestion_queue().close(drain=True)
+
+    for name, metrics in scheduler.report().items():
+        command.stdout.write(
+            f"{name}: {metrics['runs']} runs, {metrics['failures']} failed, "
+            f"{metrics['overlaps']} overlapping and {metrics['missed']} missed slots, "
+            f"mean {metrics['mean_seconds']}s, max {metrics['max_seconds']}s"
+        )
+    return scheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic collection and maintenance jobs on one scheduler'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jobs',
+            type=str,
+            default=None,
+            help='Comma separated jobs to run (default: every job with a non-zero interval in '
+                 'SCHEDULER_INTERVALS)'
+        )
+        parser.add_argument(
+            '--interval',
+            action='append',
+            default=[],
+            metavar='JOB=SECONDS',
+            help='Override the interval of one job; may be repeated'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Threads running jobs concurrently (default: SCHEDULER_MAX_WORKERS)'
+        )
+        parser.add_argument(
+            '--metrics-interval',
+            type=int,
+            default=300,
+            help='Seconds between job metrics log lines, 0 to disable (default: 300)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run every selected job once and exit'
+        )
+
+    def handle(self, *args, **options):
+        intervals = {}
+        for override in options['interval']:
+            name, _, seconds = override.partition('=')
+            try:
+                intervals[name] = float(seconds)
+            except ValueError:
+                raise CommandError(f"Invalid --interval '{override}', expected JOB=SECONDS")
+
+        if options['jobs']:
+            names = [name.strip() for name in options['jobs'].split(',') if name.strip()]
+        else:
+            names = [name for name, seconds in settings.SCHEDULER_INTERVALS.items() if seconds > 0]
+            names += [name for name in intervals if name not in names]
+
+        try:
+            jobs = [build_job(name, intervals.get(name)) for name in names]
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['once']:
+            # Every selected job runs, whatever its configured interval
+            jobs = [Job(job.name, job.func, job.interval or 1) for job in jobs]
+        elif not any(job.interval > 0 for job in jobs):
+            raise CommandError(f"No jobs to run; registered jobs: {', '.join(sorted(JOB_REGISTRY))}")
+
+        run_jobs(self, jobs, options['once'], options['metrics_interval'], options['workers'])
@@ -3,12 +3,21 @@ from django.contrib.auth import login
 import firebase_admin
 from firebase_admin import auth, credentials
 from .models import FirebaseUser
+from django.conf import settings
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+import gzip
 import os
 
-class FirebaseAuthMiddleware:
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+class FirebaseAuthMiddleware(MiddlewareMixin):
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self._initialize_firebase()
 
     def _initialize_firebase(self):
@@ -31,5 +40,62 @@ class FirebaseAuthMiddleware:
             except ValueError as e:
                 print(f"Firebase initialization error: {str(e)}")
 
-    def __call__(self, request):
-        return self.get_response(request) 
\ No newline at end of file
+
+def choose_encoding(accept_encoding: str):
+    """Best content coding the client accepts: br if available, then gzip"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Brotli or gzip for API responses above ``COMPRESSION_MIN_BYTES``
+
+    Replaces Django's GZipMiddleware so brotli can be used; like it, strong
+    ETags are made weak because the encoded bytes differ from the original.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if not content_type.startswith(settings.COMPRESSION_CONTENT_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.status_code != 200 or len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
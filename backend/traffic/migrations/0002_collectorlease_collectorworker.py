@@ -0,0 +1,40 @@
+# Generated by Django 5.0.3 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectorLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('shard_index', models.IntegerField()),
+                ('shard_count', models.IntegerField()),
+                ('owner', models.CharField(blank=True, default='', max_length=255)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('job', 'shard_index', 'shard_count')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CollectorWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('owner', models.CharField(max_length=255)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'unique_together': {('job', 'owner')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.3 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0002_collectorlease_collectorworker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Geofence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('fence_type', models.CharField(choices=[('EMERGENCY', 'Emergency Zone'), ('SCHOOL', 'School Zone'), ('CUSTOM', 'Custom Zone')], default='CUSTOM', max_length=20)),
+                ('polygon', models.JSONField()),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GeofenceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=100)),
+                ('subject_type', models.CharField(choices=[('VEHICLE', 'Vehicle'), ('ALERT', 'Alert')], default='VEHICLE', max_length=20)),
+                ('event', models.CharField(choices=[('ENTER', 'Enter'), ('EXIT', 'Exit'), ('ALERT', 'Alert Inside')], max_length=10)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('timestamp', models.DateTimeField()),
+                ('geofence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='traffic.geofence')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject', '-timestamp'], name='traffic_geo_subject_6f2797_idx')],
+            },
+        ),
+    ]
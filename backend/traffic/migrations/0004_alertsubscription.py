@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0003_geofence_geofenceevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, default='', max_length=100)),
+                ('center_latitude', models.FloatField(blank=True, null=True)),
+                ('center_longitude', models.FloatField(blank=True, null=True)),
+                ('radius_m', models.FloatField(default=1000)),
+                ('min_severity', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High')], default='LOW', max_length=10)),
+                ('alert_types', models.JSONField(blank=True, default=list)),
+                ('device_token', models.CharField(max_length=255)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='traffic.route')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_subscriptions', to='traffic.firebaseuser')),
+            ],
+        ),
+    ]
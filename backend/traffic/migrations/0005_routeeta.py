@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0004_alertsubscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteETA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_m', models.FloatField()),
+                ('free_flow_seconds', models.FloatField()),
+                ('eta_seconds', models.FloatField()),
+                ('observed_locations', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='eta', to='traffic.route')),
+            ],
+        ),
+    ]
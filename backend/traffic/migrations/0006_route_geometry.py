@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0005_routeeta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='geometry',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='geometry_source',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='bbox',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='monitored_locations',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='geometry_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
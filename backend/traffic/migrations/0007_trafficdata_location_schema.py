@@ -0,0 +1,95 @@
+# Generated by Django 5.0.3 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_locations(apps, schema_editor):
+    """Give route segment rows written before this migration a location and current speed"""
+    TrafficData = apps.get_model('traffic', 'TrafficData')
+    rows = TrafficData.objects.filter(location='').only('id', 'latitude', 'longitude', 'speed')
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        row.location = f"{row.latitude},{row.longitude}"
+        row.current_speed = row.speed
+        batch.append(row)
+        if len(batch) >= 2000:
+            TrafficData.objects.bulk_update(batch, ['location', 'current_speed'])
+            batch = []
+    if batch:
+        TrafficData.objects.bulk_update(batch, ['location', 'current_speed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0006_route_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trafficdata',
+            name='confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficdata',
+            name='current_speed',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficdata',
+            name='current_travel_time',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficdata',
+            name='free_flow_speed',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficdata',
+            name='free_flow_travel_time',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficdata',
+            name='location',
+            field=models.CharField(db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='trafficdata',
+            name='road_closure',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='trafficdata',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='trafficdata',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='trafficdata',
+            name='road_segment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='traffic.route'),
+        ),
+        migrations.AlterField(
+            model_name='trafficdata',
+            name='speed',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='trafficdata',
+            name='timestamp',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='trafficdata',
+            index=models.Index(fields=['location', '-timestamp'], name='traffic_tra_locatio_7d44bd_idx'),
+        ),
+        migrations.RunPython(backfill_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic', '0007_trafficdata_location_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50, unique=True)),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.FloatField()),
+                ('day', models.CharField(max_length=8)),
+                ('used', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
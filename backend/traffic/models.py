@@ -10,6 +10,13 @@ class Route(models.Model):
     end_latitude = models.FloatField()
     end_longitude = models.FloatField()
     waypoints = models.JSONField()
+    # Precomputed by RouteGeometryService: encoded polyline (precision 5),
+    # [minLon, minLat, maxLon, maxLat] and the monitored locations on the corridor
+    geometry = models.TextField(blank=True, default='')
+    geometry_source = models.CharField(max_length=10, blank=True, default='')
+    bbox = models.JSONField(null=True, blank=True)
+    monitored_locations = models.JSONField(default=list, blank=True)
+    geometry_updated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -17,15 +24,27 @@ class Route(models.Model):
         return self.name
 
 class TrafficData(models.Model):
-    latitude = models.FloatField()
-    longitude = models.FloatField()
-    speed = models.FloatField()
-    vehicle_count = models.IntegerField()
+    # Monitored location as "lat,lon"; every reading has one, and readings
+    # collected for a saved route also carry the route and its segment fields
+    location = models.CharField(max_length=255, default='', db_index=True)
+    current_speed = models.FloatField(null=True, blank=True)
+    free_flow_speed = models.FloatField(null=True, blank=True)
+    current_travel_time = models.IntegerField(null=True, blank=True)
+    free_flow_travel_time = models.IntegerField(null=True, blank=True)
+    confidence = models.FloatField(null=True, blank=True)
+    road_closure = models.BooleanField(default=False)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    speed = models.FloatField(null=True, blank=True)
+    vehicle_count = models.IntegerField(default=0)
     timestamp = models.DateTimeField()
-    road_segment = models.ForeignKey(Route, on_delete=models.CASCADE)
+    road_segment = models.ForeignKey(Route, null=True, blank=True, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [models.Index(fields=['location', '-timestamp'])]
 
     def __str__(self):
-        return f"{self.latitude},{self.longitude} - {self.timestamp}"
+        return f"{self.location} - {self.timestamp}"
 
 class Alert(models.Model):
     SEVERITY_CHOICES = [
@@ -49,6 +68,16 @@ class Alert(models.Model):
     def __str__(self):
         return f"{self.alert_type} - {self.location} ({self.severity})"
 
+class EmergencyVehicle(models.Model):
+    vehicle_id = models.CharField(max_length=50, unique=True)
+    vehicle_type = models.CharField(max_length=50, default='unknown')
+    current_location = models.CharField(max_length=255, default='unknown')
+    status = models.CharField(max_length=50, default='inactive')
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.vehicle_type} {self.vehicle_id} ({self.status})"
+
 class FirebaseUser(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     firebase_uid = models.CharField(max_length=128, unique=True)
@@ -60,3 +89,122 @@ class FirebaseUser(models.Model):
 
     def __str__(self):
         return f"{self.email} - {self.firebase_uid}"
+
+class CollectorLease(models.Model):
+    """Ownership of one shard of a collector job, renewed by heartbeats"""
+    job = models.CharField(max_length=100)
+    shard_index = models.IntegerField()
+    shard_count = models.IntegerField()
+    owner = models.CharField(max_length=255, blank=True, default='')
+    expires_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('job', 'shard_index', 'shard_count')
+
+    def __str__(self):
+        return f"{self.job} {self.shard_index + 1}/{self.shard_count} ({self.owner or 'free'})"
+
+class CollectorWorker(models.Model):
+    """Liveness record for a collector worker taking part in a job"""
+    job = models.CharField(max_length=100)
+    owner = models.CharField(max_length=255)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('job', 'owner')
+
+    def __str__(self):
+        return f"{self.job} worker {self.owner}"
+
+class QuotaBucket(models.Model):
+    """Token bucket and daily call count of one metered endpoint, shared by all workers"""
+    endpoint = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField()
+    # Unix time of the last refill
+    refilled_at = models.FloatField()
+    # UTC day (YYYYMMDD) that ``used`` counts calls for
+    day = models.CharField(max_length=8)
+    used = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.endpoint}: {self.used} calls on {self.day}"
+
+class Geofence(models.Model):
+    """Polygon zone evaluated locally against vehicle positions and alerts"""
+    FENCE_TYPES = [
+        ('EMERGENCY', 'Emergency Zone'),
+        ('SCHOOL', 'School Zone'),
+        ('CUSTOM', 'Custom Zone'),
+    ]
+
+    name = models.CharField(max_length=100)
+    fence_type = models.CharField(max_length=20, choices=FENCE_TYPES, default='CUSTOM')
+    # Ring of {"latitude": ..., "longitude": ...} vertices, not closed
+    polygon = models.JSONField()
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.fence_type})"
+
+class GeofenceEvent(models.Model):
+    """A vehicle entering or leaving a geofence, or an alert raised inside one"""
+    EVENT_TYPES = [
+        ('ENTER', 'Enter'),
+        ('EXIT', 'Exit'),
+        ('ALERT', 'Alert Inside'),
+    ]
+    SUBJECT_TYPES = [
+        ('VEHICLE', 'Vehicle'),
+        ('ALERT', 'Alert'),
+    ]
+
+    geofence = models.ForeignKey(Geofence, on_delete=models.CASCADE, related_name='events')
+    subject = models.CharField(max_length=100)
+    subject_type = models.CharField(max_length=20, choices=SUBJECT_TYPES, default='VEHICLE')
+    event = models.CharField(max_length=10, choices=EVENT_TYPES)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['subject', '-timestamp'])]
+
+    def __str__(self):
+        return f"{self.subject} {self.event} {self.geofence_id} at {self.timestamp}"
+
+class AlertSubscription(models.Model):
+    """A user's interest in alerts around a point or along a saved route"""
+    SEVERITY_CHOICES = Alert.SEVERITY_CHOICES
+
+    user = models.ForeignKey(FirebaseUser, on_delete=models.CASCADE, related_name='alert_subscriptions')
+    name = models.CharField(max_length=100, blank=True, default='')
+    route = models.ForeignKey(Route, null=True, blank=True, on_delete=models.CASCADE, related_name='subscriptions')
+    center_latitude = models.FloatField(null=True, blank=True)
+    center_longitude = models.FloatField(null=True, blank=True)
+    radius_m = models.FloatField(default=1000)
+    min_severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, default='LOW')
+    # Empty means every alert type
+    alert_types = models.JSONField(default=list, blank=True)
+    device_token = models.CharField(max_length=255)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        target = f"route {self.route_id}" if self.route_id else f"{self.center_latitude},{self.center_longitude}"
+        return f"{self.user.email} - {target}"
+
+class RouteETA(models.Model):
+    """Latest traffic-adjusted travel time of a saved route"""
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, related_name='eta')
+    distance_m = models.FloatField()
+    free_flow_seconds = models.FloatField()
+    eta_seconds = models.FloatField()
+    # Monitored locations on the corridor that had a reading at computation time
+    observed_locations = models.IntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.route_id}: {self.eta_seconds:.0f}s ({self.computed_at})"
@@ -0,0 +1,220 @@
+import logging
+import random
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+# Transaction bookkeeping repeats legitimately
+_IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT')
+
+
+def query_shape(sql: str) -> str:
+    """SQL with literals and parameter lists collapsed, so N+1 loops share one shape"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _IN_LIST.sub('(...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more queries than its budget, or repeated one query shape"""
+
+
+@dataclass
+class QueryBudget:
+    max_queries: int
+    # Times one query shape may run before it counts as N+1
+    repeat_threshold: Optional[int] = None
+
+
+def query_budget(max_queries: int, repeat_threshold: Optional[int] = None):
+    """Declare the query budget of a view action
+
+    Enforced by ``QueryBudgetMiddleware``; stack under ``@action``.
+    """
+    def decorator(func):
+        func.query_budget = QueryBudget(max_queries, repeat_threshold)
+        return func
+    return decorator
+
+
+def budget_for(view_func, method: str) -> Optional[QueryBudget]:
+    """Declared budget of the view or viewset action handling ``method``"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, 'query_budget', None)
+    handler = (getattr(view_func, 'actions', None) or {}).get(method.lower(), method.lower())
+    declared = getattr(getattr(cls, handler, None), 'query_budget', None)
+    if declared is None:
+        declared = getattr(cls, 'query_budgets', {}).get(handler)
+    if isinstance(declared, int):
+        declared = QueryBudget(declared)
+    return declared
+
+
+def _project_stack() -> str:
+    """Frames from this project only, innermost last"""
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base) and frame.filename != __file__
+        and 'site-packages' not in frame.filename
+    ]
+    return ''.join(traceback.format_list(frames[-8:]))
+
+
+class QueryMonitor:
+    """Records every query on every connection while active, grouped by shape
+
+    Installed with ``execute_wrapper``, so it sees queries from the ORM and
+    raw cursors alike on the current thread. The first stack of each shape
+    is kept for reports.
+    """
+
+    def __init__(self, capture_stacks: bool = True):
+        self.capture_stacks = capture_stacks
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+        self.samples: Dict[str, str] = {}
+        self.stacks: Dict[str, str] = {}
+        self._stack: Optional[ExitStack] = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if shape not in self.samples:
+                self.samples[shape] = sql
+                if self.capture_stacks:
+                    self.stacks[shape] = _project_stack()
+
+    def __enter__(self) -> 'QueryMonitor':
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stack.close()
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Shapes run at least ``threshold`` times"""
+        return {
+            shape: count for shape, count in self.shapes.items()
+            if count >= threshold and not shape.upper().startswith(_IGNORED)
+        }
+
+    def problems(self, budget: QueryBudget) -> List[str]:
+        """Budget and N+1 violations, empty when within budget"""
+        problems = []
+        if self.count > budget.max_queries:
+            problems.append(f"{self.count} queries, budget {budget.max_queries}")
+        threshold = budget.repeat_threshold or settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        for shape, count in self.repeated(threshold).items():
+            problems.append(f"N+1: {count} x {shape}")
+        return problems
+
+    def report(self, label: str, problems: List[str]) -> str:
+        lines = [f"Query budget exceeded in {label} ({self.seconds * 1000:.1f} ms in queries):"]
+        lines += [f"  {problem}" for problem in problems]
+        for shape, count in self.shapes.most_common(5):
+            lines.append(f"  {count} x {self.samples[shape][:300]}")
+            if self.stacks.get(shape):
+                lines.append('    ' + self.stacks[shape].rstrip().replace('\n', '\n    '))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def enforce_query_budget(
+    max_queries: int,
+    repeat_threshold: Optional[int] = None,
+    label: str = 'block',
+    raise_errors: bool = True
+):
+    """Run a block under a query budget, raising or logging on violations"""
+    monitor = QueryMonitor()
+    with monitor:
+        yield monitor
+    problems = monitor.problems(QueryBudget(max_queries, repeat_threshold))
+    if problems:
+        report = monitor.report(label, problems)
+        if raise_errors:
+            raise QueryBudgetExceeded(report)
+        logger.warning(report)
+
+
+class QueryBudgetTestMixin:
+    """``assertQueryBudget`` for TestCases: an upper bound plus N+1 detection
+
+    Unlike ``assertNumQueries`` it does not pin an exact count, and it
+    names the repeated query with the code that issued it on failure.
+    """
+
+    def assertQueryBudget(self, max_queries: int, repeat_threshold: Optional[int] = None):
+        return enforce_query_budget(max_queries, repeat_threshold, label=self.id())
+
+
+class QueryBudgetMiddleware(MiddlewareMixin):
+    """Applies declared query budgets to API requests
+
+    ``QUERY_BUDGET_MODE`` 'raise' checks every request and fails those over
+    budget (the test runner switches to it); 'log' checks a
+    ``QUERY_BUDGET_SAMPLE_RATE`` sample and logs violations with stack
+    traces; 'off' disables it. Actions without a declared budget get
+    ``QUERY_BUDGET_DEFAULT``. N+1 shapes are flagged either way.
+
+    The monitor sees one thread's connections, so the view is called from
+    ``process_view``: under ASGI that runs in the same worker thread as the
+    sync view. Async views query from other threads and are not checked.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = settings.QUERY_BUDGET_MODE
+        if mode == 'off' or (mode == 'log' and random.random() >= settings.QUERY_BUDGET_SAMPLE_RATE):
+            return None
+        if iscoroutinefunction(view_func):
+            return None
+
+        monitor = QueryMonitor()
+        with monitor:
+            response = view_func(request, *view_args, **view_kwargs)
+        budget = budget_for(view_func, request.method) or QueryBudget(settings.QUERY_BUDGET_DEFAULT)
+        problems = monitor.problems(budget)
+        if problems:
+            report = monitor.report(f"{request.method} {request.path}", problems)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(report)
+            logger.warning(report)
+        return response
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Test runner enforcing query budgets on every request"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_MODE = 'raise'
@@ -0,0 +1,83 @@
+import datetime
+import decimal
+import uuid
+
+import msgpack
+import numpy as np
+import orjson
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+
+def _default(obj):
+    """Types neither orjson nor msgpack encode on their own"""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (uuid.UUID, Promise)):
+        return str(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not serializable: {type(obj).__name__}")
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    return _default(obj)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON via orjson, several times faster than the stdlib encoder DRF uses"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = self.options
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=options)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack for clients that send ``Accept: application/msgpack``"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True, datetime=False)
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f'JSON parse error - {str(e)}')
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as e:
+            raise ParseError(f'MessagePack parse error - {str(e)}')
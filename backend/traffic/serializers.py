@@ -1,6 +1,11 @@
 from rest_framework import serializers
-from .models import TrafficData, Alert, Route, EmergencyVehicle
+from .models import (
+    TrafficData, Alert, Route, EmergencyVehicle, Geofence, GeofenceEvent,
+    FirebaseUser, AlertSubscription, RouteETA
+)
+from .services.geocoding_service import get_reverse_geocoder
 from django.contrib.auth.models import User
+from django.db.models.manager import BaseManager
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,21 +18,52 @@ class TrafficDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = TrafficData
         fields = [
-            'id', 'latitude', 'longitude', 
+            'id', 'location', 'current_speed', 'free_flow_speed',
+            'current_travel_time', 'free_flow_travel_time', 'confidence',
+            'road_closure', 'latitude', 'longitude',
             'speed', 'vehicle_count', 'timestamp',
             'road_segment', 'route_name'
         ]
 
+class RouteETASerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RouteETA
+        fields = [
+            'distance_m', 'free_flow_seconds', 'eta_seconds',
+            'observed_locations', 'computed_at'
+        ]
+
 class RouteSerializer(serializers.ModelSerializer):
+    eta = serializers.SerializerMethodField()
+
     class Meta:
         model = Route
         fields = [
             'id', 'name', 'description', 
             'start_latitude', 'start_longitude',
             'end_latitude', 'end_longitude',
-            'waypoints', 'created_at', 'updated_at'
+            'waypoints', 'geometry', 'geometry_source', 'bbox',
+            'monitored_locations', 'eta', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'geometry', 'geometry_source', 'bbox', 'monitored_locations'
         ]
 
+    def get_eta(self, route):
+        eta = getattr(route, 'eta', None)
+        return RouteETASerializer(eta).data if eta is not None else None
+
+class AlertListSerializer(serializers.ListSerializer):
+    """Labels every alert location with one batched reverse-geocode call"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        labels = get_reverse_geocoder().label_locations(item.location for item in items)
+        representation = super().to_representation(items)
+        for item in representation:
+            item['location_label'] = labels.get(item['location'])
+        return representation
+
 class AlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = Alert
@@ -35,6 +71,7 @@ class AlertSerializer(serializers.ModelSerializer):
             'id', 'location', 'alert_type',
             'severity', 'description', 'timestamp'
         ]
+        list_serializer_class = AlertListSerializer
 
 class EmergencyVehicleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -52,4 +89,67 @@ class TrafficConditionSerializer(serializers.Serializer):
     congestion_level = serializers.CharField()
     last_updated = serializers.DateTimeField()
     alerts = AlertSerializer(many=True)
-    traffic_segments = serializers.ListField(child=serializers.DictField()) 
\ No newline at end of file
+    traffic_segments = serializers.ListField(child=serializers.DictField()) 
+
+class GeofenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Geofence
+        fields = [
+            'id', 'name', 'fence_type', 'polygon',
+            'active', 'created_at', 'updated_at'
+        ]
+
+    def validate_polygon(self, value):
+        if not isinstance(value, list) or len(value) < 3:
+            raise serializers.ValidationError('polygon needs at least 3 vertices')
+        for vertex in value:
+            try:
+                lat = float(vertex['latitude'])
+                lon = float(vertex['longitude'])
+            except (KeyError, TypeError, ValueError):
+                raise serializers.ValidationError('vertices must have numeric latitude and longitude')
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise serializers.ValidationError('vertex out of range')
+        return value
+
+class GeofenceEventSerializer(serializers.ModelSerializer):
+    geofence_name = serializers.CharField(source='geofence.name', read_only=True)
+
+    class Meta:
+        model = GeofenceEvent
+        fields = [
+            'id', 'geofence', 'geofence_name', 'subject', 'subject_type',
+            'event', 'latitude', 'longitude', 'timestamp'
+        ]
+
+class AlertSubscriptionSerializer(serializers.ModelSerializer):
+    user = serializers.SlugRelatedField(slug_field='firebase_uid', queryset=FirebaseUser.objects.all())
+
+    class Meta:
+        model = AlertSubscription
+        fields = [
+            'id', 'user', 'name', 'route',
+            'center_latitude', 'center_longitude', 'radius_m',
+            'min_severity', 'alert_types', 'device_token',
+            'active', 'created_at'
+        ]
+        extra_kwargs = {'device_token': {'write_only': True}}
+
+    def validate_alert_types(self, value):
+        known = {code for code, _ in Alert.ALERT_TYPES}
+        if not isinstance(value, list) or not set(value) <= known:
+            raise serializers.ValidationError(f'alert types must be among {sorted(known)}')
+        return value
+
+    def validate(self, attrs):
+        def current(name):
+            return attrs.get(name, getattr(self.instance, name, None))
+
+        has_area = current('center_latitude') is not None and current('center_longitude') is not None
+        if bool(current('route')) == has_area:
+            raise serializers.ValidationError(
+                'subscribe to either a route or an area (center_latitude, center_longitude)'
+            )
+        if has_area and current('radius_m') is not None and current('radius_m') <= 0:
+            raise serializers.ValidationError('radius_m must be positive')
+        return attrs
@@ -0,0 +1,258 @@
+import logging
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from ..models import Alert, AlertSubscription
+from .fetch_planner import route_bbox
+from .resource_versions import ALERT_SUBSCRIPTIONS, get_version
+from .spatial_index import EARTH_RADIUS_M, GridIndex, haversine_m, parse_locations
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2}
+ALERT_TYPE_BITS = {code: 1 << i for i, (code, _) in enumerate(Alert.ALERT_TYPES)}
+ALL_ALERT_TYPES = sum(ALERT_TYPE_BITS.values())
+
+
+@dataclass
+class PushMessage:
+    """One notification to one device, covering one or more alerts"""
+    token: str
+    title: str
+    body: str
+    alert_ids: List[int] = field(default_factory=list)
+
+    def data(self) -> Dict[str, str]:
+        return {'alert_ids': ','.join(str(i) for i in self.alert_ids)}
+
+
+class PushSender:
+    """Delivers push messages; subclasses implement ``send``"""
+
+    def send(self, messages: List[PushMessage]) -> int:
+        """Send a batch and return how many were delivered"""
+        raise NotImplementedError
+
+
+class FirebasePushSender(PushSender):
+    """Firebase Cloud Messaging, up to 500 messages per ``send_each`` call"""
+
+    BATCH_SIZE = 500
+
+    def send(self, messages: List[PushMessage]) -> int:
+        from firebase_admin import messaging
+
+        delivered = 0
+        for start in range(0, len(messages), self.BATCH_SIZE):
+            batch = [
+                messaging.Message(
+                    token=message.token,
+                    notification=messaging.Notification(title=message.title, body=message.body),
+                    data=message.data()
+                )
+                for message in messages[start:start + self.BATCH_SIZE]
+            ]
+            response = messaging.send_each(batch)
+            delivered += response.success_count
+            if response.failure_count:
+                logger.warning(f"{response.failure_count} of {len(batch)} pushes failed")
+        return delivered
+
+
+class FakePushSender(PushSender):
+    """Keeps sent messages in memory; for tests and local development"""
+
+    def __init__(self):
+        self.batches: List[List[PushMessage]] = []
+
+    @property
+    def sent(self) -> List[PushMessage]:
+        return [message for batch in self.batches for message in batch]
+
+    def send(self, messages: List[PushMessage]) -> int:
+        self.batches.append(list(messages))
+        return len(messages)
+
+
+class SubscriptionIndex:
+    """Active subscriptions as arrays behind a grid over their bboxes
+
+    Area subscriptions are circles; route subscriptions cover the route's
+    padded bbox, the same area route conditions assign alerts by.
+    """
+
+    def __init__(self, subscriptions: Sequence[AlertSubscription], cell_size: float = 0.01, padding: float = 0.01):
+        self.subscriptions = list(subscriptions)
+        count = len(self.subscriptions)
+        self.tokens = [s.device_token for s in self.subscriptions]
+        self.min_severity = np.asarray(
+            [SEVERITY_RANK.get(s.min_severity, 0) for s in self.subscriptions], dtype=np.int64
+        )
+        self.type_mask = np.asarray([
+            sum(ALERT_TYPE_BITS.get(t, 0) for t in s.alert_types) or ALL_ALERT_TYPES
+            for s in self.subscriptions
+        ], dtype=np.int64)
+
+        self.is_area = np.asarray([s.route_id is None for s in self.subscriptions], dtype=bool)
+        self.center_lat = np.asarray([s.center_latitude or 0.0 for s in self.subscriptions], dtype=np.float64)
+        self.center_lon = np.asarray([s.center_longitude or 0.0 for s in self.subscriptions], dtype=np.float64)
+        self.radius_m = np.asarray([s.radius_m for s in self.subscriptions], dtype=np.float64)
+
+        boxes = np.zeros((count, 4))
+        for i, subscription in enumerate(self.subscriptions):
+            if subscription.route_id is not None:
+                min_lon, min_lat, max_lon, max_lat = route_bbox(subscription.route, padding)
+                boxes[i] = (min_lat, min_lon, max_lat, max_lon)
+            else:
+                d_lat = math.degrees(subscription.radius_m / EARTH_RADIUS_M)
+                d_lon = d_lat / max(math.cos(math.radians(subscription.center_latitude)), 1e-6)
+                boxes[i] = (
+                    subscription.center_latitude - d_lat, subscription.center_longitude - d_lon,
+                    subscription.center_latitude + d_lat, subscription.center_longitude + d_lon,
+                )
+        self.boxes = boxes
+
+        self.grid = GridIndex(cell_size)
+        if count:
+            self.grid.insert_many(np.arange(count), boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3])
+        self.grid.build()
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def match(self, alerts: Sequence[Alert]) -> Tuple[np.ndarray, np.ndarray]:
+        """Aligned ``(alert_index, subscription_position)`` arrays of every match"""
+        lats, lons = parse_locations([alert.location for alert in alerts])
+        points, subs = self.grid.query_points(lats, lons)
+        if not len(points):
+            return points, subs
+
+        severity = np.asarray([SEVERITY_RANK.get(a.severity, 0) for a in alerts], dtype=np.int64)
+        type_bits = np.asarray([ALERT_TYPE_BITS.get(a.alert_type, 0) for a in alerts], dtype=np.int64)
+        box = self.boxes[subs]
+        keep = (
+            (lats[points] >= box[:, 0]) & (lats[points] <= box[:, 2])
+            & (lons[points] >= box[:, 1]) & (lons[points] <= box[:, 3])
+            & (severity[points] >= self.min_severity[subs])
+            & ((type_bits[points] & self.type_mask[subs]) != 0)
+        )
+        area = self.is_area[subs]
+        distance = haversine_m(lats[points], lons[points], self.center_lat[subs], self.center_lon[subs])
+        keep &= ~area | (distance <= self.radius_m[subs])
+        return points[keep], subs[keep]
+
+    def count_in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> int:
+        """Subscriptions whose area overlaps a bbox"""
+        candidates = self.grid.query_bbox(min_lat, min_lon, max_lat, max_lon)
+        box = self.boxes[candidates]
+        overlap = (
+            (box[:, 0] <= max_lat) & (box[:, 2] >= min_lat)
+            & (box[:, 1] <= max_lon) & (box[:, 3] >= min_lon)
+        )
+        return int(overlap.sum())
+
+
+def coalesce(alerts: Sequence[Alert], points: np.ndarray, tokens: Sequence[str]) -> List[PushMessage]:
+    """One message per device for all the alerts that matched it"""
+    by_token: Dict[str, Dict[int, None]] = {}
+    for point, token in zip(points, tokens):
+        by_token.setdefault(token, {})[int(point)] = None
+
+    messages = []
+    for token, indices in by_token.items():
+        matched = [alerts[i] for i in indices]
+        if len(matched) == 1:
+            alert = matched[0]
+            title = f"{alert.get_alert_type_display()} ({alert.get_severity_display()})"
+            body = alert.description
+        else:
+            high = sum(1 for alert in matched if alert.severity == 'HIGH')
+            title = f"{len(matched)} new traffic alerts"
+            body = f"{high} high severity" if high else 'Near your saved areas'
+        messages.append(PushMessage(
+            token=token, title=title, body=body, alert_ids=[alert.id for alert in matched]
+        ))
+    return messages
+
+
+class AlertSubscriptionMatcher:
+    """Matches batches of new alerts to subscribers and pushes the results
+
+    The subscription index is rebuilt whenever the subscriptions resource
+    version moves. A batch of alerts is matched in one vectorized pass and
+    coalesced to a single message per device, so the work grows with the
+    number of matches rather than subscribers x alerts. Messages are sent
+    through the configured ``PushSender`` in batches of ``batch_size``.
+    """
+
+    def __init__(
+        self,
+        sender: Optional[PushSender] = None,
+        cell_size: float = 0.01,
+        batch_size: int = 500
+    ):
+        self.sender = sender or import_string(settings.ALERT_PUSH_SENDER)()
+        self.cell_size = cell_size
+        self.batch_size = batch_size
+        self._index: Optional[SubscriptionIndex] = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def index(self) -> SubscriptionIndex:
+        version, _ = get_version(ALERT_SUBSCRIPTIONS)
+        with self._lock:
+            if self._index is None or version != self._version:
+                subscriptions = AlertSubscription.objects.filter(active=True).select_related('route')
+                self._index = SubscriptionIndex(subscriptions, self.cell_size)
+                self._version = version
+                logger.info(f"Loaded {len(self._index)} alert subscriptions")
+            return self._index
+
+    def messages_for(self, alerts: Sequence[Alert]) -> List[PushMessage]:
+        """Coalesced messages for a batch of alerts, without sending them"""
+        alerts = list(alerts)
+        if not alerts:
+            return []
+        index = self.index()
+        points, subs = index.match(alerts)
+        return coalesce(alerts, points, [index.tokens[s] for s in subs])
+
+    def notify(self, alerts: Sequence[Alert]) -> int:
+        """Match, coalesce and send; returns the number of messages delivered"""
+        messages = self.messages_for(alerts)
+        delivered = 0
+        for start in range(0, len(messages), self.batch_size):
+            try:
+                delivered += self.sender.send(messages[start:start + self.batch_size])
+            except Exception as e:
+                logger.error(f"Error sending alert pushes: {str(e)}")
+        if messages:
+            logger.info(f"Pushed {delivered}/{len(messages)} alert notifications for {len(alerts)} alerts")
+        return delivered
+
+    def interest(self, bbox: Tuple[float, float, float, float]) -> int:
+        """Subscribers watching a ``(minLon, minLat, maxLon, maxLat)`` bbox"""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        return self.index().count_in_bbox(min_lat, min_lon, max_lat, max_lon)
+
+
+_matcher_instance: Optional[AlertSubscriptionMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def get_subscription_matcher() -> AlertSubscriptionMatcher:
+    """Process-wide matcher using the configured push sender"""
+    global _matcher_instance
+    with _matcher_lock:
+        if _matcher_instance is None:
+            _matcher_instance = AlertSubscriptionMatcher(
+                cell_size=settings.ALERT_SUBSCRIPTION_GRID_SIZE,
+                batch_size=settings.ALERT_PUSH_BATCH_SIZE
+            )
+        return _matcher_instance
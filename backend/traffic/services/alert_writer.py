@@ -0,0 +1,52 @@
+"""One write path for generated alerts
+
+Collectors, the anomaly detector and the ingestion queue all save alerts
+with ``bulk_create``, which sends no signals, so every batch goes through
+``alerts_written``: the alerts version bump, geofence evaluation and one
+coalesced round of subscriber pushes per batch.
+"""
+import logging
+from typing import List, Sequence
+
+from ..models import Alert
+from .alert_subscriptions import get_subscription_matcher
+from .geofence_engine import get_geofence_engine
+from .resource_versions import ALERTS, bump_version
+
+logger = logging.getLogger(__name__)
+
+
+def _bump_alerts(alerts: List[Alert]) -> None:
+    bump_version(ALERTS)
+
+
+def _geofence_alerts(alerts: List[Alert]) -> None:
+    get_geofence_engine().evaluate_alerts(alerts)
+
+
+def _notify_subscribers(alerts: List[Alert]) -> None:
+    get_subscription_matcher().notify(alerts)
+
+
+ALERT_HOOKS = [_bump_alerts, _geofence_alerts, _notify_subscribers]
+
+
+def alerts_written(alerts: List[Alert]) -> None:
+    """Run the post-write hooks for a batch of saved alerts"""
+    if not alerts:
+        return
+    for hook in ALERT_HOOKS:
+        try:
+            hook(alerts)
+        except Exception as e:
+            logger.error(f"Alert hook {hook.__name__} failed: {str(e)}")
+
+
+def save_alerts(alerts: Sequence[Alert], batch_size: int = 500) -> List[Alert]:
+    """Save unsaved alerts in one batch and run the post-write hooks"""
+    alerts = list(alerts)
+    if not alerts:
+        return []
+    alerts = Alert.objects.bulk_create(alerts, batch_size=batch_size)
+    alerts_written(alerts)
+    return alerts
@@ -0,0 +1,276 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Alert
+from .alert_writer import save_alerts
+from .speed_profiles import SpeedProfileStore, get_speed_profiles, hour_of_week, save_npz, _local_offset
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; a lone dev server owns the state there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Rows of the detector state: raw speeds, and residuals against a profile
+RAW, PROFILED = 0, 1
+
+
+class AnomalyDetector:
+    """Streaming detector for statistically abnormal slowdowns
+
+    Keeps an exponentially weighted mean and variance of each location's
+    speed residual in flat arrays. The residual is the reading minus the
+    usual speed for that hour of the week when a profile exists, so
+    recurring rush-hour slowdowns score as normal while an unexpected drop
+    in a usually-slow area still stands out. Readings for hours without a
+    profile yet are tracked as raw speeds in a separate row of state, so a
+    location moving between known and unknown hours never mixes the two
+    kinds of residual. Each batch is scored against
+    the state *before* it is folded in. A location alerts at most once per
+    ``cooldown`` seconds, so a lasting incident is not re-raised every batch.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.1,
+        z_threshold: float = 3.0,
+        min_samples: int = 12,
+        min_std: float = 2.0,
+        cooldown: float = 900.0,
+        capacity: int = 1024
+    ):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.min_std = min_std
+        self.cooldown = cooldown
+        self.locations: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self.mean = np.zeros((2, capacity), dtype=np.float64)
+        self.var = np.zeros((2, capacity), dtype=np.float64)
+        self.count = np.zeros((2, capacity), dtype=np.int64)
+        # Reading time of each location's last alert
+        self.last_alert = np.full(capacity, -np.inf)
+
+    def _slots_for(self, locations: Sequence[str]) -> np.ndarray:
+        slots = []
+        for location in locations:
+            slot = self._slots.get(location)
+            if slot is None:
+                slot = len(self.locations)
+                self._slots[location] = slot
+                self.locations.append(location)
+            slots.append(slot)
+
+        capacity = self.mean.shape[1]
+        if len(self.locations) > capacity:
+            extra = max(len(self.locations), capacity * 2) - capacity
+            self.mean = np.concatenate([self.mean, np.zeros((2, extra))], axis=1)
+            self.var = np.concatenate([self.var, np.zeros((2, extra))], axis=1)
+            self.count = np.concatenate([self.count, np.zeros((2, extra), dtype=np.int64)], axis=1)
+            self.last_alert = np.concatenate([self.last_alert, np.full(extra, -np.inf)])
+        return np.asarray(slots, dtype=np.int64)
+
+    def _expected(
+        self,
+        locations: Sequence[str],
+        epoch_seconds: np.ndarray,
+        profiles: Optional[SpeedProfileStore]
+    ) -> np.ndarray:
+        """Usual speed for each reading's hour of week, NaN when unknown"""
+        expected = np.full(len(locations), np.nan)
+        if profiles is None or not len(profiles):
+            return expected
+        profile = profiles.profile(min_samples=3)
+        profile_slots = np.array(
+            [-1 if profiles.slot(loc) is None else profiles.slot(loc) for loc in locations],
+            dtype=np.int64
+        )
+        known = profile_slots >= 0
+        buckets = hour_of_week(epoch_seconds[known], _local_offset())
+        values = profile[profile_slots[known], buckets]
+        expected[known] = values
+        return expected
+
+    def score_batch(
+        self,
+        locations: Sequence[str],
+        speeds: Sequence[float],
+        epoch_seconds: Optional[Sequence[float]] = None,
+        profiles: Optional[SpeedProfileStore] = None
+    ) -> np.ndarray:
+        """Z-scores for a batch of readings, then fold them into the state
+
+        Returns one z-score per reading; NaN while a location is warming up.
+        Negative scores are slower than usual.
+        """
+        speeds = np.asarray(speeds, dtype=np.float64)
+        if epoch_seconds is None:
+            epoch_seconds = np.full(len(speeds), timezone.now().timestamp())
+        epoch_seconds = np.asarray(epoch_seconds, dtype=np.float64)
+        slots = self._slots_for(locations)
+        expected = self._expected(locations, epoch_seconds, profiles)
+        rows = np.where(np.isnan(expected), RAW, PROFILED)
+        residual = speeds - np.nan_to_num(expected)
+
+        std = np.maximum(np.sqrt(self.var[rows, slots]), self.min_std)
+        z = (residual - self.mean[rows, slots]) / std
+        z = np.where(self.count[rows, slots] >= self.min_samples, z, np.nan)
+
+        # Several readings for one location in a batch are folded in order
+        valid = np.isfinite(residual)
+        for start in self._sequential_groups(slots[valid]):
+            batch_rows = rows[valid][start]
+            batch_slots = slots[valid][start]
+            batch_residual = residual[valid][start]
+            diff = batch_residual - self.mean[batch_rows, batch_slots]
+            increment = self.alpha * diff
+            self.mean[batch_rows, batch_slots] += increment
+            self.var[batch_rows, batch_slots] = (
+                (1 - self.alpha) * (self.var[batch_rows, batch_slots] + diff * increment)
+            )
+            self.count[batch_rows, batch_slots] += 1
+        return z
+
+    @staticmethod
+    def _sequential_groups(slots: np.ndarray) -> List[np.ndarray]:
+        """Split indices into rounds with at most one reading per slot"""
+        if not len(slots):
+            return []
+        order = np.argsort(slots, kind='stable')
+        sorted_slots = slots[order]
+        group_start = np.searchsorted(sorted_slots, sorted_slots, side='left')
+        occurrence = np.empty(len(slots), dtype=np.int64)
+        occurrence[order] = np.arange(len(slots)) - group_start
+        return [np.flatnonzero(occurrence == k) for k in range(int(occurrence.max()) + 1)]
+
+    def detect(
+        self,
+        locations: Sequence[str],
+        speeds: Sequence[float],
+        epoch_seconds: Optional[Sequence[float]] = None,
+        profiles: Optional[SpeedProfileStore] = None
+    ) -> List[Alert]:
+        """Score a batch and build INCIDENT alerts for abnormal drops"""
+        if epoch_seconds is None:
+            epoch_seconds = np.full(len(speeds), timezone.now().timestamp())
+        epoch_seconds = np.asarray(epoch_seconds, dtype=np.float64)
+        z = self.score_batch(locations, speeds, epoch_seconds, profiles)
+        slots = self._slots_for(locations)
+        abnormal = np.flatnonzero(z <= -self.z_threshold)
+
+        alerts = []
+        for i in abnormal:
+            if epoch_seconds[i] - self.last_alert[slots[i]] < self.cooldown:
+                continue
+            self.last_alert[slots[i]] = epoch_seconds[i]
+            severity = 'HIGH' if z[i] <= -2 * self.z_threshold else 'MEDIUM'
+            alerts.append(Alert(
+                location=locations[i],
+                alert_type='INCIDENT',
+                severity=severity,
+                description=f'Unusual slowdown: speed {speeds[i]:.1f} km/h '
+                            f'is {abs(z[i]):.1f} standard deviations below normal'
+            ))
+        return alerts
+
+    def save(self, path) -> None:
+        n = len(self.locations)
+        save_npz(
+            path,
+            locations=np.asarray(self.locations, dtype=str),
+            mean=self.mean[:, :n],
+            var=self.var[:, :n],
+            count=self.count[:, :n],
+            last_alert=self.last_alert[:n],
+        )
+
+    @classmethod
+    def load(cls, path, **kwargs) -> 'AnomalyDetector':
+        with np.load(path) as data:
+            locations = [str(loc) for loc in data['locations']]
+            detector = cls(capacity=max(len(locations), 1), **kwargs)
+            slots = detector._slots_for(locations)
+            detector.mean[:, slots] = data['mean']
+            detector.var[:, slots] = data['var']
+            detector.count[:, slots] = data['count']
+            detector.last_alert[slots] = data['last_alert']
+        return detector
+
+
+_detector: Optional[AnomalyDetector] = None
+_lock = threading.Lock()
+_owner_handle = None
+_owns_state = False
+
+
+def _state_path() -> Path:
+    return Path(settings.SPEED_PROFILE_DIR) / 'anomaly_state.npz'
+
+
+def owns_state() -> bool:
+    """Whether this process is the one that persists the detector state
+
+    Every worker detects from its own in-memory state, but only the holder
+    of an exclusive lock beside the state file writes it, so workers never
+    overwrite each other. When the owner exits the next worker to save
+    takes over.
+    """
+    global _owner_handle, _owns_state
+    if fcntl is None or _owns_state:
+        return True
+    if _owner_handle is None:
+        path = _state_path().with_suffix('.lock')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _owner_handle = open(path, 'a')
+    try:
+        fcntl.flock(_owner_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    _owns_state = True
+    logger.info(f"Anomaly detector state at {_state_path()} is owned by this process")
+    return True
+
+
+def get_anomaly_detector() -> AnomalyDetector:
+    """Process-wide detector, restored from the last persisted state"""
+    global _detector
+    with _lock:
+        if _detector is None:
+            path = _state_path()
+            cooldown = settings.ANOMALY_ALERT_COOLDOWN
+            try:
+                _detector = (
+                    AnomalyDetector.load(path, cooldown=cooldown) if path.is_file()
+                    else AnomalyDetector(cooldown=cooldown)
+                )
+            except (OSError, KeyError, ValueError) as e:
+                logger.error(f"Could not load anomaly detector state from {path}: {str(e)}")
+                _detector = AnomalyDetector(cooldown=cooldown)
+        return _detector
+
+
+def detect_incidents(
+    locations: Sequence[str],
+    speeds: Sequence[float],
+    epoch_seconds: Optional[Sequence[float]] = None
+) -> List[Alert]:
+    """Score an ingest batch, save INCIDENT alerts and persist detector state"""
+    if not len(locations):
+        return []
+    detector = get_anomaly_detector()
+    with _lock:
+        alerts = detector.detect(locations, speeds, epoch_seconds, get_speed_profiles())
+        if owns_state():
+            detector.save(_state_path())
+    if alerts:
+        alerts = save_alerts(alerts)
+        logger.info(f"Anomaly detector raised {len(alerts)} incident alerts")
+    return alerts
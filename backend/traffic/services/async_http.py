@@ -0,0 +1,34 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# httpx clients are bound to the event loop they first ran on
+_clients: 'WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = WeakKeyDictionary()
+
+
+def get_async_client() -> 'httpx.AsyncClient':
+    """Pooled upstream HTTP client shared by every request on the running loop"""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=settings.UPSTREAM_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.UPSTREAM_HTTP_MAX_KEEPALIVE,
+            ),
+            headers={'User-Agent': settings.UPSTREAM_HTTP_USER_AGENT},
+        )
+        _clients[loop] = client
+        logger.debug(f"Opened upstream HTTP client for loop {id(loop)}")
+    return client
@@ -0,0 +1,397 @@
+"""Compact binary snapshot of the whole city for client cold start
+
+One payload carries the latest condition of every monitored location, the
+alerts of the last hour and the active emergency vehicles. Layout, all
+little-endian::
+
+    header   magic b'TXSN', format u8, kind u8 (0 full, 1 delta),
+             version u64, base_version u64, generated_at u32 (epoch s)
+    body     zlib of the conditions, alerts and vehicles sections
+
+Each section is ``upserted u32, removed u32``, then every column of the
+upserted rows (column-major, see ``SECTIONS``), then the key columns of the
+removed rows. Coordinates are degrees * 1e5 and, like alert ids, written
+as differences from the previous row; rows are sorted by key so those
+stay small. Speeds are km/h * 10 (65535 missing), confidence is 0-200
+(255 missing) and timestamps are seconds before ``generated_at``. Strings are
+u16 byte lengths followed by the UTF-8 bytes.
+
+A full snapshot has no removed rows. A delta against ``base_version``
+holds only rows added or changed since then, and the keys of rows gone.
+"""
+import logging
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models import Alert, EmergencyVehicle
+from . import traffic_metrics
+from .recent_store import get_recent_store
+from .resource_versions import ALERTS, EMERGENCY_VEHICLES, TRAFFIC, get_versions
+from .spatial_index import parse_locations
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPE = 'application/vnd.traffix.snapshot'
+MAGIC = b'TXSN'
+FORMAT_VERSION = 1
+FULL, DELTA = 0, 1
+HEADER = struct.Struct('<4sBBQQI')
+COUNTS = struct.Struct('<II')
+
+COORD_SCALE = 1e5
+SPEED_SCALE = 10
+SPEED_MISSING = 0xFFFF
+CONFIDENCE_SCALE = 200
+CONFIDENCE_MISSING = 0xFF
+# Condition flags
+CLOSURE_KNOWN = 1
+CLOSED = 2
+# Alert and vehicle flags
+POSITIONED = 1
+
+ALERT_TYPES = [code for code, _ in Alert.ALERT_TYPES]
+SEVERITIES = [code for code, _ in Alert.SEVERITY_CHOICES]
+SOURCES = (TRAFFIC, ALERTS, EMERGENCY_VEHICLES)
+
+CURRENT_KEY = 'city_snapshot:current'
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    # numpy dtype, or 'str' for UTF-8 strings
+    dtype: str
+    delta: bool = False
+    # Held as epoch seconds, written as seconds before generated_at
+    age: bool = False
+
+
+@dataclass(frozen=True)
+class Section:
+    name: str
+    key_size: int
+    columns: Tuple[Column, ...]
+
+
+SECTIONS = (
+    Section('conditions', 2, (
+        Column('latitude', '<i4', delta=True),
+        Column('longitude', '<i4', delta=True),
+        Column('current_speed', '<u2'),
+        Column('free_flow_speed', '<u2'),
+        Column('confidence', 'u1'),
+        Column('flags', 'u1'),
+        Column('congestion_level', 'u1'),
+        Column('timestamp', '<u4', age=True),
+    )),
+    Section('alerts', 1, (
+        Column('id', '<u4', delta=True),
+        Column('latitude', '<i4', delta=True),
+        Column('longitude', '<i4', delta=True),
+        Column('flags', 'u1'),
+        Column('alert_type', 'u1'),
+        Column('severity', 'u1'),
+        Column('timestamp', '<u4', age=True),
+        Column('description', 'str'),
+    )),
+    Section('vehicles', 1, (
+        Column('vehicle_id', 'str'),
+        Column('vehicle_type', 'str'),
+        Column('latitude', '<i4', delta=True),
+        Column('longitude', '<i4', delta=True),
+        Column('flags', 'u1'),
+        Column('timestamp', '<u4', age=True),
+    )),
+)
+
+# Section name -> {key: row}; rows are tuples of ints and strings in column order
+State = Dict[str, Dict[tuple, tuple]]
+
+
+@dataclass
+class Snapshot:
+    data: bytes
+    kind: int
+    version: int
+    base_version: int
+
+
+def _quantize_coords(lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    positioned = ~(np.isnan(lats) | np.isnan(lons))
+    lat_q = np.where(positioned, np.round(np.nan_to_num(lats) * COORD_SCALE), 0).astype(np.int64)
+    lon_q = np.where(positioned, np.round(np.nan_to_num(lons) * COORD_SCALE), 0).astype(np.int64)
+    return lat_q, lon_q, positioned
+
+
+def _quantize(values: np.ndarray, scale: float, limit: int, missing: int) -> np.ndarray:
+    quantized = np.clip(np.round(np.nan_to_num(values) * scale), 0, limit)
+    return np.where(np.isnan(values), missing, quantized).astype(np.int64)
+
+
+def _encode_column(column: Column, values: Sequence[Any], generated_at: int) -> bytes:
+    if column.dtype == 'str':
+        encoded = [str(value or '').encode('utf-8')[:0xFFFF] for value in values]
+        lengths = np.asarray([len(e) for e in encoded], dtype='<u2')
+        return lengths.tobytes() + b''.join(encoded)
+    array = np.asarray(values, dtype=np.int64).reshape(-1)
+    if column.age:
+        array = np.clip(generated_at - array, 0, 0xFFFFFFFF)
+    if column.delta:
+        array = np.diff(array, prepend=0)
+    return array.astype(column.dtype).tobytes()
+
+
+def _decode_column(column: Column, body: bytes, offset: int, count: int, generated_at: int):
+    if column.dtype == 'str':
+        lengths = np.frombuffer(body, dtype='<u2', count=count, offset=offset)
+        offset += lengths.nbytes
+        values = []
+        for length in lengths.tolist():
+            values.append(body[offset:offset + length].decode('utf-8'))
+            offset += length
+        return values, offset
+    dtype = np.dtype(column.dtype)
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=offset).astype(np.int64)
+    offset += count * dtype.itemsize
+    if column.delta:
+        array = np.cumsum(array)
+    if column.age:
+        array = generated_at - array
+    return array.tolist(), offset
+
+
+def encode(
+    upserted: State,
+    removed: Dict[str, List[tuple]],
+    version: int,
+    generated_at: int,
+    base_version: int = 0
+) -> bytes:
+    """Binary payload of the given rows; a delta when ``base_version`` is set"""
+    parts = []
+    for section in SECTIONS:
+        rows = [row for _, row in sorted(upserted.get(section.name, {}).items())]
+        gone = sorted(removed.get(section.name, []))
+        parts.append(COUNTS.pack(len(rows), len(gone)))
+        for columns, table in ((section.columns, rows), (section.columns[:section.key_size], gone)):
+            for i, column in enumerate(columns):
+                parts.append(_encode_column(column, [row[i] for row in table], generated_at))
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, DELTA if base_version else FULL, version, base_version, generated_at
+    )
+    return header + zlib.compress(b''.join(parts), settings.CITY_SNAPSHOT_ZLIB_LEVEL)
+
+
+def decode(payload: bytes) -> Dict[str, Any]:
+    """Rows of a payload, quantized as written; the reference for clients"""
+    magic, format_version, kind, version, base_version, generated_at = HEADER.unpack_from(payload)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError('Not a version 1 city snapshot')
+    body = zlib.decompress(payload[HEADER.size:])
+    decoded = {
+        'kind': 'delta' if kind == DELTA else 'full',
+        'version': version,
+        'base_version': base_version,
+        'generated_at': generated_at,
+    }
+    offset = 0
+    for section in SECTIONS:
+        count, gone = COUNTS.unpack_from(body, offset)
+        offset += COUNTS.size
+        columns = {}
+        for column in section.columns:
+            columns[column.name], offset = _decode_column(column, body, offset, count, generated_at)
+        keys = []
+        for column in section.columns[:section.key_size]:
+            values, offset = _decode_column(column, body, offset, gone, generated_at)
+            keys.append(values)
+        decoded[section.name] = {
+            'upserted': [dict(zip(columns, row)) for row in zip(*columns.values())],
+            'removed': list(zip(*keys)),
+        }
+    return decoded
+
+
+def diff(old: State, new: State) -> Tuple[State, Dict[str, List[tuple]]]:
+    """Rows added or changed in ``new``, and keys of ``old`` rows it lacks"""
+    upserted, removed = {}, {}
+    for section in SECTIONS:
+        before, after = old.get(section.name, {}), new.get(section.name, {})
+        upserted[section.name] = {key: row for key, row in after.items() if before.get(key) != row}
+        removed[section.name] = [key for key in before if key not in after]
+    return upserted, removed
+
+
+class CitySnapshotService:
+    """Builds, caches and diffs city snapshots
+
+    A snapshot is rebuilt when the traffic, alerts or emergency vehicle
+    version has moved (so at most once per ingest cycle) or it is older
+    than ``CITY_SNAPSHOT_MAX_AGE``; everyone else is served the cached
+    payload. The state behind each version is kept for
+    ``CITY_SNAPSHOT_HISTORY_SECONDS`` so deltas can be computed against it;
+    a delta request for an expired version gets a full snapshot instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind: str, *versions: int) -> str:
+        return f"city_snapshot:{kind}:{':'.join(str(v) for v in versions)}"
+
+    def collect(self) -> State:
+        """Current rows of every section, quantized"""
+        return {
+            'conditions': self._conditions(),
+            'alerts': self._alerts(),
+            'vehicles': self._vehicles(),
+        }
+
+    def _conditions(self) -> Dict[tuple, tuple]:
+        store = get_recent_store(sync=False)
+        store.sync_from_db()
+        names, timestamps, values = store.latest_arrays()
+        if not names:
+            return {}
+        lat_q, lon_q, positioned = _quantize_coords(*parse_locations(names))
+        current, free_flow, confidence, closure = (values[:, i].astype(np.float64) for i in range(4))
+        flags = np.where(np.isnan(closure), 0, CLOSURE_KNOWN | np.where(closure > 0, CLOSED, 0))
+        codes = traffic_metrics.congestion_codes(traffic_metrics.density(current, free_flow))
+        columns = zip(
+            lat_q.tolist(), lon_q.tolist(),
+            _quantize(current, SPEED_SCALE, SPEED_MISSING - 1, SPEED_MISSING).tolist(),
+            _quantize(free_flow, SPEED_SCALE, SPEED_MISSING - 1, SPEED_MISSING).tolist(),
+            _quantize(confidence, CONFIDENCE_SCALE, CONFIDENCE_SCALE, CONFIDENCE_MISSING).tolist(),
+            flags.tolist(), codes.tolist(), timestamps.astype(np.int64).tolist(),
+        )
+        # Only located readings can be drawn
+        return {row[:2]: row for row, keep in zip(columns, positioned) if keep}
+
+    def _alerts(self) -> Dict[tuple, tuple]:
+        since = timezone.now() - timedelta(hours=1)
+        rows = list(
+            Alert.objects.filter(timestamp__gte=since)
+            .values_list('id', 'location', 'alert_type', 'severity', 'description', 'timestamp')
+        )
+        if not rows:
+            return {}
+        ids, locations, types, severities, descriptions, stamps = zip(*rows)
+        lat_q, lon_q, positioned = _quantize_coords(*parse_locations(locations))
+        return {
+            (alert_id,): (
+                alert_id, lat, lon, POSITIONED if located else 0,
+                ALERT_TYPES.index(alert_type) if alert_type in ALERT_TYPES else 0xFF,
+                SEVERITIES.index(severity) if severity in SEVERITIES else 0xFF,
+                int(stamp.timestamp()), description,
+            )
+            for alert_id, lat, lon, located, alert_type, severity, stamp, description in zip(
+                ids, lat_q.tolist(), lon_q.tolist(), positioned.tolist(),
+                types, severities, stamps, descriptions
+            )
+        }
+
+    def _vehicles(self) -> Dict[tuple, tuple]:
+        rows = list(
+            EmergencyVehicle.objects.filter(status='active')
+            .values_list('vehicle_id', 'vehicle_type', 'current_location', 'last_updated')
+        )
+        if not rows:
+            return {}
+        ids, types, locations, stamps = zip(*rows)
+        lat_q, lon_q, positioned = _quantize_coords(*parse_locations(locations))
+        return {
+            (vehicle_id,): (
+                vehicle_id, vehicle_type, lat, lon, POSITIONED if located else 0, int(stamp.timestamp())
+            )
+            for vehicle_id, vehicle_type, lat, lon, located, stamp in zip(
+                ids, types, lat_q.tolist(), lon_q.tolist(), positioned.tolist(), stamps
+            )
+        }
+
+    def _is_fresh(self, current: Optional[Dict], sources: Dict[str, int]) -> bool:
+        return (
+            current is not None
+            and current['sources'] == sources
+            and time.time() - current['generated_at'] < settings.CITY_SNAPSHOT_MAX_AGE
+        )
+
+    def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """Current snapshot metadata, rebuilding the snapshot if its sources moved"""
+        sources = get_versions(SOURCES)
+        current = cache.get(CURRENT_KEY)
+        if not force and self._is_fresh(current, sources):
+            return current
+        with self._lock:
+            current = cache.get(CURRENT_KEY)
+            if not force and self._is_fresh(current, sources):
+                return current
+
+            started = time.monotonic()
+            state = self.collect()
+            now = time.time()
+            # Millisecond versions, like resource versions, are never reused
+            version = max(int(now * 1000), (current or {}).get('version', 0) + 1)
+            payload = encode(state, {}, version, int(now))
+            timeout = settings.CITY_SNAPSHOT_HISTORY_SECONDS
+            current = {'version': version, 'sources': sources, 'generated_at': int(now)}
+            cache.set_many({
+                self._key('state', version): state,
+                self._key('full', version): payload,
+            }, timeout=timeout)
+            cache.set(CURRENT_KEY, current, timeout=None)
+            logger.info(
+                f"City snapshot {version}: {len(state['conditions'])} locations, "
+                f"{len(state['alerts'])} alerts, {len(state['vehicles'])} vehicles, "
+                f"{len(payload)} bytes in {(time.monotonic() - started) * 1000:.1f} ms"
+            )
+            return current
+
+    def snapshot(self, since: Optional[int] = None) -> Snapshot:
+        """The current full snapshot, or a delta from ``since`` when its state is still held"""
+        current = self.refresh()
+        version = current['version']
+        payload = cache.get(self._key('full', version))
+        if payload is None:
+            # Evicted from the cache; rebuild rather than serve nothing
+            current = self.refresh(force=True)
+            version = current['version']
+            payload = cache.get(self._key('full', version))
+        if not since or since > version:
+            return Snapshot(payload, FULL, version, 0)
+
+        delta_key = self._key('delta', since, version)
+        delta = cache.get(delta_key)
+        if delta is None:
+            states = cache.get_many([self._key('state', since), self._key('state', version)])
+            base = states.get(self._key('state', since))
+            state = states.get(self._key('state', version))
+            if base is None or state is None:
+                return Snapshot(payload, FULL, version, 0)
+            upserted, removed = diff(base, state)
+            delta = encode(upserted, removed, version, current['generated_at'], base_version=since)
+            cache.set(delta_key, delta, timeout=settings.CITY_SNAPSHOT_HISTORY_SECONDS)
+        return Snapshot(delta, DELTA, version, since)
+
+
+_service: Optional[CitySnapshotService] = None
+_service_lock = threading.Lock()
+
+
+def get_city_snapshot() -> CitySnapshotService:
+    """Process-wide snapshot service"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CitySnapshotService()
+        return _service
@@ -3,42 +3,45 @@ import logging
 from django.conf import settings
 from traffic.models import TrafficData, Alert
 from traffic.services.tomtom_service import TomTomService
-from django.db import transaction
-from typing import Dict, List
+from traffic.services.ingestion_queue import IngestionQueue, get_ingestion_queue
+from traffic.services.quota import QuotaExceeded
+from traffic.services.recent_store import get_recent_store
+from traffic.services import traffic_metrics
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
 class DataCollectionService:
-    def __init__(self):
+    def __init__(self, ingestion_queue: Optional[IngestionQueue] = None):
         self.tomtom_service = TomTomService()
+        self.ingestion_queue = ingestion_queue or get_ingestion_queue()
         
     def _process_traffic_flow(self, flow_data: Dict, location: str) -> None:
-        """Process and store traffic flow data"""
+        """Process and queue traffic flow data for the background writer"""
         try:
-            with transaction.atomic():
-                flow_segment = flow_data.get('flowSegmentData', {})
-                traffic_data = TrafficData(
+            flow_segment = flow_data.get('flowSegmentData', {})
+            traffic_data = TrafficData(
+                location=location,
+                current_speed=flow_segment.get('currentSpeed'),
+                free_flow_speed=flow_segment.get('freeFlowSpeed'),
+                current_travel_time=flow_segment.get('currentTravelTime'),
+                free_flow_travel_time=flow_segment.get('freeFlowTravelTime'),
+                confidence=flow_segment.get('confidence'),
+                road_closure=flow_segment.get('roadClosure', False),
+                timestamp=datetime.now()
+            )
+            self.ingestion_queue.put_reading(traffic_data)
+            
+            # Check for significant slowdowns and create alerts
+            severity = traffic_metrics.alert_severity(traffic_data.current_speed, traffic_data.free_flow_speed)[0]
+            if severity:
+                self.ingestion_queue.put_alert(Alert(
                     location=location,
-                    current_speed=flow_segment.get('currentSpeed'),
-                    free_flow_speed=flow_segment.get('freeFlowSpeed'),
-                    current_travel_time=flow_segment.get('currentTravelTime'),
-                    free_flow_travel_time=flow_segment.get('freeFlowTravelTime'),
-                    confidence=flow_segment.get('confidence'),
-                    road_closure=flow_segment.get('roadClosure', False),
+                    alert_type='CONGESTION',
+                    severity=str(severity),
+                    description=f'Traffic speed reduced to {traffic_data.current_speed} km/h (normal: {traffic_data.free_flow_speed} km/h)',
                     timestamp=datetime.now()
-                )
-                traffic_data.save()
-                
-                # Check for significant slowdowns and create alerts
-                if (traffic_data.current_speed and traffic_data.free_flow_speed and 
-                    traffic_data.current_speed < traffic_data.free_flow_speed * 0.6):  # 40% slower than normal
-                    Alert.objects.create(
-                        location=location,
-                        alert_type='CONGESTION',
-                        severity='HIGH',
-                        description=f'Traffic speed reduced to {traffic_data.current_speed} km/h (normal: {traffic_data.free_flow_speed} km/h)',
-                        timestamp=datetime.now()
-                    )
+                ))
         except Exception as e:
             logger.error(f"Error processing traffic flow data: {str(e)}")
             raise
@@ -48,36 +51,63 @@ class DataCollectionService:
         try:
             incidents = incident_data.get('incidents', [])
             for incident in incidents:
-                Alert.objects.create(
+                self.ingestion_queue.put_alert(Alert(
                     location=location,
                     alert_type='INCIDENT',
                     severity=incident.get('severity', 'MEDIUM'),
                     description=incident.get('description', 'No description available'),
                     timestamp=datetime.now()
-                )
+                ))
         except Exception as e:
             logger.error(f"Error processing traffic incidents: {str(e)}")
             raise
 
+    def _congestion(self, names: List[str]) -> Dict[str, float]:
+        """Density of the latest reading per location name"""
+        try:
+            latest = get_recent_store(sync=False).latest(names)
+        except Exception as e:
+            logger.error(f"Error reading latest conditions: {str(e)}")
+            return {}
+        rated = [name for name, row in latest.items() if row['current_speed'] is not None and row['free_flow_speed']]
+        densities = traffic_metrics.density(
+            [latest[name]['current_speed'] for name in rated], [latest[name]['free_flow_speed'] for name in rated]
+        )
+        return dict(zip(rated, densities.tolist()))
+
     def collect_traffic_data(self, locations: List[Dict[str, str]]) -> None:
         """
         Collect traffic data for specified locations
         
         Args:
             locations: List of dictionaries containing location info
-                      [{'name': 'Downtown SF', 'bbox': 'minLon,minLat,maxLon,maxLat'}]
+                      [{'name': 'Downtown SF', 'bbox': 'minLon,minLat,maxLon,maxLat', 'interest': 1.0}]
+
+        Within each endpoint's quota the stalest, most congested and most
+        watched locations are refreshed first; the others keep their last
+        readings until a later cycle.
         """
-        for location in locations:
-            try:
-                # Get traffic flow data
-                flow_data = self.tomtom_service.get_traffic_flow(location['bbox'])
-                self._process_traffic_flow(flow_data, location['name'])
-                
-                # Get traffic incidents
-                incident_data = self.tomtom_service.get_traffic_incidents(location['bbox'])
-                self._process_incidents(incident_data, location['name'])
-                
-                logger.info(f"Successfully collected traffic data for {location['name']}")
-            except Exception as e:
-                logger.error(f"Error collecting traffic data for {location['name']}: {str(e)}")
-                continue  # Continue with next location even if one fails
\ No newline at end of file
+        scheduler = self.tomtom_service.quota_scheduler
+        by_name = {location['name']: location for location in locations}
+        names = list(by_name)
+        congestion = self._congestion(names)
+        interest = {name: float(location.get('interest', 1.0)) for name, location in by_name.items()}
+
+        for endpoint, fetch, process in (
+            ('flow', self.tomtom_service.get_traffic_flow, self._process_traffic_flow),
+            ('incidents', self.tomtom_service.get_traffic_incidents, self._process_incidents),
+        ):
+            for name in scheduler.schedule(endpoint, names, congestion, interest):
+                location = by_name[name]
+                try:
+                    # Cached responses would be stored again as new readings
+                    data = fetch(location['bbox'], allow_cached=False)
+                    process(data, name)
+                    scheduler.mark_fetched(endpoint, name)
+                    logger.info(f"Successfully collected traffic {endpoint} for {name}")
+                except QuotaExceeded as e:
+                    logger.info(f"Skipping {endpoint} for {name}: {str(e)}")
+                    break
+                except Exception as e:
+                    logger.error(f"Error collecting traffic {endpoint} for {name}: {str(e)}")
+                    continue  # Continue with next location even if one fails
@@ -0,0 +1,97 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from ..models import Route
+
+logger = logging.getLogger(__name__)
+
+Tile = Tuple[int, int]
+
+
+def route_bbox(route: Route, padding: float) -> Tuple[float, float, float, float]:
+    """Padded ``(minLon, minLat, maxLon, maxLat)`` around a route
+
+    Uses the precomputed geometry bbox when the route has one, otherwise
+    the endpoints.
+    """
+    if route.bbox:
+        min_lon, min_lat, max_lon, max_lat = route.bbox
+        return (min_lon - padding, min_lat - padding, max_lon + padding, max_lat + padding)
+    return (
+        min(route.start_longitude, route.end_longitude) - padding,
+        min(route.start_latitude, route.end_latitude) - padding,
+        max(route.start_longitude, route.end_longitude) + padding,
+        max(route.start_latitude, route.end_latitude) + padding,
+    )
+
+
+def tile_bbox(tile: Tile, tile_size: float) -> Tuple[float, float, float, float]:
+    tx, ty = tile
+    return (tx * tile_size, ty * tile_size, (tx + 1) * tile_size, (ty + 1) * tile_size)
+
+
+def tiles_for_bbox(bbox: Tuple[float, float, float, float], tile_size: float) -> List[Tile]:
+    """Tiles of the global grid intersecting a bbox"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    tx0, tx1 = math.floor(min_lon / tile_size), math.ceil(max_lon / tile_size)
+    ty0, ty1 = math.floor(min_lat / tile_size), math.ceil(max_lat / tile_size)
+    return [(tx, ty) for tx in range(tx0, max(tx1, tx0 + 1)) for ty in range(ty0, max(ty1, ty0 + 1))]
+
+
+@dataclass
+class FetchPlan:
+    """Tiles to fetch in one cycle and the routes each tile's data goes to"""
+    tile_size: float
+    routes: Dict[int, Route] = field(default_factory=dict)
+    route_bboxes: Dict[int, Tuple[float, float, float, float]] = field(default_factory=dict)
+    tiles: Dict[Tile, List[int]] = field(default_factory=dict)
+
+    @property
+    def assignments(self) -> int:
+        return sum(len(route_ids) for route_ids in self.tiles.values())
+
+    @property
+    def fan_out_ratio(self) -> float:
+        """Route deliveries per API call; above 1 means calls were shared"""
+        return round(self.assignments / len(self.tiles), 3) if self.tiles else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'routes': len(self.routes),
+            'tiles': len(self.tiles),
+            'assignments': self.assignments,
+            'fan_out_ratio': self.fan_out_ratio,
+            'calls_per_route': round(len(self.tiles) / len(self.routes), 3) if self.routes else 0.0,
+        }
+
+    def fan_out(self, tile: Tile, lats: np.ndarray, lons: np.ndarray) -> Dict[int, np.ndarray]:
+        """Indices of the tile's points inside each intersecting route's padded bbox"""
+        route_ids = self.tiles.get(tile, [])
+        if not route_ids or not len(lats):
+            return {}
+        boxes = np.array([self.route_bboxes[route_id] for route_id in route_ids])
+        inside = (
+            (lons[None, :] >= boxes[:, 0:1]) & (lons[None, :] <= boxes[:, 2:3])
+            & (lats[None, :] >= boxes[:, 1:2]) & (lats[None, :] <= boxes[:, 3:4])
+        )
+        return {
+            route_id: np.nonzero(row)[0]
+            for route_id, row in zip(route_ids, inside) if row.any()
+        }
+
+
+def plan_fetches(routes: Iterable[Route], tile_size: float = 0.02, padding: float = 0.01) -> FetchPlan:
+    """Map routes onto a fixed tile grid so each tile is fetched once per cycle"""
+    plan = FetchPlan(tile_size=tile_size)
+    for route in routes:
+        bbox = route_bbox(route, padding)
+        plan.routes[route.id] = route
+        plan.route_bboxes[route.id] = bbox
+        for tile in tiles_for_bbox(bbox, tile_size):
+            plan.tiles.setdefault(tile, []).append(route.id)
+    logger.info(f"Fetch plan: {plan.stats()}")
+    return plan
@@ -0,0 +1,119 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .road_network import RoadNetwork, get_road_network
+from .spatial_index import parse_locations, points_in_polygon, project_to_segments
+
+logger = logging.getLogger(__name__)
+
+
+class ReverseGeocoder:
+    """In-process reverse geocoder over the local road network extract
+
+    Resolves whole batches of coordinates at once: grid candidates are
+    gathered for every point, distances to all candidate segments are
+    computed in one vectorized pass and the nearest named road per point is
+    kept. Admin areas are resolved the same way with point-in-polygon tests.
+    """
+
+    def __init__(self, network: Optional[RoadNetwork] = None, max_distance_m: float = 150.0):
+        self.network = network or get_road_network()
+        self.max_distance_m = max_distance_m
+        cell_m = self.network.segment_index.cell_size * 111000
+        self._radius_cells = max(1, int(np.ceil(max_distance_m / cell_m)))
+
+    @property
+    def available(self) -> bool:
+        """Whether a road network extract is loaded to resolve against"""
+        return self.network.segment_count > 0
+
+    def _nearest_roads(self, lats: np.ndarray, lons: np.ndarray):
+        """Nearest segment per point, or -1 when nothing is within range"""
+        net = self.network
+        nearest = np.full(len(lats), -1, dtype=np.int64)
+        distance = np.full(len(lats), np.inf)
+
+        point_idx, seg_idx = net.segment_index.query_points(lats, lons, self._radius_cells)
+        if not len(point_idx):
+            return nearest, distance
+
+        dist, _ = project_to_segments(
+            lats[point_idx], lons[point_idx],
+            net.seg_lat1[seg_idx], net.seg_lon1[seg_idx],
+            net.seg_lat2[seg_idx], net.seg_lon2[seg_idx],
+        )
+        in_range = dist <= self.max_distance_m
+        point_idx, seg_idx, dist = point_idx[in_range], seg_idx[in_range], dist[in_range]
+
+        # Sort by (point, distance) and keep the first pair for every point
+        order = np.lexsort((dist, point_idx))
+        point_idx, seg_idx, dist = point_idx[order], seg_idx[order], dist[order]
+        first = np.ones(len(point_idx), dtype=bool)
+        first[1:] = point_idx[1:] != point_idx[:-1]
+        nearest[point_idx[first]] = seg_idx[first]
+        distance[point_idx[first]] = dist[first]
+        return nearest, distance
+
+    def _containing_areas(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Most specific (highest admin level) area containing each point"""
+        net = self.network
+        area = np.full(len(lats), -1, dtype=np.int64)
+        level = np.full(len(lats), -1, dtype=np.int64)
+
+        point_idx, area_idx = net.area_index.query_points(lats, lons)
+        for area_id in np.unique(area_idx):
+            points = point_idx[area_idx == area_id]
+            ring = net.area_rings[area_id]
+            inside = points[points_in_polygon(lats[points], lons[points], ring[:, 1], ring[:, 0])]
+            area_level = net.area_levels[area_id]
+            better = inside[level[inside] < area_level]
+            area[better] = area_id
+            level[better] = area_level
+        return area
+
+    def reverse_geocode_batch(self, lats, lons) -> List[Dict[str, Any]]:
+        """Resolve aligned latitude/longitude sequences to road and area names"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        net = self.network
+
+        nearest, distance = self._nearest_roads(lats, lons)
+        areas = self._containing_areas(lats, lons)
+
+        results = []
+        for i in range(len(lats)):
+            road = net.road_names[net.seg_road[nearest[i]]] if nearest[i] >= 0 else None
+            area = net.area_names[areas[i]] if areas[i] >= 0 else None
+            results.append({
+                'latitude': None if np.isnan(lats[i]) else float(lats[i]),
+                'longitude': None if np.isnan(lons[i]) else float(lons[i]),
+                'road': road,
+                'area': area,
+                'distance_m': round(float(distance[i]), 1) if road else None,
+                'label': ', '.join(part for part in (road, area) if part) or None,
+            })
+        return results
+
+    def reverse_geocode(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Resolve a single coordinate"""
+        return self.reverse_geocode_batch([lat], [lon])[0]
+
+    def label_locations(self, locations: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Map raw "lat,lon" location strings to human readable labels"""
+        unique = list(dict.fromkeys(locations))
+        lats, lons = parse_locations(unique)
+        resolved = self.reverse_geocode_batch(lats, lons)
+        return {loc: result['label'] for loc, result in zip(unique, resolved)}
+
+
+_geocoder: Optional[ReverseGeocoder] = None
+
+
+def get_reverse_geocoder() -> ReverseGeocoder:
+    """Shared geocoder instance backed by the process-wide road network"""
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = ReverseGeocoder()
+    return _geocoder
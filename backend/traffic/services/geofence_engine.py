@@ -0,0 +1,290 @@
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models import Alert, Geofence, GeofenceEvent
+from .resource_versions import GEOFENCES, get_version
+from .spatial_index import GridIndex, parse_locations
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FenceEvent:
+    """Something crossing a fence boundary, before it is stored"""
+    subject: str
+    subject_type: str
+    fence_id: int
+    fence_name: str
+    fence_type: str
+    event: str
+    latitude: float
+    longitude: float
+    timestamp: datetime
+
+
+def polygon_ring(polygon: Sequence[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitude/longitude arrays of a stored polygon, without a closing vertex"""
+    lats = np.asarray([float(v['latitude']) for v in polygon], dtype=np.float64)
+    lons = np.asarray([float(v['longitude']) for v in polygon], dtype=np.float64)
+    if len(lats) > 1 and lats[0] == lats[-1] and lons[0] == lons[-1]:
+        lats, lons = lats[:-1], lons[:-1]
+    return lats, lons
+
+
+class FenceIndex:
+    """All fence edges packed into flat arrays behind a grid prefilter
+
+    Point/fence candidates come from the grid over fence bboxes, are
+    narrowed by the exact bbox and then every surviving pair is expanded
+    over its fence's edges for one even-odd ray casting pass, so a batch
+    of positions against thousands of fences is a handful of array
+    operations.
+    """
+
+    def __init__(self, fences: Sequence[Geofence], cell_size: float = 0.01):
+        self.fence_ids = np.asarray([fence.id for fence in fences], dtype=np.int64)
+        self.names = [fence.name for fence in fences]
+        self.types = [fence.fence_type for fence in fences]
+        self.position = {int(fence_id): i for i, fence_id in enumerate(self.fence_ids)}
+
+        rings = [polygon_ring(fence.polygon) for fence in fences]
+        self.edge_count = np.asarray([len(lats) for lats, _ in rings], dtype=np.int64)
+        self.edge_start = np.cumsum(self.edge_count) - self.edge_count
+        if rings:
+            self.y1 = np.concatenate([lats for lats, _ in rings])
+            self.x1 = np.concatenate([lons for _, lons in rings])
+            self.y2 = np.concatenate([np.roll(lats, -1) for lats, _ in rings])
+            self.x2 = np.concatenate([np.roll(lons, -1) for _, lons in rings])
+        else:
+            self.y1 = self.x1 = self.y2 = self.x2 = np.empty(0)
+        self.min_lat = np.asarray([lats.min() for lats, _ in rings])
+        self.max_lat = np.asarray([lats.max() for lats, _ in rings])
+        self.min_lon = np.asarray([lons.min() for _, lons in rings])
+        self.max_lon = np.asarray([lons.max() for _, lons in rings])
+
+        self.grid = GridIndex(cell_size)
+        if rings:
+            self.grid.insert_many(
+                np.arange(len(rings)), self.min_lat, self.min_lon, self.max_lat, self.max_lon
+            )
+        self.grid.build()
+
+    def __len__(self) -> int:
+        return len(self.fence_ids)
+
+    def contains(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Aligned ``(point_index, fence_position)`` arrays of points inside fences"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        points, fences = self.grid.query_points(lats, lons)
+        in_bbox = (
+            (lats[points] >= self.min_lat[fences]) & (lats[points] <= self.max_lat[fences])
+            & (lons[points] >= self.min_lon[fences]) & (lons[points] <= self.max_lon[fences])
+        ) if len(points) else np.zeros(0, dtype=bool)
+        points, fences = points[in_bbox], fences[in_bbox]
+        if not len(points):
+            return points, fences
+
+        counts = self.edge_count[fences]
+        pair = np.repeat(np.arange(len(points)), counts)
+        edge = (
+            np.repeat(self.edge_start[fences] - (np.cumsum(counts) - counts), counts)
+            + np.arange(counts.sum())
+        )
+        py = lats[points][pair]
+        px = lons[points][pair]
+        y1, x1, y2, x2 = self.y1[edge], self.x1[edge], self.y2[edge], self.x2[edge]
+
+        crosses = (y1 > py) != (y2 > py)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_at = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        hits = np.bincount(pair, weights=crosses & (px < x_at), minlength=len(points))
+        inside = (hits.astype(np.int64) % 2) == 1
+        return points[inside], fences[inside]
+
+
+class GeofenceEngine:
+    """Evaluates positions and alerts against the active geofences
+
+    The fence index is rebuilt whenever the geofences resource version
+    moves. Which fences each subject was last seen inside is kept in the
+    shared cache, so evaluating a batch of positions yields ENTER and EXIT
+    events only for the subjects that crossed a boundary, whichever worker
+    saw their previous position. Subjects not seen for ``presence_ttl``
+    seconds are forgotten. Alerts yield one ALERT event per fence they
+    fall in. Events go to every listener.
+    """
+
+    def __init__(
+        self,
+        fences: Optional[Sequence[Geofence]] = None,
+        cell_size: float = 0.01,
+        listeners: Optional[List[Callable[[List[FenceEvent]], None]]] = None,
+        presence_ttl: Optional[float] = None
+    ):
+        self.cell_size = cell_size
+        self.listeners = list(listeners or [])
+        self.presence_ttl = presence_ttl or settings.GEOFENCE_PRESENCE_TTL
+        self._lock = threading.Lock()
+        self._version = None
+        self._static = fences is not None
+        self._index = FenceIndex(list(fences), cell_size) if fences is not None else None
+
+    def index(self) -> FenceIndex:
+        """Current fence index, reloaded from the database after changes"""
+        if self._static:
+            return self._index
+        version, _ = get_version(GEOFENCES)
+        if self._index is None or version != self._version:
+            self._index = FenceIndex(list(Geofence.objects.filter(active=True)), self.cell_size)
+            self._version = version
+            logger.info(f"Loaded {len(self._index)} geofences")
+        return self._index
+
+    def containing(self, lats: np.ndarray, lons: np.ndarray) -> List[List[int]]:
+        """Ids of the fences containing each point"""
+        index = self.index()
+        points, fences = index.contains(lats, lons)
+        result: List[List[int]] = [[] for _ in range(len(lats))]
+        for point, fence in zip(points, fences):
+            result[point].append(int(index.fence_ids[fence]))
+        return result
+
+    def evaluate_positions(
+        self,
+        subjects: Sequence[str],
+        lats: np.ndarray,
+        lons: np.ndarray,
+        timestamp: Optional[datetime] = None,
+        subject_type: str = 'VEHICLE'
+    ) -> List[FenceEvent]:
+        """ENTER/EXIT events for a batch of positions, one per subject
+
+        Positions that cannot be parsed (NaN) leave the subject's state
+        unchanged.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        timestamp = timestamp or timezone.now()
+        index = self.index()
+        points, fences = index.contains(lats, lons)
+        fence_ids = index.fence_ids[fences]
+        now_inside: Dict[int, Set[int]] = {}
+        for point, fence_id in zip(points, fence_ids):
+            now_inside.setdefault(int(point), set()).add(int(fence_id))
+
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+        events = []
+        with self._lock:
+            stored = cache.get_many([self._presence_key(subjects[i]) for i in valid])
+            inside: Dict[str, Set[int]] = {key: set(fences) for key, fences in stored.items()}
+            for i in valid:
+                subject = str(subjects[i])
+                key = self._presence_key(subject)
+                current = now_inside.get(int(i), set())
+                # Fences deleted or deactivated since are forgotten without an EXIT
+                previous = {f for f in inside.get(key, ()) if f in index.position}
+                for fence_id, event in (
+                    [(f, 'ENTER') for f in sorted(current - previous)]
+                    + [(f, 'EXIT') for f in sorted(previous - current)]
+                ):
+                    events.append(self._event(
+                        index, subject, subject_type, fence_id, event,
+                        lats[i], lons[i], timestamp
+                    ))
+                inside[key] = current
+
+            # Refreshing every subject still inside restarts its idle TTL
+            cache.set_many(
+                {key: sorted(fences) for key, fences in inside.items() if fences}, timeout=self.presence_ttl
+            )
+            cache.delete_many([key for key, fences in inside.items() if not fences and key in stored])
+
+        self._emit(events)
+        return events
+
+    @staticmethod
+    def _presence_key(subject) -> str:
+        return f"geofence_inside:{subject}"
+
+    def evaluate_alerts(self, alerts: Sequence[Alert]) -> List[FenceEvent]:
+        """One ALERT event per alert and fence it falls in"""
+        if not alerts:
+            return []
+        lats, lons = parse_locations([alert.location for alert in alerts])
+        index = self.index()
+        points, fences = index.contains(lats, lons)
+        events = [
+            self._event(
+                index, f"alert:{alerts[point].id}", 'ALERT', int(index.fence_ids[fence]), 'ALERT',
+                lats[point], lons[point], alerts[point].timestamp or timezone.now()
+            )
+            for point, fence in zip(points, fences)
+        ]
+        self._emit(events)
+        return events
+
+    def _event(self, index, subject, subject_type, fence_id, event, lat, lon, timestamp):
+        fence = index.position[fence_id]
+        return FenceEvent(
+            subject=subject,
+            subject_type=subject_type,
+            fence_id=fence_id,
+            fence_name=index.names[fence],
+            fence_type=index.types[fence],
+            event=event,
+            latitude=float(lat),
+            longitude=float(lon),
+            timestamp=timestamp
+        )
+
+    def _emit(self, events: List[FenceEvent]) -> None:
+        if not events:
+            return
+        for listener in self.listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                logger.error(f"Geofence listener {getattr(listener, '__name__', listener)} failed: {str(e)}")
+
+
+def store_events(events: List[FenceEvent]) -> None:
+    """Persist fence events so they can be listed through the API"""
+    GeofenceEvent.objects.bulk_create([
+        GeofenceEvent(
+            geofence_id=event.fence_id,
+            subject=event.subject,
+            subject_type=event.subject_type,
+            event=event.event,
+            latitude=event.latitude,
+            longitude=event.longitude,
+            timestamp=event.timestamp
+        )
+        for event in events
+    ])
+    for event in events:
+        logger.info(f"{event.subject} {event.event} {event.fence_type} zone {event.fence_name}")
+
+
+_engine_instance: Optional[GeofenceEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_geofence_engine() -> GeofenceEngine:
+    """Process-wide engine over the active geofences"""
+    global _engine_instance
+    with _engine_lock:
+        if _engine_instance is None:
+            _engine_instance = GeofenceEngine(
+                cell_size=settings.GEOFENCE_GRID_SIZE,
+                listeners=[store_events]
+            )
+        return _engine_instance
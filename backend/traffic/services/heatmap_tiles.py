@@ -0,0 +1,217 @@
+"""Congestion heatmap as Web Mercator PNG tiles
+
+Each monitored location contributes its current density (1 for a closed
+road) through a Gaussian kernel of ``HEATMAP_SIGMA_PX`` screen pixels.
+The kernel is separable, so a tile is one matrix product of per-point
+row and column weights rather than a loop over points. Tiles share one
+absolute intensity scale, so neighbouring tiles meet without seams.
+Rendered tiles are cached under the traffic version and so go stale with
+every ingest cycle; the ``heatmap_tiles`` job prerenders the service area.
+"""
+import logging
+import math
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from . import traffic_metrics
+from .recent_store import FIELDS, get_recent_store
+from .resource_versions import TRAFFIC, get_version
+from .spatial_index import parse_locations
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+# Kernel support in sigmas; weights beyond it are below 1%
+KERNEL_EXTENT = 3.0
+# Points are merged on this fraction of a pixel before the kernel runs
+MERGE_STEP = 0.5
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Intensity stops: transparent, green, amber, red
+COLOR_STOPS = (
+    (0.0, (76, 175, 80, 0)),
+    (0.15, (76, 175, 80, 110)),
+    (0.5, (255, 193, 7, 170)),
+    (1.0, (229, 57, 53, 215)),
+)
+
+
+def _color_ramp() -> np.ndarray:
+    positions = np.linspace(0.0, 1.0, 256)
+    stops = np.asarray([stop for stop, _ in COLOR_STOPS])
+    colors = np.asarray([color for _, color in COLOR_STOPS], dtype=np.float64)
+    return np.stack(
+        [np.interp(positions, stops, colors[:, channel]) for channel in range(4)], axis=1
+    ).round().astype(np.uint8)
+
+
+COLOR_RAMP = _color_ramp()
+
+
+def to_pixels(lats, lons, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Global Web Mercator pixel coordinates at ``zoom``"""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -85.05112878, 85.05112878)
+    lons = np.asarray(lons, dtype=np.float64)
+    scale = TILE_SIZE * 2 ** zoom
+    phi = np.radians(lats)
+    x = (lons + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / math.pi) / 2.0 * scale
+    return x, y
+
+
+def tiles_for_bbox(bbox: Sequence[float], zoom: int) -> List[Tuple[int, int]]:
+    """``(x, y)`` of the tiles covering a ``(minLon, minLat, maxLon, maxLat)`` bbox"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    xs, ys = to_pixels([max_lat, min_lat], [min_lon, max_lon], zoom)
+    last = 2 ** zoom - 1
+    x0, x1 = (min(max(int(v // TILE_SIZE), 0), last) for v in xs)
+    y0, y1 = (min(max(int(v // TILE_SIZE), 0), last) for v in ys)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def kernel_density(px: np.ndarray, py: np.ndarray, weights: np.ndarray, sigma: float) -> np.ndarray:
+    """``(TILE_SIZE, TILE_SIZE)`` weighted Gaussian density at pixel centres
+
+    ``px``/``py`` are relative to the tile's top-left corner. The kernel
+    peaks at 1, so a lone point of weight 1 reaches 1 at its centre.
+    """
+    centers = np.arange(TILE_SIZE, dtype=np.float32) + 0.5
+    inv = np.float32(-0.5 / sigma ** 2)
+    columns = np.exp(inv * (centers[None, :] - px[:, None].astype(np.float32)) ** 2)
+    rows = np.exp(inv * (centers[None, :] - py[:, None].astype(np.float32)) ** 2)
+    return (rows * weights[:, None].astype(np.float32)).T @ columns
+
+
+def colorize(intensity: np.ndarray) -> np.ndarray:
+    """RGBA pixels for intensities in 0-1"""
+    return COLOR_RAMP[np.round(np.clip(intensity, 0.0, 1.0) * 255).astype(np.uint8)]
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(rgba: np.ndarray, level: int = 6) -> bytes:
+    """8-bit RGBA PNG of a ``(height, width, 4)`` uint8 array"""
+    height, width, _ = rgba.shape
+    rows = np.ascontiguousarray(rgba, dtype=np.uint8).reshape(height, width * 4)
+    # Filter type 2 (Up): each byte minus the one above, wrapping as PNG expects
+    filtered = rows.copy()
+    filtered[1:] -= rows[:-1]
+    raw = np.hstack([np.full((height, 1), 2, dtype=np.uint8), filtered]).tobytes()
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return PNG_SIGNATURE + _chunk(b'IHDR', header) + _chunk(b'IDAT', zlib.compress(raw, level)) + _chunk(b'IEND', b'')
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8), level=9)
+
+
+class HeatmapRenderer:
+    """Renders and caches heatmap tiles for the current traffic version"""
+
+    def __init__(
+        self,
+        sigma_px: Optional[float] = None,
+        saturation: Optional[float] = None,
+        store=None
+    ):
+        self.sigma_px = sigma_px or settings.HEATMAP_SIGMA_PX
+        self.saturation = saturation or settings.HEATMAP_SATURATION
+        self.store = store
+        self._points: Tuple[Optional[int], np.ndarray, np.ndarray, np.ndarray] = (
+            None, np.empty(0), np.empty(0), np.empty(0)
+        )
+        self._lock = threading.Lock()
+
+    def points(self, version: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Latitudes, longitudes and weights of the readings behind ``version``"""
+        with self._lock:
+            if self._points[0] == version:
+                return self._points[1:]
+            store = self.store or get_recent_store(sync=False)
+            # The version moved, so catch up on rows other processes wrote
+            store.sync_from_db()
+            names, _, values = store.latest_arrays()
+            lats, lons = parse_locations(names)
+            weights = traffic_metrics.density(
+                values[:, FIELDS.index('current_speed')], values[:, FIELDS.index('free_flow_speed')]
+            )
+            weights = np.where(values[:, FIELDS.index('road_closure')] > 0, 1.0, weights)
+            keep = ~(np.isnan(lats) | np.isnan(lons)) & (weights > 0)
+            self._points = (version, lats[keep], lons[keep], weights[keep])
+            return self._points[1:]
+
+    def render(self, zoom: int, x: int, y: int, version: int) -> bytes:
+        """PNG of one tile from the readings behind ``version``"""
+        lats, lons, weights = self.points(version)
+        px, py = to_pixels(lats, lons, zoom)
+        px, py = px - x * TILE_SIZE, py - y * TILE_SIZE
+        margin = KERNEL_EXTENT * self.sigma_px
+        inside = (px > -margin) & (px < TILE_SIZE + margin) & (py > -margin) & (py < TILE_SIZE + margin)
+        if not inside.any():
+            return EMPTY_TILE
+
+        # Points sharing a sub-pixel cell (common at low zooms) merge into one
+        cells = np.round(np.stack([px[inside], py[inside]], axis=1) / MERGE_STEP).astype(np.int64)
+        cells, index = np.unique(cells, axis=0, return_inverse=True)
+        merged = np.bincount(index.reshape(-1), weights=weights[inside], minlength=len(cells))
+        density = kernel_density(
+            cells[:, 0] * MERGE_STEP, cells[:, 1] * MERGE_STEP, merged, self.sigma_px
+        )
+        return encode_png(colorize(density / self.saturation), settings.HEATMAP_PNG_LEVEL)
+
+    @staticmethod
+    def _key(version: int, zoom: int, x: int, y: int) -> str:
+        return f"heatmap:{version}:{zoom}:{x}:{y}"
+
+    def tile(self, zoom: int, x: int, y: int) -> Tuple[bytes, int]:
+        """Cached PNG of a tile for the current traffic version, and that version"""
+        version = get_version(TRAFFIC)[0]
+        key = self._key(version, zoom, x, y)
+        png = cache.get(key)
+        if png is None:
+            png = self.render(zoom, x, y, version)
+            cache.set(key, png, timeout=settings.HEATMAP_CACHE_SECONDS)
+        return png, version
+
+    def precompute(
+        self,
+        bbox: Optional[Sequence[float]] = None,
+        zooms: Optional[Iterable[int]] = None
+    ) -> Dict:
+        """Render every tile of the service area at the common zooms, once per version"""
+        version = get_version(TRAFFIC)[0]
+        if cache.get('heatmap:precomputed') == version:
+            return {'version': version, 'tiles': 0}
+        bbox = bbox or [float(v) for v in settings.HEATMAP_SERVICE_AREA.split(',')]
+        zooms = list(zooms if zooms is not None else settings.HEATMAP_PRECOMPUTE_ZOOMS)
+
+        started = time.monotonic()
+        tiles = {}
+        for zoom in zooms:
+            for x, y in tiles_for_bbox(bbox, zoom):
+                tiles[self._key(version, zoom, x, y)] = self.render(zoom, x, y, version)
+        cache.set_many(tiles, timeout=settings.HEATMAP_CACHE_SECONDS)
+        cache.set('heatmap:precomputed', version, timeout=settings.HEATMAP_CACHE_SECONDS)
+        elapsed_ms = (time.monotonic() - started) * 1000
+        logger.info(f"Prerendered {len(tiles)} heatmap tiles for version {version} in {elapsed_ms:.0f} ms")
+        return {'version': version, 'tiles': len(tiles), 'elapsed_ms': round(elapsed_ms, 1)}
+
+
+_renderer: Optional[HeatmapRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_heatmap_renderer() -> HeatmapRenderer:
+    """Process-wide heatmap renderer"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = HeatmapRenderer()
+        return _renderer
@@ -0,0 +1,280 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models import Alert, TrafficData
+from .alert_writer import ALERT_HOOKS
+from .anomaly_detector import detect_incidents
+from .recent_store import record_readings
+from .resource_versions import TRAFFIC, bump_version, route_resource
+
+logger = logging.getLogger(__name__)
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class IngestionQueue:
+    """Bounded write-behind queue for readings and alerts
+
+    Collectors enqueue unsaved ``TrafficData`` and ``Alert`` instances and
+    carry on fetching; a background thread drains the queue and writes with
+    ``bulk_create`` whenever ``batch_size`` items are pending or
+    ``flush_interval`` seconds have passed. When the queue is full the
+    ``policy`` decides: ``block`` waits up to ``block_timeout`` (backpressure),
+    ``drop_newest`` rejects the new item, ``drop_oldest`` discards the oldest
+    queued item to make room.
+    """
+
+    POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        policy: str = 'block',
+        block_timeout: float = 5.0,
+        max_retries: int = 3,
+        on_readings_written: Optional[List[Callable[[List[TrafficData]], None]]] = None,
+        on_alerts_written: Optional[List[Callable[[List[Alert]], None]]] = None
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy must be one of {self.POLICIES}")
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+        self.on_readings_written = list(on_readings_written or [])
+        self.on_alerts_written = list(on_alerts_written or [])
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'written_readings': 0,
+            'written_alerts': 0,
+            'failed': 0,
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+            'last_flush_at': None,
+        }
+
+    def _count(self, key: str, amount=1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def start(self) -> 'IngestionQueue':
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(
+                target=self._run, name='traffic-ingestion-writer', daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def _put(self, item) -> bool:
+        if self._closed:
+            raise RuntimeError("ingestion queue is closed")
+        try:
+            if self.policy == 'block':
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            if self.policy != 'drop_oldest':
+                self._count('dropped')
+                logger.warning(f"Ingestion queue full ({self.max_size}), dropping new item")
+                return False
+            try:
+                oldest = self._queue.get_nowait()
+                if isinstance(oldest, _FlushRequest):
+                    oldest.done.set()
+                else:
+                    self._count('dropped')
+            except queue.Empty:
+                pass
+            return self._put(item)
+        self._count('enqueued')
+        return True
+
+    def put_reading(self, reading: TrafficData) -> bool:
+        """Queue an unsaved reading; returns False if it was dropped"""
+        return self._put(reading)
+
+    def put_alert(self, alert: Alert) -> bool:
+        """Queue an unsaved alert; returns False if it was dropped"""
+        return self._put(alert)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far has been written"""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, drain: bool = True, timeout: Optional[float] = 30.0) -> None:
+        """Stop the writer, writing whatever is still queued when ``drain``"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None or not self._thread.is_alive():
+            return
+        if not drain:
+            self._discard_pending()
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Ingestion writer did not drain within {timeout}s, {self.depth} items left")
+
+    def _discard_pending(self) -> None:
+        discarded = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            else:
+                discarded += 1
+        self._count('dropped', discarded)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def metrics(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'depth': self.depth,
+            'capacity': self.max_size,
+            'utilization': round(self.depth / self.max_size, 3) if self.max_size else 0.0,
+            'policy': self.policy,
+            'running': bool(self._thread and self._thread.is_alive()),
+        })
+        return stats
+
+    def _run(self) -> None:
+        readings: List[TrafficData] = []
+        alerts: List[Alert] = []
+        waiting: List[_FlushRequest] = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+
+        try:
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, _FlushRequest):
+                    waiting.append(item)
+                elif isinstance(item, TrafficData):
+                    readings.append(item)
+                elif isinstance(item, Alert):
+                    alerts.append(item)
+
+                due = time.monotonic() >= deadline
+                if stopping or waiting or due or len(readings) + len(alerts) >= self.batch_size:
+                    if readings or alerts:
+                        self._write(readings, alerts)
+                        readings, alerts = [], []
+                    for request in waiting:
+                        request.done.set()
+                    waiting = []
+                    deadline = time.monotonic() + self.flush_interval
+        finally:
+            connection.close()
+
+    def _write(self, readings: List[TrafficData], alerts: List[Alert]) -> None:
+        started = time.monotonic()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with transaction.atomic():
+                    if readings:
+                        readings = TrafficData.objects.bulk_create(readings, batch_size=self.batch_size)
+                    if alerts:
+                        alerts = Alert.objects.bulk_create(alerts, batch_size=self.batch_size)
+                break
+            except Exception as e:
+                logger.error(f"Ingestion flush failed (attempt {attempt}/{self.max_retries}): {str(e)}")
+                connection.close()
+                if attempt == self.max_retries:
+                    self._count('failed', len(readings) + len(alerts))
+                    return
+                time.sleep(min(2 ** attempt * 0.1, 2.0))
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._stats_lock:
+            self._stats['written_readings'] += len(readings)
+            self._stats['written_alerts'] += len(alerts)
+            self._stats['flushes'] += 1
+            self._stats['last_flush_ms'] = round(elapsed_ms, 2)
+            self._stats['last_flush_at'] = time.time()
+
+        for hooks, items in ((self.on_readings_written, readings), (self.on_alerts_written, alerts)):
+            if not items:
+                continue
+            for hook in hooks:
+                try:
+                    hook(items)
+                except Exception as e:
+                    logger.error(f"Ingestion hook {getattr(hook, '__name__', hook)} failed: {str(e)}")
+
+
+def _detect_incidents_for(readings: List[TrafficData]) -> None:
+    with_speed = [r for r in readings if r.current_speed is not None]
+    detect_incidents(
+        [r.location for r in with_speed],
+        [r.current_speed for r in with_speed],
+        [r.timestamp.timestamp() for r in with_speed],
+    )
+
+
+def _bump_traffic(readings: List[TrafficData]) -> None:
+    # Route conditions are cached per route, so bump the routes written to as well
+    routes = {r.road_segment_id for r in readings if r.road_segment_id is not None}
+    bump_version(TRAFFIC, *(route_resource(route_id) for route_id in sorted(routes)))
+
+
+_queue_instance: Optional[IngestionQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Process-wide writer, started on first use and drained at exit"""
+    global _queue_instance
+    with _queue_lock:
+        if _queue_instance is None:
+            _queue_instance = IngestionQueue(
+                max_size=settings.INGESTION_QUEUE_MAX_SIZE,
+                batch_size=settings.INGESTION_QUEUE_BATCH_SIZE,
+                flush_interval=settings.INGESTION_QUEUE_FLUSH_INTERVAL,
+                policy=settings.INGESTION_QUEUE_POLICY,
+                on_readings_written=[record_readings, _bump_traffic, _detect_incidents_for],
+                on_alerts_written=list(ALERT_HOOKS),
+            ).start()
+            atexit.register(_queue_instance.close)
+        return _queue_instance
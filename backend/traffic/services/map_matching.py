@@ -0,0 +1,569 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from ..models import TrafficData
+from .road_network import RoadNetwork, get_road_network
+from .recent_store import record_readings
+from .resource_versions import TRAFFIC, bump_version
+from .spatial_index import haversine_m, project_to_segments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FREE_FLOW_SPEED = 40.0  # km/h, same default the simulator uses
+
+
+@dataclass
+class MatchedPoint:
+    index: int
+    timestamp: float
+    segment_id: int
+    road: str
+    fraction: float
+    latitude: float
+    longitude: float
+    distance_m: float
+
+
+@dataclass
+class SegmentSpeed:
+    segment_id: int
+    road: str
+    latitude: float
+    longitude: float
+    speed_kmh: float
+    free_flow_speed: float
+    samples: int
+
+
+class _Candidates:
+    """Padded ``(points, K)`` candidate arrays for a run of GPS points"""
+
+    def __init__(self, seg, dist, frac, lat, lon):
+        self.seg = seg
+        self.dist = dist
+        self.frac = frac
+        self.lat = lat
+        self.lon = lon
+
+    @property
+    def valid(self) -> np.ndarray:
+        return self.seg >= 0
+
+    def row(self, i: int) -> '_Candidates':
+        return _Candidates(
+            self.seg[i], self.dist[i], self.frac[i], self.lat[i], self.lon[i]
+        )
+
+
+class MapMatcher:
+    """Hidden Markov Model map matcher over the local road network
+
+    Hidden states are candidate road segments near each GPS fix. Emission
+    scores are Gaussian in the distance to the segment, transition scores
+    penalise the difference between the along-road distance and the
+    great-circle distance between consecutive fixes (Newson & Krumm).
+    Candidate lookup and scoring run vectorized over every point of every
+    trace in a batch; the Viterbi recursion is a ``K x K`` array op per step.
+    """
+
+    def __init__(
+        self,
+        network: Optional[RoadNetwork] = None,
+        sigma_m: float = 10.0,
+        beta_m: float = 50.0,
+        search_radius_m: float = 50.0,
+        max_candidates: int = 8,
+        max_speed_kmh: float = 180.0
+    ):
+        self.network = network or get_road_network()
+        self.sigma_m = sigma_m
+        self.beta_m = beta_m
+        self.search_radius_m = search_radius_m
+        self.max_candidates = max_candidates
+        self.max_speed_kmh = max_speed_kmh
+        cell_m = self.network.segment_index.cell_size * 111000
+        self._radius_cells = max(1, int(np.ceil(search_radius_m / cell_m)))
+
+    def candidates(self, lats: np.ndarray, lons: np.ndarray) -> _Candidates:
+        """Up to ``max_candidates`` nearest segments per point, padded with -1"""
+        net = self.network
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        n, k = len(lats), self.max_candidates
+
+        seg = np.full((n, k), -1, dtype=np.int64)
+        dist = np.full((n, k), np.inf)
+        frac = np.zeros((n, k))
+
+        point_idx, seg_idx = net.segment_index.query_points(lats, lons, self._radius_cells)
+        if len(point_idx):
+            d, t = project_to_segments(
+                lats[point_idx], lons[point_idx],
+                net.seg_lat1[seg_idx], net.seg_lon1[seg_idx],
+                net.seg_lat2[seg_idx], net.seg_lon2[seg_idx],
+            )
+            keep = d <= self.search_radius_m
+            point_idx, seg_idx, d, t = point_idx[keep], seg_idx[keep], d[keep], t[keep]
+
+            order = np.lexsort((d, point_idx))
+            point_idx, seg_idx, d, t = point_idx[order], seg_idx[order], d[order], t[order]
+            group_start = np.searchsorted(point_idx, point_idx, side='left')
+            rank = np.arange(len(point_idx)) - group_start
+            keep = rank < k
+            point_idx, rank = point_idx[keep], rank[keep]
+            seg[point_idx, rank] = seg_idx[keep]
+            dist[point_idx, rank] = d[keep]
+            frac[point_idx, rank] = t[keep]
+
+        lat = np.zeros((n, k))
+        lon = np.zeros((n, k))
+        if net.segment_count:
+            safe = np.maximum(seg, 0)
+            lat = net.seg_lat1[safe] + frac * (net.seg_lat2[safe] - net.seg_lat1[safe])
+            lon = net.seg_lon1[safe] + frac * (net.seg_lon2[safe] - net.seg_lon1[safe])
+        return _Candidates(seg, dist, frac, lat, lon)
+
+    def _emission(self, cands: _Candidates) -> np.ndarray:
+        scores = -0.5 * (cands.dist / self.sigma_m) ** 2
+        return np.where(cands.valid, scores, -np.inf)
+
+    def _route_distance(self, prev: _Candidates, cur: _Candidates) -> np.ndarray:
+        """Approximate along-road distance between two candidate sets (K x K)"""
+        net = self.network
+        ps = np.maximum(prev.seg, 0)[:, None]
+        cs = np.maximum(cur.seg, 0)[None, :]
+        p_len = net.seg_length[ps]
+        c_len = net.seg_length[cs]
+        p_frac = prev.frac[:, None]
+        c_frac = cur.frac[None, :]
+
+        straight = haversine_m(prev.lat[:, None], prev.lon[:, None], cur.lat[None, :], cur.lon[None, :])
+        same = ps == cs
+        along_same = np.abs(c_frac - p_frac) * p_len
+
+        # Segments joined at a node: travel to the shared node, then onwards
+        p_to_n1, p_to_n2 = p_frac * p_len, (1 - p_frac) * p_len
+        c_from_n1, c_from_n2 = c_frac * c_len, (1 - c_frac) * c_len
+        pn1, pn2 = net.seg_node1[ps], net.seg_node2[ps]
+        cn1, cn2 = net.seg_node1[cs], net.seg_node2[cs]
+        via = np.full(same.shape, np.inf)
+        via = np.where(pn2 == cn1, np.minimum(via, p_to_n2 + c_from_n1), via)
+        via = np.where(pn2 == cn2, np.minimum(via, p_to_n2 + c_from_n2), via)
+        via = np.where(pn1 == cn1, np.minimum(via, p_to_n1 + c_from_n1), via)
+        via = np.where(pn1 == cn2, np.minimum(via, p_to_n1 + c_from_n2), via)
+
+        # Anything further apart is assumed to need a detour over the network
+        detour = straight * 1.4 + self.beta_m
+        return np.where(same, along_same, np.where(np.isfinite(via), via, detour))
+
+    def _transition(self, prev: _Candidates, cur: _Candidates, gc_distance: float) -> np.ndarray:
+        route = self._route_distance(prev, cur)
+        scores = -np.abs(route - gc_distance) / self.beta_m
+        mask = prev.valid[:, None] & cur.valid[None, :]
+        return np.where(mask, scores, -np.inf)
+
+    def _step(
+        self,
+        prev: _Candidates,
+        prev_delta: np.ndarray,
+        cur: _Candidates,
+        emission: np.ndarray,
+        gc_distance: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """One Viterbi step: returns the new scores and back-pointers"""
+        total = prev_delta[:, None] + self._transition(prev, cur, gc_distance)
+        back = np.argmax(total, axis=0)
+        delta = total[back, np.arange(len(back))] + emission
+        if not np.isfinite(delta).any():
+            # Disconnected jump: restart the chain from emissions alone
+            back = np.full(len(back), np.argmax(prev_delta))
+            delta = emission.copy()
+        return delta, back
+
+    def _matched_point(self, index, timestamp, cands: _Candidates, k: int) -> MatchedPoint:
+        seg = int(cands.seg[k])
+        return MatchedPoint(
+            index=index,
+            timestamp=timestamp,
+            segment_id=seg,
+            road=self.network.road_names[self.network.seg_road[seg]],
+            fraction=float(cands.frac[k]),
+            latitude=float(cands.lat[k]),
+            longitude=float(cands.lon[k]),
+            distance_m=float(cands.dist[k]),
+        )
+
+    def _viterbi(
+        self,
+        cands: _Candidates,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        timestamps: np.ndarray
+    ) -> List[MatchedPoint]:
+        emissions = self._emission(cands)
+        usable = np.flatnonzero(cands.valid.any(axis=1))
+        if not len(usable):
+            return []
+
+        gc = haversine_m(lats[usable[:-1]], lons[usable[:-1]], lats[usable[1:]], lons[usable[1:]])
+        delta = emissions[usable[0]]
+        backs = []
+        for step, i in enumerate(usable[1:]):
+            delta, back = self._step(
+                cands.row(usable[step]), delta, cands.row(i), emissions[i], gc[step]
+            )
+            backs.append(back)
+
+        state = int(np.argmax(delta))
+        path = [state]
+        for back in reversed(backs):
+            state = int(back[state])
+            path.append(state)
+        path.reverse()
+
+        return [
+            self._matched_point(int(i), float(timestamps[i]), cands.row(i), k)
+            for i, k in zip(usable, path)
+        ]
+
+    def match_traces(
+        self,
+        traces: Dict[str, Tuple[Sequence[float], Sequence[float], Sequence[float]]]
+    ) -> Dict[str, List[MatchedPoint]]:
+        """Match a batch of traces
+
+        Args:
+            traces: ``{trace_id: (lats, lons, unix_timestamps)}``, each
+                    trace ordered by time
+        """
+        ids = list(traces)
+        arrays = [tuple(np.asarray(a, dtype=np.float64) for a in traces[i]) for i in ids]
+        if not arrays:
+            return {}
+        lengths = np.array([len(a[0]) for a in arrays])
+        lats = np.concatenate([a[0] for a in arrays])
+        lons = np.concatenate([a[1] for a in arrays])
+        timestamps = np.concatenate([a[2] for a in arrays])
+
+        # One candidate query for the whole batch, then Viterbi per trace
+        all_cands = self.candidates(lats, lons)
+        results = {}
+        start = 0
+        for trace_id, length in zip(ids, lengths):
+            end = start + length
+            cands = _Candidates(
+                all_cands.seg[start:end], all_cands.dist[start:end],
+                all_cands.frac[start:end], all_cands.lat[start:end], all_cands.lon[start:end],
+            )
+            results[trace_id] = self._viterbi(
+                cands, lats[start:end], lons[start:end], timestamps[start:end]
+            )
+            start = end
+        return results
+
+    def _pair_distance(self, a: MatchedPoint, b: MatchedPoint) -> float:
+        prev = _Candidates(
+            np.array([a.segment_id]), np.array([a.distance_m]), np.array([a.fraction]),
+            np.array([a.latitude]), np.array([a.longitude]),
+        )
+        cur = _Candidates(
+            np.array([b.segment_id]), np.array([b.distance_m]), np.array([b.fraction]),
+            np.array([b.latitude]), np.array([b.longitude]),
+        )
+        return float(self._route_distance(prev, cur)[0, 0])
+
+    def observed_speeds(self, matched: Sequence[MatchedPoint]) -> List[Tuple[int, float]]:
+        """(segment_id, km/h) observations between consecutive matched points"""
+        observations = []
+        for a, b in zip(matched, matched[1:]):
+            dt = b.timestamp - a.timestamp
+            if dt <= 0:
+                continue
+            speed = self._pair_distance(a, b) / dt * 3.6
+            if speed <= self.max_speed_kmh:
+                observations.append((b.segment_id, speed))
+        return observations
+
+    def aggregate_speeds(self, observations: Sequence[Tuple[int, float]]) -> List[SegmentSpeed]:
+        """Average observations per segment"""
+        if not observations:
+            return []
+        net = self.network
+        obs = np.asarray(observations, dtype=np.float64)
+        seg_ids, inverse, counts = np.unique(
+            obs[:, 0].astype(np.int64), return_inverse=True, return_counts=True
+        )
+        means = np.bincount(inverse, weights=obs[:, 1]) / counts
+
+        speeds = []
+        for seg, speed, count in zip(seg_ids, means, counts):
+            road = int(net.seg_road[seg])
+            speeds.append(SegmentSpeed(
+                segment_id=int(seg),
+                road=net.road_names[road],
+                latitude=round(float(net.seg_lat1[seg] + net.seg_lat2[seg]) / 2, 6),
+                longitude=round(float(net.seg_lon1[seg] + net.seg_lon2[seg]) / 2, 6),
+                speed_kmh=round(float(speed), 2),
+                free_flow_speed=net.road_max_speeds[road] or DEFAULT_FREE_FLOW_SPEED,
+                samples=int(count),
+            ))
+        return speeds
+
+    def segment_speeds(self, results: Dict[str, List[MatchedPoint]]) -> List[SegmentSpeed]:
+        """Per-segment observed speeds over a batch of matched traces"""
+        observations = []
+        for matched in results.values():
+            observations.extend(self.observed_speeds(matched))
+        return self.aggregate_speeds(observations)
+
+
+class StreamingMatcher:
+    """Incremental fixed-lag Viterbi for live position streams
+
+    Each vehicle keeps its current Viterbi column and a short window of
+    back-pointers. A point is finalised once ``lag`` newer points have been
+    seen; finalised points feed a speed accumulator drained by the caller.
+    Vehicles silent for ``idle_ttl`` seconds are flushed, as are the least
+    recently seen ones beyond ``max_vehicles``, so state stays bounded.
+    """
+
+    def __init__(
+        self,
+        matcher: Optional[MapMatcher] = None,
+        lag: int = 3,
+        idle_ttl: float = 300.0,
+        max_vehicles: int = 10000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.matcher = matcher or MapMatcher()
+        self.lag = lag
+        self.idle_ttl = idle_ttl
+        self.max_vehicles = max_vehicles
+        self.clock = clock
+        # Least recently seen first
+        self._state: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._observations: List[Tuple[int, float]] = []
+        self._lock = threading.Lock()
+
+    def push_batch(
+        self,
+        vehicle_ids: Sequence[str],
+        lats: Sequence[float],
+        lons: Sequence[float],
+        timestamps: Sequence[float]
+    ) -> Dict[str, List[MatchedPoint]]:
+        """Feed one position per vehicle; returns newly finalised points"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        cands = self.matcher.candidates(lats, lons)
+        emissions = self.matcher._emission(cands)
+
+        finalised: Dict[str, List[MatchedPoint]] = {}
+        with self._lock:
+            now = self.clock()
+            for i, vehicle_id in enumerate(vehicle_ids):
+                if not cands.valid[i].any():
+                    continue
+                points = self._advance(
+                    vehicle_id, cands.row(i), emissions[i], lats[i], lons[i], float(timestamps[i]), now
+                )
+                if points:
+                    finalised[vehicle_id] = points
+            self._evict(now)
+        return finalised
+
+    def _advance(self, vehicle_id, cands, emission, lat, lon, timestamp, now) -> List[MatchedPoint]:
+        state = self._state.get(vehicle_id)
+        if state is None:
+            self._state[vehicle_id] = {
+                'delta': emission,
+                'window': [(cands, None, timestamp)],
+                'position': (lat, lon),
+                'last': None,
+                'seen': now,
+            }
+            return []
+
+        prev_cands = state['window'][-1][0]
+        gc = float(haversine_m(state['position'][0], state['position'][1], lat, lon))
+        state['delta'], back = self.matcher._step(prev_cands, state['delta'], cands, emission, gc)
+        state['window'].append((cands, back, timestamp))
+        state['position'] = (lat, lon)
+        state['seen'] = now
+        self._state.move_to_end(vehicle_id)
+
+        if len(state['window']) <= self.lag:
+            return []
+        return [self._finalise_oldest(vehicle_id, state)]
+
+    def _backtrack(self, state) -> List[int]:
+        k = int(np.argmax(state['delta']))
+        path = [k]
+        for _, back, _ in reversed(state['window'][1:]):
+            k = int(back[k])
+            path.append(k)
+        path.reverse()
+        return path
+
+    def _finalise_oldest(self, vehicle_id, state) -> MatchedPoint:
+        k = self._backtrack(state)[0]
+        cands, _, timestamp = state['window'].pop(0)
+        point = self.matcher._matched_point(-1, timestamp, cands, k)
+        if state['last'] is not None:
+            self._observations.extend(self.matcher.observed_speeds([state['last'], point]))
+        state['last'] = point
+        return point
+
+    def _flush(self, vehicle_id: str) -> List[MatchedPoint]:
+        state = self._state.pop(vehicle_id, None)
+        if state is None:
+            return []
+        points = []
+        path = self._backtrack(state)
+        for (cands, _, timestamp), k in zip(state['window'], path):
+            point = self.matcher._matched_point(-1, timestamp, cands, k)
+            if state['last'] is not None:
+                self._observations.extend(self.matcher.observed_speeds([state['last'], point]))
+            state['last'] = point
+            points.append(point)
+        return points
+
+    def _evict(self, now: float) -> int:
+        evicted = 0
+        while self._state:
+            vehicle_id, state = next(iter(self._state.items()))
+            if now - state['seen'] <= self.idle_ttl and len(self._state) <= self.max_vehicles:
+                break
+            self._flush(vehicle_id)
+            evicted += 1
+        return evicted
+
+    def flush(self, vehicle_id: str) -> List[MatchedPoint]:
+        """Finalise and forget everything pending for a vehicle"""
+        with self._lock:
+            return self._flush(vehicle_id)
+
+    def expire(self) -> int:
+        """Flush vehicles idle past ``idle_ttl`` or over ``max_vehicles``; returns how many"""
+        with self._lock:
+            return self._evict(self.clock())
+
+    def flush_all(self) -> int:
+        """Flush every tracked vehicle; returns how many"""
+        with self._lock:
+            vehicle_ids = list(self._state)
+            for vehicle_id in vehicle_ids:
+                self._flush(vehicle_id)
+        return len(vehicle_ids)
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    @property
+    def pending_observations(self) -> int:
+        return len(self._observations)
+
+    def drain_speeds(self) -> List[SegmentSpeed]:
+        """Aggregate and reset the speed observations collected so far"""
+        with self._lock:
+            observations, self._observations = self._observations, []
+        return self.matcher.aggregate_speeds(observations)
+
+
+def store_segment_speeds(speeds: Sequence[SegmentSpeed], timestamp=None) -> List[TrafficData]:
+    """Persist matched segment speeds as TrafficData readings"""
+    timestamp = timestamp or timezone.now()
+    rows = []
+    for speed in speeds:
+        rows.append(TrafficData(
+            location=f"{speed.latitude},{speed.longitude}",
+            current_speed=speed.speed_kmh,
+            free_flow_speed=speed.free_flow_speed,
+            current_travel_time=int(3600 * (speed.free_flow_speed / max(speed.speed_kmh, 1.0))),
+            free_flow_travel_time=3600,
+            confidence=min(1.0, speed.samples / 5),
+            road_closure=False,
+            timestamp=timestamp
+        ))
+    created = TrafficData.objects.bulk_create(rows)
+    record_readings(created)
+    bump_version(TRAFFIC)
+    return created
+
+
+class StreamFlusher:
+    """Timer that saves a streaming matcher's segment speeds
+
+    Positions only reach the matcher of the process that received them, so
+    the timer runs beside it: every ``interval`` seconds idle vehicles are
+    finalised and the pending speeds saved, even for a fleet that has gone
+    quiet. ``close`` finalises every tracked vehicle and saves what is left.
+    """
+
+    def __init__(self, matcher: StreamingMatcher, interval: float = 60.0):
+        self.matcher = matcher
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'StreamFlusher':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='traffic-stream-flush', daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self, finish: bool = False) -> Dict:
+        """Finalise idle (or, with ``finish``, all) vehicles and save pending speeds"""
+        finalised = self.matcher.flush_all() if finish else self.matcher.expire()
+        speeds = self.matcher.drain_speeds()
+        if speeds:
+            store_segment_speeds(speeds)
+        return {'finalised': finalised, 'tracked': len(self.matcher), 'segments': len(speeds)}
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Streaming speed flush failed: {str(e)}")
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+        try:
+            self.flush(finish=True)
+        except Exception as e:
+            logger.error(f"Final streaming speed flush failed: {str(e)}")
+
+
+_streaming_matcher: Optional[StreamingMatcher] = None
+_streaming_matcher_lock = threading.Lock()
+
+
+def get_streaming_matcher() -> StreamingMatcher:
+    """Shared streaming matcher for live vehicle positions, flushed on a timer and at exit"""
+    global _streaming_matcher
+    with _streaming_matcher_lock:
+        if _streaming_matcher is None:
+            _streaming_matcher = StreamingMatcher(
+                idle_ttl=settings.MAP_MATCH_STREAM_IDLE_SECONDS,
+                max_vehicles=settings.MAP_MATCH_STREAM_MAX_VEHICLES
+            )
+            flusher = StreamFlusher(_streaming_matcher, settings.MAP_MATCH_STREAM_FLUSH_SECONDS).start()
+            atexit.register(flusher.close)
+        return _streaming_matcher
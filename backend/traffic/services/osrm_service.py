@@ -1,15 +1,30 @@
+import asyncio
+import logging
 import requests
-from typing import List, Dict, Any, Optional
+from asgiref.sync import sync_to_async
+from typing import List, Dict, Any, Optional, Tuple
 from django.conf import settings
 import json
 from datetime import datetime
 import firebase_admin
 from firebase_admin import db
-from ..models import TrafficData, Alert
+import numpy as np
+from . import traffic_metrics
+from .polyline import decode_polyline
+from .recent_store import FIELDS, get_recent_store
+from .async_http import get_async_client
+from .spatial_index import parse_locations
+
+logger = logging.getLogger(__name__)
+
+CURRENT_SPEED = FIELDS.index('current_speed')
+FREE_FLOW_SPEED = FIELDS.index('free_flow_speed')
 
 class OSRMService:
     OSRM_BASE_URL = 'http://router.project-osrm.org'
     NOMINATIM_BASE_URL = 'https://nominatim.openstreetmap.org'
+    # Nominatim address keys used as the area, most specific first
+    AREA_KEYS = ('neighbourhood', 'suburb', 'city_district', 'city', 'town', 'village')
     
     def __init__(self):
         self.db_ref = None
@@ -35,26 +50,27 @@ class OSRMService:
         Get traffic flow data for a bounding box using historical and real-time data
         bbox format: "minLon,minLat,maxLon,maxLat"
         """
-        # Get traffic data from our database
-        bounds = [float(x) for x in bbox.split(',')]
-        traffic_data = TrafficData.objects.filter(
-            location__contains=f"{bounds[1]},{bounds[0]}"
-        ).order_by('-timestamp')[:100]
-
-        # Calculate traffic density for each road segment
-        flow_data = {}
-        for data in traffic_data:
-            loc = data.location
-            if loc not in flow_data:
-                flow_data[loc] = {
-                    'current_speed': data.current_speed,
-                    'free_flow_speed': data.free_flow_speed,
-                    'density': self._calculate_density(
-                        data.current_speed,
-                        data.free_flow_speed
-                    ),
-                    'confidence': data.confidence
-                }
+        # Latest readings come from the in-process recent store
+        min_lon, min_lat, max_lon, max_lat = [float(x) for x in bbox.split(',')]
+        latest = get_recent_store().latest()
+        lats, lons = parse_locations(latest.keys())
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+        # Density of every segment in the bbox in one pass
+        names = [loc for loc, is_inside in zip(latest, inside) if is_inside]
+        rows = [latest[loc] for loc in names]
+        densities = traffic_metrics.density(
+            [row['current_speed'] for row in rows], [row['free_flow_speed'] for row in rows]
+        )
+        flow_data = {
+            loc: {
+                'current_speed': row['current_speed'],
+                'free_flow_speed': row['free_flow_speed'],
+                'density': float(densities[i]),
+                'confidence': row['confidence']
+            }
+            for i, (loc, row) in enumerate(zip(names, rows))
+        }
 
         return {
             'flowSegmentData': flow_data,
@@ -66,12 +82,8 @@ class OSRMService:
         current_speed: Optional[float],
         free_flow_speed: Optional[float]
     ) -> float:
-        """Calculate traffic density (0-1 scale)"""
-        if not current_speed or not free_flow_speed or free_flow_speed == 0:
-            return 0.0
-        
-        density = (free_flow_speed - current_speed) / free_flow_speed
-        return min(max(density, 0.0), 1.0)
+        """Calculate traffic density (0-1 scale) of one reading"""
+        return float(traffic_metrics.density(current_speed, free_flow_speed)[0])
 
     def calculate_route(
         self,
@@ -83,6 +95,25 @@ class OSRMService:
         Calculate route between points using OSRM
         Points format: "lat,lon"
         """
+        url, params = self._route_request(start, end, waypoints)
+        return self._route_json(requests.get(url, params=params))
+
+    async def acalculate_route(
+        self,
+        start: str,
+        end: str,
+        waypoints: List[str] = None
+    ) -> Dict[str, Any]:
+        """``calculate_route`` on the shared async client"""
+        url, params = self._route_request(start, end, waypoints)
+        return self._route_json(await get_async_client().get(url, params=params))
+
+    def _route_request(
+        self,
+        start: str,
+        end: str,
+        waypoints: Optional[List[str]]
+    ) -> Tuple[str, Dict[str, str]]:
         # Convert coordinates to lon,lat format for OSRM
         coords = [self._convert_coords(start)]
         if waypoints:
@@ -92,7 +123,6 @@ class OSRMService:
         # Build coordinates string
         coords_str = ';'.join([f"{c[0]},{c[1]}" for c in coords])
         
-        # Make request to OSRM
         url = f"{self.OSRM_BASE_URL}/route/v1/driving/{coords_str}"
         params = {
             'overview': 'full',
@@ -100,13 +130,90 @@ class OSRMService:
             'steps': 'true',
             'annotations': 'true'
         }
-        
-        response = requests.get(url, params=params)
+        return url, params
+
+    def _route_json(self, response) -> Dict[str, Any]:
+        # Works on both requests and httpx responses
         if response.status_code != 200:
             raise Exception(f"OSRM route calculation failed: {response.text}")
+        return response.json()
+
+    def search_location(
+        self,
+        query: str,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for places with Nominatim, biased towards ``lat``/``lon``"""
+        params = self._search_params(query, lat, lon)
+        response = requests.get(
+            f"{self.NOMINATIM_BASE_URL}/search",
+            params=params,
+            headers={'User-Agent': settings.UPSTREAM_HTTP_USER_AGENT}
+        )
+        return self._search_json(response)
+
+    async def asearch_location(
+        self,
+        query: str,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """``search_location`` on the shared async client"""
+        params = self._search_params(query, lat, lon)
+        response = await get_async_client().get(f"{self.NOMINATIM_BASE_URL}/search", params=params)
+        return self._search_json(response)
+
+    def _search_params(self, query: str, lat: Optional[float], lon: Optional[float]) -> Dict[str, Any]:
+        params = {'q': query, 'format': 'jsonv2', 'limit': 10}
+        if lat is not None and lon is not None:
+            # Roughly a 10 km box; results outside it are still allowed
+            params['viewbox'] = f"{lon - 0.1},{lat + 0.1},{lon + 0.1},{lat - 0.1}"
+        return params
 
+    def _search_json(self, response) -> List[Dict[str, Any]]:
+        if response.status_code != 200:
+            raise Exception(f"Location search failed: {response.text}")
         return response.json()
 
+    def reverse_geocode(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Reverse geocode one coordinate with Nominatim
+
+        Used when no road network extract is loaded; the result has the
+        same shape as the local ``ReverseGeocoder``'s.
+        """
+        response = requests.get(
+            f"{self.NOMINATIM_BASE_URL}/reverse",
+            params=self._reverse_params(lat, lon),
+            headers={'User-Agent': settings.UPSTREAM_HTTP_USER_AGENT}
+        )
+        return self._reverse_json(response, lat, lon)
+
+    async def areverse_geocode(self, lat: float, lon: float) -> Dict[str, Any]:
+        """``reverse_geocode`` on the shared async client"""
+        response = await get_async_client().get(
+            f"{self.NOMINATIM_BASE_URL}/reverse", params=self._reverse_params(lat, lon)
+        )
+        return self._reverse_json(response, lat, lon)
+
+    def _reverse_params(self, lat: float, lon: float) -> Dict[str, Any]:
+        return {'lat': lat, 'lon': lon, 'format': 'jsonv2', 'zoom': 17}
+
+    def _reverse_json(self, response, lat: float, lon: float) -> Dict[str, Any]:
+        if response.status_code != 200:
+            raise Exception(f"Reverse geocoding failed: {response.text}")
+        address = response.json().get('address') or {}
+        road = address.get('road')
+        area = next((address[key] for key in self.AREA_KEYS if address.get(key)), None)
+        return {
+            'latitude': lat,
+            'longitude': lon,
+            'road': road,
+            'area': area,
+            'distance_m': None,
+            'label': ', '.join(part for part in (road, area) if part) or None,
+        }
+
     def _convert_coords(self, coord_str: str) -> List[float]:
         """Convert lat,lon to lon,lat format"""
         lat, lon = map(float, coord_str.split(','))
@@ -118,26 +225,22 @@ class OSRMService:
             print("Firebase not initialized, skipping sync")
             return
 
-        # Get latest traffic data
-        latest_data = TrafficData.objects.order_by('-timestamp')[:100]
-        
+        # Latest traffic data as arrays, scored in one call
+        names, timestamps, values = get_recent_store().latest_arrays()
+        metrics = traffic_metrics.compute(values[:, CURRENT_SPEED], values[:, FREE_FLOW_SPEED])
+        lats, lons = parse_locations(names)
+
         # Convert to Firebase format
-        firebase_data = {}
-        for data in latest_data:
-            key = data.location.replace(',', '_')
-            firebase_data[key] = {
-                'latitude': float(data.location.split(',')[0]),
-                'longitude': float(data.location.split(',')[1]),
-                'density': self._calculate_density(
-                    data.current_speed,
-                    data.free_flow_speed
-                ),
-                'congestion_level': self._get_congestion_level(
-                    data.current_speed,
-                    data.free_flow_speed
-                ),
-                'timestamp': int(data.timestamp.timestamp() * 1000)
+        firebase_data = {
+            location.replace(',', '_'): {
+                'latitude': float(lats[i]),
+                'longitude': float(lons[i]),
+                'density': float(metrics.density[i]),
+                'congestion_level': str(metrics.congestion_level[i]),
+                'timestamp': int(timestamps[i] * 1000)
             }
+            for i, location in enumerate(names)
+        }
         
         # Update Firebase
         self.db_ref.update(firebase_data)
@@ -147,13 +250,8 @@ class OSRMService:
         current_speed: Optional[float],
         free_flow_speed: Optional[float]
     ) -> str:
-        """Get congestion level based on density"""
-        density = self._calculate_density(current_speed, free_flow_speed)
-        if density < 0.3:
-            return 'low'
-        elif density < 0.7:
-            return 'medium'
-        return 'high'
+        """Get congestion level of one reading based on density"""
+        return str(traffic_metrics.congestion_level(current_speed, free_flow_speed)[0])
 
     def get_alternative_routes(
         self,
@@ -166,84 +264,82 @@ class OSRMService:
         base_route = self.calculate_route(start, end)
         routes = [base_route['routes'][0]]
 
+        # Calculate alternative routes avoiding congested segments
+        for waypoint in self._avoidance_waypoints(base_route, max_alternatives):
+            alt_route = self.calculate_route(start, end, [waypoint])
+            if 'routes' in alt_route and alt_route['routes']:
+                routes.append(alt_route['routes'][0])
+
+        return routes
+
+    async def aget_alternative_routes(
+        self,
+        start: str,
+        end: str,
+        max_alternatives: int = 3
+    ) -> List[Dict[str, Any]]:
+        """``get_alternative_routes`` with the candidate routes requested concurrently
+
+        A candidate that fails is dropped rather than failing the whole
+        request; the base route still has to succeed.
+        """
+        base_route = await self.acalculate_route(start, end)
+        routes = [base_route['routes'][0]]
+
+        # The congestion lookup may read the database
+        waypoints = await sync_to_async(self._avoidance_waypoints)(base_route, max_alternatives)
+        candidates = await asyncio.gather(
+            *[self.acalculate_route(start, end, [waypoint]) for waypoint in waypoints],
+            return_exceptions=True
+        )
+        for waypoint, alt_route in zip(waypoints, candidates):
+            if isinstance(alt_route, Exception):
+                logger.warning(f"Alternative route via {waypoint} failed: {str(alt_route)}")
+            elif 'routes' in alt_route and alt_route['routes']:
+                routes.append(alt_route['routes'][0])
+
+        return routes
+
+    def _avoidance_waypoints(self, base_route: Dict[str, Any], max_alternatives: int) -> List[str]:
+        """One detour waypoint per congested segment of the base route"""
         # Get traffic data along the route
         coords = self._decode_polyline(base_route['routes'][0]['geometry'])
         congested_segments = self._find_congested_segments(coords)
 
-        # Calculate alternative routes avoiding congested segments
+        waypoints = []
         for segment in congested_segments[:max_alternatives - 1]:
             # Add waypoint to avoid congested segment
             mid_lat = (segment[0][0] + segment[1][0]) / 2
             mid_lon = (segment[0][1] + segment[1][1]) / 2
-            
-            # Calculate route with waypoint
-            alt_route = self.calculate_route(
-                start,
-                end,
-                [f"{mid_lat + 0.01},{mid_lon + 0.01}"]  # Offset to avoid segment
-            )
-            if 'routes' in alt_route and alt_route['routes']:
-                routes.append(alt_route['routes'][0])
-
-        return routes
+            waypoints.append(f"{mid_lat + 0.01},{mid_lon + 0.01}")  # Offset to avoid segment
+        return waypoints
 
     def _decode_polyline(self, polyline: str) -> List[List[float]]:
         """Decode Google polyline format"""
-        coords = []
-        index = 0
-        lat = 0
-        lng = 0
-        
-        while index < len(polyline):
-            result = 1
-            shift = 0
-            while True:
-                b = ord(polyline[index]) - 63 - 1
-                index += 1
-                result += b << shift
-                shift += 5
-                if b < 0x1f:
-                    break
-            lat += (~result >> 1) if (result & 1) != 0 else (result >> 1)
-            
-            result = 1
-            shift = 0
-            while True:
-                b = ord(polyline[index]) - 63 - 1
-                index += 1
-                result += b << shift
-                shift += 5
-                if b < 0x1f:
-                    break
-            lng += (~result >> 1) if (result & 1) != 0 else (result >> 1)
-            
-            coords.append([lat * 1e-5, lng * 1e-5])
-        
-        return coords
+        lats, lons = decode_polyline(polyline)
+        return np.column_stack([lats, lons]).tolist()
 
     def _find_congested_segments(
         self,
         coords: List[List[float]]
     ) -> List[List[List[float]]]:
         """Find congested segments along a route"""
-        congested_segments = []
-        
-        for i in range(len(coords) - 1):
-            # Get traffic data for segment
-            lat1, lon1 = coords[i]
-            lat2, lon2 = coords[i + 1]
-            
-            traffic_data = TrafficData.objects.filter(
-                location__in=[
-                    f"{lat1},{lon1}",
-                    f"{lat2},{lon2}"
-                ]
-            ).order_by('-timestamp').first()
-            
-            if traffic_data and self._calculate_density(
-                traffic_data.current_speed,
-                traffic_data.free_flow_speed
-            ) > 0.7:  # High congestion threshold
-                congested_segments.append([coords[i], coords[i + 1]])
-        
-        return congested_segments 
\ No newline at end of file
+        keys = [f"{lat},{lon}" for lat, lon in coords]
+        names, timestamps, values = get_recent_store().latest_arrays(keys)
+        if not names or len(coords) < 2:
+            return []
+
+        # Row of each coordinate's latest reading, -1 without one
+        position = {name: i for i, name in enumerate(names)}
+        index = np.asarray([position.get(k, -1) for k in keys])
+        has = index >= 0
+        ts = np.where(has, timestamps[np.maximum(index, 0)], -np.inf)
+        # The newer reading of each segment's two endpoints
+        newer = np.where(ts[1:] > ts[:-1], index[1:], index[:-1])
+        covered = has[:-1] | has[1:]
+        codes = traffic_metrics.congestion_codes(traffic_metrics.density(
+            values[np.maximum(newer, 0), CURRENT_SPEED], values[np.maximum(newer, 0), FREE_FLOW_SPEED]
+        ))
+        # High congestion only
+        congested = np.flatnonzero(covered & (codes == len(traffic_metrics.CONGESTION_LEVELS) - 1))
+        return [[coords[i], coords[i + 1]] for i in congested]
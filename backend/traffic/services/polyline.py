@@ -0,0 +1,45 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def decode_polyline(polyline: str, precision: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode an encoded polyline into latitude/longitude arrays
+
+    Every character is handled as one array element: chunk boundaries come
+    from the continuation bit, each varint is a weighted ``bincount`` and
+    the coordinates are a cumulative sum of the zigzag-decoded deltas.
+    """
+    if not polyline:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty
+    chunks = np.frombuffer(polyline.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    ends = (chunks & 0x20) == 0
+    value_index = np.concatenate([[0], np.cumsum(ends)[:-1]])
+    starts = np.flatnonzero(np.concatenate([[True], ends[:-1]]))
+    shift = 5 * (np.arange(len(chunks)) - starts[value_index])
+    values = np.bincount(value_index, weights=(chunks & 0x1f) << shift).astype(np.int64)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    scale = 10.0 ** precision
+    return np.cumsum(deltas[0::2]) / scale, np.cumsum(deltas[1::2]) / scale
+
+
+def encode_polyline(lats, lons, precision: int = 5) -> str:
+    """Encode latitude/longitude sequences as a polyline string"""
+    scale = 10.0 ** precision
+    points = np.column_stack([
+        np.round(np.asarray(lats, dtype=np.float64) * scale),
+        np.round(np.asarray(lons, dtype=np.float64) * scale),
+    ]).astype(np.int64)
+    if not len(points):
+        return ''
+    deltas = np.diff(points, axis=0, prepend=[[0, 0]]).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    out = []
+    for value in values.tolist():
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return ''.join(out)
@@ -0,0 +1,216 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from ..models import TrafficData
+from .ingestion_queue import IngestionQueue, get_ingestion_queue
+from .recent_store import FIELDS, get_recent_store
+from .spatial_index import parse_locations
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('lat', 'lon', 'speed', 'ts')
+
+
+class ProbeBatchError(ValueError):
+    """The payload does not have the expected layout"""
+
+
+@dataclass
+class ProbeAggregate:
+    """Mean speed per grid cell and time bucket, ready to become readings"""
+    locations: List[str]
+    bucket_start: np.ndarray
+    speed: np.ndarray
+    samples: np.ndarray
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+def parse_probe_payload(payload: Dict) -> Dict[str, np.ndarray]:
+    """Columns from either layout of the bulk endpoint
+
+    Columnar: ``{"lat": [...], "lon": [...], "speed": [...], "ts": [...],
+    "device": [...]}``; rows: ``{"fields": ["lat", "lon", "speed", "ts"],
+    "rows": [[...], ...], "device": [...]}``. ``device`` is optional and
+    ``fields`` defaults to ``lat, lon, speed, ts``.
+    """
+    if not isinstance(payload, dict):
+        raise ProbeBatchError('payload must be an object')
+    try:
+        if 'rows' in payload:
+            fields = list(payload.get('fields') or COLUMNS)
+            rows = np.asarray(payload['rows'], dtype=np.float64)
+            if rows.ndim != 2 or rows.shape[1] != len(fields):
+                raise ProbeBatchError(f'rows must be lists of {len(fields)} numbers')
+            columns = {name: rows[:, i] for i, name in enumerate(fields)}
+        else:
+            columns = {
+                name: np.asarray(payload[name], dtype=np.float64)
+                for name in COLUMNS if name in payload
+            }
+    except (TypeError, ValueError) as e:
+        raise ProbeBatchError(f'readings must be numbers: {str(e)}')
+
+    missing = [name for name in COLUMNS if name not in columns]
+    if missing:
+        raise ProbeBatchError(f'missing columns: {", ".join(missing)}')
+    size = len(columns['lat'])
+    if any(columns[name].shape != (size,) for name in COLUMNS):
+        raise ProbeBatchError('all columns must have the same length')
+
+    device = payload.get('device')
+    if device is not None:
+        if len(device) != size:
+            raise ProbeBatchError('device must have one entry per reading')
+        columns['device'] = np.unique(np.asarray(device, dtype=str), return_inverse=True)[1]
+    return columns
+
+
+def aggregate_probes(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    speed: np.ndarray,
+    ts: np.ndarray,
+    device: Optional[np.ndarray] = None,
+    cell_size: float = 0.001,
+    bucket_seconds: int = 60,
+    max_speed: float = 200.0,
+    max_age: float = 3600.0,
+    max_skew: float = 120.0,
+    now: Optional[float] = None
+) -> ProbeAggregate:
+    """Validate, deduplicate and aggregate raw probe readings, all vectorized
+
+    Readings outside valid coordinate and speed ranges, or timestamped more
+    than ``max_age`` seconds ago or ``max_skew`` seconds ahead, are
+    rejected. Repeats of the same device and timestamp (or, without device
+    ids, of the same position, speed and timestamp) count once. What is
+    left is averaged per ``cell_size`` degree grid cell and
+    ``bucket_seconds`` time bucket.
+    """
+    now = time.time() if now is None else now
+    received = len(lat)
+    valid = (
+        np.isfinite(lat) & np.isfinite(lon) & np.isfinite(speed) & np.isfinite(ts)
+        & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        & (speed >= 0) & (speed <= max_speed)
+        & (ts >= now - max_age) & (ts <= now + max_skew)
+    )
+    lat, lon, speed, ts = lat[valid], lon[valid], speed[valid], ts[valid]
+    if device is not None:
+        device = device[valid]
+        dedupe_key = np.stack([device.astype(np.float64), ts], axis=1)
+    else:
+        dedupe_key = np.stack([lat, lon, speed, ts], axis=1)
+    _, first = np.unique(dedupe_key, axis=0, return_index=True)
+    first.sort()
+    lat, lon, speed, ts = lat[first], lon[first], speed[first], ts[first]
+
+    cell_y = np.floor((lat + 90.0) / cell_size).astype(np.int64)
+    cell_x = np.floor((lon + 180.0) / cell_size).astype(np.int64)
+    bucket = np.floor(ts / bucket_seconds).astype(np.int64)
+    # Pack (cell, bucket) into one key; bucket offsets fit in 20 bits
+    columns_per_row = int(np.ceil(360.0 / cell_size)) + 1
+    cell = cell_y * columns_per_row + cell_x
+    bucket_offset = bucket - (bucket.min() if len(bucket) else 0)
+    keys, group = np.unique(cell * (1 << 20) + bucket_offset, return_inverse=True)
+    samples = np.bincount(group, minlength=len(keys))
+    mean_speed = np.bincount(group, weights=speed, minlength=len(keys)) / np.maximum(samples, 1)
+
+    group_cell = keys >> 20
+    group_bucket = (keys & ((1 << 20) - 1)) + (bucket.min() if len(bucket) else 0)
+    centre_lat = (group_cell // columns_per_row + 0.5) * cell_size - 90.0
+    centre_lon = (group_cell % columns_per_row + 0.5) * cell_size - 180.0
+    locations = [f"{a:.6f},{b:.6f}" for a, b in zip(centre_lat, centre_lon)]
+
+    return ProbeAggregate(
+        locations=locations,
+        bucket_start=group_bucket * bucket_seconds,
+        speed=mean_speed,
+        samples=samples,
+        stats={
+            'received': received,
+            'rejected': int(received - valid.sum()),
+            'duplicates': int(valid.sum() - len(first)),
+            'aggregated': len(keys),
+        },
+    )
+
+
+class ProbeIngestionService:
+    """Bulk crowd-sourced speed readings, validated and aggregated as arrays
+
+    Probes are averaged per grid cell and time bucket and only the
+    aggregates are handed to the ingestion queue, so a batch of tens of
+    thousands of readings becomes a few hundred rows for the writer.
+    """
+
+    def __init__(
+        self,
+        ingestion_queue: Optional[IngestionQueue] = None,
+        max_batch: Optional[int] = None,
+        cell_size: Optional[float] = None,
+        bucket_seconds: Optional[int] = None,
+        full_confidence_samples: Optional[int] = None
+    ):
+        self.ingestion_queue = ingestion_queue
+        self.max_batch = max_batch or settings.PROBE_MAX_BATCH
+        self.cell_size = cell_size or settings.PROBE_CELL_SIZE
+        self.bucket_seconds = bucket_seconds or settings.PROBE_BUCKET_SECONDS
+        self.full_confidence_samples = full_confidence_samples or settings.PROBE_FULL_CONFIDENCE_SAMPLES
+
+    def ingest(self, payload: Dict, now: Optional[float] = None) -> Dict[str, int]:
+        """Parse, aggregate and enqueue one request body; returns the counters"""
+        columns = parse_probe_payload(payload)
+        if len(columns['lat']) > self.max_batch:
+            raise ProbeBatchError(f'at most {self.max_batch} readings per request')
+        aggregate = aggregate_probes(
+            columns['lat'], columns['lon'], columns['speed'], columns['ts'],
+            device=columns.get('device'),
+            cell_size=self.cell_size,
+            bucket_seconds=self.bucket_seconds,
+            now=now
+        )
+        stats = dict(aggregate.stats)
+        stats.update(self.enqueue(aggregate))
+        logger.debug(f"Probe batch: {stats}")
+        return stats
+
+    def enqueue(self, aggregate: ProbeAggregate) -> Dict[str, int]:
+        """Turn aggregated probes into TrafficData and hand them to the writer"""
+        ingestion_queue = self.ingestion_queue or get_ingestion_queue()
+        # Free-flow speed from what the location last reported, when known
+        names, _, values = get_recent_store(sync=False).latest_arrays(aggregate.locations)
+        known_free_flow = dict(zip(names, values[:, FIELDS.index('free_flow_speed')]))
+
+        lats, lons = parse_locations(aggregate.locations)
+
+        enqueued = dropped = 0
+        for location, lat, lon, start, speed, samples in zip(
+            aggregate.locations, lats.tolist(), lons.tolist(),
+            aggregate.bucket_start, aggregate.speed, aggregate.samples
+        ):
+            free_flow = known_free_flow.get(location)
+            free_flow = None if free_flow is None or np.isnan(free_flow) else float(free_flow)
+            reading = TrafficData(
+                location=location,
+                latitude=lat,
+                longitude=lon,
+                current_speed=round(float(speed), 2),
+                free_flow_speed=free_flow,
+                current_travel_time=int(3600 * free_flow / max(float(speed), 1.0)) if free_flow else None,
+                free_flow_travel_time=3600 if free_flow else None,
+                confidence=min(1.0, int(samples) / self.full_confidence_samples),
+                road_closure=False,
+                timestamp=datetime.fromtimestamp(float(start), tz=dt_timezone.utc)
+            )
+            if ingestion_queue.put_reading(reading):
+                enqueued += 1
+            else:
+                dropped += 1
+        return {'enqueued': enqueued, 'dropped': dropped}
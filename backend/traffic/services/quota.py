@@ -0,0 +1,224 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import QuotaBucket
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 24 * 3600
+
+
+class QuotaExceeded(Exception):
+    """Raised when an endpoint has no budget left for a call right now"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"Quota for {endpoint} exhausted, retry in {retry_after:.0f}s")
+
+
+class EndpointQuota:
+    """Daily budget of one endpoint, paced evenly over the day
+
+    The bucket refills so that a full day's refill plus one burst stays
+    within ``daily_limit``, and a per-day count is the hard stop. Both live
+    in the endpoint's ``QuotaBucket`` row and are updated under a row lock,
+    so every worker process and machine spends the same budget. Refills
+    follow the wall clock, the only clock the workers share.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        daily_limit: int,
+        burst_seconds: float = 900.0,
+        wall_clock: Callable[[], float] = time.time
+    ):
+        self.endpoint = endpoint
+        self.daily_limit = daily_limit
+        self.wall_clock = wall_clock
+        self.capacity = max(1.0, daily_limit * burst_seconds / DAY_SECONDS)
+        self.rate = max(daily_limit - self.capacity, 0.0) / DAY_SECONDS
+
+    def _today(self) -> str:
+        return datetime.fromtimestamp(self.wall_clock(), tz=dt_timezone.utc).strftime('%Y%m%d')
+
+    def _refilled(self, bucket: QuotaBucket, now: float) -> float:
+        return min(self.capacity, bucket.tokens + max(now - bucket.refilled_at, 0.0) * self.rate)
+
+    def _state(self) -> Tuple[float, int]:
+        """Tokens available now and calls used today, without taking any"""
+        bucket = QuotaBucket.objects.filter(endpoint=self.endpoint).first()
+        if bucket is None:
+            return self.capacity, 0
+        used = bucket.used if bucket.day == self._today() else 0
+        return self._refilled(bucket, self.wall_clock()), used
+
+    @property
+    def available(self) -> float:
+        return self._state()[0]
+
+    @property
+    def used_today(self) -> int:
+        return self._state()[1]
+
+    @property
+    def remaining_today(self) -> int:
+        return max(self.daily_limit - self.used_today, 0)
+
+    def seconds_to_midnight(self) -> float:
+        return DAY_SECONDS - self.wall_clock() % DAY_SECONDS
+
+    @property
+    def pace(self) -> float:
+        """Share of the daily budget used over the share of the day gone; above 1 is overspending"""
+        elapsed = 1.0 - self.seconds_to_midnight() / DAY_SECONDS
+        if not self.daily_limit or elapsed <= 0:
+            return 0.0
+        return (self.used_today / self.daily_limit) / elapsed
+
+    def acquire(self) -> None:
+        now = self.wall_clock()
+        today = self._today()
+        with transaction.atomic():
+            bucket, _ = QuotaBucket.objects.select_for_update().get_or_create(
+                endpoint=self.endpoint,
+                defaults={'tokens': self.capacity, 'refilled_at': now, 'day': today}
+            )
+            if bucket.day != today:
+                bucket.day, bucket.used = today, 0
+            if bucket.used >= self.daily_limit:
+                raise QuotaExceeded(self.endpoint, self.seconds_to_midnight())
+            tokens = self._refilled(bucket, now)
+            if tokens < 1.0:
+                retry_after = (1.0 - tokens) / self.rate if self.rate > 0 else self.seconds_to_midnight()
+                raise QuotaExceeded(self.endpoint, retry_after)
+            bucket.tokens = tokens - 1.0
+            bucket.refilled_at = now
+            bucket.used += 1
+            bucket.save(update_fields=['tokens', 'refilled_at', 'day', 'used'])
+
+    def callable_now(self) -> int:
+        """Calls that can be made right now without waiting"""
+        tokens, used = self._state()
+        return int(min(tokens, max(self.daily_limit - used, 0)))
+
+
+class QuotaScheduler:
+    """Token budgets per TomTom endpoint and which areas to spend them on
+
+    ``schedule`` orders candidate areas by staleness x congestion x interest
+    and keeps as many as the endpoint can afford right now; the rest keep
+    their last known data until a later cycle.
+    """
+
+    def __init__(
+        self,
+        daily_limits: Optional[Dict[str, int]] = None,
+        burst_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time
+    ):
+        daily_limits = daily_limits if daily_limits is not None else settings.TOMTOM_DAILY_QUOTAS
+        burst_seconds = burst_seconds if burst_seconds is not None else settings.TOMTOM_QUOTA_BURST_SECONDS
+        self.clock = clock
+        self.quotas = {
+            endpoint: EndpointQuota(endpoint, limit, burst_seconds, wall_clock)
+            for endpoint, limit in daily_limits.items()
+        }
+        self.last_fetched: Dict[tuple, float] = {}
+        self.skipped: Dict[str, int] = {endpoint: 0 for endpoint in self.quotas}
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint: str) -> None:
+        """Take one call from the endpoint's budget or raise ``QuotaExceeded``"""
+        quota = self.quotas.get(endpoint)
+        if quota is None:
+            return
+        try:
+            quota.acquire()
+        except QuotaExceeded:
+            with self._lock:
+                self.skipped[endpoint] += 1
+            raise
+
+    def mark_fetched(self, endpoint: str, key: Hashable) -> None:
+        with self._lock:
+            self.last_fetched[(endpoint, key)] = self.clock()
+
+    def priority(
+        self,
+        endpoint: str,
+        key: Hashable,
+        congestion: float = 0.0,
+        interest: float = 1.0
+    ) -> float:
+        """Seconds since last fetch x (1 + congestion) x interest; never fetched comes first"""
+        last = self.last_fetched.get((endpoint, key))
+        if last is None:
+            return math.inf
+        staleness = self.clock() - last + 1.0
+        return staleness * (1.0 + min(max(congestion, 0.0), 1.0)) * interest
+
+    def schedule(
+        self,
+        endpoint: str,
+        keys: Sequence[Hashable],
+        congestion: Optional[Dict[Hashable, float]] = None,
+        interest: Optional[Dict[Hashable, float]] = None
+    ) -> List[Hashable]:
+        """Keys worth a call this cycle, most urgent first, capped by the budget
+
+        ``congestion`` is ``1 - speed / free_flow`` of the latest reading and
+        ``interest`` a weight such as the number of routes or subscribers
+        that depend on the area.
+        """
+        congestion = congestion or {}
+        interest = interest or {}
+        ranked = sorted(
+            keys,
+            key=lambda k: self.priority(endpoint, k, congestion.get(k, 0.0), interest.get(k, 1.0)),
+            reverse=True
+        )
+        quota = self.quotas.get(endpoint)
+        if quota is None:
+            return ranked
+        affordable = ranked[:quota.callable_now()]
+        if len(affordable) < len(ranked):
+            logger.info(
+                f"Quota for {endpoint}: refreshing {len(affordable)} of {len(ranked)} areas "
+                f"({quota.used_today}/{quota.daily_limit} used today, pace {quota.pace:.2f})"
+            )
+        return affordable
+
+    def metrics(self) -> Dict[str, Dict]:
+        return {
+            endpoint: {
+                'daily_limit': quota.daily_limit,
+                'used_today': quota.used_today,
+                'tokens': round(quota.available, 2),
+                'pace': round(quota.pace, 3),
+                'skipped': self.skipped[endpoint],
+            }
+            for endpoint, quota in self.quotas.items()
+        }
+
+
+_scheduler: Optional[QuotaScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_quota_scheduler() -> QuotaScheduler:
+    """Process-wide scheduler built from ``TOMTOM_DAILY_QUOTAS``"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = QuotaScheduler()
+        return _scheduler
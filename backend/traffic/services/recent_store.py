@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import TrafficData
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('current_speed', 'free_flow_speed', 'confidence', 'road_closure')
+
+
+class RecentReadingsStore:
+    """Last ``depth`` readings per location in preallocated ring buffers
+
+    Memory is fixed at construction: ``timestamps`` is a
+    ``(max_locations, depth)`` array and ``values`` a
+    ``(max_locations, depth, len(FIELDS))`` array. When every slot is taken
+    the location written least recently is evicted. Readings that are not
+    newer than what a slot already holds are ignored, which makes feeding
+    the same rows from the ingestion path and from a DB catch-up idempotent.
+    """
+
+    def __init__(self, max_locations: int = 20000, depth: int = 32):
+        self.max_locations = max_locations
+        self.depth = depth
+        self.timestamps = np.zeros((max_locations, depth), dtype=np.float64)
+        self.values = np.full((max_locations, depth, len(FIELDS)), np.nan, dtype=np.float32)
+        self.heads = np.zeros(max_locations, dtype=np.int64)
+        self.sizes = np.zeros(max_locations, dtype=np.int64)
+        self.latest_ts = np.full(max_locations, -np.inf)
+        self.touched = np.zeros(max_locations, dtype=np.int64)
+        self._tick = 0
+        self.locations: List[Optional[str]] = [None] * max_locations
+        self._slots: Dict[str, int] = {}
+        self._free = list(range(max_locations - 1, -1, -1))
+        self.db_watermark = 0
+        self.last_synced = 0.0
+        self._lock = threading.RLock()
+
+    @property
+    def memory_bytes(self) -> int:
+        arrays = (self.timestamps, self.values, self.heads, self.sizes, self.latest_ts, self.touched)
+        return sum(a.nbytes for a in arrays)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _slot_for(self, location: str) -> int:
+        slot = self._slots.get(location)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = int(np.argmin(self.touched))
+            del self._slots[self.locations[slot]]
+        self._tick += 1
+        self.touched[slot] = self._tick
+        self._slots[location] = slot
+        self.locations[slot] = location
+        self.heads[slot] = 0
+        self.sizes[slot] = 0
+        self.latest_ts[slot] = -np.inf
+        return slot
+
+    def append_batch(
+        self,
+        locations: Sequence[str],
+        epoch_seconds: Sequence[float],
+        current_speed: Sequence[float],
+        free_flow_speed: Optional[Sequence[float]] = None,
+        confidence: Optional[Sequence[float]] = None,
+        road_closure: Optional[Sequence[bool]] = None
+    ) -> int:
+        """Append readings; returns how many were newer than what is held"""
+        n = len(locations)
+        if not n:
+            return 0
+        epoch_seconds = np.asarray(epoch_seconds, dtype=np.float64)
+        columns = np.full((n, len(FIELDS)), np.nan, dtype=np.float32)
+        for i, column in enumerate((current_speed, free_flow_speed, confidence, road_closure)):
+            if column is not None:
+                columns[:, i] = np.asarray(
+                    [np.nan if v is None else v for v in column], dtype=np.float32
+                )
+
+        with self._lock:
+            slots = np.fromiter((self._slot_for(loc) for loc in locations), dtype=np.int64, count=n)
+
+            # Order by (slot, time) and drop anything not newer than the slot
+            order = np.lexsort((epoch_seconds, slots))
+            slots, epoch_seconds, columns = slots[order], epoch_seconds[order], columns[order]
+            keep = epoch_seconds > self.latest_ts[slots]
+            slots, epoch_seconds, columns = slots[keep], epoch_seconds[keep], columns[keep]
+            if not len(slots):
+                return 0
+
+            group_start = np.searchsorted(slots, slots, side='left')
+            occurrence = np.arange(len(slots)) - group_start
+            positions = (self.heads[slots] + occurrence) % self.depth
+            self.timestamps[slots, positions] = epoch_seconds
+            self.values[slots, positions] = columns
+
+            unique_slots, counts = np.unique(slots, return_counts=True)
+            self.heads[unique_slots] = (self.heads[unique_slots] + counts) % self.depth
+            self.sizes[unique_slots] = np.minimum(self.sizes[unique_slots] + counts, self.depth)
+            last = np.searchsorted(slots, unique_slots, side='right') - 1
+            self.latest_ts[unique_slots] = epoch_seconds[last]
+            self._tick += 1
+            self.touched[unique_slots] = self._tick
+            return len(slots)
+
+    def append_readings(self, readings: Iterable[TrafficData]) -> int:
+        """Append saved or unsaved TrafficData instances"""
+        readings = list(readings)
+        return self.append_batch(
+            [r.location for r in readings],
+            [r.timestamp.timestamp() for r in readings],
+            [r.current_speed for r in readings],
+            [r.free_flow_speed for r in readings],
+            [r.confidence for r in readings],
+            [r.road_closure for r in readings],
+        )
+
+    @staticmethod
+    def _format(epoch_seconds: float, values: np.ndarray) -> Dict:
+        row = {
+            field: (None if np.isnan(value) else float(value))
+            for field, value in zip(FIELDS, values)
+        }
+        if row['road_closure'] is not None:
+            row['road_closure'] = bool(row['road_closure'])
+        row['timestamp'] = datetime.fromtimestamp(epoch_seconds, tz=dt_timezone.utc)
+        return row
+
+    def latest_arrays(self, locations: Optional[Sequence[str]] = None):
+        """Latest reading per location as ``(locations, timestamps, values)`` arrays"""
+        with self._lock:
+            if locations is None:
+                slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+            else:
+                slots = np.asarray(
+                    [self._slots[loc] for loc in locations if loc in self._slots], dtype=np.int64
+                )
+            slots = slots[self.sizes[slots] > 0]
+            positions = (self.heads[slots] - 1) % self.depth
+            names = [self.locations[s] for s in slots]
+            return names, self.timestamps[slots, positions].copy(), self.values[slots, positions].copy()
+
+    def latest(self, locations: Optional[Sequence[str]] = None) -> Dict[str, Dict]:
+        """Latest reading per location, optionally restricted to a set"""
+        names, timestamps, values = self.latest_arrays(locations)
+        return {
+            name: self._format(ts, row)
+            for name, ts, row in zip(names, timestamps, values)
+        }
+
+    def window(self, location: str, since: Optional[datetime] = None) -> List[Dict]:
+        """Buffered readings for a location, oldest first"""
+        with self._lock:
+            slot = self._slots.get(location)
+            if slot is None:
+                return []
+            size = int(self.sizes[slot])
+            positions = (self.heads[slot] - size + np.arange(size)) % self.depth
+            if since is not None:
+                positions = positions[self.timestamps[slot, positions] >= since.timestamp()]
+            return [self._format(self.timestamps[slot, p], self.values[slot, p]) for p in positions]
+
+    def _load_rows(self, queryset) -> int:
+        rows = list(queryset.values_list(
+            'id', 'location', 'timestamp', 'current_speed',
+            'free_flow_speed', 'confidence', 'road_closure'
+        ))
+        if not rows:
+            return 0
+        self.db_watermark = max(self.db_watermark, max(row[0] for row in rows))
+        # Rows without a monitored location have nothing to key them by
+        rows = [row for row in rows if row[1]]
+        if not rows:
+            return 0
+        _, locations, stamps, speeds, free_flow, confidence, closure = zip(*rows)
+        return self.append_batch(
+            locations, [s.timestamp() for s in stamps], speeds, free_flow, confidence, closure
+        )
+
+    def rebuild_from_db(self, lookback: timedelta = timedelta(hours=2)) -> int:
+        """Reload buffers from recent rows, e.g. on process start"""
+        with self._lock:
+            since = timezone.now() - lookback
+            added = self._load_rows(
+                TrafficData.objects.filter(timestamp__gte=since).order_by('id')
+            )
+            self.last_synced = time.monotonic()
+        logger.info(f"Recent readings store rebuilt: {added} readings for {len(self)} locations")
+        return added
+
+    def sync_from_db(self, max_rows: int = 50000) -> int:
+        """Pull rows written by other processes since the last sync"""
+        with self._lock:
+            added = self._load_rows(
+                TrafficData.objects.filter(id__gt=self.db_watermark).order_by('id')[:max_rows]
+            )
+            self.last_synced = time.monotonic()
+            return added
+
+
+_store: Optional[RecentReadingsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_recent_store(sync: bool = True) -> RecentReadingsStore:
+    """Process-wide recent readings store
+
+    Rebuilt from the DB on first use; with ``sync`` the store catches up
+    on rows written by other processes at most every
+    ``RECENT_STORE_SYNC_SECONDS``.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecentReadingsStore(
+                max_locations=settings.RECENT_STORE_MAX_LOCATIONS,
+                depth=settings.RECENT_STORE_DEPTH,
+            )
+            _store.rebuild_from_db()
+        elif sync and time.monotonic() - _store.last_synced >= settings.RECENT_STORE_SYNC_SECONDS:
+            _store.sync_from_db()
+        return _store
+
+
+def record_readings(readings: Iterable[TrafficData]) -> None:
+    """Feed freshly ingested readings to this process's store"""
+    try:
+        get_recent_store(sync=False).append_readings(readings)
+    except Exception as e:
+        logger.error(f"Error feeding recent readings store: {str(e)}")
@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TRAFFIC = 'traffic'
+ALERTS = 'alerts'
+EMERGENCY_VEHICLES = 'emergency_vehicles'
+GEOFENCES = 'geofences'
+ALERT_SUBSCRIPTIONS = 'alert_subscriptions'
+ROUTES = 'routes'
+
+
+def _keys(resource: str) -> Tuple[str, str]:
+    return f"resource_version:{resource}", f"resource_modified:{resource}"
+
+
+def get_version(resource: str) -> Tuple[int, float]:
+    """Current ``(version, last_modified_epoch)`` of a resource
+
+    Versions start from the current time in milliseconds, so a cleared
+    cache never hands out a version (and ETag) that was used before.
+    """
+    version_key, modified_key = _keys(resource)
+    values = cache.get_many([version_key, modified_key])
+    if version_key not in values:
+        now = time.time()
+        cache.add(version_key, int(now * 1000), timeout=None)
+        cache.add(modified_key, now, timeout=None)
+        values = cache.get_many([version_key, modified_key])
+    return values.get(version_key, 0), values.get(modified_key, time.time())
+
+
+def get_versions(resources: Sequence[str]) -> Dict[str, int]:
+    """Current version of many resources with one cache round trip"""
+    version_keys = {_keys(resource)[0]: resource for resource in resources}
+    values = cache.get_many(list(version_keys))
+    versions = {}
+    for key, resource in version_keys.items():
+        if key in values:
+            versions[resource] = values[key]
+        else:
+            versions[resource] = get_version(resource)[0]
+    return versions
+
+
+def route_resource(route_id: int) -> str:
+    """Resource name for the readings of one route"""
+    return f"route:{route_id}"
+
+
+def bump_version(*resources: str) -> None:
+    """Mark resources as changed; called after every write that affects them"""
+    for resource in resources:
+        version_key, modified_key = _keys(resource)
+        try:
+            try:
+                cache.incr(version_key)
+            except ValueError:
+                cache.add(version_key, int(time.time() * 1000), timeout=None)
+            cache.set(modified_key, time.time(), timeout=None)
+        except Exception as e:
+            logger.error(f"Error bumping {resource} version: {str(e)}")
+
+
+class BodyCache:
+    """Small in-process LRU of serialized response data keyed by resource version"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+body_cache = BodyCache()
@@ -0,0 +1,136 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from .spatial_index import GridIndex, bbox_of, haversine_m
+
+logger = logging.getLogger(__name__)
+
+ROAD_GEOMETRIES = ('LineString', 'MultiLineString')
+AREA_GEOMETRIES = ('Polygon', 'MultiPolygon')
+
+
+class RoadNetwork:
+    """Named road segments and admin areas loaded from a local GeoJSON extract
+
+    Roads are split into straight segments held in flat arrays
+    (``seg_lat1``/``seg_lon1``/``seg_lat2``/``seg_lon2``) and indexed on a
+    grid. Areas keep their outer rings and are indexed by bbox.
+    """
+
+    def __init__(self, features: Optional[List[Dict]] = None, cell_size: float = 0.005):
+        self.road_names: List[str] = []
+        self.road_max_speeds: List[Optional[float]] = []
+        self.area_names: List[str] = []
+        self.area_levels: List[int] = []
+        self.area_rings: List[np.ndarray] = []
+        self.segment_index = GridIndex(cell_size)
+        self.area_index = GridIndex(cell_size * 4)
+
+        seg_rows = []
+        for feature in features or []:
+            geometry = feature.get('geometry') or {}
+            properties = feature.get('properties') or {}
+            name = properties.get('name')
+            if not name:
+                continue
+
+            geom_type = geometry.get('type')
+            coordinates = geometry.get('coordinates') or []
+            if geom_type in ROAD_GEOMETRIES:
+                road_id = len(self.road_names)
+                self.road_names.append(name)
+                self.road_max_speeds.append(self._parse_speed(properties.get('maxspeed')))
+                lines = [coordinates] if geom_type == 'LineString' else coordinates
+                for line in lines:
+                    for (lon1, lat1), (lon2, lat2) in zip(line, line[1:]):
+                        seg_rows.append((road_id, lat1, lon1, lat2, lon2))
+            elif geom_type in AREA_GEOMETRIES:
+                polygons = [coordinates] if geom_type == 'Polygon' else coordinates
+                for polygon in polygons:
+                    if not polygon:
+                        continue
+                    ring = np.asarray(polygon[0], dtype=np.float64)
+                    area_id = len(self.area_names)
+                    self.area_names.append(name)
+                    self.area_levels.append(int(properties.get('admin_level', 10)))
+                    self.area_rings.append(ring)
+                    self.area_index.insert(area_id, *bbox_of(ring[:, 1], ring[:, 0]))
+
+        segments = np.asarray(seg_rows, dtype=np.float64).reshape(-1, 5)
+        self.seg_road = segments[:, 0].astype(np.int64)
+        self.seg_lat1 = segments[:, 1]
+        self.seg_lon1 = segments[:, 2]
+        self.seg_lat2 = segments[:, 3]
+        self.seg_lon2 = segments[:, 4]
+        self.seg_length = haversine_m(self.seg_lat1, self.seg_lon1, self.seg_lat2, self.seg_lon2)
+
+        # Endpoints shared between segments become graph nodes
+        endpoints = np.round(
+            np.concatenate([segments[:, 1:3], segments[:, 3:5]]) * 1e6
+        ).astype(np.int64)
+        _, node_ids = np.unique(endpoints, axis=0, return_inverse=True)
+        node_ids = node_ids.ravel()
+        self.seg_node1 = node_ids[:len(segments)]
+        self.seg_node2 = node_ids[len(segments):]
+
+        self.segment_index.insert_many(
+            np.arange(len(segments)),
+            np.minimum(self.seg_lat1, self.seg_lat2),
+            np.minimum(self.seg_lon1, self.seg_lon2),
+            np.maximum(self.seg_lat1, self.seg_lat2),
+            np.maximum(self.seg_lon1, self.seg_lon2),
+        )
+        self.segment_index.build()
+        self.area_index.build()
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.seg_road)
+
+    @staticmethod
+    def _parse_speed(value) -> Optional[float]:
+        """Parse an OSM style maxspeed tag ("50", "30 mph") to km/h"""
+        if value in (None, ''):
+            return None
+        try:
+            if isinstance(value, str) and value.strip().endswith('mph'):
+                return float(value.strip()[:-3]) * 1.609344
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def from_file(cls, path) -> 'RoadNetwork':
+        """Load a GeoJSON FeatureCollection extract"""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get('features', []))
+
+
+_network: Optional[RoadNetwork] = None
+_network_lock = threading.Lock()
+
+
+def get_road_network() -> RoadNetwork:
+    """Process-wide road network, loaded lazily from ``ROAD_NETWORK_EXTRACT``"""
+    global _network
+    if _network is None:
+        with _network_lock:
+            if _network is None:
+                path = Path(getattr(settings, 'ROAD_NETWORK_EXTRACT', ''))
+                if path.is_file():
+                    _network = RoadNetwork.from_file(path)
+                    logger.info(
+                        f"Loaded road network from {path}: "
+                        f"{_network.segment_count} segments, {len(_network.area_names)} areas"
+                    )
+                else:
+                    logger.error(f"Road network extract not found at {path}, using empty network")
+                    _network = RoadNetwork()
+    return _network
@@ -0,0 +1,134 @@
+import logging
+from datetime import timedelta
+from typing import Dict, List, Sequence
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Avg, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from ..models import Alert, Route, TrafficData
+from ..serializers import TrafficConditionSerializer
+from . import traffic_metrics
+from .fetch_planner import route_bbox
+from .resource_versions import ALERTS, get_versions, route_resource
+from .spatial_index import parse_locations
+
+logger = logging.getLogger(__name__)
+
+
+class RouteConditionsService:
+    """Per-route traffic summaries computed with a fixed number of queries
+
+    For any number of routes: one aggregate query (average speed over
+    ``window``, fastest speed over ``reference`` as the free-flow
+    reference, last update), one query for the latest snapshot of segments
+    per route and one for recent alerts, which are assigned to routes by
+    their padded bbox. Serialized summaries are cached per route under the
+    route's reading version and the alerts version, so new readings on a
+    route only invalidate that route.
+    """
+
+    def __init__(
+        self,
+        window: timedelta = timedelta(hours=1),
+        reference: timedelta = timedelta(hours=24),
+        padding: float = 0.01,
+        cache_seconds: int = 60
+    ):
+        self.window = window
+        self.reference = reference
+        self.padding = padding
+        self.cache_seconds = cache_seconds
+
+    def _cache_keys(self, routes: Sequence[Route]) -> Dict[int, str]:
+        versions = get_versions([route_resource(route.id) for route in routes] + [ALERTS])
+        return {
+            route.id: f"route_conditions:{route.id}:{versions[route_resource(route.id)]}:{versions[ALERTS]}"
+            for route in routes
+        }
+
+    def conditions(self, routes: Sequence[Route]) -> List[Dict]:
+        """Serialized ``TrafficConditionSerializer`` data, in the order of ``routes``"""
+        routes = list(routes)
+        if not routes:
+            return []
+        keys = self._cache_keys(routes)
+        cached = cache.get_many(list(keys.values()))
+        missing = [route for route in routes if keys[route.id] not in cached]
+        if missing:
+            fresh = {
+                keys[summary['route_id']]: TrafficConditionSerializer(summary).data
+                for summary in self.compute(missing)
+            }
+            cache.set_many(fresh, timeout=self.cache_seconds)
+            cached.update(fresh)
+        return [cached[keys[route.id]] for route in routes]
+
+    def compute(self, routes: Sequence[Route]) -> List[Dict]:
+        """Summaries for ``routes`` straight from the database"""
+        now = timezone.now()
+        window_start = now - self.window
+        ids = [route.id for route in routes]
+
+        stats = {
+            row['road_segment']: row
+            for row in TrafficData.objects.filter(
+                road_segment__in=ids, timestamp__gte=now - self.reference
+            ).values('road_segment').annotate(
+                average_speed=Avg('speed', filter=Q(timestamp__gte=window_start)),
+                reference_speed=Max('speed'),
+                last_updated=Max('timestamp'),
+            )
+        }
+
+        latest_timestamp = TrafficData.objects.filter(
+            road_segment=OuterRef('road_segment')
+        ).order_by('-timestamp').values('timestamp')[:1]
+        segments: Dict[int, List[Dict]] = {route_id: [] for route_id in ids}
+        for row in TrafficData.objects.filter(
+            road_segment__in=ids, timestamp__gte=window_start
+        ).filter(timestamp=Subquery(latest_timestamp)).values(
+            'road_segment', 'latitude', 'longitude', 'speed', 'vehicle_count', 'timestamp'
+        ):
+            segments[row.pop('road_segment')].append(row)
+
+        alerts = self._alerts_by_route(routes, window_start)
+
+        # Every route's congestion level in one call
+        levels = traffic_metrics.congestion_level(
+            [stats.get(route.id, {}).get('average_speed') for route in routes],
+            [stats.get(route.id, {}).get('reference_speed') for route in routes]
+        )
+
+        summaries = []
+        for route, level in zip(routes, levels):
+            row = stats.get(route.id, {})
+            average_speed = row.get('average_speed')
+            route_segments = segments[route.id]
+            summaries.append({
+                'route_id': route.id,
+                'route_name': route.name,
+                'average_speed': round(average_speed, 2) if average_speed is not None else None,
+                'total_vehicles': sum(s['vehicle_count'] for s in route_segments),
+                'congestion_level': str(level) if average_speed is not None else 'unknown',
+                'last_updated': row.get('last_updated'),
+                'alerts': alerts[route.id],
+                'traffic_segments': route_segments,
+            })
+        return summaries
+
+    def _alerts_by_route(self, routes: Sequence[Route], since) -> Dict[int, List[Alert]]:
+        alerts = list(Alert.objects.filter(timestamp__gte=since).order_by('-timestamp'))
+        by_route: Dict[int, List[Alert]] = {route.id: [] for route in routes}
+        if not alerts:
+            return by_route
+        lats, lons = parse_locations([alert.location for alert in alerts])
+        boxes = np.array([route_bbox(route, self.padding) for route in routes])
+        inside = (
+            (lons[None, :] >= boxes[:, 0:1]) & (lons[None, :] <= boxes[:, 2:3])
+            & (lats[None, :] >= boxes[:, 1:2]) & (lats[None, :] <= boxes[:, 3:4])
+        )
+        for route, row in zip(routes, inside):
+            by_route[route.id] = [alerts[i] for i in np.nonzero(row)[0]]
+        return by_route
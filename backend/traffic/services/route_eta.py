@@ -0,0 +1,253 @@
+import logging
+import math
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Route, RouteETA
+from .polyline import decode_polyline
+from .recent_store import FIELDS, RecentReadingsStore, get_recent_store
+from .resource_versions import ROUTES, get_version
+from .spatial_index import EARTH_RADIUS_M, GridIndex, haversine_m, parse_locations, project_to_segments
+
+logger = logging.getLogger(__name__)
+
+CURRENT_SPEED = FIELDS.index('current_speed')
+FREE_FLOW_SPEED = FIELDS.index('free_flow_speed')
+ROAD_CLOSURE = FIELDS.index('road_closure')
+# Slowest speed ratio an open road is assumed to have; closures use it too
+MIN_SPEED_RATIO = 0.1
+
+
+def route_polyline(route: Route) -> Tuple[np.ndarray, np.ndarray]:
+    """Stored road geometry of a saved route, or its waypoint polyline"""
+    if route.geometry:
+        lats, lons = decode_polyline(route.geometry)
+        if len(lats) >= 2:
+            return lats, lons
+    return waypoint_polyline(route)
+
+
+def waypoint_polyline(route: Route) -> Tuple[np.ndarray, np.ndarray]:
+    """Start, parseable ``"lat,lon"`` waypoints and end of a saved route"""
+    lats, lons = parse_locations(route.waypoints or [])
+    valid = ~(np.isnan(lats) | np.isnan(lons))
+    return (
+        np.concatenate([[route.start_latitude], lats[valid], [route.end_latitude]]),
+        np.concatenate([[route.start_longitude], lons[valid], [route.end_longitude]]),
+    )
+
+
+class RouteDependencyIndex:
+    """Monitored locations mapped to the legs of the routes passing them
+
+    A location depends on a leg when it lies within ``corridor_m`` of it.
+    Legs are registered in a ``GridIndex`` by their padded bbox, so mapping
+    a batch of locations is one candidate query plus one vectorized
+    projection; locations that start reporting later are added the same way.
+    """
+
+    def __init__(
+        self,
+        routes: Sequence[Route],
+        locations: Sequence[str],
+        corridor_m: float = 150.0,
+        cell_size: float = 0.005
+    ):
+        self.route_ids = np.asarray([route.id for route in routes], dtype=np.int64)
+        self.corridor_m = corridor_m
+        self.locations: List[str] = []
+        self.positions: Dict[str, int] = {}
+
+        lat1, lon1, lat2, lon2, owner = [], [], [], [], []
+        for position, route in enumerate(routes):
+            lats, lons = route_polyline(route)
+            lat1.append(lats[:-1])
+            lon1.append(lons[:-1])
+            lat2.append(lats[1:])
+            lon2.append(lons[1:])
+            owner.append(np.full(len(lats) - 1, position, dtype=np.int64))
+        concat = lambda parts, dtype=np.float64: np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        self.lat1, self.lon1, self.lat2, self.lon2 = concat(lat1), concat(lon1), concat(lat2), concat(lon2)
+        self.leg_route = concat(owner, np.int64)
+        self.leg_length_m = haversine_m(self.lat1, self.lon1, self.lat2, self.lon2)
+
+        pad_lat = math.degrees(corridor_m / EARTH_RADIUS_M)
+        pad_lon = pad_lat / max(math.cos(math.radians(float(np.mean(self.lat1)) if len(self.lat1) else 0.0)), 1e-6)
+        self.grid = grid = GridIndex(cell_size)
+        if len(self.lat1):
+            grid.insert_many(
+                np.arange(len(self.lat1)),
+                np.minimum(self.lat1, self.lat2) - pad_lat, np.minimum(self.lon1, self.lon2) - pad_lon,
+                np.maximum(self.lat1, self.lat2) + pad_lat, np.maximum(self.lon1, self.lon2) + pad_lon,
+            )
+        grid.build()
+
+        self.pair_location = np.empty(0, dtype=np.int64)
+        self.pair_leg = np.empty(0, dtype=np.int64)
+        self.dependents: Dict[str, Set[int]] = {}
+        self.add_locations(locations)
+
+    def add_locations(self, locations: Sequence[str]) -> None:
+        """Map locations not indexed yet onto the legs they lie along"""
+        new = [location for location in dict.fromkeys(locations) if location not in self.positions]
+        if not new:
+            return
+        offset = len(self.locations)
+        for position, location in enumerate(new, offset):
+            self.positions[location] = position
+        self.locations.extend(new)
+
+        loc_lats, loc_lons = parse_locations(new)
+        points, legs = self.grid.query_points(loc_lats, loc_lons)
+        if len(points):
+            distance, _ = project_to_segments(
+                loc_lats[points], loc_lons[points],
+                self.lat1[legs], self.lon1[legs], self.lat2[legs], self.lon2[legs]
+            )
+            keep = distance <= self.corridor_m
+            points, legs = points[keep], legs[keep]
+        self.pair_location = np.concatenate([self.pair_location, points + offset])
+        self.pair_leg = np.concatenate([self.pair_leg, legs])
+
+        for point, leg in zip(points, legs):
+            self.dependents.setdefault(new[point], set()).add(int(self.route_ids[self.leg_route[leg]]))
+
+    def routes_for(self, locations: Sequence[str]) -> Set[int]:
+        """Ids of the routes whose corridor passes any of ``locations``"""
+        routes: Set[int] = set()
+        for location in locations:
+            routes |= self.dependents.get(location, set())
+        return routes
+
+    def estimate(
+        self,
+        speed_ratio: np.ndarray,
+        route_ids: Sequence[int],
+        free_flow_mps: float
+    ) -> Dict[int, Dict[str, float]]:
+        """Travel time of the given routes from per-location speed ratios
+
+        ``speed_ratio`` is ``current / free_flow`` aligned with
+        ``locations`` (NaN without a reading). Each leg runs at the mean
+        ratio of the locations on it, or at free flow when none report.
+        """
+        selected = np.isin(self.route_ids, np.asarray(list(route_ids), dtype=np.int64))
+        pair_route = self.leg_route[self.pair_leg]
+        ratio = speed_ratio[self.pair_location]
+        use = selected[pair_route] & ~np.isnan(ratio)
+
+        legs = len(self.leg_route)
+        slowdown = 1.0 / np.clip(ratio[use], MIN_SPEED_RATIO, 1.0)
+        leg_total = np.bincount(self.pair_leg[use], weights=slowdown, minlength=legs)
+        leg_samples = np.bincount(self.pair_leg[use], minlength=legs)
+        leg_factor = np.where(leg_samples > 0, leg_total / np.maximum(leg_samples, 1), 1.0)
+
+        routes = len(self.route_ids)
+        leg_free = self.leg_length_m / free_flow_mps
+        distance = np.bincount(self.leg_route, weights=self.leg_length_m, minlength=routes)
+        free_flow = np.bincount(self.leg_route, weights=leg_free, minlength=routes)
+        eta = np.bincount(self.leg_route, weights=leg_free * leg_factor, minlength=routes)
+        # Distinct reporting locations per route
+        stride = max(len(self.locations), 1)
+        observed_pairs = np.unique(pair_route[use] * stride + self.pair_location[use])
+        observed = np.bincount(observed_pairs // stride, minlength=routes)
+
+        return {
+            int(self.route_ids[i]): {
+                'distance_m': float(distance[i]),
+                'free_flow_seconds': float(free_flow[i]),
+                'eta_seconds': float(eta[i]),
+                'observed_locations': int(observed[i]),
+            }
+            for i in np.flatnonzero(selected)
+        }
+
+
+class RouteEtaUpdater:
+    """Keeps ``RouteETA`` rows current, recomputing only affected routes
+
+    Each pass reads the latest speed ratio of every monitored location and
+    compares it with the ratio last used. Only locations that moved by more
+    than ``change_threshold`` (or started or stopped reporting) count as
+    changed, and only the routes depending on them are recomputed and
+    written. Locations that start reporting are added to the dependency
+    index as they appear; it is rebuilt, and every route recomputed, only
+    when the routes change.
+    """
+
+    def __init__(
+        self,
+        corridor_m: Optional[float] = None,
+        change_threshold: Optional[float] = None,
+        free_flow_kmh: Optional[float] = None,
+        store: Optional[RecentReadingsStore] = None
+    ):
+        self.corridor_m = corridor_m or settings.ROUTE_ETA_CORRIDOR_M
+        self.change_threshold = change_threshold or settings.ROUTE_ETA_CHANGE_THRESHOLD
+        self.free_flow_mps = (free_flow_kmh or settings.ROUTE_ETA_FREE_FLOW_KMH) / 3.6
+        self.store = store
+        self.index: Optional[RouteDependencyIndex] = None
+        self._routes_version = None
+        self.used_ratio = np.empty(0)
+
+    def _speed_ratios(self, store: RecentReadingsStore, locations: List[str]) -> np.ndarray:
+        names, _, values = store.latest_arrays(locations)
+        current = values[:, CURRENT_SPEED].astype(np.float64)
+        free_flow = values[:, FREE_FLOW_SPEED].astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = np.where(free_flow > 0, current / free_flow, np.nan)
+        ratio = np.where(values[:, ROAD_CLOSURE] > 0, MIN_SPEED_RATIO, ratio)
+        by_name = dict(zip(names, ratio))
+        return np.asarray([by_name.get(location, np.nan) for location in locations], dtype=np.float64)
+
+    def update(self) -> Dict[str, int]:
+        """One pass; returns how many locations changed and routes were recomputed"""
+        store = self.store or get_recent_store()
+        locations, _, _ = store.latest_arrays()
+        routes_version = get_version(ROUTES)[0]
+        rebuilt = self.index is None or routes_version != self._routes_version
+        if rebuilt:
+            self.index = RouteDependencyIndex(list(Route.objects.all()), locations, self.corridor_m)
+            self._routes_version = routes_version
+            self.used_ratio = np.full(len(self.index.locations), np.nan)
+        else:
+            # New locations start without a used ratio, so their routes count as changed
+            self.index.add_locations(locations)
+            added = len(self.index.locations) - len(self.used_ratio)
+            self.used_ratio = np.concatenate([self.used_ratio, np.full(added, np.nan)])
+
+        ratio = self._speed_ratios(store, self.index.locations)
+        changed = (np.isnan(ratio) != np.isnan(self.used_ratio)) | (
+            np.abs(np.nan_to_num(ratio) - np.nan_to_num(self.used_ratio)) > self.change_threshold
+        )
+        self.used_ratio = np.where(changed, ratio, self.used_ratio)
+
+        if rebuilt:
+            dirty = set(self.index.route_ids.tolist())
+        else:
+            dirty = self.index.routes_for([self.index.locations[i] for i in np.flatnonzero(changed)])
+        if dirty:
+            self._write(self.index.estimate(self.used_ratio, dirty, self.free_flow_mps))
+        return {
+            'routes': len(self.index.route_ids),
+            'changed_locations': int(changed.sum()),
+            'recomputed': len(dirty),
+        }
+
+    def _write(self, estimates: Dict[int, Dict[str, float]]) -> None:
+        now = timezone.now()
+        existing = {eta.route_id: eta for eta in RouteETA.objects.filter(route_id__in=list(estimates))}
+        created = []
+        for route_id, values in estimates.items():
+            eta = existing.get(route_id) or RouteETA(route_id=route_id)
+            for name, value in values.items():
+                setattr(eta, name, value)
+            eta.computed_at = now
+            if route_id not in existing:
+                created.append(eta)
+        fields = ['distance_m', 'free_flow_seconds', 'eta_seconds', 'observed_locations', 'computed_at']
+        RouteETA.objects.bulk_update(list(existing.values()), fields)
+        RouteETA.objects.bulk_create(created)
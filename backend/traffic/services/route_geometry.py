@@ -0,0 +1,119 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Route
+from .osrm_service import OSRMService
+from .polyline import decode_polyline, encode_polyline
+from .recent_store import get_recent_store
+from .resource_versions import ROUTES, bump_version
+from .route_eta import RouteDependencyIndex, waypoint_polyline
+
+logger = logging.getLogger(__name__)
+
+
+def polyline_bbox(geometry: str) -> Optional[List[float]]:
+    """``[minLon, minLat, maxLon, maxLat]`` of an encoded polyline"""
+    lats, lons = decode_polyline(geometry)
+    if not len(lats):
+        return None
+    return [float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())]
+
+
+class RouteGeometryService:
+    """Precomputes saved route geometry so requests never decode polylines
+
+    On create or update a route gets its OSRM road geometry as an encoded
+    polyline (or the waypoint polyline when OSRM is unreachable), its bbox
+    and the monitored locations within ``corridor_m`` of it. A background
+    refresh retries routes stuck on the waypoint fallback and remaps every
+    route as new monitored locations start reporting.
+    """
+
+    OSRM = 'osrm'
+    WAYPOINTS = 'waypoints'
+
+    def __init__(self, osrm_service: Optional[OSRMService] = None, corridor_m: Optional[float] = None):
+        self.osrm_service = osrm_service or OSRMService()
+        self.corridor_m = corridor_m or settings.ROUTE_ETA_CORRIDOR_M
+
+    def fetch_geometry(self, route: Route) -> Tuple[str, str]:
+        """``(encoded_polyline, source)`` for a route's current endpoints and waypoints"""
+        try:
+            data = self.osrm_service.calculate_route(
+                f"{route.start_latitude},{route.start_longitude}",
+                f"{route.end_latitude},{route.end_longitude}",
+                list(route.waypoints or [])
+            )
+            return data['routes'][0]['geometry'], self.OSRM
+        except Exception as e:
+            logger.warning(f"Using waypoint geometry for route {route.id}: {str(e)}")
+            return encode_polyline(*waypoint_polyline(route)), self.WAYPOINTS
+
+    def refresh(self, route: Route, locations: Optional[Sequence[str]] = None) -> Route:
+        """Recompute and store one route's geometry, bbox and location mapping"""
+        route.geometry, route.geometry_source = self.fetch_geometry(route)
+        route.bbox = polyline_bbox(route.geometry)
+        route.monitored_locations = self.map_locations([route], locations)[route.id]
+        route.geometry_updated_at = timezone.now()
+        self._store(route)
+        bump_version(ROUTES)
+        return route
+
+    def map_locations(
+        self,
+        routes: Sequence[Route],
+        locations: Optional[Sequence[str]] = None
+    ) -> Dict[int, List[str]]:
+        """Monitored locations on each route's corridor, in one index pass"""
+        if locations is None:
+            try:
+                locations, _, _ = get_recent_store(sync=False).latest_arrays()
+            except Exception as e:
+                logger.error(f"Error reading monitored locations: {str(e)}")
+                locations = []
+        index = RouteDependencyIndex(routes, locations, self.corridor_m)
+        mapping: Dict[int, List[str]] = {route.id: [] for route in routes}
+        for location, route_ids in index.dependents.items():
+            for route_id in route_ids:
+                mapping[route_id].append(location)
+        return {route_id: sorted(found) for route_id, found in mapping.items()}
+
+    def refresh_all(self, retry_fallback: bool = True) -> Dict[str, int]:
+        """Background pass: refetch fallback geometry, then remap changed routes"""
+        routes = list(Route.objects.all())
+        refetched = 0
+        for route in routes:
+            if route.geometry_source == self.OSRM or (route.geometry and not retry_fallback):
+                continue
+            geometry, source = self.fetch_geometry(route)
+            if geometry != route.geometry or source != route.geometry_source:
+                route.geometry, route.geometry_source = geometry, source
+                route.bbox = polyline_bbox(geometry)
+                route.geometry_updated_at = timezone.now()
+                self._store(route)
+                refetched += 1
+
+        remapped = 0
+        mapping = self.map_locations(routes)
+        for route in routes:
+            found = mapping[route.id]
+            if found != route.monitored_locations:
+                route.monitored_locations = found
+                self._store(route)
+                remapped += 1
+        if refetched:
+            bump_version(ROUTES)
+        return {'routes': len(routes), 'refetched': refetched, 'remapped': remapped}
+
+    def _store(self, route: Route) -> None:
+        # A queryset update leaves updated_at and the save signals alone
+        Route.objects.filter(pk=route.pk).update(
+            geometry=route.geometry,
+            geometry_source=route.geometry_source,
+            bbox=route.bbox,
+            monitored_locations=route.monitored_locations,
+            geometry_updated_at=route.geometry_updated_at,
+        )
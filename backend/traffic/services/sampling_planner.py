@@ -0,0 +1,206 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LeafKey = Tuple[int, int, int]
+
+
+def _levels_for(span: float, cell: float) -> int:
+    # Tolerance keeps e.g. 0.32 / 0.04 at exactly three halvings
+    return max(0, math.ceil(math.log2(span / cell) - 1e-9))
+
+
+@dataclass
+class _Leaf:
+    level: int
+    ix: int
+    iy: int
+    ratio: float = math.nan
+    change: float = 0.0
+    stable: int = 0
+    last_sampled: int = -1
+
+
+class QuadTreePlanner:
+    """Adaptive sampling points for a bbox, kept as the leaves of a quadtree
+
+    Each leaf is sampled at its centre. After a cycle's readings come back,
+    leaves that are congested (``speed / free_flow < congested_ratio``) or
+    whose ratio moved by more than ``change_threshold`` are split into four,
+    down to cells of ``min_cell`` degrees, and groups of four sibling leaves
+    that have stayed at free flow for ``stable_cycles`` observations are
+    merged back into their parent. Stable leaves are only resampled every
+    ``stable_interval`` cycles, and at most ``budget`` points are handed out
+    per cycle, most urgent first. ``density`` points (e.g. road segment
+    midpoints) make the initial tree finer where roads are dense.
+    """
+
+    def __init__(
+        self,
+        bbox: Tuple[float, float, float, float],
+        min_cell: float = 0.005,
+        budget: int = 500,
+        max_leaves: Optional[int] = None,
+        initial_cell: float = 0.04,
+        congested_ratio: float = 0.7,
+        free_flow_ratio: float = 0.9,
+        change_threshold: float = 0.15,
+        stable_cycles: int = 3,
+        stable_interval: int = 4,
+        density: Optional[Tuple[Sequence[float], Sequence[float]]] = None,
+        density_threshold: int = 20
+    ):
+        self.min_lon, self.min_lat, self.max_lon, self.max_lat = bbox
+        self.span_lon = self.max_lon - self.min_lon
+        self.span_lat = self.max_lat - self.min_lat
+        if self.span_lon <= 0 or self.span_lat <= 0:
+            raise ValueError("bbox must be (minLon, minLat, maxLon, maxLat) with positive extent")
+        self.min_cell = min_cell
+        self.budget = budget
+        self.max_leaves = max_leaves or 4 * budget
+        self.congested_ratio = congested_ratio
+        self.free_flow_ratio = free_flow_ratio
+        self.change_threshold = change_threshold
+        self.stable_cycles = stable_cycles
+        self.stable_interval = stable_interval
+        self.cycle = 0
+        self.last_sampled_count = 0
+
+        span = max(self.span_lon, self.span_lat)
+        self.max_level = _levels_for(span, min_cell)
+        start_level = min(self.max_level, _levels_for(span, initial_cell))
+        self.leaves: Dict[LeafKey, _Leaf] = {}
+        for ix in range(2 ** start_level):
+            for iy in range(2 ** start_level):
+                self.leaves[(start_level, ix, iy)] = _Leaf(start_level, ix, iy)
+
+        if density is not None:
+            self._refine_dense(np.asarray(density[0], dtype=float),
+                               np.asarray(density[1], dtype=float), density_threshold)
+
+    def _cell_bounds(self, level: int, ix: int, iy: int) -> Tuple[float, float, float, float]:
+        width = self.span_lon / 2 ** level
+        height = self.span_lat / 2 ** level
+        return (
+            self.min_lon + ix * width, self.min_lat + iy * height,
+            self.min_lon + (ix + 1) * width, self.min_lat + (iy + 1) * height,
+        )
+
+    def location_for(self, key: LeafKey) -> str:
+        """Stable ``"lat,lon"`` of a leaf centre, used as the reading location"""
+        min_lon, min_lat, max_lon, max_lat = self._cell_bounds(*key)
+        return f"{(min_lat + max_lat) / 2:.6f},{(min_lon + max_lon) / 2:.6f}"
+
+    def _cells_at(self, level: int, lats: np.ndarray, lons: np.ndarray):
+        n = 2 ** level
+        ix = np.floor((lons - self.min_lon) / self.span_lon * n).astype(np.int64)
+        iy = np.floor((lats - self.min_lat) / self.span_lat * n).astype(np.int64)
+        inside = (ix >= 0) & (ix < n) & (iy >= 0) & (iy < n)
+        return ix[inside], iy[inside]
+
+    def _refine_dense(self, lats: np.ndarray, lons: np.ndarray, threshold: int) -> None:
+        # Split leaves holding more than ``threshold`` points, one level at a time
+        for level in range(min(k[0] for k in self.leaves), self.max_level - 1):
+            ix, iy = self._cells_at(level, lats, lons)
+            n = 2 ** level
+            counts = np.bincount(ix * n + iy, minlength=n * n)
+            for cell in np.nonzero(counts > threshold)[0]:
+                key = (level, int(cell // n), int(cell % n))
+                if key in self.leaves and len(self.leaves) + 3 <= self.max_leaves:
+                    self._split(key)
+
+    def _split(self, key: LeafKey) -> None:
+        parent = self.leaves.pop(key)
+        level, ix, iy = key
+        for dx in (0, 1):
+            for dy in (0, 1):
+                child = _Leaf(level + 1, 2 * ix + dx, 2 * iy + dy, ratio=parent.ratio, change=parent.change)
+                self.leaves[(child.level, child.ix, child.iy)] = child
+
+    def _merge(self, parent_key: LeafKey, children: List[_Leaf]) -> None:
+        for child in children:
+            del self.leaves[(child.level, child.ix, child.iy)]
+        level, ix, iy = parent_key
+        self.leaves[parent_key] = _Leaf(
+            level, ix, iy,
+            ratio=float(np.nanmean([c.ratio for c in children])),
+            stable=min(c.stable for c in children),
+            last_sampled=max(c.last_sampled for c in children),
+        )
+
+    def _urgency(self, leaf: _Leaf) -> float:
+        if leaf.last_sampled < 0 or math.isnan(leaf.ratio):
+            return math.inf
+        staleness = (self.cycle - leaf.last_sampled) / self.stable_interval
+        return (1.0 - leaf.ratio) + leaf.change + 0.1 * staleness
+
+    def plan(self) -> List[Tuple[LeafKey, str]]:
+        """Leaves to sample this cycle as ``(key, location)``, most urgent first"""
+        self.cycle += 1
+        due = [
+            leaf for leaf in self.leaves.values()
+            if leaf.last_sampled < 0
+            or leaf.stable < self.stable_cycles
+            or self.cycle - leaf.last_sampled >= self.stable_interval
+        ]
+        due.sort(key=self._urgency, reverse=True)
+        due = due[:self.budget]
+        self.last_sampled_count = len(due)
+        keys = [(leaf.level, leaf.ix, leaf.iy) for leaf in due]
+        return [(key, self.location_for(key)) for key in keys]
+
+    def observe(self, observations: Dict[LeafKey, Tuple[float, float]]) -> None:
+        """Record ``(speed, free_flow_speed)`` per sampled leaf, then reshape the tree"""
+        for key, (speed, free_flow) in observations.items():
+            leaf = self.leaves.get(key)
+            if leaf is None or not free_flow:
+                continue
+            ratio = min(float(speed) / float(free_flow), 1.5)
+            leaf.change = 0.0 if math.isnan(leaf.ratio) else abs(ratio - leaf.ratio)
+            leaf.ratio = ratio
+            leaf.last_sampled = self.cycle
+            if ratio >= self.free_flow_ratio and leaf.change <= self.change_threshold:
+                leaf.stable += 1
+            else:
+                leaf.stable = 0
+        self._coarsen()
+        self._refine()
+
+    def _coarsen(self) -> None:
+        groups: Dict[LeafKey, List[_Leaf]] = {}
+        for leaf in self.leaves.values():
+            if leaf.level > 0:
+                groups.setdefault((leaf.level - 1, leaf.ix // 2, leaf.iy // 2), []).append(leaf)
+        for parent_key, children in groups.items():
+            if len(children) == 4 and all(c.stable >= self.stable_cycles for c in children):
+                self._merge(parent_key, children)
+
+    def _refine(self) -> None:
+        candidates = [
+            leaf for leaf in self.leaves.values()
+            if leaf.level < self.max_level
+            and leaf.last_sampled == self.cycle
+            and (leaf.ratio < self.congested_ratio or leaf.change > self.change_threshold)
+        ]
+        candidates.sort(key=lambda leaf: (leaf.ratio - leaf.change))
+        for leaf in candidates:
+            if len(self.leaves) + 3 > self.max_leaves:
+                break
+            self._split((leaf.level, leaf.ix, leaf.iy))
+
+    def stats(self) -> Dict:
+        levels = np.bincount([leaf.level for leaf in self.leaves.values()], minlength=self.max_level + 1)
+        fixed_grid = math.ceil(self.span_lon / self.min_cell) * math.ceil(self.span_lat / self.min_cell)
+        return {
+            'cycle': self.cycle,
+            'leaves': len(self.leaves),
+            'sampled': self.last_sampled_count,
+            'fixed_grid_points': fixed_grid,
+            'sampling_ratio': round(self.last_sampled_count / fixed_grid, 4),
+            'leaves_per_level': levels.tolist(),
+        }
@@ -0,0 +1,222 @@
+"""Built-in jobs for the scheduler
+
+Each factory builds its collaborators once and returns the callable the
+scheduler runs every interval. Factories that take a ``lease`` work on the
+shards it currently owns; job-wide steps run only on the holder of shard 0.
+"""
+import logging
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Alert, GeofenceEvent, Route, TrafficData
+from .city_snapshot import get_city_snapshot
+from .data_collection_service import DataCollectionService
+from .heatmap_tiles import get_heatmap_renderer
+from .ingestion_queue import get_ingestion_queue
+from .osrm_service import OSRMService
+from .route_eta import RouteEtaUpdater
+from .route_geometry import RouteGeometryService
+from .scheduler import Job, register_job
+from .sharding import LeaseManager, shard_queryset
+from .speed_profiles import refresh_speed_forecasts
+from .traffic_collector import TrafficCollector
+from .traffic_simulator import DEFAULT_BBOX, TrafficSimulator
+
+logger = logging.getLogger(__name__)
+
+# Areas swept by collect_areas
+MONITORED_AREAS = [
+    {
+        'name': 'Downtown SF',
+        'bbox': '-122.4194,37.7749,-122.4094,37.7849'
+    },
+    {
+        'name': 'Golden Gate Bridge',
+        'bbox': '-122.4883,37.8099,-122.4783,37.8199'
+    },
+    {
+        'name': 'SF Airport',
+        'bbox': '-122.4000,37.6100,-122.3500,37.6500'
+    }
+]
+
+
+def is_leader(lease: Optional[LeaseManager]) -> bool:
+    return lease is None or 0 in lease.owned
+
+
+def lease_heartbeat(lease: LeaseManager) -> Job:
+    """Renews a sharded worker's leases often enough that they do not expire"""
+    return Job(name=f'lease:{lease.job}', func=lease.claim, interval=lease.ttl / 3)
+
+
+@register_job('collect')
+def collect_routes(lease: Optional[LeaseManager] = None) -> Callable[[], Dict]:
+    """TomTom flow for every saved route, one call per shared tile"""
+    collector = TrafficCollector()
+
+    def run() -> Dict:
+        if lease is None:
+            routes = list(Route.objects.all())
+        else:
+            routes = [
+                route
+                for shard in lease.owned
+                for route in shard_queryset(Route.objects.all(), shard, lease.shard_count)
+            ]
+        stats = collector.collect_all(routes)
+        logger.info(
+            f"Collected traffic data for {stats['routes']} routes with "
+            f"{stats['fetched_tiles']} of {stats['tiles']} tile requests "
+            f"(fan-out {stats['fan_out_ratio']}, {stats['deferred_tiles']} deferred "
+            f"by quota, {stats['failed_tiles']} failed)"
+        )
+        return stats
+    return run
+
+
+@register_job('collect_areas')
+def collect_areas(areas: Optional[List[Dict[str, str]]] = None) -> Callable[[], Dict]:
+    """TomTom flow and incidents for fixed monitored areas"""
+    service = DataCollectionService()
+    areas = areas or MONITORED_AREAS
+
+    def run() -> Dict:
+        service.collect_traffic_data(areas)
+        return {
+            'areas': len(areas),
+            'queue': service.ingestion_queue.metrics(),
+            'quota': service.tomtom_service.quota_scheduler.metrics(),
+        }
+    return run
+
+
+@register_job('simulate')
+def simulate(
+    bbox: str = DEFAULT_BBOX,
+    adaptive: bool = False,
+    budget: int = 500,
+    lease: Optional[LeaseManager] = None
+) -> Callable[[], Dict]:
+    """Simulated readings over a bbox, for development without a TomTom key"""
+    simulator = TrafficSimulator(adaptive=adaptive, budget=budget)
+
+    def run() -> Dict:
+        if lease is None:
+            points = simulator.sweep(bbox)
+        else:
+            points = sum(simulator.sweep(bbox, shard, lease.shard_count) for shard in lease.owned)
+        return {'points': points, 'shards': lease.owned if lease else 'all'}
+    return run
+
+
+@register_job('sync_firebase')
+def sync_firebase(lease: Optional[LeaseManager] = None) -> Callable[[], Any]:
+    """Push the latest readings to the Firebase realtime database"""
+    osrm_service = OSRMService()
+
+    def run() -> bool:
+        if not is_leader(lease):
+            return False
+        # Sync what has been collected so far
+        get_ingestion_queue().flush()
+        osrm_service.sync_traffic_data()
+        return True
+    return run
+
+
+@register_job('rollups')
+def rollups(lease: Optional[LeaseManager] = None) -> Callable[[], Any]:
+    """Fold new readings into the speed profiles and recompute forecasts"""
+    def run() -> Optional[int]:
+        if not is_leader(lease):
+            return None
+        get_ingestion_queue().flush()
+        return len(refresh_speed_forecasts().locations)
+    return run
+
+
+@register_job('retention')
+def retention(batch_size: Optional[int] = None) -> Callable[[], Dict[str, int]]:
+    """Delete readings, alerts and geofence events past their retention"""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    tables = [
+        ('traffic_data', TrafficData),
+        ('alerts', Alert),
+        ('geofence_events', GeofenceEvent),
+    ]
+
+    def run() -> Dict[str, int]:
+        deleted = {}
+        for name, model in tables:
+            days = settings.RETENTION_DAYS.get(name)
+            if not days:
+                continue
+            cutoff = timezone.now() - timedelta(days=days)
+            deleted[name] = 0
+            # Small batches keep each delete's locks short
+            while True:
+                ids = list(
+                    model.objects.filter(timestamp__lt=cutoff).values_list('pk', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                deleted[name] += model.objects.filter(pk__in=ids).delete()[0]
+        if any(deleted.values()):
+            logger.info(f"Retention removed {deleted}")
+        return deleted
+    return run
+
+
+@register_job('route_etas')
+def route_etas() -> Callable[[], Dict]:
+    """Recompute ETAs of the saved routes affected by changed readings"""
+    updater = RouteEtaUpdater()
+
+    def run() -> Dict:
+        stats = updater.update()
+        logger.info(
+            f"Recomputed {stats['recomputed']} of {stats['routes']} route ETAs "
+            f"({stats['changed_locations']} locations changed)"
+        )
+        return stats
+    return run
+
+
+@register_job('route_geometry')
+def route_geometry() -> Callable[[], Dict]:
+    """Refetch fallback route geometry and remap monitored locations"""
+    service = RouteGeometryService()
+
+    def run() -> Dict:
+        stats = service.refresh_all()
+        logger.info(
+            f"Refetched geometry for {stats['refetched']} and remapped "
+            f"{stats['remapped']} of {stats['routes']} routes"
+        )
+        return stats
+    return run
+
+
+@register_job('city_snapshot')
+def city_snapshot() -> Callable[[], Dict]:
+    """Rebuild the binary city snapshot once its sources have moved"""
+    service = get_city_snapshot()
+
+    def run() -> Dict:
+        return service.refresh()
+    return run
+
+
+@register_job('heatmap_tiles')
+def heatmap_tiles() -> Callable[[], Dict]:
+    """Prerender the service area's heatmap tiles for the current traffic version"""
+    renderer = get_heatmap_renderer()
+
+    def run() -> Dict:
+        return renderer.precompute()
+    return run
+
@@ -0,0 +1,196 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+JobFactory = Callable[..., Callable[[], Any]]
+
+# Job name -> factory returning the callable to run; see scheduled_jobs.py
+JOB_REGISTRY: Dict[str, JobFactory] = {}
+
+
+def register_job(name: str) -> Callable[[JobFactory], JobFactory]:
+    """Register a factory under ``name`` so the scheduler can build the job"""
+    def decorator(factory: JobFactory) -> JobFactory:
+        JOB_REGISTRY[name] = factory
+        return factory
+    return decorator
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    interval: float
+    # Upper bound of the random delay before the first run
+    jitter: float = 0.0
+
+
+def build_job(name: str, interval: Optional[float] = None, **options) -> Job:
+    """A registered job at its configured interval, its factory given ``options``"""
+    from . import scheduled_jobs  # noqa: F401  registers the built-in jobs
+
+    if name not in JOB_REGISTRY:
+        raise ValueError(f"Unknown job '{name}', choose from {', '.join(sorted(JOB_REGISTRY))}")
+    if interval is None:
+        interval = settings.SCHEDULER_INTERVALS.get(name, 0)
+    return Job(
+        name=name,
+        func=JOB_REGISTRY[name](**options),
+        interval=interval,
+        jitter=interval * settings.SCHEDULER_JITTER,
+    )
+
+
+@dataclass
+class JobMetrics:
+    runs: int = 0
+    failures: int = 0
+    # Slots skipped because the previous run was still going
+    overlaps: int = 0
+    # Slots that passed while the scheduler was behind
+    missed: int = 0
+    last_seconds: float = 0.0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_error: str = ''
+    last_result: Any = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float, result: Any = None, error: Optional[Exception] = None) -> None:
+        with self._lock:
+            self.runs += 1
+            self.last_seconds = seconds
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            if error is None:
+                self.last_result = result
+            else:
+                self.failures += 1
+                self.last_error = str(error)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'failures': self.failures,
+                'overlaps': self.overlaps,
+                'missed': self.missed,
+                'last_seconds': round(self.last_seconds, 3),
+                'mean_seconds': round(self.total_seconds / self.runs, 3) if self.runs else 0.0,
+                'max_seconds': round(self.max_seconds, 3),
+                'last_error': self.last_error,
+            }
+
+
+class Scheduler:
+    """Runs registered jobs at a fixed rate on a thread pool
+
+    Each job's next slot is its previous slot plus ``interval``, not the
+    time its last run finished, so runs do not drift later over time. A
+    slot that comes due while the job is still running is skipped (counted
+    in ``overlaps``) rather than queued behind it, and slots missed while
+    the scheduler was behind are dropped (counted in ``missed``) so a slow
+    run is followed by one run, not a burst. Different jobs run
+    concurrently, up to ``max_workers`` at a time.
+    """
+
+    def __init__(
+        self,
+        jobs: Sequence[Job],
+        max_workers: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        jobs = [job for job in jobs if job.interval > 0]
+        self.jobs: Dict[str, Job] = {job.name: job for job in jobs}
+        self.metrics: Dict[str, JobMetrics] = {job.name: JobMetrics() for job in jobs}
+        self.clock = clock
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(jobs), 1),
+            thread_name_prefix='scheduler'
+        )
+        self._running: Dict[str, Future] = {}
+        self._next: Dict[str, float] = {}
+        self._stop = threading.Event()
+
+    def start(self, now: Optional[float] = None) -> None:
+        """Place every job's first slot, spread by its jitter"""
+        now = self.clock() if now is None else now
+        self._next = {
+            name: now + random.uniform(0, job.jitter) for name, job in self.jobs.items()
+        }
+
+    def run_pending(self, now: Optional[float] = None) -> List[str]:
+        """Submit the jobs that are due; returns their names"""
+        now = self.clock() if now is None else now
+        submitted = []
+        for name, job in self.jobs.items():
+            due = self._next[name]
+            if now < due:
+                continue
+            missed = int((now - due) // job.interval)
+            self._next[name] = due + (missed + 1) * job.interval
+            metrics = self.metrics[name]
+            if missed:
+                with metrics._lock:
+                    metrics.missed += missed
+
+            running = self._running.get(name)
+            if running is not None and not running.done():
+                with metrics._lock:
+                    metrics.overlaps += 1
+                logger.warning(f"Job {name} is still running, skipping this slot")
+                continue
+            self._running[name] = self._pool.submit(self._execute, job)
+            submitted.append(name)
+        return submitted
+
+    def _execute(self, job: Job) -> None:
+        # Pool threads outlive requests, so drop connections the server closed
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            result = job.func()
+        except Exception as e:
+            self.metrics[job.name].record(time.perf_counter() - started, error=e)
+            logger.error(f"Error in scheduled job {job.name}: {str(e)}")
+        else:
+            self.metrics[job.name].record(time.perf_counter() - started, result)
+        finally:
+            close_old_connections()
+
+    def run(self) -> None:
+        """Run until ``stop`` is called; running jobs are finished on the way out"""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self.run_pending()
+                if not self._next:
+                    break
+                self._stop.wait(max(min(self._next.values()) - self.clock(), 0.0))
+        finally:
+            self.shutdown()
+
+    def run_once(self) -> None:
+        """Run every job once, concurrently, and wait for them"""
+        futures = [self._pool.submit(self._execute, job) for job in self.jobs.values()]
+        wait(futures)
+        self.shutdown()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-job timing and failure counters"""
+        return {name: metrics.as_dict() for name, metrics in self.metrics.items()}
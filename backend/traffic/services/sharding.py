@@ -0,0 +1,182 @@
+import logging
+import math
+import multiprocessing
+import os
+import socket
+import time
+from datetime import timedelta
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from ..models import CollectorLease, CollectorWorker
+
+logger = logging.getLogger(__name__)
+
+
+def strip_bounds(n: int, shard_count: int) -> List[Tuple[int, int]]:
+    """Split ``range(n)`` into ``shard_count`` contiguous ``(start, stop)`` strips"""
+    edges = [n * k // shard_count for k in range(shard_count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def shard_queryset(queryset, shard_index: int, shard_count: int):
+    """Rows of ``queryset`` whose primary key falls in the given shard"""
+    return queryset.alias(_shard=Mod('pk', shard_count)).filter(_shard=shard_index)
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseManager:
+    """Claims shards of a collector job through lease rows in the database
+
+    Every worker heartbeats a ``CollectorWorker`` row and holds at most
+    ``ceil(shard_count / live_workers)`` ``CollectorLease`` rows, so shards
+    rebalance as workers join or leave. Leases of a worker that stops
+    renewing expire after ``ttl`` seconds and are picked up by the others.
+    Because coordination only goes through the shared database the same
+    job can run across several machines.
+    """
+
+    def __init__(
+        self,
+        job: str,
+        shard_count: int,
+        owner: Optional[str] = None,
+        ttl: Optional[float] = None
+    ):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        self.job = job
+        self.shard_count = shard_count
+        self.owner = owner or default_owner()
+        self.ttl = ttl if ttl is not None else settings.COLLECTOR_LEASE_TTL
+        self.owned: List[int] = []
+
+    def _leases(self):
+        return CollectorLease.objects.filter(job=self.job, shard_count=self.shard_count)
+
+    def claim(self) -> List[int]:
+        """Heartbeat, renew held leases and claim up to a fair share of shards"""
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        with transaction.atomic():
+            CollectorWorker.objects.update_or_create(
+                job=self.job, owner=self.owner, defaults={'last_seen': now}
+            )
+            CollectorLease.objects.bulk_create(
+                [
+                    CollectorLease(job=self.job, shard_index=i, shard_count=self.shard_count)
+                    for i in range(self.shard_count)
+                ],
+                ignore_conflicts=True
+            )
+            live_workers = CollectorWorker.objects.filter(
+                job=self.job, last_seen__gte=now - timedelta(seconds=self.ttl)
+            ).count()
+            fair_share = math.ceil(self.shard_count / max(live_workers, 1))
+
+            # Rows another worker is updating right now are left for it
+            leases = list(
+                self._leases().select_for_update(skip_locked=True).order_by('shard_index')
+            )
+            mine = [
+                lease for lease in leases
+                if lease.owner == self.owner and lease.expires_at and lease.expires_at > now
+            ]
+            free = [
+                lease for lease in leases
+                if not lease.owner or not lease.expires_at or lease.expires_at <= now
+            ]
+
+            for lease in mine[fair_share:]:
+                lease.owner, lease.expires_at = '', None
+                lease.save(update_fields=['owner', 'expires_at', 'updated_at'])
+            mine = mine[:fair_share]
+            for lease in free[:fair_share - len(mine)]:
+                lease.owner = self.owner
+                mine.append(lease)
+            for lease in mine:
+                lease.expires_at = expires_at
+                lease.save(update_fields=['owner', 'expires_at', 'updated_at'])
+
+        owned = sorted(lease.shard_index for lease in mine)
+        if owned != self.owned:
+            logger.info(
+                f"Collector {self.owner} now owns shards {owned} of {self.shard_count} "
+                f"for {self.job} ({live_workers} live workers)"
+            )
+        self.owned = owned
+        return owned
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep while renewing leases often enough that they do not expire"""
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, self.ttl / 3))
+            try:
+                self.claim()
+            except Exception as e:
+                logger.error(f"Error renewing collector leases for {self.job}: {str(e)}")
+
+    def release_all(self) -> None:
+        """Give up every lease and deregister, e.g. on shutdown"""
+        try:
+            self._leases().filter(owner=self.owner).update(owner='', expires_at=None)
+            CollectorWorker.objects.filter(job=self.job, owner=self.owner).delete()
+        except Exception as e:
+            logger.error(f"Error releasing collector leases for {self.job}: {str(e)}")
+        self.owned = []
+
+
+def run_worker_processes(
+    target: Callable[[int], None],
+    workers: int,
+    poll_interval: float = 5.0
+) -> None:
+    """Run ``target(worker_index)`` in forked processes, respawning any that die
+
+    Database connections are closed before forking so that every worker
+    opens its own; process-wide singletons such as the ingestion queue must
+    likewise be created inside ``target``.
+    """
+    context = multiprocessing.get_context('fork')
+    processes = {}
+
+    def spawn(index: int) -> None:
+        connections.close_all()
+        process = context.Process(
+            target=target, args=(index,), name=f'traffic-collector-{index}', daemon=False
+        )
+        process.start()
+        processes[index] = process
+
+    for index in range(workers):
+        spawn(index)
+
+    try:
+        while True:
+            time.sleep(poll_interval)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    logger.warning(
+                        f"Collector worker {index} (pid {process.pid}) exited with "
+                        f"{process.exitcode}, respawning"
+                    )
+                    spawn(index)
+    except KeyboardInterrupt:
+        logger.info("Stopping collector workers")
+    finally:
+        for process in processes.values():
+            process.join(30)
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,252 @@
+import math
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+# Cell keys pack (row, col) into one int64 so lookups are a single searchsorted
+_KEY_OFFSET = 1 << 24
+_KEY_SHIFT = 1 << 25
+
+
+def parse_locations(locations: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse "lat,lon" location strings into latitude/longitude arrays
+
+    Unparseable entries come back as NaN so callers can mask them out.
+    """
+    lats = []
+    lons = []
+    for location in locations:
+        try:
+            lat, lon = location.split(',')
+            lats.append(float(lat))
+            lons.append(float(lon))
+        except (AttributeError, ValueError):
+            lats.append(np.nan)
+            lons.append(np.nan)
+    return np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+
+
+def to_local_xy(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    ref_lat: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection to metres around a reference latitude"""
+    scale = math.pi / 180.0 * EARTH_RADIUS_M
+    x = np.asarray(lons, dtype=np.float64) * scale * math.cos(math.radians(ref_lat))
+    y = np.asarray(lats, dtype=np.float64) * scale
+    return x, y
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in metres, broadcasting over arrays"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def project_to_segments(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    seg_lat1: np.ndarray,
+    seg_lon1: np.ndarray,
+    seg_lat2: np.ndarray,
+    seg_lon2: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Project points onto paired segments
+
+    All arrays are aligned element-wise (point i against segment i).
+    Returns the distance in metres and the fraction (0-1) along each segment.
+    """
+    ref_lat = float(np.nanmean(lats)) if len(lats) else 0.0
+    px, py = to_local_xy(lats, lons, ref_lat)
+    ax, ay = to_local_xy(seg_lat1, seg_lon1, ref_lat)
+    bx, by = to_local_xy(seg_lat2, seg_lon2, ref_lat)
+
+    dx = bx - ax
+    dy = by - ay
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = ((px - ax) * dx + (py - ay) * dy) / length_sq
+    t = np.where(length_sq > 0, np.clip(t, 0.0, 1.0), 0.0)
+
+    cx = ax + t * dx
+    cy = ay + t * dy
+    distance = np.hypot(px - cx, py - cy)
+    return distance, t
+
+
+def points_in_polygon(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    ring_lats: np.ndarray,
+    ring_lons: np.ndarray
+) -> np.ndarray:
+    """Even-odd ray casting of many points against one polygon ring"""
+    lats = np.asarray(lats, dtype=np.float64)[:, None]
+    lons = np.asarray(lons, dtype=np.float64)[:, None]
+    y1 = np.asarray(ring_lats, dtype=np.float64)[None, :]
+    x1 = np.asarray(ring_lons, dtype=np.float64)[None, :]
+    y2 = np.roll(y1, -1, axis=1)
+    x2 = np.roll(x1, -1, axis=1)
+
+    crosses = (y1 > lats) != (y2 > lats)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_at = x1 + (lats - y1) * (x2 - x1) / (y2 - y1)
+    hits = crosses & (lons < x_at)
+    return (np.count_nonzero(hits, axis=1) % 2) == 1
+
+
+class GridIndex:
+    """Uniform lat/lon grid over item bounding boxes
+
+    Items are registered with their bbox, then ``build`` packs the
+    cell -> item mapping into sorted arrays so that candidate lookups for
+    thousands of points are a couple of vectorized ``searchsorted`` calls.
+    """
+
+    def __init__(self, cell_size: float = 0.005):
+        self.cell_size = cell_size
+        self._pending: List[np.ndarray] = []
+        self._keys = np.empty(0, dtype=np.int64)
+        self._items = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return sum(len(block) for block in self._pending)
+
+    def _cell(self, values) -> np.ndarray:
+        return np.floor(np.asarray(values, dtype=np.float64) / self.cell_size).astype(np.int64)
+
+    def _key(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return (rows + _KEY_OFFSET) * _KEY_SHIFT + (cols + _KEY_OFFSET)
+
+    def insert(
+        self,
+        item_id: int,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float
+    ) -> None:
+        """Register an item's bounding box; call ``build`` before querying"""
+        self._pending.append(
+            np.array([[item_id, min_lat, min_lon, max_lat, max_lon]], dtype=np.float64)
+        )
+
+    def insert_many(
+        self,
+        item_ids: np.ndarray,
+        min_lats: np.ndarray,
+        min_lons: np.ndarray,
+        max_lats: np.ndarray,
+        max_lons: np.ndarray
+    ) -> None:
+        """Register many bounding boxes at once"""
+        self._pending.append(
+            np.column_stack([item_ids, min_lats, min_lons, max_lats, max_lons]).astype(np.float64)
+        )
+
+    def build(self) -> None:
+        """Pack registered items into the sorted cell arrays"""
+        if not self._pending:
+            self._keys = np.empty(0, dtype=np.int64)
+            self._items = np.empty(0, dtype=np.int64)
+            return
+
+        boxes = np.concatenate(self._pending)
+        item_ids = boxes[:, 0].astype(np.int64)
+        row0 = self._cell(boxes[:, 1])
+        col0 = self._cell(boxes[:, 2])
+        row1 = self._cell(boxes[:, 3])
+        col1 = self._cell(boxes[:, 4])
+
+        n_rows = row1 - row0 + 1
+        n_cols = col1 - col0 + 1
+        n_cells = n_rows * n_cols
+
+        # Expand every bbox into the cells it covers without a Python loop
+        owner = np.repeat(np.arange(len(item_ids)), n_cells)
+        starts = np.cumsum(n_cells) - n_cells
+        offset = np.arange(n_cells.sum()) - np.repeat(starts, n_cells)
+        rows = row0[owner] + offset // n_cols[owner]
+        cols = col0[owner] + offset % n_cols[owner]
+
+        keys = self._key(rows, cols)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._items = item_ids[owner][order]
+
+    def query_points(
+        self,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        radius_cells: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidate items for each point
+
+        Returns aligned ``(point_index, item_id)`` arrays covering every item
+        whose bbox shares a cell with the point, or with one of the
+        neighbouring cells within ``radius_cells``. Pairs are unique.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if not len(self._keys) or not len(lats):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+        rows = self._cell(lats[valid])
+        cols = self._cell(lons[valid])
+
+        span = np.arange(-radius_cells, radius_cells + 1)
+        d_row, d_col = np.meshgrid(span, span, indexing='ij')
+        rows = (rows[:, None] + d_row.ravel()[None, :]).ravel()
+        cols = (cols[:, None] + d_col.ravel()[None, :]).ravel()
+        point_idx = np.repeat(valid, d_row.size)
+
+        keys = self._key(rows, cols)
+        left = np.searchsorted(self._keys, keys, side='left')
+        right = np.searchsorted(self._keys, keys, side='right')
+        counts = right - left
+
+        pair_points = np.repeat(point_idx, counts)
+        starts = np.repeat(left - (np.cumsum(counts) - counts), counts)
+        pair_items = self._items[starts + np.arange(counts.sum())]
+
+        if radius_cells and len(pair_points):
+            # Items spanning several neighbouring cells show up more than once
+            stride = int(self._items.max()) + 1
+            pairs = np.unique(pair_points * stride + pair_items)
+            pair_points, pair_items = pairs // stride, pairs % stride
+        return pair_points, pair_items
+
+    def query_bbox(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float
+    ) -> np.ndarray:
+        """Item ids whose cells overlap a bounding box"""
+        if not len(self._keys):
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(self._cell(min_lat), self._cell(max_lat) + 1)
+        cols = np.arange(self._cell(min_lon), self._cell(max_lon) + 1)
+        grid_rows, grid_cols = np.meshgrid(rows, cols, indexing='ij')
+        keys = self._key(grid_rows.ravel(), grid_cols.ravel())
+        mask = np.isin(self._keys, keys)
+        return np.unique(self._items[mask])
+
+
+def bbox_of(lats: Iterable[float], lons: Iterable[float]) -> Optional[Tuple[float, float, float, float]]:
+    """(min_lat, min_lon, max_lat, max_lon) of a coordinate sequence"""
+    lats = np.asarray(list(lats), dtype=np.float64)
+    lons = np.asarray(list(lons), dtype=np.float64)
+    if not len(lats):
+        return None
+    return float(lats.min()), float(lons.min()), float(lats.max()), float(lons.max())
@@ -0,0 +1,369 @@
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import TrafficData
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+# 1970-01-01 was a Thursday; shift so that hour 0 is Monday 00:00
+_EPOCH_HOUR_OFFSET = 3 * 24
+
+
+def hour_of_week(epoch_seconds, utc_offset_seconds: float = 0.0) -> np.ndarray:
+    """Hour-of-week bucket (0 = Monday 00:00) for unix timestamps"""
+    hours = np.floor((np.asarray(epoch_seconds, dtype=np.float64) + utc_offset_seconds) / 3600)
+    return ((hours.astype(np.int64) + _EPOCH_HOUR_OFFSET) % HOURS_PER_WEEK)
+
+
+def save_npz(path, **arrays) -> None:
+    """Atomically replace ``path`` with a compressed npz of ``arrays``
+
+    Each writer gets its own temporary file next to ``path``, so processes
+    saving the same file never write into each other's partial output.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _local_offset(moment: Optional[datetime] = None) -> float:
+    moment = moment or timezone.now()
+    offset = timezone.localtime(moment).utcoffset()
+    return offset.total_seconds() if offset else 0.0
+
+
+class SpeedProfileStore:
+    """Per-location hour-of-week speed profiles kept as compact arrays
+
+    ``speed_sum`` and ``counts`` are ``(locations, 168)`` arrays that only
+    ever grow, so the profile can be updated incrementally from new readings
+    using an id watermark instead of rescanning history, as the recent
+    readings store does; a timestamp watermark would skip rows that arrive
+    late or share the last timestamp. The latest reading per location is
+    tracked alongside for live blending.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.locations: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self.speed_sum = np.zeros((capacity, HOURS_PER_WEEK), dtype=np.float32)
+        self.counts = np.zeros((capacity, HOURS_PER_WEEK), dtype=np.uint32)
+        self.last_speed = np.full(capacity, np.nan, dtype=np.float32)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        # Highest TrafficData id folded in
+        self.watermark = 0
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.speed_sum)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        extra = new_capacity - capacity
+        self.speed_sum = np.vstack([self.speed_sum, np.zeros((extra, HOURS_PER_WEEK), dtype=np.float32)])
+        self.counts = np.vstack([self.counts, np.zeros((extra, HOURS_PER_WEEK), dtype=np.uint32)])
+        self.last_speed = np.concatenate([self.last_speed, np.full(extra, np.nan, dtype=np.float32)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros(extra)])
+
+    def slots_for(self, locations: Iterable[str]) -> np.ndarray:
+        """Slot index per location, registering unseen locations"""
+        slots = []
+        for location in locations:
+            slot = self._slots.get(location)
+            if slot is None:
+                slot = len(self.locations)
+                self._slots[location] = slot
+                self.locations.append(location)
+            slots.append(slot)
+        self._grow(len(self.locations))
+        return np.asarray(slots, dtype=np.int64)
+
+    def slot(self, location: str) -> Optional[int]:
+        return self._slots.get(location)
+
+    def add_readings(
+        self,
+        locations: Sequence[str],
+        epoch_seconds: Sequence[float],
+        speeds: Sequence[float],
+        utc_offset_seconds: Optional[float] = None
+    ) -> None:
+        """Fold a batch of readings into the profiles"""
+        speeds = np.asarray(speeds, dtype=np.float64)
+        epoch_seconds = np.asarray(epoch_seconds, dtype=np.float64)
+        valid = np.isfinite(speeds) & (speeds >= 0)
+        if not valid.any():
+            return
+
+        slots = self.slots_for(locations)[valid]
+        speeds = speeds[valid]
+        epoch_seconds = epoch_seconds[valid]
+        if utc_offset_seconds is None:
+            utc_offset_seconds = _local_offset()
+        buckets = hour_of_week(epoch_seconds, utc_offset_seconds)
+
+        np.add.at(self.speed_sum, (slots, buckets), speeds)
+        np.add.at(self.counts, (slots, buckets), 1)
+
+        # Latest reading per slot: sort by time so the last write wins
+        order = np.argsort(epoch_seconds, kind='stable')
+        newer = epoch_seconds[order] >= self.last_seen[slots[order]]
+        self.last_speed[slots[order][newer]] = speeds[order][newer]
+        self.last_seen[slots[order][newer]] = epoch_seconds[order][newer]
+
+    def update_from_db(self, batch_size: int = 5000) -> int:
+        """Fold readings written since the watermark into the profiles"""
+        queryset = TrafficData.objects.filter(id__gt=self.watermark).order_by('id')
+
+        added = 0
+        locations, stamps, speeds = [], [], []
+        offset = _local_offset()
+        for row_id, location, stamp, speed in queryset.values_list(
+            'id', 'location', 'timestamp', 'current_speed'
+        ).iterator(chunk_size=batch_size):
+            self.watermark = row_id
+            # Rows without a monitored location have nothing to key them by
+            if not location:
+                continue
+            locations.append(location)
+            stamps.append(stamp.timestamp())
+            speeds.append(speed if speed is not None else np.nan)
+            if len(locations) >= batch_size:
+                self.add_readings(locations, stamps, speeds, offset)
+                added += len(locations)
+                locations, stamps, speeds = [], [], []
+        if locations:
+            self.add_readings(locations, stamps, speeds, offset)
+            added += len(locations)
+        return added
+
+    def profile(self, min_samples: int = 1) -> np.ndarray:
+        """Mean speed per ``(location, hour_of_week)``, NaN where unknown"""
+        n = len(self.locations)
+        counts = self.counts[:n]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.speed_sum[:n] / counts
+        return np.where(counts >= min_samples, mean, np.nan)
+
+    def free_flow_speeds(self, min_samples: int = 3) -> np.ndarray:
+        """Free-flow estimate per location: the fastest hourly mean"""
+        profile = self.profile(min_samples)
+        result = np.full(len(profile), np.nan)
+        known = ~np.all(np.isnan(profile), axis=1)
+        result[known] = np.nanmax(profile[known], axis=1)
+        return result
+
+    def save(self, path) -> None:
+        n = len(self.locations)
+        save_npz(
+            path,
+            locations=np.asarray(self.locations, dtype=str),
+            speed_sum=self.speed_sum[:n],
+            counts=self.counts[:n],
+            last_speed=self.last_speed[:n],
+            last_seen=self.last_seen[:n],
+            watermark_id=np.asarray(self.watermark),
+        )
+
+    @classmethod
+    def load(cls, path) -> 'SpeedProfileStore':
+        with np.load(path) as data:
+            locations = [str(loc) for loc in data['locations']]
+            store = cls(capacity=max(len(locations), 1))
+            store.slots_for(locations)
+            n = len(locations)
+            store.speed_sum[:n] = data['speed_sum']
+            store.counts[:n] = data['counts']
+            store.last_speed[:n] = data['last_speed']
+            store.last_seen[:n] = data['last_seen']
+            store.watermark = int(data['watermark_id'])
+        return store
+
+
+class SpeedForecaster:
+    """Blends live readings with hour-of-week profiles
+
+    The live deviation from the profile decays exponentially with the
+    horizon, so near-term forecasts follow current conditions and longer
+    horizons fall back to the usual pattern for that hour. Forecasts for
+    every location and horizon are produced in one vectorized pass and kept
+    as a lookup table.
+    """
+
+    HORIZONS = (15, 30, 45, 60)
+
+    def __init__(self, decay_minutes: float = 30.0, max_live_age_minutes: float = 30.0):
+        self.decay_minutes = decay_minutes
+        self.max_live_age_minutes = max_live_age_minutes
+        self.locations: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self.forecasts = np.empty((0, len(self.HORIZONS)), dtype=np.float32)
+        self.live_speeds = np.empty(0, dtype=np.float32)
+        self.free_flow = np.empty(0, dtype=np.float32)
+        self.generated_at: Optional[datetime] = None
+
+    def compute(self, profiles: SpeedProfileStore, now: Optional[datetime] = None) -> None:
+        now = now or timezone.now()
+        n = len(profiles)
+        profile = profiles.profile()
+        offset = _local_offset(now)
+        horizons = np.asarray(self.HORIZONS, dtype=np.float64)
+
+        now_epoch = now.timestamp()
+        bucket_now = hour_of_week(now_epoch, offset)
+        buckets = hour_of_week(now_epoch + horizons * 60, offset)
+
+        live = profiles.last_speed[:n].astype(np.float64)
+        age_minutes = (now_epoch - profiles.last_seen[:n]) / 60
+        live = np.where(age_minutes <= self.max_live_age_minutes, live, np.nan)
+
+        expected_now = profile[:, bucket_now]
+        expected = profile[:, buckets]
+        deviation = (live - expected_now)[:, None]
+        weight = np.exp(-horizons / self.decay_minutes)[None, :]
+
+        blended = expected + deviation * weight
+        # Missing profile: persist the live reading; missing live: profile only
+        blended = np.where(np.isnan(expected), live[:, None], blended)
+        blended = np.where(np.isnan(deviation), expected, blended)
+
+        self.locations = list(profiles.locations)
+        self._slots = {loc: i for i, loc in enumerate(self.locations)}
+        self.forecasts = np.maximum(blended, 0).astype(np.float32)
+        self.live_speeds = live.astype(np.float32)
+        self.free_flow = profiles.free_flow_speeds().astype(np.float32)
+        self.generated_at = now
+
+    def _row(self, slot: int, horizons: Sequence[int]) -> Dict:
+        columns = [self.HORIZONS.index(h) for h in horizons]
+        return {
+            'current_speed': _clean(self.live_speeds[slot]),
+            'free_flow_speed': _clean(self.free_flow[slot]),
+            'forecast': {
+                str(h): _clean(self.forecasts[slot, c]) for h, c in zip(horizons, columns)
+            },
+        }
+
+    def lookup(
+        self,
+        location: Optional[str] = None,
+        horizon: Optional[int] = None
+    ) -> Dict[str, Dict]:
+        """Forecast rows keyed by location; raises KeyError for unknown ones"""
+        horizons = [horizon] if horizon is not None else list(self.HORIZONS)
+        if location is not None:
+            return {location: self._row(self._slots[location], horizons)}
+        return {loc: self._row(i, horizons) for i, loc in enumerate(self.locations)}
+
+    def save(self, path) -> None:
+        save_npz(
+            path,
+            locations=np.asarray(self.locations, dtype=str),
+            forecasts=self.forecasts,
+            live_speeds=self.live_speeds,
+            free_flow=self.free_flow,
+            generated_at=np.asarray(self.generated_at.timestamp() if self.generated_at else np.nan),
+        )
+
+    @classmethod
+    def load(cls, path) -> 'SpeedForecaster':
+        forecaster = cls()
+        with np.load(path) as data:
+            forecaster.locations = [str(loc) for loc in data['locations']]
+            forecaster.forecasts = data['forecasts']
+            forecaster.live_speeds = data['live_speeds']
+            forecaster.free_flow = data['free_flow']
+            generated_at = float(data['generated_at'])
+        forecaster._slots = {loc: i for i, loc in enumerate(forecaster.locations)}
+        if not np.isnan(generated_at):
+            forecaster.generated_at = datetime.fromtimestamp(generated_at, tz=dt_timezone.utc)
+        return forecaster
+
+
+def _clean(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, 2)
+
+
+_profiles: Optional[SpeedProfileStore] = None
+_forecaster: Optional[SpeedForecaster] = None
+_forecaster_mtime: Optional[float] = None
+_lock = threading.Lock()
+
+
+def _profile_path() -> Path:
+    return Path(settings.SPEED_PROFILE_DIR) / 'speed_profiles.npz'
+
+
+def _forecast_path() -> Path:
+    return Path(settings.SPEED_PROFILE_DIR) / 'speed_forecasts.npz'
+
+
+def get_speed_profiles() -> SpeedProfileStore:
+    """Process-wide profile store, restored from disk when available"""
+    global _profiles
+    with _lock:
+        if _profiles is None:
+            path = _profile_path()
+            try:
+                _profiles = SpeedProfileStore.load(path) if path.is_file() else SpeedProfileStore()
+            except (OSError, KeyError, ValueError) as e:
+                logger.error(f"Could not load speed profiles from {path}: {str(e)}")
+                _profiles = SpeedProfileStore()
+        return _profiles
+
+
+def refresh_speed_forecasts(now: Optional[datetime] = None) -> SpeedForecaster:
+    """Fold new readings into the profiles and recompute all forecasts
+
+    Called once per collection cycle; the results are written to disk so
+    that API processes only have to load the lookup table.
+    """
+    global _forecaster, _forecaster_mtime
+    profiles = get_speed_profiles()
+    added = profiles.update_from_db()
+    forecaster = SpeedForecaster()
+    forecaster.compute(profiles, now)
+    profiles.save(_profile_path())
+    forecaster.save(_forecast_path())
+    with _lock:
+        _forecaster = forecaster
+        _forecaster_mtime = _forecast_path().stat().st_mtime
+    logger.info(f"Speed forecasts refreshed for {len(forecaster.locations)} locations ({added} new readings)")
+    return forecaster
+
+
+def get_speed_forecaster() -> SpeedForecaster:
+    """Latest forecasts, reloaded whenever the collector writes a new table"""
+    global _forecaster, _forecaster_mtime
+    path = _forecast_path()
+    with _lock:
+        mtime = path.stat().st_mtime if path.is_file() else None
+        if mtime is not None and mtime != _forecaster_mtime:
+            _forecaster = SpeedForecaster.load(path)
+            _forecaster_mtime = mtime
+        if _forecaster is None:
+            _forecaster = SpeedForecaster()
+        return _forecaster
@@ -1,37 +1,84 @@
+import hashlib
+import json
 import requests
 from django.conf import settings
+from django.core.cache import cache
 from typing import Dict, List, Optional, Union
+from .quota import QuotaExceeded, QuotaScheduler, get_quota_scheduler
 import logging
 
 logger = logging.getLogger(__name__)
 
 class TomTomService:
-    def __init__(self):
+    def __init__(self, quota_scheduler: Optional[QuotaScheduler] = None):
         self.api_key = settings.TOMTOM_API_KEY
         self.base_url = settings.TOMTOM_BASE_URL
+        self.quota_scheduler = quota_scheduler or get_quota_scheduler()
 
-    def _make_request(self, endpoint: str, params: Dict = None) -> Dict:
-        """Make a request to TomTom API"""
+    @staticmethod
+    def _cache_key(endpoint: str, params: Dict) -> str:
+        digest = hashlib.sha1(
+            json.dumps([endpoint, params], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return f"tomtom_response:{digest}"
+
+    def _make_request(
+        self,
+        endpoint: str,
+        params: Dict = None,
+        quota: Optional[str] = None,
+        allow_cached: bool = True
+    ) -> Dict:
+        """Make a request to TomTom API
+
+        Calls under a ``quota`` group spend that group's budget. When the
+        budget is exhausted the last good response for the same request is
+        returned if ``allow_cached``, otherwise ``QuotaExceeded`` is raised.
+        """
         if params is None:
             params = {}
+        cache_key = self._cache_key(endpoint, params) if quota else None
+
+        if quota:
+            try:
+                self.quota_scheduler.acquire(quota)
+            except QuotaExceeded:
+                cached = cache.get(cache_key) if allow_cached else None
+                if cached is None:
+                    logger.warning(f"TomTom {quota} quota exhausted, no cached response for {endpoint}")
+                    raise
+                logger.info(f"TomTom {quota} quota exhausted, serving cached response for {endpoint}")
+                return cached
+
         params['key'] = self.api_key
 
         url = f"{self.base_url}{endpoint}"
         try:
             response = requests.get(url, params=params)
             response.raise_for_status()
-            return response.json()
+            data = response.json()
         except requests.exceptions.RequestException as e:
             logger.error(f"TomTom API request failed: {str(e)}")
             raise
 
-    def get_traffic_flow(self, bbox: str, zoom: int = 10, style: str = 'relative0') -> Dict:
+        if cache_key:
+            cache.set(cache_key, data, timeout=settings.TOMTOM_RESPONSE_CACHE_SECONDS)
+        return data
+
+    def get_traffic_flow(
+        self,
+        bbox: str,
+        zoom: int = 10,
+        style: str = 'relative0',
+        allow_cached: bool = True
+    ) -> Dict:
         """Get traffic flow data for a bounding box
         
         Args:
             bbox: Bounding box in format 'minLon,minLat,maxLon,maxLat'
             zoom: Zoom level (0-22), defaults to 10
             style: Flow style (relative0, absolute, etc.), defaults to relative0
+            allow_cached: Serve the last response instead of failing when the flow quota is spent
         """
         endpoint = f"/traffic/services/4/flowSegmentData/{style}/{zoom}/json"
         try:
@@ -47,15 +94,15 @@ class TomTomService:
                 'point': f"{center_lat},{center_lon}",  # Use point instead of points
                 'unit': 'KMPH',  # Use kilometers per hour for speed
                 'openLr': 'false'  # Don't include OpenLR code
-            })
+            }, quota='flow', allow_cached=allow_cached)
         except (ValueError, IndexError) as e:
             logger.error(f"Invalid bbox format: {str(e)}")
             raise ValueError("bbox must be in format: lon1,lat1,lon2,lat2")
 
-    def get_traffic_incidents(self, bbox: str) -> Dict:
+    def get_traffic_incidents(self, bbox: str, allow_cached: bool = True) -> Dict:
         """Get traffic incidents in a bounding box"""
         endpoint = f"/traffic/services/5/incidentDetails"
-        return self._make_request(endpoint, {'bbox': bbox})
+        return self._make_request(endpoint, {'bbox': bbox}, quota='incidents', allow_cached=allow_cached)
 
     def calculate_route(
         self,
@@ -80,7 +127,7 @@ class TomTomService:
             'computeTravelTimeFor': 'all'
         }
         
-        return self._make_request(endpoint, params)
+        return self._make_request(endpoint, params, quota='routing')
 
     def search_location(self, query: str, lat: float = None, lon: float = None) -> Dict:
         """Search for locations"""
@@ -94,12 +141,12 @@ class TomTomService:
                 'radius': 10000
             })
 
-        return self._make_request(endpoint, params)
+        return self._make_request(endpoint, params, quota='search')
 
     def reverse_geocode(self, lat: float, lon: float) -> Dict:
         """Convert coordinates to address"""
         endpoint = f"/search/2/reverseGeocode/{lat},{lon}.json"
-        return self._make_request(endpoint)
+        return self._make_request(endpoint, quota='search')
 
     def get_matrix_routes(
         self,
@@ -117,7 +164,7 @@ class TomTomService:
             'travelMode': 'car'
         }
         
-        return self._make_request(endpoint, params)
+        return self._make_request(endpoint, params, quota='routing')
 
     def get_map_tiles(self, style: str = 'main') -> str:
         """Get map tile URL"""
@@ -1,92 +1,166 @@
 import requests
 from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
 from django.conf import settings
 from ..models import TrafficData, Route, Alert
 from django.utils import timezone
+from . import traffic_metrics
+from .alert_subscriptions import get_subscription_matcher
+from .fetch_planner import plan_fetches, route_bbox, tile_bbox
+from .ingestion_queue import IngestionQueue, get_ingestion_queue
+from .quota import QuotaExceeded, get_quota_scheduler
 import logging
 
 logger = logging.getLogger(__name__)
 
 class TrafficCollector:
-    def __init__(self):
+    def __init__(self, ingestion_queue: Optional[IngestionQueue] = None):
         self.api_key = settings.TOMTOM_API_KEY
         self.base_url = settings.TOMTOM_BASE_URL
         self.api_version = settings.TOMTOM_API_VERSION
+        self.tile_size = settings.COLLECTION_TILE_SIZE
+        self.padding = 0.01  # Approximately 1km
+        self.quota_scheduler = get_quota_scheduler()
+        self.ingestion_queue = ingestion_queue or get_ingestion_queue()
+        # Share of slowed segments in each tile's last response, for scheduling
+        self.tile_congestion: Dict[Tuple[int, int], float] = {}
+
+    def _fetch_flow_segments(self, bbox: str) -> List[Dict]:
+        """Call the TomTom flow API for one bbox, spending one flow quota call"""
+        self.quota_scheduler.acquire('flow')
+        url = f"{self.base_url}/traffic/services/{self.api_version}/flowSegmentData/relative/10/json"
+        params = {
+            'key': self.api_key,
+            'bbox': bbox,
+            'unit': 'KMPH'
+        }
+        
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        return response.json().get('flowSegmentData', [])
 
     def collect_traffic_data(self, route: Route) -> None:
         """
         Collect real-time traffic data for a specific route
         """
         try:
-            # Create bounding box around route
-            min_lat = min(route.start_latitude, route.end_latitude)
-            max_lat = max(route.start_latitude, route.end_latitude)
-            min_lon = min(route.start_longitude, route.end_longitude)
-            max_lon = max(route.start_longitude, route.end_longitude)
-
-            # Add some padding to the bounding box
-            padding = 0.01  # Approximately 1km
-            bbox = f"{min_lon-padding},{min_lat-padding},{max_lon+padding},{max_lat+padding}"
-
-            # Call TomTom Traffic API
-            url = f"{self.base_url}/traffic/services/{self.api_version}/flowSegmentData/relative/10/json"
-            params = {
-                'key': self.api_key,
-                'bbox': bbox,
-                'unit': 'MPH'
-            }
-            
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            # Process and save traffic data
-            if 'flowSegmentData' in data:
-                for segment in data['flowSegmentData']:
-                    TrafficData.objects.create(
-                        road_segment=route,
-                        latitude=segment['coordinates']['latitude'],
-                        longitude=segment['coordinates']['longitude'],
-                        speed=segment.get('currentSpeed', 0),
-                        vehicle_count=segment.get('vehicleCount', 0),
-                        timestamp=timezone.now()
-                    )
-
-                    # Check for congestion and create alerts if needed
-                    self._check_congestion(segment, route)
+            # Create bounding box around route, with ~1km of padding
+            bbox = ','.join(str(v) for v in route_bbox(route, self.padding))
+
+            # Process and queue traffic data
+            segments = self._fetch_flow_segments(bbox)
+            self._store_segments(route, segments)
 
         except Exception as e:
             logger.error(f"Error collecting traffic data for route {route.name}: {str(e)}")
             raise
 
-    def _check_congestion(self, segment: dict, route: Route) -> None:
+    def collect_all(self, routes: Iterable[Route]) -> Dict:
+        """
+        Collect traffic data for many routes with one API call per shared tile
+
+        Tiles are refreshed in quota scheduler order (staleness x congestion x
+        number of routes and alert subscribers) for as long as the flow
+        budget allows; routes on deferred tiles keep their last readings.
+        Returns the plan's stats plus how many tiles were fetched, deferred
+        and failed.
+        """
+        plan = plan_fetches(routes, tile_size=self.tile_size, padding=self.padding)
+        per_route: Dict[int, Dict[Tuple[float, float], Dict]] = {route_id: {} for route_id in plan.routes}
+        failed = fetched = 0
+
+        matcher = get_subscription_matcher()
+        scheduled = self.quota_scheduler.schedule(
+            'flow', list(plan.tiles), self.tile_congestion,
+            {
+                tile: len(route_ids) + matcher.interest(tile_bbox(tile, self.tile_size))
+                for tile, route_ids in plan.tiles.items()
+            }
+        )
+        for tile in scheduled:
+            try:
+                bbox = ','.join(str(v) for v in tile_bbox(tile, self.tile_size))
+                segments = self._fetch_flow_segments(bbox)
+            except QuotaExceeded as e:
+                logger.info(f"Deferring remaining tiles: {str(e)}")
+                break
+            except Exception as e:
+                failed += 1
+                logger.error(f"Error collecting traffic data for tile {tile}: {str(e)}")
+                continue
+            fetched += 1
+            self.quota_scheduler.mark_fetched('flow', tile)
+            self.tile_congestion[tile] = self._congestion_share(segments)
+            lats = np.array([s['coordinates']['latitude'] for s in segments], dtype=float)
+            lons = np.array([s['coordinates']['longitude'] for s in segments], dtype=float)
+            for route_id, indices in plan.fan_out(tile, lats, lons).items():
+                # Points on a tile edge come back for both tiles; keep one
+                for i in indices:
+                    per_route[route_id][(lats[i], lons[i])] = segments[i]
+
+        for route_id, segments in per_route.items():
+            if not segments:
+                continue
+            try:
+                self._store_segments(plan.routes[route_id], list(segments.values()))
+            except Exception as e:
+                logger.error(f"Error storing traffic data for route {plan.routes[route_id].name}: {str(e)}")
+
+        return dict(
+            plan.stats(),
+            fetched_tiles=fetched,
+            deferred_tiles=len(plan.tiles) - fetched - failed,
+            failed_tiles=failed
+        )
+
+    @staticmethod
+    def _congestion_share(segments: List[Dict]) -> float:
+        """Mean density of the segments that report a free-flow speed"""
+        rated = [s for s in segments if s.get('freeFlowSpeed')]
+        if not rated:
+            return 0.0
+        return float(np.mean(traffic_metrics.density(
+            [s.get('currentSpeed', 0) for s in rated], [s['freeFlowSpeed'] for s in rated]
+        )))
+
+    def _store_segments(self, route: Route, segments: List[Dict]) -> None:
+        """Queue a route's readings for the background writer"""
+        now = timezone.now()
+        for segment in segments:
+            self.ingestion_queue.put_reading(TrafficData(
+                road_segment=route,
+                location=f"{segment['coordinates']['latitude']},{segment['coordinates']['longitude']}",
+                latitude=segment['coordinates']['latitude'],
+                longitude=segment['coordinates']['longitude'],
+                speed=segment.get('currentSpeed', 0),
+                current_speed=segment.get('currentSpeed'),
+                free_flow_speed=segment.get('freeFlowSpeed'),
+                vehicle_count=segment.get('vehicleCount', 0),
+                timestamp=now
+            ))
+        # Check for congestion and create alerts if needed
+        self._check_congestion(segments, route)
+
+    def _check_congestion(self, segments: List[Dict], route: Route) -> None:
         """
-        Check for congestion and create alerts if needed
+        Queue congestion alerts for the segments past the alert thresholds
         """
         try:
-            current_speed = segment.get('currentSpeed', 0)
-            free_flow_speed = segment.get('freeFlowSpeed', 0)
-
-            if free_flow_speed > 0:
-                congestion_ratio = current_speed / free_flow_speed
-                
-                # Define congestion thresholds
-                if congestion_ratio < 0.5:  # Severe congestion
-                    severity = 'HIGH'
-                elif congestion_ratio < 0.7:  # Moderate congestion
-                    severity = 'MEDIUM'
-                else:
-                    return  # No significant congestion
-
-                # Create or update alert
-                Alert.objects.create(
+            current = [s.get('currentSpeed', 0) for s in segments]
+            free_flow = [s.get('freeFlowSpeed', 0) for s in segments]
+            severities = traffic_metrics.alert_severity(current, free_flow)
+            for i in np.flatnonzero(severities != ''):
+                segment = segments[i]
+                self.ingestion_queue.put_alert(Alert(
                     location=f"{segment['coordinates']['latitude']},{segment['coordinates']['longitude']}",
                     alert_type='CONGESTION',
-                    severity=severity,
+                    severity=str(severities[i]),
                     description=f"Traffic congestion detected on {route.name}. "
-                              f"Current speed: {current_speed:.1f} MPH "
-                              f"(Normal speed: {free_flow_speed:.1f} MPH)"
-                )
+                              f"Current speed: {current[i]:.1f} km/h "
+                              f"(Normal speed: {free_flow[i]:.1f} km/h)"
+                ))
 
         except Exception as e:
-            logger.error(f"Error checking congestion: {str(e)}") 
\ No newline at end of file
+            logger.error(f"Error checking congestion: {str(e)}")
@@ -0,0 +1,116 @@
+"""Vectorized traffic metrics shared by the views, sync and collectors
+
+Every function takes speeds as scalars, sequences or arrays (``None`` and
+NaN meaning missing) and classifies against the single threshold table in
+``settings.TRAFFIC_METRIC_THRESHOLDS``, so a whole store snapshot or
+queryset is scored in one call.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+CONGESTION_LEVELS = ('low', 'medium', 'high')
+# Alert severities by increasing density; '' means no alert
+ALERT_SEVERITIES = ('', 'MEDIUM', 'HIGH')
+
+
+def as_speeds(values) -> np.ndarray:
+    """Float array with ``None`` as NaN; a scalar becomes a one-element array"""
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False)
+    if values is None or np.isscalar(values):
+        values = [values]
+    return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _bounds(table: str, names: Sequence[str]) -> np.ndarray:
+    thresholds = settings.TRAFFIC_METRIC_THRESHOLDS[table]
+    return np.asarray([thresholds[name] for name in names[1:]], dtype=np.float64)
+
+
+def density(current_speed, free_flow_speed) -> np.ndarray:
+    """Share of free-flow speed lost, 0-1; 0 without both speeds"""
+    current = as_speeds(current_speed)
+    free_flow = as_speeds(free_flow_speed)
+    valid = (current > 0) & (free_flow > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lost = (free_flow - current) / free_flow
+    return np.where(valid, np.clip(lost, 0.0, 1.0), 0.0)
+
+
+def delay_ratio(current_speed, free_flow_speed) -> np.ndarray:
+    """Travel time relative to free flow (``free_flow / current``); NaN without both speeds"""
+    current = as_speeds(current_speed)
+    free_flow = as_speeds(free_flow_speed)
+    valid = (current > 0) & (free_flow > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, free_flow / current, np.nan)
+
+
+def congestion_codes(densities: np.ndarray) -> np.ndarray:
+    """Index into ``CONGESTION_LEVELS`` for each density"""
+    return np.searchsorted(_bounds('congestion_level', CONGESTION_LEVELS), densities, side='right')
+
+
+def congestion_level(current_speed, free_flow_speed) -> np.ndarray:
+    """'low', 'medium' or 'high' for each reading"""
+    return np.asarray(CONGESTION_LEVELS)[congestion_codes(density(current_speed, free_flow_speed))]
+
+
+def alert_severity(current_speed, free_flow_speed) -> np.ndarray:
+    """Congestion alert severity for each reading, '' where none is due"""
+    codes = np.searchsorted(
+        _bounds('alert_severity', ALERT_SEVERITIES), density(current_speed, free_flow_speed), side='right'
+    )
+    return np.asarray(ALERT_SEVERITIES)[codes]
+
+
+@dataclass
+class TrafficMetrics:
+    density: np.ndarray
+    congestion_level: np.ndarray
+    delay_ratio: np.ndarray
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Plain Python values of one reading, for serializing"""
+        delay = self.delay_ratio[i]
+        return {
+            'density': float(self.density[i]),
+            'congestion_level': str(self.congestion_level[i]),
+            'delay_ratio': None if np.isnan(delay) else float(delay),
+        }
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [self.row(i) for i in range(len(self.density))]
+
+
+def compute(current_speed, free_flow_speed) -> TrafficMetrics:
+    """Density, congestion level and delay ratio in one pass"""
+    current = as_speeds(current_speed)
+    free_flow = as_speeds(free_flow_speed)
+    densities = density(current, free_flow)
+    return TrafficMetrics(
+        density=densities,
+        congestion_level=np.asarray(CONGESTION_LEVELS)[congestion_codes(densities)],
+        delay_ratio=delay_ratio(current, free_flow),
+    )
+
+
+def queryset_metrics(
+    queryset,
+    current_field: str = 'current_speed',
+    free_flow_field: str = 'free_flow_speed',
+    key_field: Optional[str] = None
+) -> Tuple[List[Any], TrafficMetrics]:
+    """Metrics of every row of a queryset, from one ``values_list`` query
+
+    Returns the ``key_field`` values (or primary keys) aligned with the
+    metric arrays.
+    """
+    rows = list(queryset.values_list(key_field or 'pk', current_field, free_flow_field))
+    if not rows:
+        return [], compute(np.empty(0), np.empty(0))
+    keys, current, free_flow = zip(*rows)
+    return list(keys), compute(list(current), list(free_flow))
@@ -0,0 +1,117 @@
+import logging
+import random
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.utils import timezone
+
+from ..models import TrafficData
+from .ingestion_queue import IngestionQueue, get_ingestion_queue
+from .road_network import get_road_network
+from .sampling_planner import QuadTreePlanner
+from .sharding import strip_bounds
+
+logger = logging.getLogger(__name__)
+
+# Kathmandu Valley
+DEFAULT_BBOX = '85.2443,27.6258,85.5419,27.8075'
+
+
+class TrafficSimulator:
+    """Simulated readings over a bbox, for development without a TomTom key
+
+    Sweeps a fixed grid (~500 m) or, with ``adaptive``, the points a
+    quadtree planner picks within ``budget``. Shards are strips of grid
+    columns, so every shard layout yields the same points.
+    """
+
+    def __init__(
+        self,
+        ingestion_queue: Optional[IngestionQueue] = None,
+        adaptive: bool = False,
+        budget: int = 500,
+        step: float = 0.005
+    ):
+        self.ingestion_queue = ingestion_queue or get_ingestion_queue()
+        self.adaptive = adaptive
+        self.budget = budget
+        self.step = step
+        self.planners: Dict[Tuple[int, int], QuadTreePlanner] = {}
+
+    def sweep(self, bbox: str, shard: int = 0, shard_count: int = 1, now: Optional[datetime] = None) -> int:
+        """Queue readings for the bbox, or one strip of it; returns how many"""
+        min_lon, min_lat, max_lon, max_lat = map(float, bbox.split(','))
+        current_time = now or timezone.now()
+
+        if self.adaptive:
+            return self._sweep_adaptive((min_lon, min_lat, max_lon, max_lat), shard, shard_count, current_time)
+
+        lons = list(self._frange(min_lon, max_lon, self.step))
+        start, stop = strip_bounds(len(lons), shard_count)[shard]
+        lons = lons[start:stop]
+
+        count = 0
+        for lat in self._frange(min_lat, max_lat, self.step):
+            for lon in lons:
+                self.collect_point(f"{lat},{lon}", current_time)
+                count += 1
+        return count
+
+    def _sweep_adaptive(self, bbox, shard: int, shard_count: int, current_time: datetime) -> int:
+        """Sample the points the quadtree planner asks for and feed the results back"""
+        planner = self.planners.get((shard, shard_count))
+        if planner is None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            width = (max_lon - min_lon) / shard_count
+            network = get_road_network()
+            planner = QuadTreePlanner(
+                (min_lon + shard * width, min_lat, min_lon + (shard + 1) * width, max_lat),
+                budget=self.budget,
+                density=(
+                    (network.seg_lat1 + network.seg_lat2) / 2,
+                    (network.seg_lon1 + network.seg_lon2) / 2,
+                ),
+            )
+            self.planners[(shard, shard_count)] = planner
+
+        observations = {}
+        for key, location in planner.plan():
+            reading = self.collect_point(location, current_time)
+            observations[key] = (reading.current_speed, reading.free_flow_speed)
+        planner.observe(observations)
+        logger.info(f"Adaptive sampling for shard {shard}/{shard_count}: {planner.stats()}")
+        return len(observations)
+
+    def collect_point(self, location: str, current_time: datetime) -> TrafficData:
+        """Simulate and queue one reading"""
+        # Calculate simulated traffic data based on time of day
+        hour = current_time.hour
+        base_speed = 40.0  # Base speed in km/h
+
+        # Simulate rush hours (7-10 AM and 4-7 PM)
+        if (7 <= hour < 10) or (16 <= hour < 19):
+            current_speed = base_speed * (0.4 + 0.3 * random.random())
+        else:
+            current_speed = base_speed * (0.8 + 0.2 * random.random())
+
+        reading = TrafficData(
+            location=location,
+            current_speed=current_speed,
+            free_flow_speed=base_speed,
+            current_travel_time=int(3600 * (base_speed / current_speed)),
+            free_flow_travel_time=3600,
+            confidence=0.85 + 0.15 * random.random(),
+            road_closure=False,
+            timestamp=current_time
+        )
+        # Queue traffic data for the background writer
+        self.ingestion_queue.put_reading(reading)
+        return reading
+
+    @staticmethod
+    def _frange(start: float, stop: float, step: float) -> Iterator[float]:
+        """Generate a range of floats"""
+        i = start
+        while i < stop:
+            yield i
+            i += step
@@ -0,0 +1,51 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Alert, AlertSubscription, EmergencyVehicle, Geofence, Route, TrafficData
+from .services.geofence_engine import get_geofence_engine
+from .services.resource_versions import (
+    ALERT_SUBSCRIPTIONS, ALERTS, EMERGENCY_VEHICLES, GEOFENCES, ROUTES, TRAFFIC, bump_version,
+    route_resource
+)
+
+
+@receiver([post_save, post_delete], sender=TrafficData)
+def traffic_data_changed(sender, instance, **kwargs):
+    # Readings written in bulk skip signals and bump from the ingestion queue hook
+    resources = [TRAFFIC]
+    if instance.road_segment_id is not None:
+        resources.append(route_resource(instance.road_segment_id))
+    bump_version(*resources)
+
+
+@receiver([post_save, post_delete], sender=Alert)
+def alert_changed(sender, **kwargs):
+    bump_version(ALERTS)
+
+
+@receiver(post_save, sender=Alert)
+def alert_created(sender, instance, created, **kwargs):
+    # Batched writes skip signals and run the alert_writer hooks instead;
+    # subscriber pushes only go out from there, one coalesced round per batch
+    if created:
+        get_geofence_engine().evaluate_alerts([instance])
+
+
+@receiver([post_save, post_delete], sender=EmergencyVehicle)
+def emergency_vehicle_changed(sender, **kwargs):
+    bump_version(EMERGENCY_VEHICLES)
+
+
+@receiver([post_save, post_delete], sender=Geofence)
+def geofence_changed(sender, **kwargs):
+    bump_version(GEOFENCES)
+
+
+@receiver([post_save, post_delete], sender=AlertSubscription)
+def alert_subscription_changed(sender, **kwargs):
+    bump_version(ALERT_SUBSCRIPTIONS)
+
+
+@receiver([post_save, post_delete], sender=Route)
+def route_changed(sender, **kwargs):
+    bump_version(ROUTES)
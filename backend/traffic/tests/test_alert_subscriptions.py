@@ -0,0 +1,108 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from traffic.models import Alert, AlertSubscription, FirebaseUser, Route
+from traffic.services import alert_subscriptions
+from traffic.services.alert_subscriptions import AlertSubscriptionMatcher, FakePushSender
+from traffic.services.alert_writer import save_alerts
+
+def make_user(name):
+    user = User.objects.create(username=name)
+    return FirebaseUser.objects.create(user=user, firebase_uid=f'uid-{name}', email=f'{name}@example.com')
+
+class TestAlertSubscriptionMatcher(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.route = Route.objects.create(
+            name='ring', description='', start_latitude=27.70, start_longitude=85.30,
+            end_latitude=27.72, end_longitude=85.32, waypoints=[]
+        )
+        # Alice watches two overlapping areas from one phone, Bob a route for high severity only
+        AlertSubscription.objects.create(
+            user=self.alice, center_latitude=27.700, center_longitude=85.300, radius_m=500, device_token='phone-a'
+        )
+        AlertSubscription.objects.create(
+            user=self.alice, center_latitude=27.702, center_longitude=85.300, radius_m=500,
+            alert_types=['CLOSURE'], device_token='phone-a'
+        )
+        AlertSubscription.objects.create(
+            user=self.bob, route=self.route, min_severity='HIGH', device_token='phone-b'
+        )
+        self.sender = FakePushSender()
+        self.matcher = AlertSubscriptionMatcher(sender=self.sender, batch_size=1)
+
+    def alert(self, location, severity='MEDIUM', alert_type='CONGESTION'):
+        return Alert.objects.create(location=location, severity=severity, alert_type=alert_type)
+
+    def test_matches_are_filtered_and_coalesced_per_device(self):
+        near = self.alert('27.7010,85.3000', alert_type='CLOSURE')
+        high = self.alert('27.7100,85.3100', severity='HIGH')
+        far = self.alert('27.9000,85.5000', severity='HIGH')
+        outside_radius = self.alert('27.7100,85.3000')
+
+        messages = {m.token: m for m in self.matcher.messages_for([near, high, far, outside_radius])}
+        self.assertEqual(set(messages), {'phone-a', 'phone-b'})
+        # Both of Alice's areas contain the closure; she gets it once
+        self.assertEqual(messages['phone-a'].alert_ids, [near.id])
+        self.assertEqual(messages['phone-b'].alert_ids, [high.id])
+
+        self.assertEqual(self.matcher.notify([near, high, far]), 2)
+        self.assertEqual(len(self.sender.batches), 2)
+
+    def test_severity_and_type_filters(self):
+        low_on_route = self.alert('27.7100,85.3100', severity='LOW')
+        self.assertEqual(self.matcher.messages_for([low_on_route]), [])
+
+        both = [self.alert('27.7001,85.3001'), self.alert('27.7002,85.3002', severity='HIGH')]
+        [message] = [m for m in self.matcher.messages_for(both) if m.token == 'phone-a']
+        self.assertEqual(message.title, '2 new traffic alerts')
+        self.assertEqual(message.body, '1 high severity')
+
+    def test_index_reloads_after_subscription_changes(self):
+        alert = self.alert('27.7100,85.3100', severity='HIGH')
+        self.assertEqual(len(self.matcher.messages_for([alert])), 1)
+        AlertSubscription.objects.filter(user=self.bob).update(active=False)
+        AlertSubscription.objects.filter(user=self.bob).first().save()
+        self.assertEqual(self.matcher.messages_for([alert]), [])
+
+    def test_saved_batches_push_once_and_single_saves_do_not(self):
+        alert_subscriptions._matcher_instance = self.matcher
+        self.addCleanup(setattr, alert_subscriptions, '_matcher_instance', None)
+        self.alert('27.7010,85.3000')
+        self.assertEqual(self.sender.sent, [])
+
+        saved = save_alerts([
+            Alert(location='27.7001,85.3001'), Alert(location='27.7002,85.3002', severity='HIGH')
+        ])
+        self.assertTrue(all(alert.pk for alert in saved))
+        # One message per device for the whole write
+        messages = {m.token: m.alert_ids for m in self.sender.sent}
+        self.assertEqual(len(self.sender.sent), len(messages))
+        self.assertEqual(messages['phone-a'], [alert.pk for alert in saved])
+
+    def test_interest_counts_overlapping_subscriptions(self):
+        self.assertEqual(self.matcher.interest((85.29, 27.69, 85.31, 27.71)), 3)
+        self.assertEqual(self.matcher.interest((86.0, 28.0, 86.1, 28.1)), 0)
+
+    def test_api_validation(self):
+        client = APIClient()
+        response = client.post('/api/alert-subscriptions/', {
+            'user': 'uid-bob', 'center_latitude': 27.7, 'center_longitude': 85.3,
+            'radius_m': 300, 'device_token': 'phone-b'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('device_token', response.data)
+
+        for body in (
+            {'user': 'uid-bob', 'device_token': 't'},
+            {'user': 'uid-bob', 'device_token': 't', 'route': self.route.id, 'center_latitude': 1, 'center_longitude': 1},
+            {'user': 'uid-bob', 'device_token': 't', 'route': self.route.id, 'alert_types': ['FLOOD']},
+        ):
+            response = client.post('/api/alert-subscriptions/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+
+        response = client.get('/api/alert-subscriptions/', {'user__firebase_uid': 'uid-bob'})
+        self.assertEqual(response.data['count'], 2)
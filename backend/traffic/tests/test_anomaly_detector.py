@@ -0,0 +1,140 @@
+import fcntl
+import os
+import tempfile
+import threading
+import unittest
+import numpy as np
+from django.test import TestCase, override_settings
+from traffic.services import anomaly_detector
+from traffic.services.anomaly_detector import RAW, AnomalyDetector
+from traffic.services.speed_profiles import SpeedProfileStore
+
+MONDAY_8AM = 1792396800.0  # 2026-10-19 08:00 UTC
+WEEK = 7 * 24 * 3600
+
+class TestAnomalyDetector(TestCase):
+    def setUp(self):
+        self.detector = AnomalyDetector(alpha=0.2, z_threshold=3.0, min_samples=5)
+        self.rng = np.random.default_rng(42)
+
+    def warm_up(self, locations, speed, rounds=30):
+        for _ in range(rounds):
+            speeds = speed + self.rng.normal(0, 1, len(locations))
+            self.detector.score_batch(locations, speeds)
+
+    def test_warm_up_scores_are_nan(self):
+        """No scores until a location has enough history"""
+        z = self.detector.score_batch(['a'], [10.0])
+        self.assertTrue(np.isnan(z[0]))
+
+    def test_sudden_drop_raises_incident(self):
+        """Only the location with an abnormal drop gets an alert"""
+        self.warm_up(['a', 'b'], 40.0)
+        alerts = self.detector.detect(['a', 'b'], [10.0, 39.0])
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0].location, 'a')
+        self.assertEqual(alerts[0].alert_type, 'INCIDENT')
+        self.assertEqual(alerts[0].severity, 'HIGH')
+
+    def test_usually_slow_area(self):
+        """A drop in a usually slow area is still detected"""
+        self.warm_up(['slow', 'fast'], 12.0)
+        self.warm_up(['fast'], 40.0, rounds=60)
+        alerts = self.detector.detect(['slow', 'fast'], [4.0, 37.0])
+        self.assertEqual([alert.location for alert in alerts], ['slow'])
+
+    def test_recurring_rush_hour_is_not_an_incident(self):
+        """Slowdowns matching the hour-of-week profile score as normal"""
+        profiles = SpeedProfileStore()
+        for week in range(1, 5):
+            past = MONDAY_8AM - week * WEEK
+            profiles.add_readings(['a', 'a'], [past, past + 3 * 3600], [15.0, 40.0], 0)
+
+        off_peak = MONDAY_8AM + 3.5 * 3600
+        for i in range(30):
+            self.detector.score_batch(['a'], [40.0 + self.rng.normal(0, 1)], [off_peak - i * 60], profiles)
+        z = self.detector.score_batch(['a'], [15.5], [MONDAY_8AM], profiles)
+        self.assertGreater(z[0], -3.0)
+
+    def test_moving_between_unknown_and_profiled_hours(self):
+        """Raw speeds and profile residuals are scored against separate state"""
+        profiles = SpeedProfileStore()
+        for week in range(1, 5):
+            profiles.add_readings(['a'], [MONDAY_8AM - week * WEEK], [40.0], 0)
+
+        unknown_hour = MONDAY_8AM + 3.5 * 3600
+        for i in range(30):
+            speed = 40.0 + self.rng.normal(0, 1)
+            self.assertEqual(self.detector.detect(['a'], [speed], [unknown_hour - i * 60], profiles), [])
+        for i in range(30):
+            speed = 40.0 + self.rng.normal(0, 1)
+            self.assertEqual(self.detector.detect(['a'], [speed], [MONDAY_8AM + i * 60], profiles), [])
+        self.assertEqual(self.detector.detect(['a'], [39.0], [unknown_hour + 3600], profiles), [])
+        # A real drop at a profiled hour still alerts
+        self.assertEqual(len(self.detector.detect(['a'], [10.0], [MONDAY_8AM + 1800], profiles)), 1)
+
+    def test_repeated_location_in_batch(self):
+        """Several readings for one location are folded in sequentially"""
+        self.detector.score_batch(['a', 'a', 'a'], [10.0, 20.0, 30.0])
+        self.assertEqual(self.detector.count[RAW, 0], 3)
+        expected = 0.0
+        for value in (10.0, 20.0, 30.0):
+            expected += 0.2 * (value - expected)
+        self.assertAlmostEqual(self.detector.mean[RAW, 0], expected)
+
+    def test_state_survives_restart(self):
+        """Persisted state restores without a warm-up"""
+        self.warm_up(['a'], 40.0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'state.npz')
+            self.detector.save(path)
+            restored = AnomalyDetector.load(path, alpha=0.2, min_samples=5)
+        self.assertEqual(len(restored.detect(['a'], [10.0])), 1)
+
+    def test_lasting_incident_alerts_once_per_cooldown(self):
+        """A location that stays abnormal is not re-alerted every batch"""
+        self.detector.cooldown = 600
+        self.warm_up(['a', 'b'], 40.0)
+        # Adapt slowly so the drop keeps scoring as abnormal
+        self.detector.alpha = 0.01
+        self.assertEqual(len(self.detector.detect(['a'], [10.0], [MONDAY_8AM])), 1)
+        self.assertEqual(self.detector.detect(['a'], [10.0], [MONDAY_8AM + 60]), [])
+        self.assertEqual(len(self.detector.detect(['b'], [10.0], [MONDAY_8AM + 60])), 1)
+        self.assertEqual(len(self.detector.detect(['a'], [10.0], [MONDAY_8AM + 601])), 1)
+
+    def test_concurrent_saves(self):
+        """Writers saving the same path never share a temporary file"""
+        self.warm_up(['a'], 40.0)
+        errors = []
+
+        def save(path):
+            try:
+                for _ in range(20):
+                    self.detector.save(path)
+            except Exception as e:
+                errors.append(e)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'state.npz')
+            threads = [threading.Thread(target=save, args=(path,)) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(tmp), ['state.npz'])
+            self.assertEqual(AnomalyDetector.load(path).locations, ['a'])
+
+    def test_only_the_lock_holder_persists_state(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(SPEED_PROFILE_DIR=tmp):
+            self.addCleanup(setattr, anomaly_detector, '_owner_handle', None)
+            self.addCleanup(setattr, anomaly_detector, '_owns_state', False)
+            with open(os.path.join(tmp, 'anomaly_state.lock'), 'a') as other:
+                fcntl.flock(other, fcntl.LOCK_EX)
+                self.assertFalse(anomaly_detector.owns_state())
+                fcntl.flock(other, fcntl.LOCK_UN)
+            self.assertTrue(anomaly_detector.owns_state())
+            anomaly_detector._owner_handle.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+from django.core.handlers.asgi import ASGIHandler
+from django.test import TestCase, override_settings
+from traffic import async_views
+from traffic.services.osrm_service import OSRMService
+
+ROUTE = {'routes': [{'geometry': '_p~iF~ps|U_ulLnnqC', 'distance': 1000.0}]}
+
+class FakeAsyncClient:
+    """Answers every GET after a short wait, tracking how many overlap"""
+
+    def __init__(self, fail_waypoint=None):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.urls = []
+        self.fail_waypoint = fail_waypoint
+
+    async def get(self, url, params=None):
+        self.urls.append(url)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if self.fail_waypoint and self.fail_waypoint in url:
+            return SimpleNamespace(status_code=502, text='bad gateway', json=lambda: {})
+        return SimpleNamespace(status_code=200, text='', json=lambda: ROUTE)
+
+class TestAsyncAlternatives(TestCase):
+    def setUp(self):
+        self.service = OSRMService()
+        waypoints = mock.patch.object(
+            OSRMService, '_avoidance_waypoints', return_value=['27.71,85.31', '27.72,85.32', '27.73,85.33']
+        )
+        waypoints.start()
+        self.addCleanup(waypoints.stop)
+
+    def run_alternatives(self, client):
+        with mock.patch('traffic.services.osrm_service.get_async_client', return_value=client):
+            return asyncio.run(self.service.aget_alternative_routes('27.7,85.3', '27.7,85.4', 4))
+
+    def test_candidates_are_requested_concurrently(self):
+        client = FakeAsyncClient()
+        routes = self.run_alternatives(client)
+        self.assertEqual(len(routes), 4)
+        self.assertEqual(len(client.urls), 4)
+        self.assertEqual(client.max_in_flight, 3)
+
+    def test_failed_candidate_is_dropped(self):
+        client = FakeAsyncClient(fail_waypoint='85.32,27.72')
+        self.assertEqual(len(self.run_alternatives(client)), 3)
+
+class TestAsyncViews(TestCase):
+    def test_calculate_requires_endpoints(self):
+        response = self.client.post('/api/routes/calculate/', {'start': '27.7,85.3'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'start and end points are required'})
+
+    def test_calculate_returns_upstream_route(self):
+        with mock.patch('traffic.services.osrm_service.get_async_client', return_value=FakeAsyncClient()):
+            response = self.client.post(
+                '/api/routes/calculate/', {'start': '27.7,85.3', 'end': '27.7,85.4'},
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), ROUTE)
+
+    def test_reverse_geocode(self):
+        geocoder = mock.Mock()
+        geocoder.reverse_geocode.return_value = {'label': 'Ring Road, Kathmandu'}
+        with mock.patch.object(async_views, 'get_reverse_geocoder', return_value=geocoder):
+            response = self.client.get('/api/locations/reverse_geocode/', {'lat': '27.7', 'lon': '85.31'})
+            invalid = self.client.get('/api/locations/reverse_geocode/', {'lat': 'x', 'lon': '85.31'})
+        self.assertEqual(response.json(), {'label': 'Ring Road, Kathmandu'})
+        geocoder.reverse_geocode.assert_called_once_with(27.7, 85.31)
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_reverse_geocode_falls_back_to_nominatim(self):
+        client = mock.Mock()
+        client.get = mock.AsyncMock(return_value=SimpleNamespace(status_code=200, text='', json=lambda: {
+            'display_name': 'Ring Road, Kathmandu, Nepal',
+            'address': {'road': 'Ring Road', 'suburb': 'Kalanki', 'city': 'Kathmandu'},
+        }))
+        geocoder = mock.Mock(available=False)
+        with mock.patch.object(async_views, 'get_reverse_geocoder', return_value=geocoder), \
+                mock.patch('traffic.services.osrm_service.get_async_client', return_value=client):
+            response = self.client.get('/api/locations/reverse_geocode/', {'lat': '27.7', 'lon': '85.31'})
+        self.assertEqual(response.json(), {
+            'latitude': 27.7, 'longitude': 85.31, 'road': 'Ring Road', 'area': 'Kalanki',
+            'distance_m': None, 'label': 'Ring Road, Kalanki',
+        })
+        self.assertTrue(client.get.call_args.args[0].endswith('/reverse'))
+        geocoder.reverse_geocode.assert_not_called()
+
+class TestAsyncMiddleware(TestCase):
+    @override_settings(DEBUG=True)
+    def test_chain_is_not_adapted_to_sync(self):
+        # Django logs each middleware it has to wrap in sync_to_async
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_responses_pass_through_the_async_chain(self):
+        response = await self.async_client.post(
+            '/api/routes/calculate/', {'start': '27.7,85.3'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Accept-Encoding', response['Vary'])
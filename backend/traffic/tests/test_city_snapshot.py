@@ -0,0 +1,123 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from traffic.models import Alert, EmergencyVehicle, TrafficData
+from traffic.services import city_snapshot, recent_store
+from traffic.services.recent_store import RecentReadingsStore
+from traffic.services.resource_versions import TRAFFIC, bump_version
+
+class TestCitySnapshot(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.store = RecentReadingsStore(max_locations=16, depth=4)
+        self.clock = 1_700_000_000.0
+        self.feed({'27.70001,85.31002': 20.0, '27.71,85.3': 38.26, 'Ring Road': 10.0})
+        self.alert = Alert.objects.create(
+            location='27.7,85.31', alert_type='CLOSURE', severity='HIGH', description='Bridge shut'
+        )
+        self.vehicle = EmergencyVehicle.objects.create(
+            vehicle_id='amb-1', vehicle_type='ambulance', current_location='27.69,85.33', status='active'
+        )
+        mock.patch('traffic.services.city_snapshot.get_recent_store', return_value=self.store).start()
+        mock.patch.object(self.store, 'sync_from_db').start()
+        self.addCleanup(mock.patch.stopall)
+        city_snapshot._service = None
+
+    def feed(self, speeds):
+        self.clock += 60
+        self.store.append_batch(
+            list(speeds), [self.clock] * len(speeds), list(speeds.values()),
+            [40.0] * len(speeds), [0.9] * len(speeds), [False] * len(speeds)
+        )
+
+    def get(self, **params):
+        response = self.client.get('/api/snapshot/', params)
+        self.assertEqual(response['Content-Type'], city_snapshot.MEDIA_TYPE)
+        return response, city_snapshot.decode(response.content)
+
+    def test_full_snapshot_round_trips_quantized_rows(self):
+        response, snapshot = self.get()
+        self.assertEqual(snapshot['kind'], 'full')
+        self.assertEqual(int(response['X-Snapshot-Version']), snapshot['version'])
+        # The unlocated reading is left out
+        conditions = sorted(snapshot['conditions']['upserted'], key=lambda row: row['latitude'])
+        self.assertEqual(len(conditions), 2)
+        self.assertEqual(conditions[0], {
+            'latitude': 2770001, 'longitude': 8531002, 'current_speed': 200, 'free_flow_speed': 400,
+            'confidence': 180, 'flags': city_snapshot.CLOSURE_KNOWN, 'congestion_level': 1,
+            'timestamp': int(self.clock),
+        })
+        self.assertEqual(conditions[1]['current_speed'], 383)
+        [alert] = snapshot['alerts']['upserted']
+        self.assertEqual(
+            (alert['id'], alert['latitude'], alert['alert_type'], alert['severity'], alert['description']),
+            (self.alert.id, 2770000, 2, 2, 'Bridge shut')
+        )
+        [vehicle] = snapshot['vehicles']['upserted']
+        self.assertEqual((vehicle['vehicle_id'], vehicle['longitude']), ('amb-1', 8533000))
+
+    def test_snapshot_is_built_once_per_source_version(self):
+        with mock.patch.object(
+            city_snapshot.CitySnapshotService, 'collect', autospec=True,
+            side_effect=city_snapshot.CitySnapshotService.collect
+        ) as collect:
+            first, _ = self.get()
+            second, _ = self.get()
+            self.assertEqual(first.content, second.content)
+            self.assertEqual(collect.call_count, 1)
+            bump_version(TRAFFIC)
+            self.get()
+            self.assertEqual(collect.call_count, 2)
+
+    def test_delta_carries_only_changes(self):
+        _, base = self.get()
+        self.feed({'27.71,85.3': 12.0})
+        bump_version(TRAFFIC)
+        self.vehicle.status = 'inactive'
+        self.vehicle.save()
+
+        response, delta = self.get(since=base['version'])
+        self.assertEqual((delta['kind'], delta['base_version']), ('delta', base['version']))
+        self.assertEqual(
+            [(row['latitude'], row['current_speed']) for row in delta['conditions']['upserted']],
+            [(2771000, 120)]
+        )
+        self.assertEqual(delta['alerts'], {'upserted': [], 'removed': []})
+        self.assertEqual(delta['vehicles']['removed'], [('amb-1',)])
+
+        self.assertEqual(
+            self.client.get('/api/snapshot/', {'since': base['version']}, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, 304
+        )
+
+    def test_unknown_base_gets_a_full_snapshot(self):
+        _, snapshot = self.get(since=12345)
+        self.assertEqual((snapshot['kind'], len(snapshot['conditions']['upserted'])), ('full', 2))
+        self.assertEqual(self.client.get('/api/snapshot/', {'since': 'latest'}).status_code, 400)
+
+class TestCitySnapshotFromDatabase(TestCase):
+    def setUp(self):
+        cache.clear()
+        city_snapshot._service = None
+        recent_store._store = None
+        self.addCleanup(setattr, recent_store, '_store', None)
+
+    def test_empty_database(self):
+        response = APIClient().get('/api/snapshot/')
+        self.assertEqual(response.status_code, 200)
+        snapshot = city_snapshot.decode(response.content)
+        for section in ('conditions', 'alerts', 'vehicles'):
+            self.assertEqual(snapshot[section], {'upserted': [], 'removed': []})
+
+    def test_saved_readings(self):
+        TrafficData.objects.create(
+            location='27.7,85.3', current_speed=12.5, free_flow_speed=40.0, road_closure=True,
+            timestamp=timezone.now()
+        )
+        snapshot = city_snapshot.decode(APIClient().get('/api/snapshot/').content)
+        [row] = snapshot['conditions']['upserted']
+        self.assertEqual((row['latitude'], row['current_speed']), (2770000, 125))
+        self.assertEqual(row['flags'], city_snapshot.CLOSURE_KNOWN | city_snapshot.CLOSED)
@@ -0,0 +1,84 @@
+import unittest
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from django.utils import timezone
+from traffic.models import Alert, EmergencyVehicle, TrafficData
+from traffic.services.resource_versions import ALERTS, bump_version, get_version
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        EmergencyVehicle.objects.create(vehicle_id='amb-1', status='active', current_location='27.7,85.3')
+
+    def test_etag_and_not_modified(self):
+        """A repeated request with the ETag gets a 304 without querying"""
+        response = self.client.get('/api/emergency-vehicles/active/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"emergency_vehicles-'))
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/emergency-vehicles/active/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(
+            '/api/emergency-vehicles/active/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        """Saving a vehicle bumps the version and the next body is rebuilt"""
+        etag = self.client.get('/api/emergency-vehicles/active/')['ETag']
+        EmergencyVehicle.objects.create(vehicle_id='amb-2', status='active')
+        response = self.client.get('/api/emergency-vehicles/active/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), 2)
+
+    def test_body_is_cached_per_version(self):
+        self.client.get('/api/emergency-vehicles/active/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/emergency-vehicles/active/')
+        self.assertEqual(len(response.data), 1)
+
+    def test_active_alerts_etag_rolls_with_window(self):
+        Alert.objects.create(location='27.7,85.3')
+        with mock.patch('traffic.conditional.time.time', return_value=1000.0):
+            first = self.client.get('/api/alerts/active_alerts/')['ETag']
+        with mock.patch('traffic.conditional.time.time', return_value=1070.0):
+            second = self.client.get('/api/alerts/active_alerts/')['ETag']
+        self.assertNotEqual(first, second)
+
+    def test_reading_writes_change_traffic_etag(self):
+        url = '/api/traffic-data/current_conditions/'
+        etag = self.client.get(url)['ETag']
+        reading = TrafficData.objects.create(location='27.7,85.3', current_speed=20.0, timestamp=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(url)['ETag']
+        reading.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_formats_have_their_own_etag(self):
+        url = '/api/emergency-vehicles/active/'
+        as_json = self.client.get(url, HTTP_ACCEPT='application/json')
+        as_msgpack = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertNotEqual(as_json['ETag'], as_msgpack['ETag'])
+        self.assertIn('Accept', as_msgpack['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=as_json['ETag'])
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=as_msgpack['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_bump_version_increments(self):
+        version, _ = get_version(ALERTS)
+        bump_version(ALERTS)
+        self.assertEqual(get_version(ALERTS)[0], version + 1)
+
+if __name__ == '__main__':
+    unittest.main()
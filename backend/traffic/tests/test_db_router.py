@@ -0,0 +1,68 @@
+import unittest
+from unittest import mock
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from traffic.db_router import ReplicaRouter, STICKY_COOKIE, replica_health, use_replica
+from traffic.models import Alert
+
+SEPARATE_REPLICA = (
+    'replica' in settings.DATABASES
+    and not settings.DATABASES['replica'].get('TEST', {}).get('MIRROR')
+)
+
+class TestReplicaRouter(TestCase):
+    def setUp(self):
+        replica_health.reset()
+        self.addCleanup(replica_health.reset)
+        self.router = ReplicaRouter()
+
+    def test_reads_outside_replica_scope_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(Alert))
+        self.assertEqual(self.router.db_for_write(Alert), 'default')
+
+    def test_falls_back_to_primary(self):
+        with override_settings(DATABASES={**settings.DATABASES, 'replica': {}}):
+            with mock.patch.object(replica_health, '_check', return_value=True):
+                with use_replica():
+                    self.assertEqual(self.router.db_for_read(Alert), 'replica')
+            replica_health.reset()
+            with mock.patch.object(replica_health, '_check', return_value=False) as check:
+                with use_replica():
+                    self.assertIsNone(self.router.db_for_read(Alert))
+                    self.assertIsNone(self.router.db_for_read(Alert))
+                # The failed check is cached between health checks
+                self.assertEqual(check.call_count, 1)
+
+        with override_settings(DATABASES={'default': settings.DATABASES['default']}):
+            with use_replica():
+                self.assertIsNone(self.router.db_for_read(Alert))
+
+@unittest.skipUnless(SEPARATE_REPLICA, 'needs a separate replica database')
+class TestReplicaReads(TestCase):
+    # The runner sets up every alias named here, skipped or not
+    databases = {'default', 'replica'} if SEPARATE_REPLICA else {'default'}
+
+    def setUp(self):
+        replica_health.reset()
+        self.addCleanup(replica_health.reset)
+        self.client = APIClient()
+        # Two diverging databases show which one served a read
+        Alert.objects.using('default').create(location='27.7,85.3', description='primary')
+        Alert.objects.using('replica').create(location='27.7,85.3', description='replica')
+
+    def descriptions(self):
+        response = self.client.get('/api/alerts/')
+        return [alert['description'] for alert in response.data['results']]
+
+    def test_read_only_viewsets_read_from_replica(self):
+        self.assertEqual(self.descriptions(), ['replica'])
+
+    def test_reads_after_a_write_stick_to_primary(self):
+        response = self.client.post('/api/geofences/', {'name': 'x', 'polygon': []}, format='json')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.descriptions(), ['primary'])
+
+    def test_unhealthy_replica_falls_back(self):
+        with mock.patch.object(replica_health, '_check', return_value=False):
+            self.assertEqual(self.descriptions(), ['primary'])
@@ -0,0 +1,84 @@
+import unittest
+from unittest import mock
+import numpy as np
+from django.test import TestCase
+from traffic.models import Route
+from traffic.services.fetch_planner import plan_fetches, tiles_for_bbox
+from traffic.services.traffic_collector import TrafficCollector
+
+def make_route(name, start, end):
+    return Route.objects.create(
+        name=name, description='', start_latitude=start[0], start_longitude=start[1],
+        end_latitude=end[0], end_longitude=end[1], waypoints=[]
+    )
+
+def segment(lat, lon, speed=30):
+    return {'coordinates': {'latitude': lat, 'longitude': lon}, 'currentSpeed': speed, 'freeFlowSpeed': 30}
+
+class FakeQueue:
+    def __init__(self):
+        self.readings = []
+        self.alerts = []
+
+    def put_reading(self, reading):
+        self.readings.append(reading)
+        return True
+
+    def put_alert(self, alert):
+        self.alerts.append(alert)
+        return True
+
+class TestFetchPlanner(TestCase):
+    def setUp(self):
+        # Three overlapping routes in the same few blocks
+        self.routes = [
+            make_route('a', (27.701, 85.301), (27.705, 85.305)),
+            make_route('b', (27.702, 85.302), (27.706, 85.306)),
+            make_route('c', (27.703, 85.303), (27.704, 85.304)),
+        ]
+
+    def test_tiles_cover_bbox(self):
+        self.assertEqual(tiles_for_bbox((0.01, 0.01, 0.03, 0.019), 0.02), [(0, 0), (1, 0)])
+
+    def test_overlapping_routes_share_tiles(self):
+        """API calls scale with covered area rather than route count"""
+        plan = plan_fetches(self.routes, tile_size=0.02, padding=0.01)
+        self.assertEqual(len(plan.tiles), 4)
+        self.assertEqual(plan.assignments, 12)
+        self.assertEqual(plan.fan_out_ratio, 3.0)
+
+    def test_fan_out_respects_route_bbox(self):
+        """Points are only delivered to routes whose padded bbox holds them"""
+        plan = plan_fetches(self.routes[:1], tile_size=0.02, padding=0.01)
+        tile = (int(85.30 // 0.02), int(27.70 // 0.02))
+        fanned = plan.fan_out(tile, np.array([27.703, 27.79]), np.array([85.303, 85.39]))
+        self.assertEqual({k: v.tolist() for k, v in fanned.items()}, {self.routes[0].id: [0]})
+
+    def test_collect_all_fetches_each_tile_once(self):
+        queue = FakeQueue()
+        collector = TrafficCollector(ingestion_queue=queue)
+        fetched = []
+
+        def fetch(bbox):
+            fetched.append(bbox)
+            min_lon, min_lat, max_lon, max_lat = map(float, bbox.split(','))
+            if min_lon <= 85.303 <= max_lon and min_lat <= 27.703 <= max_lat:
+                return [segment(27.703, 85.303), segment(27.7031, 85.3031, speed=5)]
+            return []
+
+        with mock.patch.object(collector, '_fetch_flow_segments', side_effect=fetch):
+            stats = collector.collect_all(Route.objects.all())
+
+        self.assertEqual(len(fetched), stats['tiles'])
+        self.assertEqual(stats['fetched_tiles'], stats['tiles'])
+        self.assertEqual(stats['failed_tiles'], 0)
+        # Readings and alerts go through the write-behind queue, once per route
+        self.assertEqual(len(queue.readings), 6)
+        self.assertEqual(
+            {(reading.road_segment_id, reading.location) for reading in queue.readings},
+            {(route.id, location) for route in self.routes for location in ('27.703,85.303', '27.7031,85.3031')}
+        )
+        self.assertEqual([alert.location for alert in queue.alerts], ['27.7031,85.3031'] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
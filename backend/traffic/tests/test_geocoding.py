@@ -0,0 +1,110 @@
+import unittest
+from unittest import mock
+from django.test import TestCase
+from rest_framework.test import APIClient
+from traffic.services.road_network import RoadNetwork
+from traffic.services.geocoding_service import ReverseGeocoder
+
+EXTRACT = [
+    {
+        'type': 'Feature',
+        'properties': {'name': 'Ring Road', 'maxspeed': '50'},
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [[85.300, 27.700], [85.310, 27.700], [85.320, 27.700]],
+        },
+    },
+    {
+        'type': 'Feature',
+        'properties': {'name': 'Durbar Marg'},
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [[85.300, 27.710], [85.300, 27.720]],
+        },
+    },
+    {
+        'type': 'Feature',
+        'properties': {'name': 'Kathmandu', 'admin_level': 6},
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [[[85.29, 27.69], [85.33, 27.69], [85.33, 27.73], [85.29, 27.73], [85.29, 27.69]]],
+        },
+    },
+    {
+        'type': 'Feature',
+        'properties': {'name': 'Thamel', 'admin_level': 10},
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [[[85.295, 27.705], [85.305, 27.705], [85.305, 27.725], [85.295, 27.725], [85.295, 27.705]]],
+        },
+    },
+]
+
+class TestReverseGeocoder(TestCase):
+    def setUp(self):
+        self.geocoder = ReverseGeocoder(RoadNetwork(EXTRACT), max_distance_m=100)
+
+    def test_nearest_road_and_area(self):
+        """Points resolve to the closest road and the most specific area"""
+        result = self.geocoder.reverse_geocode(27.7002, 85.315)
+        self.assertEqual(result['road'], 'Ring Road')
+        self.assertEqual(result['area'], 'Kathmandu')
+        self.assertLess(result['distance_m'], 30)
+
+        result = self.geocoder.reverse_geocode(27.715, 85.3002)
+        self.assertEqual(result['road'], 'Durbar Marg')
+        self.assertEqual(result['area'], 'Thamel')
+        self.assertEqual(result['label'], 'Durbar Marg, Thamel')
+
+    def test_out_of_range(self):
+        """Points far from any road or area resolve to nothing"""
+        result = self.geocoder.reverse_geocode(27.80, 85.50)
+        self.assertIsNone(result['road'])
+        self.assertIsNone(result['area'])
+        self.assertIsNone(result['label'])
+
+    def test_batch_matches_single_lookups(self):
+        """Batch results line up with the input order"""
+        lats = [27.7002, 27.80, 27.715, 27.6999]
+        lons = [85.315, 85.50, 85.3002, 85.301]
+        batch = self.geocoder.reverse_geocode_batch(lats, lons)
+        self.assertEqual(len(batch), 4)
+        for lat, lon, result in zip(lats, lons, batch):
+            self.assertEqual(result, self.geocoder.reverse_geocode(lat, lon))
+
+    def test_label_locations(self):
+        """Raw location strings are labelled, bad strings map to None"""
+        labels = self.geocoder.label_locations(['27.7002,85.315', 'garbage', '27.7002,85.315'])
+        self.assertEqual(labels, {
+            '27.7002,85.315': 'Ring Road, Kathmandu',
+            'garbage': None,
+        })
+
+class TestReverseGeocodeBatchEndpoint(TestCase):
+    URL = '/api/locations/reverse_geocode_batch/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.geocoder = ReverseGeocoder(RoadNetwork(EXTRACT), max_distance_m=100)
+        mock.patch('traffic.views.get_reverse_geocoder', return_value=self.geocoder).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_points_and_locations(self):
+        response = self.client.post(self.URL, {'points': [[27.7002, 85.315]]}, format='json')
+        self.assertEqual(response.data['results'][0]['label'], 'Ring Road, Kathmandu')
+        response = self.client.post(self.URL, {'locations': ['27.7002,85.315']}, format='json')
+        self.assertEqual(response.data['results'][0]['label'], 'Ring Road, Kathmandu')
+
+    def test_non_list_input_is_rejected(self):
+        for body in ({'points': 5}, {'points': '27.7,85.3'}, {'locations': 5}, {'locations': {'a': 1}}):
+            response = self.client.post(self.URL, body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.client.post(self.URL, {}, format='json').status_code, 400)
+
+    def test_missing_road_network(self):
+        self.geocoder.network = RoadNetwork()
+        response = self.client.post(self.URL, {'points': [[27.7002, 85.315]]}, format='json')
+        self.assertEqual(response.status_code, 503)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import time
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from traffic.models import Alert, Geofence, GeofenceEvent
+from traffic.services.geofence_engine import FenceIndex, GeofenceEngine
+
+def square(lat, lon, size):
+    return [
+        {'latitude': lat, 'longitude': lon},
+        {'latitude': lat, 'longitude': lon + size},
+        {'latitude': lat + size, 'longitude': lon + size},
+        {'latitude': lat + size, 'longitude': lon},
+    ]
+
+# An L shape: the top-right quarter of the unit square is outside
+L_SHAPE = [
+    {'latitude': 0.0, 'longitude': 0.0},
+    {'latitude': 0.0, 'longitude': 0.02},
+    {'latitude': 0.01, 'longitude': 0.02},
+    {'latitude': 0.01, 'longitude': 0.01},
+    {'latitude': 0.02, 'longitude': 0.01},
+    {'latitude': 0.02, 'longitude': 0.0},
+]
+
+class TestFenceIndex(TestCase):
+    def test_concave_and_overlapping_fences(self):
+        fences = [
+            Geofence(id=1, name='L', polygon=L_SHAPE),
+            Geofence(id=2, name='sq', polygon=square(0.005, 0.005, 0.01)),
+        ]
+        index = FenceIndex(fences)
+        lats = np.array([0.003, 0.012, 0.008, 0.03, np.nan])
+        lons = np.array([0.003, 0.012, 0.008, 0.03, 0.0])
+        points, positions = index.contains(lats, lons)
+        found = sorted(zip(points.tolist(), index.fence_ids[positions].tolist()))
+        self.assertEqual(found, [(0, 1), (1, 2), (2, 1), (2, 2)])
+
+    def test_matches_brute_force_on_many_fences(self):
+        rng = np.random.default_rng(1)
+        fences = [
+            Geofence(id=i + 1, name=f'f{i}', polygon=square(*rng.random(2) * 0.5, 0.01 + rng.random() * 0.02))
+            for i in range(2000)
+        ]
+        index = FenceIndex(fences)
+        lats, lons = rng.random(5000) * 0.52, rng.random(5000) * 0.52
+
+        started = time.perf_counter()
+        points, positions = index.contains(lats, lons)
+        self.assertLess(time.perf_counter() - started, 2.0)
+
+        corners = np.array([[f.polygon[0]['latitude'], f.polygon[0]['longitude'], f.polygon[2]['latitude'], f.polygon[2]['longitude']] for f in fences])
+        inside = (
+            (lats[:, None] > corners[None, :, 0]) & (lats[:, None] < corners[None, :, 2])
+            & (lons[:, None] > corners[None, :, 1]) & (lons[:, None] < corners[None, :, 3])
+        )
+        expected = set(zip(*np.nonzero(inside)))
+        self.assertEqual(set(zip(points.tolist(), positions.tolist())), expected)
+
+class TestGeofenceEngine(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def engine(self, **kwargs):
+        return GeofenceEngine(
+            fences=[Geofence(id=7, name='school', fence_type='SCHOOL', polygon=square(27.7, 85.3, 0.01))],
+            **kwargs
+        )
+
+    def test_enter_and_exit_events(self):
+        received = []
+        engine = GeofenceEngine(
+            fences=[Geofence(id=7, name='school', fence_type='SCHOOL', polygon=square(27.7, 85.3, 0.01))],
+            listeners=[received.append]
+        )
+        self.assertEqual(engine.evaluate_positions(['a', 'b'], [27.69, 27.69], [85.3, 85.3]), [])
+
+        events = engine.evaluate_positions(['a', 'b'], [27.705, 27.69], [85.305, 85.3])
+        self.assertEqual([(e.subject, e.event, e.fence_id) for e in events], [('a', 'ENTER', 7)])
+        # Still inside, and unparseable positions change nothing
+        self.assertEqual(engine.evaluate_positions(['a', 'b'], [27.706, np.nan], [85.306, np.nan]), [])
+
+        events = engine.evaluate_positions(['a'], [27.8], [85.3])
+        self.assertEqual([(e.subject, e.event, e.fence_type) for e in events], [('a', 'EXIT', 'SCHOOL')])
+        self.assertEqual(len(received), 2)
+
+    def test_workers_share_presence(self):
+        """Consecutive positions on different workers give one ENTER and one EXIT"""
+        first, second = self.engine(), self.engine()
+        events = first.evaluate_positions(['a'], [27.705], [85.305])
+        events += second.evaluate_positions(['a'], [27.706], [85.306])
+        events += first.evaluate_positions(['a'], [27.707], [85.307])
+        events += second.evaluate_positions(['a'], [27.8], [85.3])
+        self.assertEqual([e.event for e in events], ['ENTER', 'EXIT'])
+        self.assertIsNone(cache.get('geofence_inside:a'))
+
+    def test_idle_subjects_are_forgotten(self):
+        engine = self.engine(presence_ttl=0.05)
+        engine.evaluate_positions(['a'], [27.705], [85.305])
+        time.sleep(0.1)
+        events = engine.evaluate_positions(['a'], [27.705], [85.305])
+        self.assertEqual([e.event for e in events], ['ENTER'])
+
+    def test_database_fences_reload_and_events_are_stored(self):
+        cache.clear()
+        client = APIClient()
+        response = client.post('/api/geofences/', {
+            'name': 'hospital', 'fence_type': 'EMERGENCY', 'polygon': square(27.7, 85.3, 0.01)
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        bad = client.post('/api/geofences/', {'name': 'x', 'polygon': square(0, 0, 1)[:2]}, format='json')
+        self.assertEqual(bad.status_code, 400)
+
+        response = client.post('/api/geofences/evaluate/', {
+            'subjects': ['amb-1'], 'lat': [27.705], 'lon': [85.305]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['events'][0]['event'], 'ENTER')
+
+        Alert.objects.create(location='27.701,85.301', severity='HIGH')
+        self.assertEqual(
+            sorted(GeofenceEvent.objects.values_list('event', flat=True)), ['ALERT', 'ENTER']
+        )
+
+        response = client.get('/api/geofences/containing/', {'location': '27.705,85.305'})
+        self.assertEqual([fence['name'] for fence in response.data], ['hospital'])
+        response = client.get('/api/geofences/events/', {'subject': 'amb-1'})
+        self.assertEqual(response.data['count'], 1)
+
+        Geofence.objects.update(active=False)
+        Geofence.objects.first().save()
+        response = client.get('/api/geofences/containing/', {'location': '27.705,85.305'})
+        self.assertEqual(response.data, [])
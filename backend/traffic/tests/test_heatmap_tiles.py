@@ -0,0 +1,118 @@
+import struct
+import zlib
+from unittest import mock
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from traffic.models import TrafficData
+from traffic.services import heatmap_tiles, recent_store
+from traffic.services.heatmap_tiles import HeatmapRenderer, kernel_density, tiles_for_bbox, to_pixels
+from traffic.services.recent_store import RecentReadingsStore
+from traffic.services.resource_versions import TRAFFIC, bump_version
+
+def read_png(data):
+    """RGBA pixels of a PNG written by encode_png (single IDAT, Up filter)"""
+    assert data[:8] == heatmap_tiles.PNG_SIGNATURE
+    width, height = struct.unpack('>II', data[16:24])
+    idat_length = struct.unpack('>I', data[33:37])[0]
+    raw = np.frombuffer(zlib.decompress(data[41:41 + idat_length]), dtype=np.uint8)
+    rows = raw.reshape(height, width * 4 + 1)
+    assert (rows[:, 0] == 2).all()
+    return np.cumsum(rows[:, 1:], axis=0, dtype=np.uint8).reshape(height, width, 4)
+
+CONGESTED = (27.7, 85.32)
+
+@override_settings(HEATMAP_SIGMA_PX=8, HEATMAP_SATURATION=1.0)
+class TestHeatmapTiles(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.store = RecentReadingsStore(max_locations=16, depth=4)
+        # One jammed location, one free-flowing one that draws nothing
+        self.store.append_batch(
+            [f'{CONGESTED[0]},{CONGESTED[1]}', '27.71,85.3'], [1_700_000_000.0] * 2, [4.0, 40.0], [40.0, 40.0]
+        )
+        mock.patch.object(self.store, 'sync_from_db').start()
+        self.addCleanup(mock.patch.stopall)
+        heatmap_tiles._renderer = HeatmapRenderer(store=self.store)
+        self.addCleanup(setattr, heatmap_tiles, '_renderer', None)
+
+    def tile_of(self, zoom):
+        px, py = to_pixels([CONGESTED[0]], [CONGESTED[1]], zoom)
+        return int(px[0] // 256), int(py[0] // 256), int(px[0] % 256), int(py[0] % 256)
+
+    def test_kernel_is_continuous_across_tiles(self):
+        # A point on the shared edge of two tiles, weighted 0.5
+        left = kernel_density(np.array([256.0]), np.array([100.5]), np.array([0.5]), 8.0)
+        right = kernel_density(np.array([0.0]), np.array([100.5]), np.array([0.5]), 8.0)
+        np.testing.assert_allclose(left[:, -1], right[:, 0], rtol=1e-6)
+        self.assertAlmostEqual(float(left[100, -1]), 0.5 * np.exp(-0.5 * (0.5 / 8) ** 2), places=5)
+
+    def test_tile_draws_congestion_where_it_is(self):
+        x, y, col, row = self.tile_of(14)
+        response = self.client.get(f'/api/heatmap/14/{x}/{y}.png')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        pixels = read_png(response.content)
+        self.assertEqual(pixels.shape, (256, 256, 4))
+        # Density 0.9 under the reading, fading out with distance
+        self.assertGreater(pixels[row, col, 3], 180)
+        self.assertGreater(pixels[row, col, 0], pixels[row, col, 1])
+        self.assertEqual(pixels[row, (col + 60) % 256, 3], 0)
+
+        empty = self.client.get(f'/api/heatmap/14/{x + 5}/{y}.png')
+        self.assertEqual(empty.content, heatmap_tiles.EMPTY_TILE)
+
+    def test_tiles_are_cached_per_traffic_version(self):
+        x, y, _, _ = self.tile_of(13)
+        url = f'/api/heatmap/13/{x}/{y}.png'
+        with mock.patch.object(HeatmapRenderer, 'render', autospec=True, side_effect=HeatmapRenderer.render) as render:
+            first = self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+            bump_version(TRAFFIC)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+            self.assertEqual(render.call_count, 2)
+
+    def test_invalid_tiles(self):
+        self.assertEqual(self.client.get('/api/heatmap/2/4/0.png').status_code, 400)
+        self.assertEqual(self.client.get('/api/heatmap/30/0/0.png').status_code, 400)
+
+    def test_precompute_covers_the_service_area_once_per_version(self):
+        bbox = (85.2443, 27.6258, 85.5419, 27.8075)
+        expected = sum(len(tiles_for_bbox(bbox, zoom)) for zoom in (11, 12))
+        renderer = heatmap_tiles._renderer
+        self.assertEqual(renderer.precompute(bbox, [11, 12])['tiles'], expected)
+        self.assertEqual(renderer.precompute(bbox, [11, 12])['tiles'], 0)
+        x, y, _, _ = self.tile_of(12)
+        with mock.patch.object(HeatmapRenderer, 'render') as render:
+            self.client.get(f'/api/heatmap/12/{x}/{y}.png')
+        render.assert_not_called()
+
+class TestHeatmapTilesFromDatabase(TestCase):
+    def setUp(self):
+        cache.clear()
+        heatmap_tiles._renderer = None
+        recent_store._store = None
+        self.addCleanup(setattr, recent_store, '_store', None)
+
+    def test_saved_readings_are_drawn(self):
+        TrafficData.objects.create(
+            location=f'{CONGESTED[0]},{CONGESTED[1]}', current_speed=4.0, free_flow_speed=40.0,
+            timestamp=timezone.now()
+        )
+        px, py = to_pixels([CONGESTED[0]], [CONGESTED[1]], 14)
+        x, y = int(px[0] // 256), int(py[0] // 256)
+        response = APIClient().get(f'/api/heatmap/14/{x}/{y}.png')
+        self.assertEqual(response.status_code, 200)
+        pixels = read_png(response.content)
+        self.assertGreater(pixels[int(py[0] % 256), int(px[0] % 256), 3], 0)
+
+    def test_precompute_on_an_empty_database(self):
+        stats = heatmap_tiles.get_heatmap_renderer().precompute(zooms=[11])
+        self.assertEqual(stats['tiles'], len(tiles_for_bbox(
+            [float(v) for v in settings.HEATMAP_SERVICE_AREA.split(',')], 11
+        )))
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+from django.test import TransactionTestCase
+from traffic.models import Alert, TrafficData
+from traffic.services.ingestion_queue import IngestionQueue, _detect_incidents_for
+from traffic.services.traffic_simulator import TrafficSimulator
+
+def make_alert(i):
+    return Alert(location=f'27.7,85.{i}', alert_type='CONGESTION', severity='LOW')
+
+class TestIngestionQueue(TransactionTestCase):
+    def test_flush_on_size_and_drain_on_close(self):
+        """Alerts are written in batches and the rest on close"""
+        written = []
+        ingestion = IngestionQueue(
+            batch_size=10, flush_interval=60, on_alerts_written=[written.append]
+        ).start()
+        for i in range(25):
+            ingestion.put_alert(make_alert(i))
+        ingestion.close(drain=True)
+
+        self.assertEqual(Alert.objects.count(), 25)
+        self.assertEqual([len(batch) for batch in written], [10, 10, 5])
+        metrics = ingestion.metrics()
+        self.assertEqual(metrics['written_alerts'], 25)
+        self.assertEqual(metrics['depth'], 0)
+        self.assertFalse(metrics['running'])
+
+    def test_flush_on_time(self):
+        """A partial batch is written once the flush interval passes"""
+        ingestion = IngestionQueue(batch_size=1000, flush_interval=0.05).start()
+        ingestion.put_alert(make_alert(1))
+        self.assertTrue(ingestion.flush(timeout=5))
+        self.assertEqual(Alert.objects.count(), 1)
+        ingestion.close()
+
+    def test_drop_newest_when_full(self):
+        """drop_newest rejects items once the queue is full"""
+        ingestion = IngestionQueue(max_size=2, policy='drop_newest')
+        results = [ingestion.put_alert(make_alert(i)) for i in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(ingestion.metrics()['dropped'], 2)
+        self.assertEqual(ingestion.depth, 2)
+
+    def test_drop_oldest_when_full(self):
+        """drop_oldest keeps the most recent items"""
+        ingestion = IngestionQueue(max_size=2, policy='drop_oldest', flush_interval=60)
+        for i in range(4):
+            self.assertTrue(ingestion.put_alert(make_alert(i)))
+        ingestion.start().close(drain=True)
+        self.assertEqual(
+            sorted(Alert.objects.values_list('location', flat=True)),
+            ['27.7,85.2', '27.7,85.3']
+        )
+
+    def test_block_policy_times_out(self):
+        """block applies backpressure and gives up after the timeout"""
+        ingestion = IngestionQueue(max_size=1, policy='block', block_timeout=0.01)
+        self.assertTrue(ingestion.put_alert(make_alert(1)))
+        self.assertFalse(ingestion.put_alert(make_alert(2)))
+
+    def test_closed_queue_rejects_items(self):
+        ingestion = IngestionQueue().start()
+        ingestion.close()
+        with self.assertRaises(RuntimeError):
+            ingestion.put_alert(make_alert(1))
+
+    def test_simulated_readings_are_saved_and_scored(self):
+        """Queued readings land as TrafficData rows and reach the incident hook"""
+        ingestion = IngestionQueue(
+            batch_size=100, flush_interval=60, on_readings_written=[_detect_incidents_for]
+        ).start()
+        with mock.patch('traffic.services.ingestion_queue.detect_incidents') as detect:
+            count = TrafficSimulator(ingestion_queue=ingestion).sweep('85.3,27.7,85.31,27.705')
+            ingestion.close(drain=True)
+
+        rows = list(TrafficData.objects.order_by('id'))
+        self.assertEqual(len(rows), count)
+        self.assertEqual(rows[0].location, '27.7,85.3')
+        self.assertEqual(rows[0].free_flow_speed, 40.0)
+        self.assertIsNone(rows[0].road_segment_id)
+        locations, speeds, _ = detect.call_args.args
+        self.assertEqual(locations, [row.location for row in rows])
+        self.assertEqual(speeds, [row.current_speed for row in rows])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            IngestionQueue(policy='spill')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import numpy as np
+from django.test import TestCase
+from traffic.services.road_network import RoadNetwork
+from traffic.models import TrafficData
+from traffic.services.map_matching import MapMatcher, StreamFlusher, StreamingMatcher
+
+# Two parallel east-west roads ~110 m apart joined by a short connector
+EXTRACT = [
+    {
+        'type': 'Feature',
+        'properties': {'name': 'Ring Road', 'maxspeed': '60'},
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [[85.300, 27.700], [85.305, 27.700], [85.310, 27.700]],
+        },
+    },
+    {
+        'type': 'Feature',
+        'properties': {'name': 'Service Lane'},
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [[85.300, 27.701], [85.310, 27.701]],
+        },
+    },
+]
+
+def drive(start_lon, end_lon, lat, points, seconds_per_point=5.0, noise=0.0):
+    lons = np.linspace(start_lon, end_lon, points)
+    lats = np.full(points, lat) + noise
+    timestamps = np.arange(points) * seconds_per_point
+    return lats, lons, timestamps
+
+class TestMapMatcher(TestCase):
+    def setUp(self):
+        self.matcher = MapMatcher(RoadNetwork(EXTRACT))
+
+    def test_matches_noisy_trace_to_nearest_road(self):
+        """A trace just north of Ring Road stays on Ring Road"""
+        lats, lons, ts = drive(85.301, 85.309, 27.70015, 9)
+        result = self.matcher.match_traces({'car': (lats, lons, ts)})
+        self.assertEqual(len(result['car']), 9)
+        self.assertEqual({p.road for p in result['car']}, {'Ring Road'})
+
+    def test_points_without_candidates_are_skipped(self):
+        """Fixes far from every road are left unmatched"""
+        lats, lons, ts = drive(85.301, 85.309, 27.70015, 5)
+        lats[2] = 27.80
+        result = self.matcher.match_traces({'car': (lats, lons, ts)})
+        self.assertEqual([p.index for p in result['car']], [0, 1, 3, 4])
+
+    def test_segment_speeds(self):
+        """Observed speeds come out per segment in km/h"""
+        # ~98 m every 5 s is roughly 70 km/h
+        lats, lons, ts = drive(85.301, 85.309, 27.7000, 9)
+        result = self.matcher.match_traces({'a': (lats, lons, ts), 'b': (lats, lons, ts)})
+        speeds = self.matcher.segment_speeds(result)
+        self.assertTrue(speeds)
+        for speed in speeds:
+            self.assertEqual(speed.road, 'Ring Road')
+            self.assertEqual(speed.free_flow_speed, 60.0)
+            self.assertAlmostEqual(speed.speed_kmh, 70.6, delta=3)
+
+    def test_streaming_matches_batch(self):
+        """The fixed-lag streaming matcher agrees with batch matching"""
+        lats, lons, ts = drive(85.301, 85.309, 27.70015, 9)
+        batch = self.matcher.match_traces({'car': (lats, lons, ts)})['car']
+
+        streaming = StreamingMatcher(self.matcher, lag=2)
+        points = []
+        for lat, lon, t in zip(lats, lons, ts):
+            points.extend(streaming.push_batch(['car'], [lat], [lon], [t]).get('car', []))
+        points.extend(streaming.flush('car'))
+
+        self.assertEqual([p.segment_id for p in points], [p.segment_id for p in batch])
+        self.assertTrue(streaming.drain_speeds())
+        self.assertEqual(streaming.pending_observations, 0)
+
+    def test_idle_and_excess_vehicles_are_flushed(self):
+        """Streaming state is bounded by an idle TTL and a vehicle cap"""
+        now = [0.0]
+        streaming = StreamingMatcher(self.matcher, lag=20, idle_ttl=60, max_vehicles=2, clock=lambda: now[0])
+        lats, lons, ts = drive(85.301, 85.309, 27.70015, 9)
+        for lat, lon, t in zip(lats, lons, ts):
+            streaming.push_batch(['a'], [lat], [lon], [t])
+        streaming.push_batch(['b'], [lats[0]], [lons[0]], [ts[0]])
+        self.assertEqual(len(streaming), 2)
+
+        # A third vehicle pushes out the least recently seen one, whose points are finalised
+        streaming.push_batch(['c'], [lats[0]], [lons[0]], [ts[0]])
+        self.assertEqual(sorted(streaming._state), ['b', 'c'])
+        self.assertTrue(streaming.drain_speeds())
+
+        now[0] = 30
+        streaming.push_batch(['c'], [lats[1]], [lons[1]], [ts[1]])
+        now[0] = 61
+        self.assertEqual(streaming.expire(), 1)
+        self.assertEqual(list(streaming._state), ['c'])
+
+    def test_flusher_saves_speeds_of_quiet_vehicles(self):
+        """Idle vehicles are saved without another push, the rest at close"""
+        now = [0.0]
+        streaming = StreamingMatcher(self.matcher, lag=20, idle_ttl=60, clock=lambda: now[0])
+        flusher = StreamFlusher(streaming)
+        lats, lons, ts = drive(85.301, 85.309, 27.70015, 9)
+        for lat, lon, t in zip(lats, lons, ts):
+            streaming.push_batch(['a', 'b'], [lat, lat], [lon, lon], [t, t])
+        self.assertEqual(flusher.flush(), {'finalised': 0, 'tracked': 2, 'segments': 0})
+
+        now[0] = 30
+        streaming.push_batch(['b'], [lats[-1]], [lons[-1]], [ts[-1] + 1])
+        now[0] = 61
+        stats = flusher.flush()
+        self.assertEqual((stats['finalised'], stats['tracked']), (1, 1))
+        self.assertGreater(stats['segments'], 0)
+        saved = TrafficData.objects.count()
+        self.assertEqual(saved, stats['segments'])
+
+        flusher.close()
+        self.assertEqual(len(streaming), 0)
+        self.assertGreater(TrafficData.objects.count(), saved)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import time
+from unittest import mock
+import msgpack
+import numpy as np
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from traffic.models import TrafficData
+from traffic.services import recent_store
+from traffic.services.ingestion_queue import IngestionQueue
+from traffic.services.probe_ingestion import (
+    ProbeBatchError, ProbeIngestionService, aggregate_probes, parse_probe_payload
+)
+
+class FakeQueue:
+    def __init__(self):
+        self.readings = []
+
+    def put_reading(self, reading):
+        self.readings.append(reading)
+        return True
+
+class TestAggregateProbes(TestCase):
+    def setUp(self):
+        recent_store._store = None
+        self.addCleanup(setattr, recent_store, '_store', None)
+
+    def test_rejects_invalid_and_duplicate_readings(self):
+        now = 1_700_000_000.0
+        lat = np.array([27.7001, 27.7002, 27.7002, 95.0, 27.7, 27.7])
+        lon = np.array([85.3001, 85.3002, 85.3002, 85.3, 85.3, 85.3])
+        speed = np.array([20.0, 30.0, 30.0, 20.0, -1.0, 20.0])
+        ts = np.array([now, now, now, now, now, now - 7200])
+        result = aggregate_probes(lat, lon, speed, ts, now=now)
+
+        self.assertEqual(result.stats['received'], 6)
+        self.assertEqual(result.stats['rejected'], 3)
+        self.assertEqual(result.stats['duplicates'], 1)
+        # Both remaining probes fall into the same cell and bucket
+        self.assertEqual(result.stats['aggregated'], 1)
+        self.assertAlmostEqual(result.speed[0], 25.0)
+        self.assertEqual(result.samples[0], 2)
+        self.assertEqual(result.locations, ['27.700500,85.300500'])
+
+    def test_device_ids_deduplicate_per_device_and_time(self):
+        now = 1_700_000_000.0
+        columns = parse_probe_payload({
+            'rows': [[27.7, 85.3, 20, now], [27.7001, 85.3, 22, now], [27.7, 85.3, 20, now]],
+            'device': ['a', 'a', 'b'],
+        })
+        result = aggregate_probes(
+            columns['lat'], columns['lon'], columns['speed'], columns['ts'],
+            device=columns['device'], now=now
+        )
+        self.assertEqual(result.stats['duplicates'], 1)
+        self.assertEqual(result.samples.sum(), 2)
+
+    def test_buckets_split_by_time(self):
+        now = 1_700_000_040.0
+        result = aggregate_probes(
+            np.full(4, 27.7), np.full(4, 85.3), np.array([10.0, 20.0, 30.0, 40.0]),
+            np.array([now - 120, now - 110, now, now]), now=now, bucket_seconds=60
+        )
+        self.assertEqual(result.stats['aggregated'], 2)
+        np.testing.assert_allclose(result.speed, [15.0, 35.0])
+
+    def test_malformed_payloads(self):
+        with self.assertRaises(ProbeBatchError):
+            parse_probe_payload({'lat': [1], 'lon': [1], 'speed': [1]})
+        with self.assertRaises(ProbeBatchError):
+            parse_probe_payload({'lat': [1, 2], 'lon': [1], 'speed': [1], 'ts': [1]})
+        with self.assertRaises(ProbeBatchError):
+            parse_probe_payload({'rows': [[1, 2, 3]]})
+        with self.assertRaises(ProbeBatchError):
+            parse_probe_payload({'lat': ['x'], 'lon': [1], 'speed': [1], 'ts': [1]})
+
+    def test_large_batch_is_aggregated(self):
+        now = time.time()
+        size = 50000
+        rng = np.random.default_rng(0)
+        queue = FakeQueue()
+        payload = {
+            'lat': (27.70 + rng.random(size) * 0.01).tolist(),
+            'lon': (85.30 + rng.random(size) * 0.01).tolist(),
+            'speed': (rng.random(size) * 60).tolist(),
+            'ts': (now - rng.random(size) * 300).tolist(),
+        }
+        stats = ProbeIngestionService(ingestion_queue=queue).ingest(payload, now=now)
+        self.assertEqual(stats['received'], size)
+        self.assertEqual(stats['rejected'], 0)
+        self.assertEqual(stats['enqueued'], len(queue.readings))
+        self.assertLessEqual(stats['aggregated'], 100 * 6 + 100 * 6)
+
+class TestBulkEndpoint(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.queue = IngestionQueue(flush_interval=60)
+        mock.patch('traffic.services.probe_ingestion.get_ingestion_queue', return_value=self.queue).start()
+        self.addCleanup(mock.patch.stopall)
+        recent_store._store = None
+        self.addCleanup(setattr, recent_store, '_store', None)
+
+    def test_columnar_json_is_saved(self):
+        TrafficData.objects.create(
+            location='27.700500,85.300500', current_speed=40.0, free_flow_speed=45.0, timestamp=timezone.now()
+        )
+        now = time.time()
+        response = self.client.post('/api/traffic-data/bulk/', {
+            'lat': [27.7001, 27.7002], 'lon': [85.3001, 85.3002], 'speed': [20, 30], 'ts': [now, now]
+        }, format='json')
+        self.assertEqual(response.status_code, 202, response.data)
+        self.queue.start().close(drain=True)
+
+        reading = TrafficData.objects.order_by('-id').first()
+        self.assertEqual(reading.location, '27.700500,85.300500')
+        self.assertEqual((reading.latitude, reading.longitude), (27.7005, 85.3005))
+        self.assertEqual(reading.current_speed, 25.0)
+        # Free flow comes from what the location reported before
+        self.assertEqual(reading.free_flow_speed, 45.0)
+        self.assertEqual(reading.current_travel_time, int(3600 * 45 / 25))
+
+    def test_msgpack_rows(self):
+        now = time.time()
+        body = msgpack.packb({'rows': [[27.7, 85.3, 20.0, now], [27.7, 85.3, 30.0, now]]})
+        response = self.client.post(
+            '/api/traffic-data/bulk/', body, content_type='application/msgpack'
+        )
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(response.data['enqueued'], 1)
+        self.queue.start().close(drain=True)
+        reading = TrafficData.objects.get()
+        self.assertEqual(reading.current_speed, 25.0)
+        self.assertAlmostEqual(reading.confidence, 0.4)
+
+    def test_rejects_malformed_and_oversized(self):
+        response = self.client.post('/api/traffic-data/bulk/', {'lat': [1]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.settings(PROBE_MAX_BATCH=1):
+            response = self.client.post('/api/traffic-data/bulk/', {
+                'lat': [27.7, 27.7], 'lon': [85.3, 85.3], 'speed': [1, 2], 'ts': [0, 0]
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.queue.depth, 0)
@@ -0,0 +1,60 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from traffic.models import Route, RouteETA
+from traffic.query_budget import QueryBudgetExceeded, QueryBudgetTestMixin, query_shape
+from traffic.views import RouteViewSet
+
+class TestQueryShape(TestCase):
+    def test_literals_and_in_lists_collapse(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "name" = \'x\' LIMIT 21'),
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s) AND "name" = \'y\'  LIMIT 5'),
+        )
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class TestQueryBudget(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(6):
+            route = Route.objects.create(
+                name=f'route {i}', description='x', start_latitude=27.7, start_longitude=85.3,
+                end_latitude=27.7, end_longitude=85.32, waypoints=[]
+            )
+            RouteETA.objects.create(
+                route=route, distance_m=1000, free_flow_seconds=90, eta_seconds=120, computed_at=timezone.now()
+            )
+
+    def test_repeated_query_shape_is_reported_with_its_caller(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with self.assertQueryBudget(20):
+                for route in Route.objects.all():
+                    route.eta
+        self.assertIn('N+1: 6 x', str(raised.exception))
+        self.assertIn('test_query_budget.py', str(raised.exception))
+
+    def test_declared_action_budget_holds(self):
+        response = self.client.get('/api/routes/')
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_list_regression_fails_the_request(self):
+        # Dropping select_related('eta') turns the list into one query per route
+        with mock.patch.object(RouteViewSet, 'queryset', Route.objects.order_by('id')):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                self.client.get('/api/routes/')
+        self.assertIn('GET /api/routes/', str(raised.exception))
+
+    async def test_budget_holds_under_asgi(self):
+        # The sync view runs in the thread-sensitive worker, where the monitor is installed
+        with mock.patch.object(RouteViewSet, 'queryset', Route.objects.order_by('id')):
+            with self.assertRaises(QueryBudgetExceeded):
+                await self.async_client.get('/api/routes/')
+
+    @override_settings(QUERY_BUDGET_MODE='log', QUERY_BUDGET_SAMPLE_RATE=1.0)
+    def test_sampling_mode_logs_instead(self):
+        with mock.patch.object(RouteViewSet, 'queryset', Route.objects.order_by('id')):
+            with self.assertLogs('traffic.query_budget', 'WARNING') as logs:
+                response = self.client.get('/api/routes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('N+1', logs.output[0])
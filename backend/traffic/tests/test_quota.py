@@ -0,0 +1,103 @@
+import unittest
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from traffic.models import QuotaBucket
+from traffic.services.quota import EndpointQuota, QuotaExceeded, QuotaScheduler
+from traffic.services.tomtom_service import TomTomService
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class TestEndpointQuota(TestCase):
+    def test_refills_at_rate_up_to_capacity(self):
+        wall = FakeClock(1792396800.0)
+        # Capacity 2 and 0.5 tokens per second
+        quota = EndpointQuota('flow', 43202, burst_seconds=4, wall_clock=wall)
+        quota.acquire()
+        quota.acquire()
+        with self.assertRaises(QuotaExceeded) as raised:
+            quota.acquire()
+        self.assertAlmostEqual(raised.exception.retry_after, 2.0, places=2)
+        wall.now += 100
+        self.assertAlmostEqual(quota.available, 2, places=2)
+
+    def test_workers_share_one_budget(self):
+        """Each process builds its own quota objects; the bucket row is shared"""
+        wall = FakeClock(1792396800.0)
+        workers = [EndpointQuota('flow', 96, burst_seconds=1800, wall_clock=wall) for _ in range(3)]
+        workers[0].acquire()
+        workers[1].acquire()
+        with self.assertRaises(QuotaExceeded):
+            workers[2].acquire()
+        self.assertEqual([worker.used_today for worker in workers], [2, 2, 2])
+        self.assertEqual(QuotaBucket.objects.get().used, 2)
+
+class TestQuotaScheduler(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        self.wall = FakeClock(1792396800.0)  # 08:00 UTC
+        self.scheduler = QuotaScheduler(
+            {'flow': 96}, burst_seconds=1800, clock=self.clock, wall_clock=self.wall
+        )
+
+    def test_calls_are_spread_over_the_day(self):
+        """A burst is allowed, then calls are paced by the refill rate"""
+        for _ in range(2):
+            self.scheduler.acquire('flow')
+        with self.assertRaises(QuotaExceeded):
+            self.scheduler.acquire('flow')
+        self.wall.now += 920
+        self.scheduler.acquire('flow')
+        self.assertEqual(self.scheduler.quotas['flow'].used_today, 3)
+        self.assertEqual(self.scheduler.metrics()['flow']['skipped'], 1)
+
+    def test_daily_limit_is_a_hard_stop(self):
+        QuotaBucket.objects.create(endpoint='flow', tokens=2, refilled_at=self.wall.now, day='20261019', used=96)
+        with self.assertRaises(QuotaExceeded) as raised:
+            self.scheduler.acquire('flow')
+        self.assertEqual(raised.exception.retry_after, 16 * 3600)
+
+    def test_unmetered_endpoints_pass(self):
+        self.scheduler.acquire('traffic_alerts')
+
+    def test_schedule_prioritises_and_caps(self):
+        """Never fetched first, then staleness x congestion x interest, within budget"""
+        for area in ('quiet', 'jammed', 'watched'):
+            self.scheduler.mark_fetched('flow', area)
+        self.clock.now = 60
+        self.scheduler.mark_fetched('flow', 'quiet')
+        ranked = self.scheduler.schedule('incidents', ['quiet', 'jammed'], congestion={'jammed': 0.8})
+        self.assertEqual(ranked, ['quiet', 'jammed'])
+
+        picked = self.scheduler.schedule(
+            'flow', ['quiet', 'jammed', 'watched', 'new'],
+            congestion={'jammed': 0.8}, interest={'watched': 3.0}
+        )
+        self.assertEqual(picked, ['new', 'watched'])
+
+class TestTomTomQuotaFallback(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = TomTomService(QuotaScheduler({'flow': 1}, burst_seconds=1))
+
+    @mock.patch('traffic.services.tomtom_service.requests.get')
+    def test_serves_cached_response_when_budget_is_spent(self, get):
+        get.return_value.json.return_value = {'flowSegmentData': {'currentSpeed': 20}}
+        first = self.service.get_traffic_flow('85.3,27.7,85.31,27.71')
+        second = self.service.get_traffic_flow('85.3,27.7,85.31,27.71')
+        self.assertEqual(first, second)
+        self.assertEqual(get.call_count, 1)
+
+        with self.assertRaises(QuotaExceeded):
+            self.service.get_traffic_flow('85.3,27.7,85.31,27.71', allow_cached=False)
+        with self.assertRaises(QuotaExceeded):
+            self.service.get_traffic_flow('85.4,27.7,85.41,27.71')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from django.test import TestCase
+from django.utils import timezone as django_timezone
+from rest_framework.test import APIClient
+from traffic.models import Route, TrafficData
+from traffic.services import recent_store
+from traffic.services.recent_store import RecentReadingsStore
+
+class TestRecentReadingsStore(TestCase):
+    def setUp(self):
+        self.store = RecentReadingsStore(max_locations=3, depth=4)
+
+    def test_latest_per_location(self):
+        """Latest returns the newest reading regardless of batch order"""
+        self.store.append_batch(
+            ['a', 'b', 'a'], [20.0, 10.0, 10.0], [30.0, 50.0, 35.0], [40.0, 60.0, 40.0]
+        )
+        latest = self.store.latest()
+        self.assertEqual(latest['a']['current_speed'], 30.0)
+        self.assertEqual(latest['b']['free_flow_speed'], 60.0)
+        self.assertEqual(latest['a']['timestamp'], datetime.fromtimestamp(20, tz=timezone.utc))
+        self.assertIsNone(latest['a']['confidence'])
+
+    def test_ring_buffer_wraps(self):
+        """Only the last ``depth`` readings are kept, oldest first"""
+        for t in range(1, 8):
+            self.store.append_batch(['a'], [float(t)], [float(t)])
+        window = self.store.window('a')
+        self.assertEqual([r['current_speed'] for r in window], [4.0, 5.0, 6.0, 7.0])
+
+        since = datetime.fromtimestamp(6, tz=timezone.utc)
+        self.assertEqual([r['current_speed'] for r in self.store.window('a', since)], [6.0, 7.0])
+
+    def test_stale_and_duplicate_readings_are_ignored(self):
+        """Replaying readings already held does not duplicate them"""
+        self.assertEqual(self.store.append_batch(['a', 'a'], [1.0, 2.0], [10.0, 20.0]), 2)
+        self.assertEqual(self.store.append_batch(['a', 'a'], [1.0, 2.0], [10.0, 20.0]), 0)
+        self.assertEqual(len(self.store.window('a')), 2)
+
+    def test_bounded_locations_evict_least_recent(self):
+        """A full store evicts the location written least recently"""
+        self.store.append_batch(['a', 'b', 'c'], [1.0, 1.0, 1.0], [1.0, 2.0, 3.0])
+        self.store.append_batch(['a', 'c'], [2.0, 2.0], [1.0, 3.0])
+        self.store.append_batch(['d'], [3.0], [4.0])
+        self.assertEqual(set(self.store.latest()), {'a', 'c', 'd'})
+        self.assertEqual(self.store.window('b'), [])
+        self.assertEqual(self.store.window('d')[0]['current_speed'], 4.0)
+
+    def test_latest_subset(self):
+        """Unknown locations are skipped when querying a subset"""
+        self.store.append_batch(['a', 'b'], [1.0, 1.0], [1.0, 2.0], road_closure=[True, False])
+        latest = self.store.latest(['b', 'zzz'])
+        self.assertEqual(list(latest), ['b'])
+        self.assertIs(latest['b']['road_closure'], False)
+
+class TestRecentStoreFromDatabase(TestCase):
+    def setUp(self):
+        self.now = django_timezone.now()
+        self.route = Route.objects.create(
+            name='ring', description='', start_latitude=27.7, start_longitude=85.3,
+            end_latitude=27.7, end_longitude=85.32, waypoints=[]
+        )
+        TrafficData.objects.create(
+            location='27.7,85.3', current_speed=20.0, free_flow_speed=40.0,
+            confidence=0.9, road_closure=False, timestamp=self.now - timedelta(minutes=5)
+        )
+        # Written by the route collector, with the route segment fields as well
+        TrafficData.objects.create(
+            road_segment=self.route, location='27.7,85.31', latitude=27.7, longitude=85.31,
+            speed=12.0, current_speed=12.0, free_flow_speed=40.0, vehicle_count=3, timestamp=self.now
+        )
+        recent_store._store = None
+        self.addCleanup(setattr, recent_store, '_store', None)
+
+    def test_rebuild_and_sync_read_saved_rows(self):
+        store = RecentReadingsStore(max_locations=8, depth=4)
+        self.assertEqual(store.rebuild_from_db(), 2)
+        self.assertEqual(store.latest()['27.7,85.31']['current_speed'], 12.0)
+
+        TrafficData.objects.create(location='27.7,85.3', current_speed=35.0, timestamp=self.now)
+        self.assertEqual(store.sync_from_db(), 1)
+        self.assertEqual(store.latest()['27.7,85.3']['current_speed'], 35.0)
+        self.assertEqual(store.sync_from_db(), 0)
+
+    def test_current_conditions_from_the_database(self):
+        response = APIClient().get('/api/traffic-data/current_conditions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['27.7,85.3']['current_speed'], 20.0)
+        self.assertEqual(response.data['27.7,85.31']['congestion_level'], 'high')
+
+if __name__ == '__main__':
+    unittest.main()
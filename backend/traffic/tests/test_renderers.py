@@ -0,0 +1,82 @@
+import gzip
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+import msgpack
+import numpy as np
+import orjson
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from traffic.middleware import choose_encoding
+from traffic.models import EmergencyVehicle
+from traffic.renderers import MessagePackRenderer, ORJSONRenderer
+from traffic.services.geocoding_service import ReverseGeocoder
+from traffic.services.road_network import RoadNetwork
+from traffic.tests.test_geocoding import EXTRACT
+
+class TestRenderers(TestCase):
+    def test_orjson_handles_numpy_and_datetimes(self):
+        data = {'speeds': np.array([1.5, 2.5]), 'count': np.int64(3),
+                'at': datetime(2026, 10, 19, tzinfo=timezone.utc)}
+        self.assertEqual(
+            orjson.loads(ORJSONRenderer().render(data)),
+            {'speeds': [1.5, 2.5], 'count': 3, 'at': '2026-10-19T00:00:00+00:00'}
+        )
+
+    def test_msgpack_round_trip(self):
+        data = {'at': datetime(2026, 10, 19, tzinfo=timezone.utc), 'value': np.float32(1.5)}
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)),
+            {'at': '2026-10-19T00:00:00+00:00', 'value': 1.5}
+        )
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(choose_encoding('gzip;q=0, identity'))
+        self.assertIsNone(choose_encoding(''))
+
+class TestNegotiation(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for i in range(30):
+            EmergencyVehicle.objects.create(vehicle_id=f'amb-{i}', status='active', current_location='27.7,85.3')
+
+    def test_msgpack_accept(self):
+        response = self.client.get('/api/emergency-vehicles/active/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(len(msgpack.unpackb(response.content)), 30)
+
+    def test_msgpack_request_body(self):
+        body = msgpack.packb({'locations': ['27.7,85.3']})
+        geocoder = ReverseGeocoder(RoadNetwork(EXTRACT))
+        with mock.patch('traffic.views.get_reverse_geocoder', return_value=geocoder):
+            response = self.client.post(
+                '/api/locations/reverse_geocode_batch/', body, content_type='application/msgpack'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+    @override_settings(COMPRESSION_MIN_BYTES=100)
+    def test_large_responses_are_compressed(self):
+        """Compressed bodies decode to the same JSON and carry a weak ETag"""
+        plain = self.client.get('/api/emergency-vehicles/active/')
+        response = self.client.get('/api/emergency-vehicles/active/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+
+        revalidated = self.client.get(
+            '/api/emergency-vehicles/active/', HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/forecast/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+if __name__ == '__main__':
+    unittest.main()
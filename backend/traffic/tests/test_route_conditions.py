@@ -0,0 +1,84 @@
+import unittest
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from traffic.models import Alert, Route, TrafficData
+from traffic.services.ingestion_queue import _bump_traffic
+from traffic.services.resource_versions import bump_version, route_resource
+
+def make_route(name, lat, lon):
+    return Route.objects.create(
+        name=name, description='', start_latitude=lat, start_longitude=lon,
+        end_latitude=lat + 0.01, end_longitude=lon + 0.01, waypoints=[]
+    )
+
+class TestRouteConditions(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        now = timezone.now()
+        self.routes = [make_route(f'r{i}', 27.70 + i * 0.1, 85.30) for i in range(3)]
+        for route in self.routes:
+            # An older, faster snapshot and the latest, slower one
+            for age, speed in ((timedelta(minutes=30), 40.0), (timedelta(minutes=5), 10.0)):
+                for k in range(2):
+                    TrafficData.objects.create(
+                        road_segment=route, latitude=route.start_latitude + k * 0.001,
+                        longitude=route.start_longitude, speed=speed, vehicle_count=5,
+                        timestamp=now - age
+                    )
+        Alert.objects.create(location='27.705,85.305', severity='HIGH')
+
+    def test_bulk_conditions_use_fixed_queries(self):
+        """Summaries for all routes take the same queries as for one"""
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/routes/conditions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+        first = response.data[0]
+        self.assertEqual(first['route_name'], 'r0')
+        self.assertEqual(first['average_speed'], 25.0)
+        self.assertEqual(first['total_vehicles'], 10)
+        self.assertEqual(len(first['traffic_segments']), 2)
+        self.assertEqual(first['congestion_level'], 'medium')
+        self.assertEqual([a['location'] for a in first['alerts']], ['27.705,85.305'])
+        self.assertEqual(response.data[1]['alerts'], [])
+
+    def test_cached_until_route_gets_readings(self):
+        route = self.routes[0]
+        self.client.get('/api/routes/conditions/')
+        with self.assertNumQueries(1):  # get_object only
+            self.client.get(f'/api/routes/{route.id}/conditions/')
+
+        TrafficData.objects.create(
+            road_segment=route, latitude=27.7, longitude=85.3, speed=2.0,
+            vehicle_count=1, timestamp=timezone.now()
+        )
+        bump_version(route_resource(route.id))
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/routes/{route.id}/conditions/')
+        self.assertEqual(response.data['total_vehicles'], 1)
+
+        # Other routes stay cached
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/routes/conditions/?ids={self.routes[1].id}')
+        self.assertEqual(response.data[0]['total_vehicles'], 10)
+
+    def test_queued_readings_invalidate_their_route(self):
+        route = self.routes[0]
+        self.client.get('/api/routes/conditions/')
+        _bump_traffic([TrafficData(road_segment=route, timestamp=timezone.now()), TrafficData(timestamp=timezone.now())])
+        with self.assertNumQueries(4):
+            self.client.get(f'/api/routes/{route.id}/conditions/')
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/routes/conditions/?ids={self.routes[1].id}')
+
+    def test_invalid_ids(self):
+        response = self.client.get('/api/routes/conditions/?ids=a,b')
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from traffic.models import Route, RouteETA, TrafficData
+from traffic.services import recent_store
+from traffic.services.recent_store import RecentReadingsStore
+from traffic.services.route_eta import RouteDependencyIndex, RouteEtaUpdater
+
+def make_route(name, start, end, waypoints=()):
+    return Route.objects.create(
+        name=name, description='', start_latitude=start[0], start_longitude=start[1],
+        end_latitude=end[0], end_longitude=end[1], waypoints=list(waypoints)
+    )
+
+ON_EAST = '27.700500,85.310000'
+ON_NORTH = '27.760000,85.300500'
+OFF_ROUTE = '27.730000,85.310000'
+
+class TestRouteEta(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.east = make_route('east', (27.70, 85.30), (27.70, 85.32))
+        self.north = make_route('north', (27.75, 85.30), (27.77, 85.30), ['27.76,85.30'])
+        self.store = RecentReadingsStore(max_locations=16, depth=4)
+        self.clock = 1_700_000_000.0
+        self.feed({ON_EAST: 20.0, ON_NORTH: 40.0, OFF_ROUTE: 5.0})
+        self.updater = RouteEtaUpdater(
+            corridor_m=150, change_threshold=0.1, free_flow_kmh=36, store=self.store
+        )
+
+    def feed(self, speeds):
+        self.clock += 60
+        self.store.append_batch(
+            list(speeds), [self.clock] * len(speeds), list(speeds.values()), [40.0] * len(speeds)
+        )
+
+    def test_dependency_index_uses_corridor(self):
+        index = RouteDependencyIndex(
+            [self.east, self.north], [ON_EAST, ON_NORTH, OFF_ROUTE], corridor_m=150
+        )
+        self.assertEqual(index.routes_for([ON_EAST]), {self.east.id})
+        self.assertEqual(index.routes_for([ON_NORTH]), {self.north.id})
+        self.assertEqual(index.routes_for([OFF_ROUTE]), set())
+
+    def test_only_routes_with_changed_readings_are_recomputed(self):
+        stats = self.updater.update()
+        self.assertEqual(stats['recomputed'], 2)
+        east = RouteETA.objects.get(route=self.east)
+        # Half of free-flow speed on its only leg doubles the travel time
+        self.assertAlmostEqual(east.eta_seconds, 2 * east.free_flow_seconds)
+        self.assertAlmostEqual(east.free_flow_seconds, east.distance_m / 10.0)
+        self.assertEqual(east.observed_locations, 1)
+        north = RouteETA.objects.get(route=self.north)
+        self.assertAlmostEqual(north.eta_seconds, north.free_flow_seconds)
+
+        # A change below the threshold leaves every ETA alone
+        self.feed({ON_EAST: 18.0})
+        self.assertEqual(self.updater.update()['recomputed'], 0)
+
+        self.feed({ON_NORTH: 8.0, OFF_ROUTE: 40.0})
+        stats = self.updater.update()
+        self.assertEqual(stats['recomputed'], 1)
+        self.assertEqual(RouteETA.objects.get(route=self.east).computed_at, east.computed_at)
+        north = RouteETA.objects.get(route=self.north)
+        self.assertAlmostEqual(north.eta_seconds, 5 * north.free_flow_seconds)
+
+    def test_new_locations_extend_the_index(self):
+        self.updater.update()
+        index = self.updater.index
+        self.feed({'27.700400,85.315000': 10.0, '27.740000,85.310000': 30.0})
+        stats = self.updater.update()
+        self.assertIs(self.updater.index, index)
+        self.assertEqual((stats['changed_locations'], stats['recomputed']), (2, 1))
+        self.assertEqual(index.routes_for(['27.700400,85.315000']), {self.east.id})
+        self.assertEqual(RouteETA.objects.get(route=self.east).observed_locations, 2)
+        self.assertEqual(self.updater.update()['recomputed'], 0)
+
+    def test_new_route_triggers_rebuild(self):
+        self.updater.update()
+        make_route('west', (27.70, 85.28), (27.70, 85.30))
+        self.assertEqual(self.updater.update()['recomputed'], 3)
+
+    def test_route_list_includes_eta_cheaply(self):
+        self.updater.update()
+        make_route('pending', (28.0, 85.0), (28.1, 85.1))
+        client = APIClient()
+        with self.assertNumQueries(2):
+            response = client.get('/api/routes/')
+        by_name = {route['name']: route for route in response.data['results']}
+        self.assertGreater(by_name['east']['eta']['eta_seconds'], 0)
+        self.assertIsNone(by_name['pending']['eta'])
+
+class TestRouteEtaCommand(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        recent_store._store = None
+        self.addCleanup(setattr, recent_store, '_store', None)
+
+    def test_etas_from_saved_readings(self):
+        route = make_route('east', (27.70, 85.30), (27.70, 85.32))
+        TrafficData.objects.create(
+            location=ON_EAST, current_speed=18.0, free_flow_speed=36.0, timestamp=timezone.now()
+        )
+        call_command('update_route_etas', '--once', stdout=StringIO())
+        eta = RouteETA.objects.get(route=route)
+        self.assertEqual(eta.observed_locations, 1)
+        self.assertGreater(eta.eta_seconds, eta.free_flow_seconds)
@@ -0,0 +1,68 @@
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from traffic.models import Route
+from traffic.services.osrm_service import OSRMService
+from traffic.services.polyline import decode_polyline, encode_polyline
+from traffic.services.route_geometry import RouteGeometryService
+
+# Road geometry with a detour north of the straight line between the endpoints
+ROAD = encode_polyline([27.70, 27.71, 27.71, 27.70], [85.30, 85.30, 85.32, 85.32])
+
+class TestPolyline(TestCase):
+    def test_round_trip_and_reference_string(self):
+        lats, lons = decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        np.testing.assert_allclose(lats, [38.5, 40.7, 43.252])
+        np.testing.assert_allclose(lons, [-120.2, -120.95, -126.453])
+        self.assertEqual(encode_polyline(lats, lons), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(OSRMService()._decode_polyline(ROAD)[1], [27.71, 85.3])
+
+class TestRouteGeometry(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.osrm = mock.Mock()
+        self.service = RouteGeometryService(self.osrm, corridor_m=150)
+        self.route = Route.objects.create(
+            name='detour', description='', start_latitude=27.70, start_longitude=85.30,
+            end_latitude=27.70, end_longitude=85.32, waypoints=[]
+        )
+
+    def test_refresh_stores_geometry_bbox_and_mapping(self):
+        self.osrm.calculate_route.return_value = {'routes': [{'geometry': ROAD}]}
+        self.service.refresh(self.route, locations=['27.710000,85.310000', '27.700000,85.310000'])
+        route = Route.objects.get(pk=self.route.pk)
+        self.assertEqual(route.geometry_source, 'osrm')
+        self.assertEqual(route.bbox, [85.30, 27.70, 85.32, 27.71])
+        # On the road geometry, not on the straight line between the endpoints
+        self.assertEqual(route.monitored_locations, ['27.710000,85.310000'])
+
+    def test_fallback_geometry_is_retried_in_background(self):
+        self.osrm.calculate_route.side_effect = Exception('unreachable')
+        self.service.refresh(self.route, locations=[])
+        route = Route.objects.get(pk=self.route.pk)
+        self.assertEqual(route.geometry_source, 'waypoints')
+        self.assertEqual(len(decode_polyline(route.geometry)[0]), 2)
+
+        self.osrm.calculate_route.side_effect = None
+        self.osrm.calculate_route.return_value = {'routes': [{'geometry': ROAD}]}
+        stats = self.service.refresh_all()
+        self.assertEqual(stats['refetched'], 1)
+        self.assertEqual(Route.objects.get(pk=self.route.pk).geometry, ROAD)
+        self.assertEqual(self.service.refresh_all()['refetched'], 0)
+
+    def test_created_through_api(self):
+        client = APIClient()
+        with mock.patch.object(
+            OSRMService, 'calculate_route', return_value={'routes': [{'geometry': ROAD}]}
+        ):
+            response = client.post('/api/routes/', {
+                'name': 'api', 'description': 'ring road', 'start_latitude': 27.70, 'start_longitude': 85.30,
+                'end_latitude': 27.70, 'end_longitude': 85.32, 'waypoints': [],
+                'geometry': 'ignored'
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        route = Route.objects.get(pk=response.data['id'])
+        self.assertEqual(route.geometry, ROAD)
+        self.assertEqual(route.bbox, [85.30, 27.70, 85.32, 27.71])
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from django.test import TestCase
+from traffic.services.sampling_planner import QuadTreePlanner
+
+BBOX = (85.24, 27.62, 85.56, 27.82)
+
+class TestQuadTreePlanner(TestCase):
+    def run_cycle(self, planner, ratio_for):
+        planned = planner.plan()
+        planner.observe({key: (40.0 * ratio_for(key, planner), 40.0) for key, _ in planned})
+        return planned
+
+    def test_initial_tree_is_coarse(self):
+        planner = QuadTreePlanner(BBOX, budget=1000)
+        self.assertEqual(planner.max_level, 6)
+        self.assertEqual(len(planner.plan()), 64)
+        self.assertLess(len(planner.leaves), planner.stats()['fixed_grid_points'])
+
+    def test_congestion_is_refined_to_min_cell(self):
+        """Cells around a jam split down to the finest level"""
+        planner = QuadTreePlanner(BBOX, budget=1000)
+        jam = planner._cells_at(planner.max_level, np.array([27.70]), np.array([85.30]))
+        jam_key = (planner.max_level, int(jam[0][0]), int(jam[1][0]))
+
+        def ratio_for(key, p):
+            level, ix, iy = key
+            shift = p.max_level - level
+            inside = (jam_key[1] >> shift) == ix and (jam_key[2] >> shift) == iy
+            return 0.3 if inside else 1.0
+
+        for _ in range(10):
+            self.run_cycle(planner, ratio_for)
+        self.assertIn(jam_key, planner.leaves)
+
+    def test_stable_free_flow_coarsens_and_backs_off(self):
+        """Free flowing areas merge and are sampled less often"""
+        planner = QuadTreePlanner(BBOX, budget=1000, stable_cycles=2, stable_interval=4)
+        first = len(planner.leaves)
+        sampled = [len(self.run_cycle(planner, lambda key, p: 1.0)) for _ in range(8)]
+        self.assertLess(len(planner.leaves), first)
+        self.assertLess(min(sampled), sampled[0])
+
+    def test_budget_caps_points_per_cycle(self):
+        planner = QuadTreePlanner(BBOX, budget=10)
+        self.assertEqual(len(planner.plan()), 10)
+
+    def test_density_refines_initial_tree(self):
+        """Road dense cells start finer than empty ones"""
+        lats = [27.70] * 50
+        lons = [85.30] * 50
+        planner = QuadTreePlanner(BBOX, budget=1000, density=(lats, lons), density_threshold=20)
+        self.assertEqual(max(key[0] for key in planner.leaves), planner.max_level - 1)
+
+    def test_locations_are_stable(self):
+        planner = QuadTreePlanner(BBOX)
+        key, location = planner.plan()[0]
+        self.assertEqual(planner.location_for(key), location)
+        lat, lon = map(float, location.split(','))
+        self.assertTrue(BBOX[1] <= lat <= BBOX[3] and BBOX[0] <= lon <= BBOX[2])
+
+if __name__ == '__main__':
+    unittest.main()
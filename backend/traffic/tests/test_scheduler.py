@@ -0,0 +1,83 @@
+import threading
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from traffic.models import Alert
+from traffic.services.scheduler import Job, Scheduler, build_job
+
+class TestScheduler(TestCase):
+    def setUp(self):
+        self.runs = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def job(self, name='job', interval=10.0, fail=False):
+        def run():
+            self.release.wait(5)
+            self.runs.append(name)
+            if fail:
+                raise RuntimeError('upstream down')
+            return len(self.runs)
+        return Job(name, run, interval)
+
+    def scheduler(self, *jobs):
+        scheduler = Scheduler(jobs, clock=lambda: 0.0)
+        self.addCleanup(scheduler.shutdown)
+        scheduler.start(0.0)
+        return scheduler
+
+    def settle(self, scheduler):
+        for future in scheduler._running.values():
+            future.result(5)
+
+    def test_fixed_rate_slots_do_not_drift(self):
+        scheduler = self.scheduler(self.job())
+        self.assertEqual(scheduler.run_pending(0.0), ['job'])
+        self.settle(scheduler)
+        self.assertEqual(scheduler.run_pending(9.9), [])
+        # Picked up late, the next slot still follows the scheduled one
+        self.assertEqual(scheduler.run_pending(10.7), ['job'])
+        self.assertEqual(scheduler._next['job'], 20.0)
+        self.settle(scheduler)
+        self.assertEqual(scheduler.report()['job']['runs'], 2)
+
+    def test_running_job_is_not_started_again(self):
+        self.release.clear()
+        scheduler = self.scheduler(self.job())
+        scheduler.run_pending(0.0)
+        self.assertEqual(scheduler.run_pending(10.0), [])
+        self.release.set()
+        self.settle(scheduler)
+        # Slots 20 and 30 passed while behind; one run covers them
+        self.assertEqual(scheduler.run_pending(35.0), ['job'])
+        self.settle(scheduler)
+        metrics = scheduler.report()['job']
+        self.assertEqual((metrics['runs'], metrics['overlaps'], metrics['missed']), (2, 1, 1))
+        self.assertEqual(scheduler._next['job'], 40.0)
+
+    def test_jobs_run_concurrently_and_failures_are_counted(self):
+        self.release.clear()
+        scheduler = self.scheduler(self.job('a'), self.job('b', fail=True), self.job('off', interval=0))
+        self.assertEqual(scheduler.run_pending(0.0), ['a', 'b'])
+        # Both are in flight before either finishes
+        self.assertFalse(any(f.done() for f in scheduler._running.values()))
+        self.release.set()
+        self.settle(scheduler)
+        report = scheduler.report()
+        self.assertEqual(report['b']['failures'], 1)
+        self.assertEqual(report['b']['last_error'], 'upstream down')
+        self.assertEqual(report['a']['failures'], 0)
+        self.assertNotIn('off', report)
+
+class TestScheduledJobs(TestCase):
+    def test_unknown_job(self):
+        with self.assertRaises(ValueError):
+            build_job('nope')
+
+    @override_settings(RETENTION_DAYS={'alerts': 30}, RETENTION_BATCH_SIZE=2)
+    def test_retention_deletes_old_rows_in_batches(self):
+        old = [Alert.objects.create(location='27.7,85.3') for _ in range(3)]
+        Alert.objects.create(location='27.7,85.3')
+        Alert.objects.filter(pk__in=[a.pk for a in old]).update(timestamp=timezone.now() - timedelta(days=31))
+        self.assertEqual(build_job('retention', 3600).func(), {'alerts': 3})
+        self.assertEqual(Alert.objects.count(), 1)
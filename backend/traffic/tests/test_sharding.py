@@ -0,0 +1,64 @@
+import unittest
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from traffic.models import CollectorLease, CollectorWorker, Route
+from traffic.services.sharding import LeaseManager, shard_queryset, strip_bounds
+
+class TestStripBounds(TestCase):
+    def test_strips_cover_range(self):
+        """Strips are contiguous, disjoint and near equal in size"""
+        self.assertEqual(strip_bounds(10, 3), [(0, 3), (3, 6), (6, 10)])
+        self.assertEqual(strip_bounds(2, 4), [(0, 0), (0, 1), (1, 1), (1, 2)])
+
+    def test_route_shards_partition_routes(self):
+        for i in range(7):
+            Route.objects.create(
+                name=f'r{i}', description='', start_latitude=0, start_longitude=0,
+                end_latitude=1, end_longitude=1, waypoints=[]
+            )
+        seen = []
+        for shard in range(3):
+            seen.extend(shard_queryset(Route.objects.all(), shard, 3).values_list('id', flat=True))
+        self.assertEqual(sorted(seen), sorted(Route.objects.values_list('id', flat=True)))
+
+class TestLeaseManager(TestCase):
+    def manager(self, owner):
+        return LeaseManager('job', 4, owner=owner, ttl=60)
+
+    def test_single_worker_claims_every_shard(self):
+        self.assertEqual(self.manager('a').claim(), [0, 1, 2, 3])
+        self.assertEqual(CollectorLease.objects.filter(owner='a').count(), 4)
+
+    def test_shards_rebalance_when_a_worker_joins(self):
+        """An existing worker gives up shards beyond its fair share"""
+        a, b = self.manager('a'), self.manager('b')
+        a.claim()
+        self.assertEqual(b.claim(), [])
+        self.assertEqual(a.claim(), [0, 1])
+        self.assertEqual(b.claim(), [2, 3])
+        self.assertEqual(a.claim(), [0, 1])
+
+    def test_dead_worker_shards_are_taken_over(self):
+        """Expired leases of a worker that stopped renewing are reclaimed"""
+        a, b = self.manager('a'), self.manager('b')
+        a.claim()
+        b.claim()
+        a.claim()
+        b.claim()
+
+        past = timezone.now() - timedelta(minutes=5)
+        CollectorLease.objects.filter(owner='b').update(expires_at=past)
+        CollectorWorker.objects.filter(owner='b').update(last_seen=past)
+        self.assertEqual(a.claim(), [0, 1, 2, 3])
+
+    def test_release_all(self):
+        a = self.manager('a')
+        a.claim()
+        a.release_all()
+        self.assertFalse(CollectorLease.objects.exclude(owner='').exists())
+        self.assertFalse(CollectorWorker.objects.exists())
+        self.assertEqual(self.manager('b').claim(), [0, 1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
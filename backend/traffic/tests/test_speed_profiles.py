@@ -0,0 +1,43 @@
+import os
+import tempfile
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from traffic.models import TrafficData
+from traffic.services.speed_profiles import SpeedProfileStore
+
+class TestSpeedProfileUpdates(TestCase):
+    def reading(self, speed, timestamp, location='27.7,85.3'):
+        return TrafficData.objects.create(location=location, current_speed=speed, timestamp=timestamp)
+
+    def test_late_and_same_timestamp_rows_are_folded_in(self):
+        now = timezone.now()
+        store = SpeedProfileStore()
+        self.reading(30.0, now)
+        self.assertEqual(store.update_from_db(), 1)
+
+        # Written after the last update but stamped at or before its newest reading
+        self.reading(20.0, now)
+        self.reading(10.0, now - timedelta(minutes=5))
+        self.assertEqual(store.update_from_db(), 2)
+        self.assertEqual(store.update_from_db(), 0)
+        self.assertEqual(int(store.counts[0].sum()), 3)
+
+    def test_rows_without_location_advance_the_watermark(self):
+        store = SpeedProfileStore()
+        last = self.reading(30.0, timezone.now(), location='')
+        self.assertEqual(store.update_from_db(), 0)
+        self.assertEqual(store.watermark, last.id)
+
+    def test_saved_watermark_is_resumed(self):
+        now = timezone.now()
+        store = SpeedProfileStore()
+        self.reading(30.0, now - timedelta(hours=1))
+        store.update_from_db()
+        newer = self.reading(25.0, now)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profiles.npz')
+            store.save(path)
+            restored = SpeedProfileStore.load(path)
+        self.assertEqual(restored.update_from_db(), 1)
+        self.assertEqual(restored.watermark, newer.id)
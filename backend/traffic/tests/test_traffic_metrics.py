@@ -0,0 +1,53 @@
+from unittest import mock
+import numpy as np
+from django.test import TestCase, override_settings
+from traffic.services import traffic_metrics
+from traffic.services.osrm_service import OSRMService
+from traffic.services.recent_store import RecentReadingsStore
+
+class TestTrafficMetrics(TestCase):
+    def test_density_and_delay_over_arrays(self):
+        current = [40.0, 20.0, None, 0.0, 50.0]
+        free_flow = [40.0, 40.0, 40.0, 40.0, 40.0]
+        np.testing.assert_allclose(traffic_metrics.density(current, free_flow), [0.0, 0.5, 0.0, 0.0, 0.0])
+        np.testing.assert_allclose(
+            traffic_metrics.delay_ratio(current, free_flow), [1.0, 2.0, np.nan, np.nan, 0.8]
+        )
+
+    def test_levels_and_severities_share_the_threshold_table(self):
+        current = np.array([36.0, 24.0, 18.0, 8.0])
+        free_flow = np.full(4, 40.0)
+        self.assertEqual(
+            traffic_metrics.congestion_level(current, free_flow).tolist(), ['low', 'medium', 'medium', 'high']
+        )
+        self.assertEqual(
+            traffic_metrics.alert_severity(current, free_flow).tolist(), ['', 'MEDIUM', 'HIGH', 'HIGH']
+        )
+        metrics = traffic_metrics.compute(current, free_flow)
+        self.assertEqual(metrics.row(3), {'density': 0.8, 'congestion_level': 'high', 'delay_ratio': 5.0})
+
+    @override_settings(TRAFFIC_METRIC_THRESHOLDS={
+        'congestion_level': {'medium': 0.1, 'high': 0.4},
+        'alert_severity': {'MEDIUM': 0.9, 'HIGH': 0.95},
+    })
+    def test_thresholds_are_configurable(self):
+        self.assertEqual(traffic_metrics.congestion_level([36.0, 20.0], [40.0, 40.0]).tolist(), ['medium', 'high'])
+        self.assertEqual(traffic_metrics.alert_severity([20.0], [40.0]).tolist(), [''])
+
+    def test_scalar_wrappers_match(self):
+        service = OSRMService()
+        self.assertEqual(service._calculate_density(20.0, 40.0), 0.5)
+        self.assertEqual(service._calculate_density(None, 40.0), 0.0)
+        self.assertEqual(service._get_congestion_level(10.0, 40.0), 'high')
+
+    def test_congested_segments_use_the_newer_endpoint(self):
+        store = RecentReadingsStore()
+        coords = [[27.7, 85.3], [27.7, 85.31], [27.7, 85.32], [27.7, 85.33]]
+        # Second point slow but superseded by a newer free-flowing third point
+        store.append_batch(
+            ['27.7,85.3', '27.7,85.31', '27.7,85.32'],
+            [10.0, 20.0, 30.0], [5.0, 5.0, 40.0], [40.0, 40.0, 40.0]
+        )
+        with mock.patch('traffic.services.osrm_service.get_recent_store', return_value=store):
+            segments = OSRMService()._find_congested_segments(coords)
+        self.assertEqual(segments, [[coords[0], coords[1]]])
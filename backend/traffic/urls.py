@@ -1,13 +1,28 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from traffic import views
+from traffic import async_views, views
 
 router = DefaultRouter()
 router.register(r'traffic-data', views.TrafficDataViewSet)
 router.register(r'routes', views.RouteViewSet)
 router.register(r'alerts', views.AlertViewSet)
 router.register(r'emergency-vehicles', views.EmergencyVehicleViewSet)
+router.register(r'locations', views.LocationViewSet, basename='location')
+router.register(r'geofences', views.GeofenceViewSet)
+router.register(r'alert-subscriptions', views.AlertSubscriptionViewSet)
+router.register(r'forecast', views.ForecastViewSet, basename='forecast')
+router.register(r'snapshot', views.SnapshotViewSet, basename='snapshot')
 
 urlpatterns = [
+    # Upstream-bound actions are async views, mounted ahead of the router
+    path('routes/calculate/', async_views.calculate_route, name='route-calculate'),
+    path('routes/alternatives/', async_views.alternative_routes, name='route-alternatives'),
+    path('locations/search/', async_views.search_locations, name='location-search'),
+    path('locations/reverse_geocode/', async_views.reverse_geocode, name='location-reverse-geocode'),
+    path(
+        'heatmap/<int:z>/<int:x>/<int:y>.png',
+        views.HeatmapViewSet.as_view({'get': 'tile'}),
+        name='heatmap-tile'
+    ),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
@@ -2,19 +2,44 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import TrafficData, Route, Alert, EmergencyVehicle
+from .models import (
+    TrafficData, Route, Alert, EmergencyVehicle, Geofence, GeofenceEvent, AlertSubscription
+)
 from .serializers import (
     TrafficDataSerializer,
     RouteSerializer,
     AlertSerializer,
     EmergencyVehicleSerializer,
+    GeofenceSerializer,
+    GeofenceEventSerializer,
+    AlertSubscriptionSerializer,
 )
 from .services.osrm_service import OSRMService
+from .services.geocoding_service import get_reverse_geocoder
+from .services.spatial_index import parse_locations
+from .services.map_matching import MapMatcher, get_streaming_matcher, store_segment_speeds
+from .services.speed_profiles import SpeedForecaster, get_speed_forecaster
+from .services.recent_store import get_recent_store
+from .services.route_conditions import RouteConditionsService
+from .services.route_geometry import RouteGeometryService
+from .services.probe_ingestion import ProbeBatchError, ProbeIngestionService
+from .services.geofence_engine import get_geofence_engine
+from .services import traffic_metrics
+from .services import city_snapshot
+from .services.heatmap_tiles import get_heatmap_renderer
+from .services.resource_versions import ALERTS, EMERGENCY_VEHICLES, TRAFFIC
+from .conditional import conditional_response
+from .db_router import ReplicaReadMixin
+from .query_budget import query_budget
 from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from datetime import timedelta
+from dataclasses import asdict
 from django.db.models import Avg
+import numpy as np
 import firebase_admin
 from firebase_admin import db
 
@@ -71,201 +96,269 @@ class TrafficViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class RouteViewSet(viewsets.ModelViewSet):
-    queryset = Route.objects.all()
+class RouteViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    # ETAs are kept current by update_route_etas, so listing them is one join
+    queryset = Route.objects.select_related('eta').order_by('id')
     serializer_class = RouteSerializer
+    query_budgets = {'list': 3, 'retrieve': 2}
     permission_classes = [permissions.AllowAny]
     osrm_service = OSRMService()
+    conditions_service = RouteConditionsService()
+    geometry_service = RouteGeometryService(osrm_service)
+    # calculate and alternatives are async views, see async_views.py
+
+    def perform_create(self, serializer):
+        self.geometry_service.refresh(serializer.save())
+
+    def perform_update(self, serializer):
+        self.geometry_service.refresh(serializer.save())
+
+    @action(detail=True, methods=['get'])
+    @query_budget(5)
+    def conditions(self, request, pk=None):
+        """Current traffic summary for one route"""
+        route = self.get_object()
+        return Response(self.conditions_service.conditions([route])[0])
+
+    @action(detail=False, methods=['get'], url_path='conditions', url_name='bulk-conditions')
+    @query_budget(5)
+    def bulk_conditions(self, request):
+        """Current traffic summaries for all routes, or those listed in ``ids``"""
+        routes = self.get_queryset().order_by('id')
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                routes = routes.filter(id__in=[int(i) for i in ids.split(',')])
+            except ValueError:
+                return Response(
+                    {'error': 'ids must be a comma separated list of route ids'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return Response(self.conditions_service.conditions(routes))
+
+class LocationViewSet(viewsets.ViewSet):
+    # search and reverse_geocode are async views, see async_views.py
+    permission_classes = [permissions.AllowAny]
+    MAX_GEOCODE_BATCH = 10000
 
     @action(detail=False, methods=['post'])
-    def calculate(self, request):
-        """Calculate route between points"""
-        start = request.data.get('start')
-        end = request.data.get('end')
-        waypoints = request.data.get('waypoints', [])
-        
-        if not start or not end:
+    def reverse_geocode_batch(self, request):
+        """Convert many coordinates to addresses in one call
+
+        Accepts either ``points`` as ``[[lat, lon], ...]`` or ``locations``
+        as ``["lat,lon", ...]`` strings.
+        """
+        points = request.data.get('points')
+        locations = request.data.get('locations')
+
+        if points is None and locations is None:
             return Response(
-                {'error': 'start and end points are required'},
+                {'error': 'points or locations is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        try:
-            data = self.osrm_service.calculate_route(start, end, waypoints)
-            return Response(data)
-        except Exception as e:
+
+        if points is not None and not isinstance(points, list):
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'points must be a list of [lat, lon] pairs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if points is None and not isinstance(locations, list):
+            return Response(
+                {'error': 'locations must be a list of "lat,lon" strings'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-    @action(detail=False, methods=['post'])
-    def alternatives(self, request):
-        """Get alternative routes avoiding congested areas"""
-        start = request.data.get('start')
-        end = request.data.get('end')
-        max_alternatives = request.data.get('max_alternatives', 3)
-        
-        if not start or not end:
+        size = len(points if points is not None else locations)
+        if size > self.MAX_GEOCODE_BATCH:
             return Response(
-                {'error': 'start and end points are required'},
+                {'error': f'at most {self.MAX_GEOCODE_BATCH} coordinates per request'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+
+        geocoder = get_reverse_geocoder()
+        if not geocoder.available:
+            # Nominatim's usage policy rules out bulk lookups, so there is no fallback here
+            return Response(
+                {'error': 'road network extract is not loaded, see ROAD_NETWORK_EXTRACT'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
         try:
-            routes = self.osrm_service.get_alternative_routes(
-                start,
-                end,
-                max_alternatives
+            if points is not None:
+                coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+                results = geocoder.reverse_geocode_batch(coords[:, 0], coords[:, 1])
+            else:
+                lats, lons = parse_locations(locations)
+                results = geocoder.reverse_geocode_batch(lats, lons)
+            return Response({'results': results})
+        except ValueError:
+            return Response(
+                {'error': 'points must be [lat, lon] pairs'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            return Response({'routes': routes})
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class LocationViewSet(viewsets.ViewSet):
-    permission_classes = [permissions.AllowAny]
-    osrm_service = OSRMService()
+    @action(detail=False, methods=['post'])
+    def match_traces(self, request):
+        """Map-match GPS traces onto the local road network
 
-    @action(detail=False, methods=['get'])
-    def search(self, request):
-        """Search for locations"""
-        query = request.query_params.get('query')
-        lat = request.query_params.get('lat')
-        lon = request.query_params.get('lon')
-        
-        if not query:
+        Expects ``traces`` as ``{trace_id: [[lat, lon, unix_ts], ...]}``.
+        With ``store`` set, per-segment observed speeds are saved as
+        traffic data.
+        """
+        traces = request.data.get('traces')
+        if not isinstance(traces, dict) or not traces:
             return Response(
-                {'error': 'query parameter is required'},
+                {'error': 'traces must be a non-empty object of point lists'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        try:
-            data = self.osrm_service.search_location(
-                query,
-                float(lat) if lat else None,
-                float(lon) if lon else None
-            )
-            return Response(data)
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
 
-    @action(detail=False, methods=['get'])
-    def reverse_geocode(self, request):
-        """Convert coordinates to address"""
-        lat = request.query_params.get('lat')
-        lon = request.query_params.get('lon')
-        
-        if not lat or not lon:
+        try:
+            parsed = {}
+            for trace_id, points in traces.items():
+                arr = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+                parsed[trace_id] = (arr[:, 0], arr[:, 1], arr[:, 2])
+        except ValueError:
             return Response(
-                {'error': 'lat and lon parameters are required'},
+                {'error': 'each point must be [lat, lon, unix_ts]'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+
         try:
-            data = self.osrm_service.reverse_geocode(float(lat), float(lon))
-            return Response(data)
+            matcher = MapMatcher()
+            matched = matcher.match_traces(parsed)
+            speeds = matcher.segment_speeds(matched)
+            if request.data.get('store'):
+                store_segment_speeds(speeds)
+            return Response({
+                'matched': {
+                    trace_id: [asdict(point) for point in points]
+                    for trace_id, points in matched.items()
+                },
+                'segment_speeds': [asdict(speed) for speed in speeds],
+            })
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class TrafficDataViewSet(viewsets.ReadOnlyModelViewSet):
+class TrafficDataViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for traffic data
     """
-    queryset = TrafficData.objects.all().order_by('-timestamp')
+    # route_name comes from road_segment
+    queryset = TrafficData.objects.select_related('road_segment').order_by('-timestamp')
     serializer_class = TrafficDataSerializer
+    query_budgets = {'list': 3, 'retrieve': 2}
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['location', 'road_closure']
     ordering_fields = ['timestamp', 'current_speed', 'free_flow_speed']
-    osrm_service = OSRMService()
 
     @action(detail=False, methods=['get'])
+    @query_budget(3)
     def current_conditions(self, request):
         """Get current traffic conditions for all monitored locations"""
-        locations = TrafficData.objects.values('location').distinct()
+        return conditional_response(request, TRAFFIC, self._build_current_conditions)
+
+    def _build_current_conditions(self):
+        # The version moved, so catch up on rows other processes wrote
+        store = get_recent_store(sync=False)
+        store.sync_from_db()
+        latest = store.latest()
+        metrics = traffic_metrics.compute(
+            [row['current_speed'] for row in latest.values()],
+            [row['free_flow_speed'] for row in latest.values()]
+        )
         conditions = {}
+        for (location, row), scores in zip(latest.items(), metrics.rows()):
+            conditions[location] = {
+                'current_speed': row['current_speed'],
+                'free_flow_speed': row['free_flow_speed'],
+                **scores,
+                'road_closure': row['road_closure'],
+                'timestamp': row['timestamp']
+            }
+
+        labels = get_reverse_geocoder().label_locations(conditions.keys())
+        for location, condition in conditions.items():
+            condition['label'] = labels.get(location)
         
-        for loc in locations:
-            latest = TrafficData.objects.filter(
-                location=loc['location']
-            ).order_by('-timestamp').first()
-            
-            if latest:
-                conditions[loc['location']] = {
-                    'current_speed': latest.current_speed,
-                    'free_flow_speed': latest.free_flow_speed,
-                    'density': self.osrm_service._calculate_density(
-                        latest.current_speed,
-                        latest.free_flow_speed
-                    ),
-                    'congestion_level': self.osrm_service._get_congestion_level(
-                        latest.current_speed,
-                        latest.free_flow_speed
-                    ),
-                    'road_closure': latest.road_closure,
-                    'timestamp': latest.timestamp
-                }
-        
-        return Response(conditions)
+        return conditions
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    @query_budget(3)
+    def bulk(self, request):
+        """Ingest a batch of crowd-sourced speed readings (JSON or MessagePack)"""
+        try:
+            stats = ProbeIngestionService().ingest(request.data)
+        except ProbeBatchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(stats, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=False, methods=['get'])
+    @query_budget(2)
     def historical_analysis(self, request):
         """Get historical traffic analysis for the past 24 hours"""
         time_threshold = timezone.now() - timedelta(hours=24)
-        locations = TrafficData.objects.values('location').distinct()
-        analysis = {}
-        
-        for loc in locations:
-            data = TrafficData.objects.filter(
-                location=loc['location'],
-                timestamp__gte=time_threshold
-            ).aggregate(
+        # One grouped query, then density for every location in one call
+        rows = list(
+            TrafficData.objects.filter(timestamp__gte=time_threshold)
+            .values('location')
+            .annotate(
                 avg_speed=Avg('current_speed'),
-                avg_travel_time=Avg('current_travel_time')
+                avg_travel_time=Avg('current_travel_time'),
+                avg_free_flow_speed=Avg('free_flow_speed')
             )
-            
-            if data['avg_speed']:
-                analysis[loc['location']] = {
-                    'average_speed': round(data['avg_speed'], 2),
-                    'average_travel_time': round(data['avg_travel_time'], 2) if data['avg_travel_time'] else 0,
-                    'average_density': self.osrm_service._calculate_density(
-                        data['avg_speed'],
-                        TrafficData.objects.filter(
-                            location=loc['location']
-                        ).first().free_flow_speed
-                    )
-                }
+            .filter(avg_speed__isnull=False)
+            .order_by('location')
+        )
+        densities = traffic_metrics.density(
+            [row['avg_speed'] for row in rows], [row['avg_free_flow_speed'] for row in rows]
+        )
+        analysis = {
+            row['location']: {
+                'average_speed': round(row['avg_speed'], 2),
+                'average_travel_time': round(row['avg_travel_time'], 2) if row['avg_travel_time'] else 0,
+                'average_density': float(density)
+            }
+            for row, density in zip(rows, densities)
+        }
         
         return Response(analysis)
 
-class AlertViewSet(viewsets.ReadOnlyModelViewSet):
+class AlertViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for traffic alerts
     """
     queryset = Alert.objects.all().order_by('-timestamp')
     serializer_class = AlertSerializer
+    query_budgets = {'list': 3, 'retrieve': 2}
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['location', 'alert_type', 'severity']
     ordering_fields = ['timestamp']
 
     @action(detail=False, methods=['get'])
+    @query_budget(2)
     def active_alerts(self, request):
         """Get active alerts from the last hour"""
-        time_threshold = timezone.now() - timedelta(hours=1)
-        alerts = Alert.objects.filter(
-            timestamp__gte=time_threshold
-        ).order_by('-timestamp')
-        
-        serializer = self.get_serializer(alerts, many=True)
-        return Response(serializer.data)
+        def build():
+            time_threshold = timezone.now() - timedelta(hours=1)
+            alerts = Alert.objects.filter(
+                timestamp__gte=time_threshold
+            ).order_by('-timestamp')
+            
+            serializer = self.get_serializer(alerts, many=True)
+            return serializer.data
+
+        # Alerts also age out of the window, so the ETag rolls over every minute
+        return conditional_response(request, ALERTS, build, window=60)
 
 class EmergencyVehicleViewSet(viewsets.ModelViewSet):
     """
@@ -276,10 +369,215 @@ class EmergencyVehicleViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['vehicle_type', 'status']
     ordering_fields = ['last_updated']
+    SPEED_FLUSH_OBSERVATIONS = 20
+
+    def perform_create(self, serializer):
+        self._track_position(serializer.save())
+
+    def perform_update(self, serializer):
+        self._track_position(serializer.save())
+
+    def _track_position(self, vehicle):
+        """Feed the vehicle position to the live map matcher"""
+        lats, lons = parse_locations([vehicle.current_location])
+        if np.isnan(lats[0]):
+            return
+        matcher = get_streaming_matcher()
+        matcher.push_batch(
+            [vehicle.vehicle_id], lats, lons, [vehicle.last_updated.timestamp()]
+        )
+        if matcher.pending_observations >= self.SPEED_FLUSH_OBSERVATIONS:
+            store_segment_speeds(matcher.drain_speeds())
+        get_geofence_engine().evaluate_positions(
+            [vehicle.vehicle_id], lats, lons, vehicle.last_updated
+        )
 
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Get all active emergency vehicles"""
-        active_vehicles = self.get_queryset().filter(status='active')
-        serializer = self.get_serializer(active_vehicles, many=True)
-        return Response(serializer.data)
+        def build():
+            active_vehicles = self.get_queryset().filter(status='active')
+            serializer = self.get_serializer(active_vehicles, many=True)
+            return serializer.data
+
+        return conditional_response(request, EMERGENCY_VEHICLES, build)
+
+
+class GeofenceViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for locally evaluated geofences
+    """
+    queryset = Geofence.objects.all().order_by('name')
+    serializer_class = GeofenceSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['fence_type', 'active']
+    ordering_fields = ['name', 'created_at']
+
+    @action(detail=False, methods=['post'])
+    def evaluate(self, request):
+        """Evaluate a batch of positions and return the ENTER/EXIT events
+
+        Body: ``{"subjects": [...], "lat": [...], "lon": [...]}``
+        """
+        subjects = request.data.get('subjects')
+        try:
+            lats = np.asarray(request.data.get('lat'), dtype=np.float64)
+            lons = np.asarray(request.data.get('lon'), dtype=np.float64)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'lat and lon must be lists of numbers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(subjects, list) or lats.shape != (len(subjects),) or lons.shape != lats.shape:
+            return Response(
+                {'error': 'subjects, lat and lon must be lists of the same length'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        events = get_geofence_engine().evaluate_positions(subjects, lats, lons)
+        return Response({'events': [asdict(event) for event in events]})
+
+    @action(detail=False, methods=['get'])
+    def containing(self, request):
+        """Get the active geofences containing a location"""
+        location = request.query_params.get('location')
+        lats, lons = parse_locations([location])
+        if np.isnan(lats[0]):
+            return Response(
+                {'error': 'location must be "lat,lon"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        fence_ids = get_geofence_engine().containing(lats, lons)[0]
+        fences = self.get_queryset().filter(id__in=fence_ids)
+        return Response(self.get_serializer(fences, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def events(self, request):
+        """Get recent geofence events, optionally for one subject"""
+        events = GeofenceEvent.objects.select_related('geofence').order_by('-timestamp')
+        subject = request.query_params.get('subject')
+        if subject:
+            events = events.filter(subject=subject)
+        page = self.paginate_queryset(events)
+        if page is not None:
+            return self.get_paginated_response(GeofenceEventSerializer(page, many=True).data)
+        return Response(GeofenceEventSerializer(events, many=True).data)
+
+
+class AlertSubscriptionViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for alert subscriptions on areas and saved routes
+    """
+    queryset = AlertSubscription.objects.select_related('user').order_by('-created_at')
+    serializer_class = AlertSubscriptionSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['user__firebase_uid', 'route', 'active']
+    ordering_fields = ['created_at']
+
+
+class ForecastViewSet(viewsets.ViewSet):
+    """
+    API endpoint for short-term speed forecasts
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def list(self, request):
+        """Forecast speeds 15-60 minutes ahead for monitored locations"""
+        location = request.query_params.get('location')
+        horizon = request.query_params.get('horizon')
+
+        if horizon is not None:
+            try:
+                horizon = int(horizon)
+            except ValueError:
+                horizon = None
+            if horizon not in SpeedForecaster.HORIZONS:
+                return Response(
+                    {'error': f'horizon must be one of {list(SpeedForecaster.HORIZONS)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        forecaster = get_speed_forecaster()
+        try:
+            forecasts = forecaster.lookup(location, horizon)
+        except KeyError:
+            return Response(
+                {'error': f'no forecast for location {location}'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response({
+            'generated_at': forecaster.generated_at,
+            'forecasts': forecasts,
+        })
+
+
+class SnapshotViewSet(viewsets.ViewSet):
+    """
+    API endpoint for the binary city snapshot used on app start
+    """
+    permission_classes = [permissions.AllowAny]
+    query_budgets = {'list': 5}
+
+    def list(self, request):
+        """Conditions, active alerts and vehicles in one payload; ``since`` gets a delta"""
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response(
+                    {'error': 'since must be a snapshot version'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        try:
+            snapshot = city_snapshot.get_city_snapshot().snapshot(since)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        etag = f'"snapshot-{snapshot.base_version}-{snapshot.version}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(snapshot.data, content_type=city_snapshot.MEDIA_TYPE)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        response['X-Snapshot-Version'] = str(snapshot.version)
+        return response
+
+
+class HeatmapViewSet(viewsets.ViewSet):
+    """
+    API endpoint for congestion heatmap tiles
+    """
+    permission_classes = [permissions.AllowAny]
+    query_budgets = {'tile': 2}
+
+    def tile(self, request, z=None, x=None, y=None):
+        """256px PNG heatmap tile of current density at z/x/y"""
+        z, x, y = int(z), int(x), int(y)
+        if not 0 <= z <= settings.HEATMAP_MAX_ZOOM:
+            return Response(
+                {'error': f'zoom must be between 0 and {settings.HEATMAP_MAX_ZOOM}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return Response(
+                {'error': f'tile {x}/{y} does not exist at zoom {z}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            png, version = get_heatmap_renderer().tile(z, x, y)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        etag = f'"heatmap-{version}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(png, content_type='image/png')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'traffic.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +61,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'traffic.middleware.FirebaseAuthMiddleware',
+    'traffic.db_router.ReadYourWritesMiddleware',
+    'traffic.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'traffix_backend.urls'
@@ -81,6 +84,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'traffix_backend.wsgi.application'
+# Serve with an ASGI worker so the async routing and geocoding views don't hold
+# a thread per upstream call: gunicorn -k uvicorn.workers.UvicornWorker traffix_backend.asgi
+ASGI_APPLICATION = 'traffix_backend.asgi.application'
 
 
 # Database
@@ -94,9 +100,31 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'password'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        # Required when connecting through a transaction-mode pooler (PgBouncer)
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_POOLER', 'False') == 'True',
     }
 }
 
+# Optional read replica for read-only viewsets (see traffic.db_router)
+DATABASE_REPLICA_ALIAS = 'replica'
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['traffic.db_router.ReplicaRouter']
+# Seconds a client reads from the primary after writing, between replica
+# health checks, and of replication lag before the replica is skipped
+DATABASE_REPLICA_STICKY_SECONDS = float(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
+DATABASE_REPLICA_HEALTH_SECONDS = float(os.getenv('DB_REPLICA_HEALTH_SECONDS', '10'))
+DATABASE_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '30'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -140,13 +168,181 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Shared async client for OSRM and Nominatim calls made by the async views
+UPSTREAM_HTTP_TIMEOUT = float(os.getenv('UPSTREAM_HTTP_TIMEOUT', '10'))
+UPSTREAM_HTTP_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_HTTP_MAX_CONNECTIONS', '200'))
+UPSTREAM_HTTP_MAX_KEEPALIVE = int(os.getenv('UPSTREAM_HTTP_MAX_KEEPALIVE', '50'))
+# Nominatim rejects requests without an identifying User-Agent
+UPSTREAM_HTTP_USER_AGENT = os.getenv('UPSTREAM_HTTP_USER_AGENT', 'traffix-backend')
+
 # TomTom API Configuration
 TOMTOM_API_KEY = os.getenv('TOMTOM_API_KEY', '')
 TOMTOM_API_VERSION = '2'
 TOMTOM_BASE_URL = 'https://api.tomtom.com'
 
+# Daily call budgets per TomTom endpoint group, paced over the day
+TOMTOM_DAILY_QUOTAS = {
+    'flow': int(os.getenv('TOMTOM_QUOTA_FLOW', '1500')),
+    'incidents': int(os.getenv('TOMTOM_QUOTA_INCIDENTS', '500')),
+    'routing': int(os.getenv('TOMTOM_QUOTA_ROUTING', '400')),
+    'search': int(os.getenv('TOMTOM_QUOTA_SEARCH', '100')),
+}
+TOMTOM_QUOTA_BURST_SECONDS = float(os.getenv('TOMTOM_QUOTA_BURST_SECONDS', '900'))
+# How long the last good response is served when a budget runs out
+TOMTOM_RESPONSE_CACHE_SECONDS = int(os.getenv('TOMTOM_RESPONSE_CACHE_SECONDS', '3600'))
+
+# Local road network extract (GeoJSON) used for reverse geocoding
+ROAD_NETWORK_EXTRACT = os.getenv(
+    'ROAD_NETWORK_EXTRACT',
+    os.path.join(BASE_DIR, 'data', 'road_network.geojson')
+)
+
+# Live map matching: vehicles silent this long are finalised and dropped,
+# and at most this many are tracked per process
+MAP_MATCH_STREAM_IDLE_SECONDS = float(os.getenv('MAP_MATCH_STREAM_IDLE_SECONDS', '300'))
+MAP_MATCH_STREAM_MAX_VEHICLES = int(os.getenv('MAP_MATCH_STREAM_MAX_VEHICLES', '10000'))
+# Seconds between saves of the segment speeds finalised by the live matcher
+MAP_MATCH_STREAM_FLUSH_SECONDS = float(os.getenv('MAP_MATCH_STREAM_FLUSH_SECONDS', '60'))
+
+# Hour-of-week speed profiles and forecast tables written by the collectors
+SPEED_PROFILE_DIR = os.getenv('SPEED_PROFILE_DIR', os.path.join(BASE_DIR, 'data', 'profiles'))
+
+# Seconds before the anomaly detector alerts again for the same location
+ANOMALY_ALERT_COOLDOWN = float(os.getenv('ANOMALY_ALERT_COOLDOWN', '900'))
+
+# In-process ring buffers of the latest readings per location
+RECENT_STORE_MAX_LOCATIONS = int(os.getenv('RECENT_STORE_MAX_LOCATIONS', '20000'))
+RECENT_STORE_DEPTH = int(os.getenv('RECENT_STORE_DEPTH', '32'))
+RECENT_STORE_SYNC_SECONDS = float(os.getenv('RECENT_STORE_SYNC_SECONDS', '5'))
+
+# Write-behind queue used by the collectors (policy: block, drop_newest, drop_oldest)
+INGESTION_QUEUE_MAX_SIZE = int(os.getenv('INGESTION_QUEUE_MAX_SIZE', '10000'))
+INGESTION_QUEUE_BATCH_SIZE = int(os.getenv('INGESTION_QUEUE_BATCH_SIZE', '500'))
+INGESTION_QUEUE_FLUSH_INTERVAL = float(os.getenv('INGESTION_QUEUE_FLUSH_INTERVAL', '2'))
+INGESTION_QUEUE_POLICY = os.getenv('INGESTION_QUEUE_POLICY', 'block')
+
+# Side in degrees of the fixed tile grid route collection fetches by
+COLLECTION_TILE_SIZE = float(os.getenv('COLLECTION_TILE_SIZE', '0.02'))
+
+# Lower density bounds (share of free-flow speed lost, 0-1) of each congestion
+# level and congestion alert severity, used everywhere via traffic_metrics
+TRAFFIC_METRIC_THRESHOLDS = {
+    'congestion_level': {
+        'medium': float(os.getenv('CONGESTION_MEDIUM_DENSITY', '0.3')),
+        'high': float(os.getenv('CONGESTION_HIGH_DENSITY', '0.7')),
+    },
+    'alert_severity': {
+        'MEDIUM': float(os.getenv('ALERT_MEDIUM_DENSITY', '0.3')),
+        'HIGH': float(os.getenv('ALERT_HIGH_DENSITY', '0.5')),
+    },
+}
+
+# Seconds a sharded collector worker holds a shard lease without renewing it
+COLLECTOR_LEASE_TTL = float(os.getenv('COLLECTOR_LEASE_TTL', '60'))
+
+# Bulk probe ingestion: readings per request, aggregation grid (degrees),
+# time bucket (seconds) and samples needed for a confidence of 1
+PROBE_MAX_BATCH = int(os.getenv('PROBE_MAX_BATCH', '50000'))
+PROBE_CELL_SIZE = float(os.getenv('PROBE_CELL_SIZE', '0.001'))
+PROBE_BUCKET_SECONDS = int(os.getenv('PROBE_BUCKET_SECONDS', '60'))
+PROBE_FULL_CONFIDENCE_SAMPLES = int(os.getenv('PROBE_FULL_CONFIDENCE_SAMPLES', '5'))
+
+# Grid cell size in degrees of the local geofence prefilter
+GEOFENCE_GRID_SIZE = float(os.getenv('GEOFENCE_GRID_SIZE', '0.01'))
+# Seconds after which a vehicle not seen again is no longer inside any geofence
+GEOFENCE_PRESENCE_TTL = float(os.getenv('GEOFENCE_PRESENCE_TTL', '3600'))
+
+# Alert subscription matching and push delivery (sender is a dotted path to a PushSender)
+ALERT_SUBSCRIPTION_GRID_SIZE = float(os.getenv('ALERT_SUBSCRIPTION_GRID_SIZE', '0.01'))
+ALERT_PUSH_BATCH_SIZE = int(os.getenv('ALERT_PUSH_BATCH_SIZE', '500'))
+ALERT_PUSH_SENDER = os.getenv(
+    'ALERT_PUSH_SENDER', 'traffic.services.alert_subscriptions.FirebasePushSender'
+)
+
+# Saved route ETAs: corridor width (metres) mapping monitored locations to
+# routes, speed ratio change that triggers a recompute, assumed free-flow speed
+ROUTE_ETA_CORRIDOR_M = float(os.getenv('ROUTE_ETA_CORRIDOR_M', '150'))
+ROUTE_ETA_CHANGE_THRESHOLD = float(os.getenv('ROUTE_ETA_CHANGE_THRESHOLD', '0.1'))
+ROUTE_ETA_FREE_FLOW_KMH = float(os.getenv('ROUTE_ETA_FREE_FLOW_KMH', '40'))
+
+# Binary city snapshot (traffic/services/city_snapshot.py): seconds before an
+# unchanged snapshot is rebuilt anyway, seconds each version is kept for
+# deltas, and zlib level
+CITY_SNAPSHOT_MAX_AGE = int(os.getenv('CITY_SNAPSHOT_MAX_AGE', '60'))
+CITY_SNAPSHOT_HISTORY_SECONDS = int(os.getenv('CITY_SNAPSHOT_HISTORY_SECONDS', '3600'))
+CITY_SNAPSHOT_ZLIB_LEVEL = int(os.getenv('CITY_SNAPSHOT_ZLIB_LEVEL', '6'))
+
+# Heatmap tiles (traffic/services/heatmap_tiles.py): kernel sigma in screen
+# pixels, summed density drawn fully saturated, deepest zoom served, seconds a
+# rendered tile is cached, PNG zlib level, and the area (minLon,minLat,maxLon,
+# maxLat) and zooms the heatmap_tiles job prerenders
+HEATMAP_SIGMA_PX = float(os.getenv('HEATMAP_SIGMA_PX', '8'))
+HEATMAP_SATURATION = float(os.getenv('HEATMAP_SATURATION', '1.5'))
+HEATMAP_MAX_ZOOM = int(os.getenv('HEATMAP_MAX_ZOOM', '18'))
+HEATMAP_CACHE_SECONDS = int(os.getenv('HEATMAP_CACHE_SECONDS', '900'))
+HEATMAP_PNG_LEVEL = int(os.getenv('HEATMAP_PNG_LEVEL', '6'))
+HEATMAP_SERVICE_AREA = os.getenv('HEATMAP_SERVICE_AREA', '85.2443,27.6258,85.5419,27.8075')
+HEATMAP_PRECOMPUTE_ZOOMS = [
+    int(zoom) for zoom in os.getenv('HEATMAP_PRECOMPUTE_ZOOMS', '11,12,13,14').split(',') if zoom.strip()
+]
+
+# Job scheduler (run_scheduler): seconds between runs of each registered job,
+# 0 disables it. First runs are spread over SCHEDULER_JITTER of the interval.
+SCHEDULER_INTERVALS = {
+    'collect': int(os.getenv('SCHEDULE_COLLECT_SECONDS', '300')),
+    'collect_areas': int(os.getenv('SCHEDULE_COLLECT_AREAS_SECONDS', '0')),
+    'simulate': int(os.getenv('SCHEDULE_SIMULATE_SECONDS', '0')),
+    'sync_firebase': int(os.getenv('SCHEDULE_SYNC_FIREBASE_SECONDS', '300')),
+    'rollups': int(os.getenv('SCHEDULE_ROLLUPS_SECONDS', '300')),
+    'retention': int(os.getenv('SCHEDULE_RETENTION_SECONDS', '3600')),
+    'route_etas': int(os.getenv('SCHEDULE_ROUTE_ETAS_SECONDS', '60')),
+    'route_geometry': int(os.getenv('SCHEDULE_ROUTE_GEOMETRY_SECONDS', '900')),
+    'city_snapshot': int(os.getenv('SCHEDULE_CITY_SNAPSHOT_SECONDS', '30')),
+    'heatmap_tiles': int(os.getenv('SCHEDULE_HEATMAP_TILES_SECONDS', '60')),
+}
+SCHEDULER_MAX_WORKERS = int(os.getenv('SCHEDULER_MAX_WORKERS', '4'))
+SCHEDULER_JITTER = float(os.getenv('SCHEDULER_JITTER', '0.1'))
+
+# Days of history kept by the retention job (0 keeps everything)
+RETENTION_DAYS = {
+    'traffic_data': int(os.getenv('RETENTION_TRAFFIC_DATA_DAYS', '30')),
+    'alerts': int(os.getenv('RETENTION_ALERTS_DAYS', '90')),
+    'geofence_events': int(os.getenv('RETENTION_GEOFENCE_EVENTS_DAYS', '30')),
+}
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '5000'))
+
+# Shared cache for resource versions, quota counters and cached API responses.
+# Collectors and the web server must see the same cache, so the default is
+# file based; set REDIS_URL (needs the redis package) for several machines.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', os.path.join(BASE_DIR, 'data', 'cache')),
+        }
+    }
+
 # Update REST_FRAMEWORK settings
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'traffic.renderers.ORJSONRenderer',
+        'traffic.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'traffic.renderers.ORJSONParser',
+        'traffic.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.OrderingFilter',
@@ -156,6 +352,23 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 100,
 }
 
+# Query budgets (traffic/query_budget.py): 'raise' fails requests over their
+# declared budget (the test runner sets it), 'log' checks a sample of requests
+# and logs violations with stack traces, 'off' disables the check
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'log')
+QUERY_BUDGET_SAMPLE_RATE = float(os.getenv('QUERY_BUDGET_SAMPLE_RATE', '0.01'))
+# Budget of actions that declare none, and how often one query shape may run
+# in a request before it is reported as N+1
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', '50'))
+QUERY_BUDGET_REPEAT_THRESHOLD = int(os.getenv('QUERY_BUDGET_REPEAT_THRESHOLD', '5'))
+TEST_RUNNER = 'traffic.query_budget.QueryBudgetTestRunner'
+
+# Response compression (brotli is used when the Brotli package is installed)
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+COMPRESSION_CONTENT_TYPES = ('application/json', 'application/msgpack', 'text/')
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only, configure properly in production
 